@@ -5,7 +5,11 @@ from model import *
 from parameterized import *
 import priors
 from gp import GP
+from iterative_gp import IterativeGP
+from toeplitz_gp import ToeplitzGP
+from kiss_gp import KISSGP
 from sparse_gp import SparseGP
+from sparse_gp_statistics import SparseGPFromStatistics
 from fitc import FITC
 from svigp import SVIGP
 from mapping import *
@@ -43,10 +43,15 @@ class FITC(SparseGP):
         self._set_params(self._get_params())
 
     def _compute_kernel_matrices(self):
-        # kernel computations, using BGPLVM notation
-        self.Kmm = self.kern.K(self.Z)
-        self.psi0 = self.kern.Kdiag(self.X)
-        self.psi1 = self.kern.K(self.Z, self.X)
+        # kernel computations, using BGPLVM notation. Only the quantities
+        # whose inputs have changed since the last call are recomputed.
+        theta = self.kern._get_params()
+        if self._has_changed('Kmm', theta, self.Z):
+            self.Kmm = self.kern.K(self.Z)
+        if self._has_changed('psi0', theta, self.X):
+            self.psi0 = self.kern.Kdiag(self.X)
+        if self._has_changed('psi1', theta, self.Z, self.X):
+            self.psi1 = self.kern.K(self.Z, self.X)
         self.psi2 = None
 
     def _computations(self):
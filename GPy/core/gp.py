@@ -5,8 +5,10 @@
 import numpy as np
 import pylab as pb
 from .. import kern
-from ..util.linalg import pdinv, mdot, tdot, dpotrs, dtrtrs
-from ..likelihoods import EP, Laplace
+from ..util.linalg import pdinv, block_pdinv, mdot, tdot, dpotrs, dtrtrs, dpotrf, dpotri, jitchol, chol_inv, cholupdate, symmetrify, DSYR
+from ..util import diag
+from ..util.block_matrices import label_blocks
+from ..likelihoods import EP, Laplace, Gaussian
 from gp_base import GPBase
 
 class GP(GPBase):
@@ -23,6 +25,22 @@ class GP(GPBase):
     .. Note:: Multiple independent outputs are allowed using columns of Y
 
     """
+    # upper bound (in bytes) on the temporaries used by _raw_predict: Xnew
+    # is processed in chunks so that Kx never grows beyond this.
+    predict_memory = 2 ** 27
+
+    # lean mode keeps a single N x N array, the Cholesky factor of K, which
+    # is computed in place. K^{-1} and dL_dK are only formed when a gradient
+    # needs them, and their buffer is reused across calls to _set_params.
+    # The distance cache of the kernel is emptied and sized to nothing.
+    lean = False
+
+    # when the kernel makes K block diagonal (up to a permutation, e.g. for
+    # independent outputs), the rows of each block and the Cholesky factors
+    # of the blocks, which are factorized separately (see _factorize)
+    _K_blocks = None
+    _block_L = None
+
     def __init__(self, X, likelihood, kernel, normalize_X=False):
         GPBase.__init__(self, X, likelihood, kernel, normalize_X=normalize_X)
         self.update_likelihood_approximation()
@@ -36,31 +54,291 @@ class GP(GPBase):
         self.kern._set_params_transformed(new_kern_params)
         self.likelihood._set_params_transformed(new_likelihood_params)
 
-        self.K = self.kern.K(self.X)
+        kern_changed = self._has_changed('kern', self.kern._get_params(), self.X)
+        if self.lean:
+            self._lean_factorization()
+        else:
+            if isinstance(self.likelihood, Gaussian) and not kern_changed and getattr(self, 'K', None) is not None:
+                # only the noise has changed: swap it on the diagonal of K
+                diag.add(self.K, self.likelihood._variance - self._K_noise)
+            else:
+                self.K = self._compute_K()
+            if isinstance(self.likelihood, Gaussian):
+                self._K_noise = self.likelihood._variance
+            self._Ki, self.L, self._Li, self.K_logdet = self._factorize(self.K)
+
+        self._posterior_computations()
+
+    def _block_structure(self):
+        """
+        The rows of each block of K, when the kernel makes it block diagonal
+        (see kern.block_labels), None otherwise. This depends on X only,
+        and is kept until X changes.
+        """
+        if getattr(self, '_K_blocks_X', None) is not self.X:
+            labels = self.kern.block_labels(self.X)
+            self._K_blocks = None if labels is None or labels.max() == 0 else label_blocks(labels)
+            self._K_blocks_X = self.X
+        return self._K_blocks
+
+    def _factorize(self, K):
+        """
+        pdinv of K, block by block when K is block diagonal: P blocks of n
+        rows cost P n^3 rather than (P n)^3, and are factorized in threads
+        (see GPy.util.parallel).
+        """
+        blocks = self._block_structure()
+        if blocks is None:
+            self._block_L = None
+            return pdinv(K)
+        Ki, L, Li, logdet, self._block_L = block_pdinv(K, blocks)
+        return Ki, L, Li, logdet
+
+    def _block_solve(self, B):
+        """K^{-1} B, from the Cholesky factor of K (or of its blocks)."""
+        if self._block_L is None:
+            return dpotrs(self.L, np.asfortranarray(B), lower=1)[0]
+        X = np.empty(B.shape)
+        for b, L in zip(self._K_blocks, self._block_L):
+            X[b] = dpotrs(L, np.asfortranarray(B[b]), lower=1)[0]
+        return X
+
+    def _block_half_solve(self, B):
+        """L^{-1} B, for the Cholesky factor L of K (or of its blocks)."""
+        if self._block_L is None:
+            return dtrtrs(self.L, np.asfortranarray(B), lower=1)[0]
+        X = np.empty(B.shape)
+        for b, L in zip(self._K_blocks, self._block_L):
+            X[b] = dtrtrs(L, np.asfortranarray(B[b]), lower=1)[0]
+        return X
+
+    def _dense_factor(self):
+        """
+        Replace the Cholesky factors of the blocks of K by the (triangular)
+        Cholesky factor of the whole of K.
+        """
+        if self._block_L is not None:
+            self.L, self._Li, self._block_L = jitchol(self.K), None, None
+
+    def _compute_K(self, target=None):
+        """
+        The covariance matrix of the observations, K + covariance of the
+        likelihood.
+        """
+        if self.lean:
+            K = self.kern.K(self.X, target=target)
+            self._kern_cache = None
+        else:
+            # keep the intermediate results of the kernel for the gradients
+            K, cache = self.kern.K_and_cache(self.X, target=target)
+            self._kern_cache = (self.X, self.kern._get_params(), cache)
 
         #Re fit likelihood approximation (if it is an approx), as parameters have changed
         if isinstance(self.likelihood, Laplace):
-            self.likelihood.fit_full(self.K)
+            self.likelihood.fit_full(K)
 
-        self.K += self.likelihood.covariance_matrix
+        if isinstance(self.likelihood, Gaussian):
+            diag.add(K, self.likelihood._variance)
+        else:
+            K += self.likelihood.covariance_matrix
+        return K
 
-        self.Ki, self.L, self.Li, self.K_logdet = pdinv(self.K)
+    def _lean_buffer(self, buf):
+        """
+        Return buf if it can hold an N x N Fortran ordered matrix, or a new
+        array which can.
+        """
+        if buf is None or buf.shape != (self.num_data, self.num_data) or not buf.flags['F_CONTIGUOUS']:
+            buf = np.empty((self.num_data, self.num_data), order='F')
+        return buf
+
+    def _lean_factorization(self):
+        """
+        Compute K into the memory of the previous Cholesky factor, and
+        factorize it in place.
+        """
+        self.kern.distances.max_bytes = 0
+        self.kern.distances.clear()
+        self.K = self._Ki = self._Li = self._block_L = None
+        K = self._compute_K(target=self._lean_buffer(getattr(self, 'L', None)))
+        self.L, info = dpotrf(K, lower=1, overwrite_A=True)
+        if info != 0:
+            # K has been overwritten by the failed factorization
+            self.L = jitchol(self._compute_K())
+        self.K_logdet = 2.*np.sum(np.log(np.diag(self.L)))
+
+    def _posterior_computations(self):
+        """
+        Compute the posterior weights and the gradient of the likelihood wrt
+        the covariance matrix from self.L and self.Ki. In lean mode, the
+        gradient is left to be computed on demand.
+        """
+        # the posterior weights, alpha = K^{-1}Y. Together with self.L these
+        # are all that _raw_predict needs.
+        self.alpha = self._block_solve(self.likelihood.Y)
+
+        if self.lean:
+            self._dL_dK = None
+            return
 
         # the gradient of the likelihood wrt the covariance matrix
         if self.likelihood.YYT is None:
-            # alpha = np.dot(self.Ki, self.likelihood.Y)
-            alpha, _ = dpotrs(self.L, self.likelihood.Y, lower=1)
-
-            self.dL_dK = 0.5 * (tdot(alpha) - self.output_dim * self.Ki)
+            self._dL_dK = 0.5 * (tdot(self.alpha) - self.output_dim * self.Ki)
         else:
             # tmp = mdot(self.Ki, self.likelihood.YYT, self.Ki)
-            tmp, _ = dpotrs(self.L, np.asfortranarray(self.likelihood.YYT), lower=1)
-            tmp, _ = dpotrs(self.L, np.asfortranarray(tmp.T), lower=1)
-            self.dL_dK = 0.5 * (tmp - self.output_dim * self.Ki)
+            tmp = self._block_solve(self.likelihood.YYT)
+            tmp = self._block_solve(tmp.T)
+            self._dL_dK = 0.5 * (tmp - self.output_dim * self.Ki)
 
         #Adding dZ_dK (0 for a non-approximate likelihood, compensates for
         #additional gradients of K when log-likelihood has non-zero Z term)
-        self.dL_dK += self.likelihood.dZ_dK
+        self._dL_dK += self.likelihood.dZ_dK
+
+    def _lean_dL_dK(self):
+        """
+        dL_dK = 0.5 * (alpha alpha^T - D K^{-1}), computed in place from the
+        Cholesky factor.
+        """
+        dL_dK = self._lean_buffer(getattr(self, '_dL_dK_buffer', None))
+        dL_dK[:] = self.L
+        dL_dK, _ = dpotri(dL_dK, lower=1, overwrite_A=True)
+        symmetrify(dL_dK)
+        dL_dK *= -0.5 * self.output_dim
+        # alpha alpha^T = K^{-1} YY^T K^{-1}, as rank one updates (on the C
+        # ordered view of the symmetric matrix, as DSYR expects)
+        for alpha_d in self.alpha.T:
+            DSYR(dL_dK.T, np.ascontiguousarray(alpha_d), 0.5)
+        dL_dK += self.likelihood.dZ_dK
+        self._dL_dK_buffer = dL_dK
+        return dL_dK
+
+    @property
+    def Ki(self):
+        """
+        The inverse of K. In lean mode this is computed from the Cholesky
+        factor on every access.
+        """
+        if self._Ki is None:
+            Ki, _ = dpotri(self.L, lower=1)
+            symmetrify(Ki)
+            return Ki
+        return self._Ki
+
+    @property
+    def dL_dK(self):
+        """
+        The gradient of the log likelihood wrt the covariance matrix.
+        """
+        if self._dL_dK is None:
+            self._dL_dK = self._lean_dL_dK()
+        return self._dL_dK
+
+    @property
+    def Li(self):
+        """
+        The inverse of the Cholesky factor of K, computed on demand.
+        """
+        if self._Li is None:
+            self._Li = chol_inv(self.L)
+        return self._Li
+
+    def append_data(self, X_new, Y_new):
+        """
+        Add observations to the model, keeping the hyperparameters fixed.
+
+        Rather than refactorizing the whole covariance matrix, the Cholesky
+        factor and the inverse of K are extended by a block update, which
+        costs O(num_data^2 * k) for k new points. The normalization of X and
+        Y computed at construction time is kept.
+
+        :param X_new: the new inputs
+        :type X_new: np.ndarray, k x self.input_dim
+        :param Y_new: the new observations
+        :type Y_new: np.ndarray, k x self.output_dim
+
+        .. Note:: Gaussian likelihoods only, not available in lean mode.
+        """
+        assert isinstance(self.likelihood, Gaussian), "incremental updates need a Gaussian likelihood"
+        assert not self.lean, "incremental updates need K and its inverse"
+        assert X_new.shape[0] == Y_new.shape[0]
+        self._dense_factor()
+        X_new = (X_new - self._Xoffset) / self._Xscale
+        N, num_new = self.num_data, X_new.shape[0]
+
+        K12 = self.kern.K(self.X, X_new)
+        K22 = self.kern.K(X_new) + np.eye(num_new) * self.likelihood._variance
+
+        # L = [[L11, 0], [L21, L22]] with L21 = (L11^{-1} K12)^T
+        L21T, _ = dtrtrs(self.L, np.asfortranarray(K12), lower=1)
+        L22 = jitchol(K22 - tdot(L21T.T))
+        L = np.zeros((N + num_new, N + num_new), order='F')
+        L[:N, :N] = self.L
+        L[N:, :N] = L21T.T
+        L[N:, N:] = L22
+
+        # the inverse, through the Schur complement S = L22 L22^T
+        KiK12 = np.dot(self.Ki, K12)
+        Si = tdot(chol_inv(L22).T)
+        B = -np.dot(KiK12, Si)
+        Ki = np.empty((N + num_new, N + num_new))
+        Ki[:N, :N] = self.Ki - np.dot(B, KiK12.T)
+        Ki[:N, N:] = B
+        Ki[N:, :N] = B.T
+        Ki[N:, N:] = Si
+
+        self.K = np.vstack((np.hstack((self.K, K12)), np.hstack((K12.T, K22))))
+        self._Ki, self.L, self._Li = Ki, L, None
+        self.K_logdet += 2.*np.sum(np.log(np.diag(L22)))
+
+        self.X = np.vstack((self.X, X_new))
+        self.num_data = self.X.shape[0]
+        self.likelihood.set_data(np.vstack((self.likelihood.data, Y_new)))
+        self._posterior_computations()
+
+    def remove_data(self, index):
+        """
+        Remove observations from the model, keeping the hyperparameters
+        fixed.
+
+        The Cholesky factor is downdated with one rank-1 update of its
+        trailing block per removed point (see GPy.util.linalg.cholupdate),
+        and the inverse of K through the Schur complement, so this costs
+        O(num_data^2 * k) for k removed points.
+
+        :param index: the rows of X (and Y) to remove
+        :type index: int, list of ints, slice or boolean mask
+
+        .. Note:: Gaussian likelihoods only, not available in lean mode.
+        """
+        assert isinstance(self.likelihood, Gaussian), "incremental updates need a Gaussian likelihood"
+        assert not self.lean, "incremental updates need K and its inverse"
+        self._dense_factor()
+        index = np.unique(np.arange(self.num_data)[index])
+        keep = np.setdiff1d(np.arange(self.num_data), index)
+
+        # Ki_kk - Ki_kr Ki_rr^{-1} Ki_rk
+        Ki_kr = self.Ki[np.ix_(keep, index)]
+        tmp, _ = dpotrs(jitchol(self.Ki[np.ix_(index, index)]), np.asfortranarray(Ki_kr.T), lower=1)
+        Ki = self.Ki[np.ix_(keep, keep)] - np.dot(Ki_kr, tmp)
+
+        # deleting row and column i of K leaves L11 and L21 untouched, and
+        # L33 becomes the Cholesky factor of L33 L33^T + l32 l32^T.
+        L = self.L.copy()
+        for i in index[::-1]:
+            if i + 1 < L.shape[0]:
+                L33 = L[i + 1:, i + 1:].copy()
+                cholupdate(L33, L[i + 1:, i].copy())
+                L[i + 1:, i + 1:] = L33
+            L = np.delete(np.delete(L, i, 0), i, 1)
+
+        self.K = self.K[np.ix_(keep, keep)]
+        self._Ki, self.L, self._Li = Ki, np.asfortranarray(L), None
+        self.K_logdet = 2.*np.sum(np.log(np.diag(L)))
+
+        self.X = self.X[keep]
+        self.num_data = self.X.shape[0]
+        self.likelihood.set_data(self.likelihood.data[keep])
+        self._posterior_computations()
 
     def _get_params(self):
         return np.hstack((self.kern._get_params_transformed(), self.likelihood._get_params()))
@@ -81,14 +359,10 @@ class GP(GPBase):
 
     def _model_fit_term(self):
         """
-        Computes the model fit using YYT if it's available
+        Computes the model fit, -0.5 * trace(K^{-1} YY^T), from the posterior
+        weights alpha = K^{-1}Y
         """
-        if self.likelihood.YYT is None:
-            tmp, _ = dtrtrs(self.L, np.asfortranarray(self.likelihood.Y), lower=1)
-            return -0.5 * np.sum(np.square(tmp))
-            # return -0.5 * np.sum(np.square(np.dot(self.Li, self.likelihood.Y)))
-        else:
-            return -0.5 * np.sum(np.multiply(self.Ki, self.likelihood.YYT))
+        return -0.5 * np.sum(self.likelihood.Y * self.alpha)
 
     def log_likelihood(self):
         """
@@ -106,25 +380,60 @@ class GP(GPBase):
         The gradient of all parameters.
 
         Note, we use the chain rule: dL_dtheta = dL_dK * d_K_dtheta
+
+        The kernel reuses the intermediate results of the computation of K
+        when they are still valid.
+        """
+        cache = getattr(self, '_kern_cache', None)
+        if cache is not None and cache[0] is self.X and np.array_equal(cache[1], self.kern._get_params()):
+            dL_dtheta = self.kern.dK_dtheta_from_cache(self.dL_dK, cache[2])
+        else:
+            dL_dtheta = self.kern.dK_dtheta(dL_dK=self.dL_dK, X=self.X)
+        return np.hstack((dL_dtheta, self.likelihood._gradients(partial=np.diag(self.dL_dK))))
+
+    def _predict_chunksize(self, num_arrays=2):
+        """
+        The number of prediction points that can be processed at once
+        without exceeding self.predict_memory, with num_arrays arrays of
+        num_data x chunksize (Kx and L^{-1}Kx by default).
         """
-        return np.hstack((self.kern.dK_dtheta(dL_dK=self.dL_dK, X=self.X), self.likelihood._gradients(partial=np.diag(self.dL_dK))))
+        return max(1, int(self.predict_memory // (8 * num_arrays * self.num_data)))
 
     def _raw_predict(self, _Xnew, which_parts='all', full_cov=False, stop=False):
         """
         Internal helper function for making predictions, does not account
         for normalization or likelihood
+
+        The posterior (self.alpha and self.L) is computed once in
+        _set_params, so the mean costs O(num_data) per prediction point and
+        the variance a single triangular solve. _Xnew is processed in chunks
+        of self._predict_chunksize() points. With full_cov, the covariance
+        between two chunks is Kx_1^T K^{-1} Kx_2, from a solve for the later
+        chunk and the recomputed Kx of the earlier one, so that the
+        temporaries stay within self.predict_memory as well.
         """
-        Kx = self.kern.K(_Xnew, self.X, which_parts=which_parts).T
-        # KiKx = np.dot(self.Ki, Kx)
-        KiKx, _ = dpotrs(self.L, np.asfortranarray(Kx), lower=1)
-        mu = np.dot(KiKx.T, self.likelihood.Y)
+        num_new = _Xnew.shape[0]
+        chunksize = self._predict_chunksize(3 if full_cov else 2)
+        chunks = [slice(start, min(start + chunksize, num_new)) for start in range(0, num_new, chunksize)]
+        mu = np.empty((num_new, self.alpha.shape[1]))
         if full_cov:
-            Kxx = self.kern.K(_Xnew, which_parts=which_parts)
-            var = Kxx - np.dot(KiKx.T, Kx)
+            var = self.kern.K(_Xnew, which_parts=which_parts)
         else:
-            Kxx = self.kern.Kdiag(_Xnew, which_parts=which_parts)
-            var = Kxx - np.sum(np.multiply(KiKx, Kx), 0)
-            var = var[:, None]
+            var = np.empty((num_new, 1))
+        for i, s in enumerate(chunks):
+            Kx = self.kern.K(self.X, _Xnew[s], which_parts=which_parts)
+            mu[s] = np.dot(Kx.T, self.alpha)
+            if not full_cov:
+                tmp = self._block_half_solve(Kx)
+                var[s, 0] = self.kern.Kdiag(_Xnew[s], which_parts=which_parts) - np.sum(np.square(tmp), 0)
+            elif len(chunks) == 1:
+                var -= tdot(self._block_half_solve(Kx).T)
+            else:
+                KiKx = self._block_solve(Kx)
+                for s2 in chunks[:i]:
+                    var[s2, s] -= np.dot(self.kern.K(_Xnew[s2], self.X, which_parts=which_parts), KiKx)
+                    var[s, s2] = var[s2, s].T
+                var[s, s] -= np.dot(Kx.T, KiKx)
         if stop:
             debug_this # @UndefinedVariable
         return mu, var
@@ -0,0 +1,173 @@
+# Copyright (c) 2013, GPy authors (see AUTHORS.txt).
+# Licensed under the BSD 3-clause license (see LICENSE.txt)
+
+import numpy as np
+from ..util.iterative import pcg, lanczos_quadrature, rademacher
+from ..likelihoods import Gaussian
+from gp import GP
+from gp_base import GPBase
+
+class IterativeGP(GP):
+    """
+    Gaussian Process model for regression with matrix-free inference.
+
+    The covariance matrix is never stored: K is only accessed through
+    matrix-vector products computed block_size rows at a time. Linear
+    systems are solved by conjugate gradients, preconditioned by the
+    diagonal of K. The log-determinant is estimated by stochastic Lanczos
+    quadrature, and the trace term of the gradients by a Hutchinson
+    estimator, both using the same probe vectors, which are drawn once at
+    construction so that the objective is deterministic.
+
+    :param X: input observations
+    :param likelihood: a GPy likelihood, must be Gaussian
+    :param kernel: a GPy kernel
+    :param normalize_X:  whether to normalize the input data before computing (predictions will be in original scales)
+    :type normalize_X: False|True
+    :param num_probes: the number of probe vectors of the stochastic estimators
+    :type num_probes: int
+    :param block_size: the number of rows of K computed at once
+    :type block_size: int
+    :param tol: relative tolerance of the conjugate gradient solves
+    :param maxiter: maximum number of conjugate gradient iterations (default: num_data)
+
+    .. Note:: the log likelihood and its gradients are stochastic estimates.
+    """
+    def __init__(self, X, likelihood, kernel, normalize_X=False, num_probes=20, block_size=500, tol=1e-6, maxiter=None):
+        assert isinstance(likelihood, Gaussian), "iterative inference needs a Gaussian likelihood"
+        GPBase.__init__(self, X, likelihood, kernel, normalize_X=normalize_X)
+        self.block_size = block_size
+        self.tol = tol
+        self.maxiter = maxiter
+        self.probes = rademacher(self.num_data, num_probes)
+        self._set_params(self._get_params())
+
+    def _blocks(self):
+        for start in range(0, self.num_data, self.block_size):
+            yield slice(start, min(start + self.block_size, self.num_data))
+
+    def _K_dot(self, V):
+        """
+        The product of the (noisy) covariance matrix with V, computed
+        block_size rows at a time.
+        """
+        KV = self.likelihood._variance * V
+        for s in self._blocks():
+            Ks = self.kern.K(self.X[s], self.X)
+            # cross covariances omit the white noise terms of the kernel
+            Ks[:, s] = self.kern.K(self.X[s])
+            KV[s] += np.dot(Ks, V)
+        return KV
+
+    def _update_operator(self):
+        """
+        Update what _K_dot and the preconditioner need after a change of
+        parameters: here the diagonal of K.
+        """
+        self.Kdiag = self.kern.Kdiag(self.X) + self.likelihood._variance
+
+    def _precondition(self, R):
+        """P^{-1} R, P being the preconditioner (the diagonal of K)"""
+        return R / self.Kdiag[:, None]
+
+    def _precondition_sqrt(self, R):
+        """P^{1/2} R"""
+        return R * np.sqrt(self.Kdiag)[:, None]
+
+    def _precondition_logdet(self):
+        """log|P|"""
+        return np.sum(np.log(self.Kdiag))
+
+    def _solve(self, B):
+        return pcg(self._K_dot, B, self._precondition, tol=self.tol, maxiter=self.maxiter)
+
+    def _set_params(self, p):
+        new_kern_params = p[:self.kern.num_params_transformed()]
+        new_likelihood_params = p[self.kern.num_params_transformed():]
+        self.kern._set_params_transformed(new_kern_params)
+        self.likelihood._set_params_transformed(new_likelihood_params)
+
+        self._update_operator()
+
+        # the probes are scaled so that E[z z^T] = P, the preconditioner
+        num_probes = self.probes.shape[1]
+        Z = self._precondition_sqrt(self.probes)
+        X, alphas, betas, iterations = self._solve(np.hstack((self.likelihood.Y, Z)))
+        self.alpha, U = X[:, :self.output_dim], X[:, self.output_dim:]
+
+        # log|K| = log|P| + log|P^{-1/2} K P^{-1/2}|
+        quad = lanczos_quadrature(alphas[:, self.output_dim:], betas[:, self.output_dim:], iterations[self.output_dim:])
+        self.K_logdet = self._precondition_logdet() + np.mean(np.sum(np.square(self.probes), 0) * quad)
+
+        # dL_dK = 0.5 * (alpha alpha^T - D K^{-1}) is kept in the low rank
+        # form dL_dK_A dL_dK_B^T, K^{-1} being estimated by U (P^{-1}Z)^T / num_probes
+        self.dL_dK_A = np.hstack((self.alpha, U))
+        self.dL_dK_B = np.hstack((0.5 * self.alpha, -0.5 * self.output_dim / num_probes * self._precondition(Z)))
+
+    def update_likelihood_approximation(self, **kwargs):
+        """
+        The likelihood is Gaussian, so no approximation is required and this
+        function does nothing.
+        """
+        pass
+
+    def _model_fit_term(self):
+        return -0.5 * np.sum(self.likelihood.Y * self.alpha)
+
+    def _log_likelihood_gradients(self):
+        """
+        The gradient of all parameters.
+
+        The kernel gradients are accumulated over blocks of rows of
+        dL_dK = dL_dK_A dL_dK_B^T, so no N x N matrix is formed.
+        """
+        dL_dtheta = 0.
+        for s in self._blocks():
+            dL_dK = np.dot(self.dL_dK_A[s], self.dL_dK_B.T)
+            dL_dK_ss = dL_dK[:, s].copy()
+            dL_dK[:, s] = 0.
+            dL_dtheta += self.kern.dK_dtheta(dL_dK, self.X[s], self.X)
+            dL_dtheta += self.kern.dK_dtheta(dL_dK_ss, self.X[s])
+        partial = np.sum(self.dL_dK_A * self.dL_dK_B, 1)
+        return np.hstack((dL_dtheta, self.likelihood._gradients(partial=partial)))
+
+    def _raw_predict(self, _Xnew, which_parts='all', full_cov=False, stop=False):
+        """
+        Internal helper function for making predictions, does not account
+        for normalization or likelihood
+
+        The variance needs one conjugate gradient solve for each block_size
+        prediction points.
+        """
+        num_new = _Xnew.shape[0]
+        mu = np.empty((num_new, self.output_dim))
+        if full_cov:
+            Kx_all = np.empty((self.num_data, num_new))
+            KiKx_all = np.empty((self.num_data, num_new))
+        else:
+            var = np.empty((num_new, 1))
+        for start in range(0, num_new, self.block_size):
+            s = slice(start, min(start + self.block_size, num_new))
+            Kx = self.kern.K(self.X, _Xnew[s], which_parts=which_parts)
+            mu[s] = np.dot(Kx.T, self.alpha)
+            KiKx = self._solve(Kx)[0]
+            if full_cov:
+                Kx_all[:, s], KiKx_all[:, s] = Kx, KiKx
+            else:
+                var[s, 0] = self.kern.Kdiag(_Xnew[s], which_parts=which_parts) - np.sum(Kx * KiKx, 0)
+        if full_cov:
+            var = self.kern.K(_Xnew, which_parts=which_parts) - np.dot(Kx_all.T, KiKx_all)
+        if stop:
+            debug_this # @UndefinedVariable
+        return mu, var
+
+    def getstate(self):
+        return GPBase.getstate(self) + [self.block_size, self.tol, self.maxiter, self.probes]
+
+    def setstate(self, state):
+        self.probes = state.pop()
+        self.maxiter = state.pop()
+        self.tol = state.pop()
+        self.block_size = state.pop()
+        GPBase.setstate(self, state)
+        self._set_params(self._get_params())
@@ -0,0 +1,123 @@
+# Copyright (c) 2013, GPy authors (see AUTHORS.txt).
+# Licensed under the BSD 3-clause license (see LICENSE.txt)
+
+import numpy as np
+from ..util.toeplitz import embedding_lags, bttb_eig, bttb_dot, lag_sums
+from ..util.interpolation import regular_grid, cubic_interpolation_weights
+from ..kern.parts.white import White
+from iterative_gp import IterativeGP
+
+class KISSGP(IterativeGP):
+    """
+    Gaussian Process model for regression by structured kernel
+    interpolation (KISS-GP), for many low dimensional inputs and a
+    stationary kernel.
+
+    The kernel is evaluated on a dense regular grid of inducing points U,
+    and the covariance matrix is approximated by interpolating it from the
+    grid: K ~ W K_UU W^T, where W holds sparse cubic interpolation weights
+    (4^D per input). K_UU is (block) Toeplitz, so products with K cost
+    O(N + G log G) for G grid points. Inference then proceeds as in
+    IterativeGP, and predictions interpolate from the grid as well.
+
+    :param X: input observations
+    :param likelihood: a GPy likelihood, must be Gaussian
+    :param kernel: a stationary GPy kernel (without white noise, which interpolation would smooth out)
+    :param normalize_X:  whether to normalize the input data before computing (predictions will be in original scales)
+    :type normalize_X: False|True
+    :param grid_size: the number of grid points in each dimension (default: N^(1/D), within 10 and 1000)
+    :type grid_size: int or list of int
+    :param num_probes: the number of probe vectors of the stochastic estimators
+    :type num_probes: int
+    :param block_size: the number of prediction points handled at once
+    :type block_size: int
+    :param tol: relative tolerance of the conjugate gradient solves
+    :param maxiter: maximum number of conjugate gradient iterations (default: num_data)
+
+    .. Note:: the log likelihood and its gradients are stochastic estimates. Predictions outside the range of the training inputs are extrapolated from the cells at the border of the grid, and quickly become inaccurate.
+    """
+    def __init__(self, X, likelihood, kernel, normalize_X=False, grid_size=None, num_probes=20, block_size=500, tol=1e-6, maxiter=None):
+        assert all([p.stationary for p in kernel.parts]), "KISS-GP needs a stationary kernel"
+        # interpolation would smear the white noise over the neighbouring points
+        assert not any([isinstance(p, White) for p in kernel.parts]), "KISS-GP kernels must not have white noise parts, the likelihood holds the noise"
+        if grid_size is None:
+            grid_size = int(np.clip(X.shape[0] ** (1. / X.shape[1]), 10, 1000))
+        self.grid_size = list(np.ones(X.shape[1], dtype=np.int) * grid_size)
+        IterativeGP.__init__(self, X, likelihood, kernel, normalize_X=normalize_X, num_probes=num_probes, block_size=block_size, tol=tol, maxiter=maxiter)
+
+    def _update_operator(self):
+        """
+        Compute the kernel at all the lags of the grid, and the eigenvalues
+        of the circulant embedding of K_UU.
+        """
+        if self._has_changed('kiss', self.X, np.asarray(self.grid_size)):
+            self._grid_start, self._grid_step = regular_grid(self.X, self.grid_size)
+            self.W = cubic_interpolation_weights(self.X, self._grid_start, self._grid_step, self.grid_size)
+            self._u0 = self._grid_start[None, :]
+            self._lag_points = self._u0 + embedding_lags(self.grid_size) * self._grid_step
+        t = self.kern.K(self._lag_points, self._u0)[:, 0]
+        t[0] = self.kern.Kdiag(self._u0)[0]
+        self._eig = bttb_eig(t, self.grid_size)
+        IterativeGP._update_operator(self)
+
+    def _KUU_dot(self, V):
+        return bttb_dot(self._eig, self.grid_size, V)
+
+    def _K_dot(self, V):
+        return self.W.dot(self._KUU_dot(self.W.T.dot(V))) + self.likelihood._variance * V
+
+    def _log_likelihood_gradients(self):
+        """
+        The gradient of all parameters.
+
+        With K = W K_UU W^T, trace(dL_dK dK) = trace((W^T dL_dK W) dK_UU),
+        and W^T dL_dK W = (W^T dL_dK_A)(W^T dL_dK_B)^T is summed over each
+        lag of the grid by FFTs.
+        """
+        lags = lag_sums(self.W.T.dot(self.dL_dK_A), self.W.T.dot(self.dL_dK_B), self.grid_size)
+        # the zero lag goes through Kdiag
+        dL_dKdiag = lags[:1].copy()
+        lags[0] = 0.
+        dL_dtheta = self.kern.dK_dtheta(lags[:, None], self._lag_points, self._u0) + self.kern.dKdiag_dtheta(dL_dKdiag, self._u0)
+        partial = np.sum(self.dL_dK_A * self.dL_dK_B, 1)
+        return np.hstack((dL_dtheta, self.likelihood._gradients(partial=partial)))
+
+    def _raw_predict(self, _Xnew, which_parts='all', full_cov=False, stop=False):
+        """
+        Internal helper function for making predictions, does not account
+        for normalization or likelihood
+
+        Cross covariances are interpolated from the grid, so the mean costs
+        O(1) per point; the variance needs one conjugate gradient solve for
+        each block_size prediction points.
+        """
+        assert which_parts == 'all', "KISS-GP predictions use the whole kernel"
+        num_new = _Xnew.shape[0]
+        Wnew = cubic_interpolation_weights(_Xnew, self._grid_start, self._grid_step, self.grid_size)
+        mu = Wnew.dot(self._KUU_dot(self.W.T.dot(self.alpha)))
+        if full_cov:
+            Kx_all = np.empty((self.num_data, num_new))
+            KiKx_all = np.empty((self.num_data, num_new))
+        else:
+            var = np.empty((num_new, 1))
+        for start in range(0, num_new, self.block_size):
+            s = slice(start, min(start + self.block_size, num_new))
+            KUUw = self._KUU_dot(Wnew[s].T.toarray())
+            Kx = self.W.dot(KUUw)
+            KiKx = self._solve(Kx)[0]
+            if full_cov:
+                Kx_all[:, s], KiKx_all[:, s] = Kx, KiKx
+            else:
+                var[s, 0] = np.asarray(Wnew[s].multiply(KUUw.T).sum(1)).flatten() - np.sum(Kx * KiKx, 0)
+        if full_cov:
+            var = Wnew.dot(self._KUU_dot(Wnew.T.toarray())) - np.dot(Kx_all.T, KiKx_all)
+        if stop:
+            debug_this # @UndefinedVariable
+        return mu, var
+
+    def getstate(self):
+        return IterativeGP.getstate(self) + [self.grid_size]
+
+    def setstate(self, state):
+        self.grid_size = state.pop()
+        IterativeGP.setstate(self, state)
@@ -54,6 +54,28 @@ class Parameterized(object):
     def _has_get_set_state(self):
         return 'getstate' in vars(self.__class__) and 'setstate' in vars(self.__class__)
 
+    def _has_changed(self, group, *values):
+        """
+        Check whether any of values differs from the values passed for the
+        same group at the previous call, and remember them for the next one.
+
+        Models use this to track which groups of parameters (and data) have
+        changed since the last evaluation, so that quantities depending only
+        on unchanged groups need not be recomputed. The first call for a
+        group always returns True.
+
+        :param group: the name of the group
+        :param values: the arrays (or None) the group depends on
+        """
+        if not hasattr(self, '_change_cache'):
+            self._change_cache = {}
+        old = self._change_cache.get(group)
+        if old is not None and len(old) == len(values) and \
+                all([(a is None and b is None) or (a is not None and b is not None and np.array_equal(a, b)) for a, b in zip(old, values)]):
+            return False
+        self._change_cache[group] = [None if v is None else np.array(v, copy=True) for v in values]
+        return True
+
     def getstate(self):
         """
         Get the current state of the class,
@@ -28,6 +28,9 @@ class SparseGP(GPBase):
     :type normalize_(X|Y): bool
 
     """
+    # upper bound (in bytes) on the temporaries used by _raw_predict: Xnew
+    # is processed in chunks so that Kx (and psi2) never grow beyond this.
+    predict_memory = 2 ** 27
 
     def __init__(self, X, likelihood, kernel, Z, X_variance=None, normalize_X=False):
         GPBase.__init__(self, X, likelihood, kernel, normalize_X=normalize_X)
@@ -54,16 +57,28 @@ class SparseGP(GPBase):
         self._const_jitter = None
 
     def _compute_kernel_matrices(self):
-        # kernel computations, using BGPLVM notation
-        self.Kmm = self.kern.K(self.Z)
-        if self.has_uncertain_inputs:
-            self.psi0 = self.kern.psi0(self.Z, self.X, self.X_variance)
-            self.psi1 = self.kern.psi1(self.Z, self.X, self.X_variance)
-            self.psi2 = self.kern.psi2(self.Z, self.X, self.X_variance)
-        else:
-            self.psi0 = self.kern.Kdiag(self.X)
-            self.psi1 = self.kern.K(self.X, self.Z)
-            self.psi2 = None
+        # kernel computations, using BGPLVM notation. Only the quantities
+        # whose inputs have changed since the last call are recomputed.
+        theta = self.kern._get_params()
+        if self._has_changed('Kmm', theta, self.Z):
+            self.Kmm = self.kern.K(self.Z)
+        if self._has_changed('psi0', theta, self.X, self.X_variance):
+            if self.has_uncertain_inputs:
+                self.psi0 = self.kern.psi0(self.Z, self.X, self.X_variance)
+            else:
+                self.psi0 = self.kern.Kdiag(self.X)
+        if self._has_changed('psi1', theta, self.Z, self.X, self.X_variance):
+            if self.has_uncertain_inputs:
+                self.psi1 = self.kern.psi1(self.Z, self.X, self.X_variance)
+                if self.likelihood.is_heteroscedastic:
+                    self.psi2 = self.kern.psi2(self.Z, self.X, self.X_variance)
+                else:
+                    # only the sum over the data is needed
+                    self.psi2 = None
+                    self.psi2_sum = self.kern.psi2_sum(self.Z, self.X, self.X_variance)
+            else:
+                self.psi1 = self.kern.K(self.X, self.Z)
+                self.psi2 = None
 
     def _computations(self):
         if self._const_jitter is None or not(self._const_jitter.shape[0] == self.num_inducing):
@@ -79,7 +94,7 @@ class SparseGP(GPBase):
             if self.likelihood.is_heteroscedastic:
                 psi2_beta = (self.psi2 * (self.likelihood.precision.flatten().reshape(self.num_data, 1, 1))).sum(0)
             else:
-                psi2_beta = self.psi2.sum(0) * self.likelihood.precision
+                psi2_beta = self.psi2_sum * self.likelihood.precision
             if self.backsub:
                 evals, evecs = linalg.eigh(psi2_beta)
                 clipped_evals = np.clip(evals, 0., 1e6) # TODO: make clipping configurable
@@ -149,8 +164,8 @@ class SparseGP(GPBase):
         else:
             dL_dpsi2 = self.likelihood.precision * dL_dpsi2_beta
             if self.has_uncertain_inputs:
-                # repeat for each of the N psi_2 matrices
-                self.dL_dpsi2 = np.repeat(dL_dpsi2[None, :, :], self.num_data, axis=0)
+                # the same for each of the N psi_2 matrices (see kern.dpsi2_dtheta)
+                self.dL_dpsi2 = dL_dpsi2
             else:
                 # subsume back into psi1 (==Kmn)
                 self.dL_dpsi1 += 2.*np.dot(self.psi1, dL_dpsi2)
@@ -207,6 +222,7 @@ class SparseGP(GPBase):
         self._compute_kernel_matrices()
         self._computations()
         self.Cpsi1V = None
+        self._Kmmi_LmiBLmi = None
 
     def _get_params(self):
         return np.hstack([self.Z.flatten(), self.kern._get_params_transformed(), self.likelihood._get_params()])
@@ -269,41 +285,77 @@ class SparseGP(GPBase):
             dL_dZ += self.kern.dK_dX(self.dL_dpsi1.T, self.Z, self.X)
         return dL_dZ
 
-    def _raw_predict(self, Xnew, X_variance_new=None, which_parts='all', full_cov=False):
+    def _predictive_matrices(self):
         """
-        Internal helper function for making predictions, does not account for
-        normalization or likelihood function
+        The M x M matrices of the predictions, Kmm^{-1} psi1 V and
+        Kmm^{-1} - (Kmm + psi2 beta)^{-1}, which are computed on the first
+        prediction after each call to _set_params.
         """
-
-        Bi, _ = dpotri(self.LB, lower=0) # WTH? this lower switch should be 1, but that doesn't work!
-        symmetrify(Bi)
-        Kmmi_LmiBLmi = backsub_both_sides(self._Lm, np.eye(self.num_inducing) - Bi)
-
         if self.Cpsi1V is None:
             psi1V = np.dot(self.psi1.T, self.likelihood.V)
             tmp, _ = dtrtrs(self._Lm, np.asfortranarray(psi1V), lower=1, trans=0)
             tmp, _ = dpotrs(self.LB, tmp, lower=1)
             self.Cpsi1V, _ = dtrtrs(self._Lm, tmp, lower=1, trans=1)
+        if self._Kmmi_LmiBLmi is None:
+            Bi, _ = dpotri(self.LB, lower=1)
+            symmetrify(Bi)
+            self._Kmmi_LmiBLmi = backsub_both_sides(self._Lm, np.eye(self.num_inducing) - Bi)
+        return self.Cpsi1V, self._Kmmi_LmiBLmi
+
+    def _predict_chunksize(self, uncertain_inputs=False):
+        """
+        The number of prediction points that can be processed at once
+        without exceeding self.predict_memory (Kx is num_inducing x
+        chunksize, psi2 is chunksize x num_inducing x num_inducing).
+        """
+        if uncertain_inputs:
+            return max(1, int(self.predict_memory // (16 * self.num_inducing ** 2)))
+        return max(1, int(self.predict_memory // (16 * self.num_inducing)))
+
+    def _raw_predict(self, Xnew, X_variance_new=None, which_parts='all', full_cov=False):
+        """
+        Internal helper function for making predictions, does not account for
+        normalization or likelihood function
+
+        The predictive matrices (see _predictive_matrices) are cached
+        between calls, so that a prediction costs O(num_inducing^2) per
+        point. Xnew is processed in chunks of self._predict_chunksize()
+        points.
+        """
+        Cpsi1V, Kmmi_LmiBLmi = self._predictive_matrices()
+        num_new = Xnew.shape[0]
+        mu = np.empty((num_new, Cpsi1V.shape[1]))
+        var = np.empty(num_new)
 
         if X_variance_new is None:
-            Kx = self.kern.K(self.Z, Xnew, which_parts=which_parts)
-            mu = np.dot(Kx.T, self.Cpsi1V)
+            chunksize = self._predict_chunksize()
+            if full_cov:
+                Kx = np.empty((self.num_inducing, num_new))
+                tmp = np.empty((self.num_inducing, num_new))
+            for start in range(0, num_new, chunksize):
+                s = slice(start, min(start + chunksize, num_new))
+                Kx_s = self.kern.K(self.Z, Xnew[s], which_parts=which_parts)
+                mu[s] = np.dot(Kx_s.T, Cpsi1V)
+                if full_cov:
+                    Kx[:, s] = Kx_s
+                    tmp[:, s] = np.dot(Kmmi_LmiBLmi, Kx_s)
+                else:
+                    var[s] = self.kern.Kdiag(Xnew[s], which_parts=which_parts) - np.sum(Kx_s * np.dot(Kmmi_LmiBLmi, Kx_s), 0)
             if full_cov:
                 Kxx = self.kern.K(Xnew, which_parts=which_parts)
-                var = Kxx - mdot(Kx.T, Kmmi_LmiBLmi, Kx) # NOTE this won't work for plotting
-            else:
-                Kxx = self.kern.Kdiag(Xnew, which_parts=which_parts)
-                var = Kxx - np.sum(Kx * np.dot(Kmmi_LmiBLmi, Kx), 0)
+                var = Kxx - np.dot(Kx.T, tmp) # NOTE this won't work for plotting
         else:
             # assert which_parts=='all', "swithching out parts of variational kernels is not implemented"
-            Kx = self.kern.psi1(self.Z, Xnew, X_variance_new) # , which_parts=which_parts) TODO: which_parts
-            mu = np.dot(Kx, self.Cpsi1V)
             if full_cov:
                 raise NotImplementedError, "TODO"
-            else:
-                Kxx = self.kern.psi0(self.Z, Xnew, X_variance_new)
-                psi2 = self.kern.psi2(self.Z, Xnew, X_variance_new)
-                var = Kxx - np.sum(np.sum(psi2 * Kmmi_LmiBLmi[None, :, :], 1), 1)
+            chunksize = self._predict_chunksize(uncertain_inputs=True)
+            for start in range(0, num_new, chunksize):
+                s = slice(start, min(start + chunksize, num_new))
+                Kx = self.kern.psi1(self.Z, Xnew[s], X_variance_new[s]) # , which_parts=which_parts) TODO: which_parts
+                mu[s] = np.dot(Kx, Cpsi1V)
+                Kxx = self.kern.psi0(self.Z, Xnew[s], X_variance_new[s])
+                psi2 = self.kern.psi2(self.Z, Xnew[s], X_variance_new[s])
+                var[s] = Kxx - np.sum(np.sum(psi2 * Kmmi_LmiBLmi[None, :, :], 1), 1)
 
         return mu, var[:, None]
 
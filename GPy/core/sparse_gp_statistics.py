@@ -0,0 +1,171 @@
+# Copyright (c) 2013, GPy authors (see AUTHORS.txt).
+# Licensed under the BSD 3-clause license (see LICENSE.txt)
+
+import numpy as np
+from ..util.linalg import jitchol, tdot, backsub_both_sides, dtrtrs
+from sparse_gp import SparseGP
+
+class SparseGPFromStatistics(SparseGP):
+    """
+    A SparseGP with a (homoscedastic) Gaussian likelihood, whose bound is
+    computed from sums over the data only:
+
+        psi0 = sum_n <k(x_n, x_n)>,  psi1^T Y,  psi2 = sum_n <psi1_n psi1_n^T>,  trace(Y^T Y)
+
+    (the expectations being under q(x_n) for uncertain inputs), so that the
+    data may be read in chunks or spread over several processes. Subclasses
+    accumulate these sums in _sum_statistics, and the gradients of the
+    kernel parameters and Z in _sum_gradients, which only need the
+    quantities of _computations which are shared by all the data:
+
+        dL_dpsi0 (a scalar),  dL_dpsi1_n = Y_n VCpsi1Vf^T,  dL_dpsi2 (M x M)
+
+    The rest of the computations are O(num_inducing^3), whatever the
+    number of data.
+    """
+    def _varying_data(self):
+        """The parameters, other than the kernel's and Z, which the sums depend on."""
+        return []
+
+    def _sum_statistics(self):
+        """
+        The sums over the (normalized) data: num_data, psi0, psi1^T Y, psi2
+        and trace(Y^T Y).
+        """
+        raise NotImplementedError
+
+    def _sum_gradients(self):
+        """
+        The sums over the data of the gradients of the bound wrt the kernel
+        parameters and Z, given the shared quantities of _computations.
+        """
+        raise NotImplementedError
+
+    def _compute_kernel_matrices(self):
+        theta = self.kern._get_params()
+        if self._has_changed('Kmm', theta, self.Z):
+            self.Kmm = self.kern.K(self.Z)
+        if self._has_changed('statistics', theta, self.Z, *self._varying_data()):
+            self.num_data, self.psi0_sum, self.psi1Y, self.psi2_sum, self.trYYT = self._sum_statistics()
+
+    def _computations(self):
+        if self._const_jitter is None or not(self._const_jitter.shape[0] == self.num_inducing):
+            self._const_jitter = np.eye(self.num_inducing) * 1e-7
+        beta = self.likelihood.precision
+
+        # factor Kmm and B = I + beta Lm^{-1} psi2 Lm^{-T}
+        self._Lm = jitchol(self.Kmm + self._const_jitter)
+        self._A = beta * backsub_both_sides(self._Lm, self.psi2_sum, transpose='right')
+        self.B = np.eye(self.num_inducing) + self._A
+        self.LB = jitchol(self.B)
+
+        # back substitute C into psi1Vf
+        self.psi1Vf = beta * self.psi1Y
+        tmp, _ = dtrtrs(self._Lm, np.asfortranarray(self.psi1Vf), lower=1, trans=0)
+        self._LBi_Lmi_psi1Vf, _ = dtrtrs(self.LB, np.asfortranarray(tmp), lower=1, trans=0)
+        tmp, _ = dtrtrs(self.LB, self._LBi_Lmi_psi1Vf, lower=1, trans=1)
+        self.Cpsi1Vf, _ = dtrtrs(self._Lm, tmp, lower=1, trans=1)
+
+        # Compute dL_dKmm
+        tmp = tdot(self._LBi_Lmi_psi1Vf)
+        self.data_fit = np.trace(tmp)
+        self.DBi_plus_BiPBi = backsub_both_sides(self.LB, self.output_dim * np.eye(self.num_inducing) + tmp)
+        tmp = -0.5 * self.DBi_plus_BiPBi
+        tmp += -0.5 * self.B * self.output_dim
+        tmp += self.output_dim * np.eye(self.num_inducing)
+        self.dL_dKmm = backsub_both_sides(self._Lm, tmp)
+
+        # the gradients wrt the psi statistics, shared by all the data
+        self.dL_dpsi0 = -0.5 * self.output_dim * beta
+        self.VCpsi1Vf = beta * self.Cpsi1Vf
+        self.dL_dpsi2 = 0.5 * beta * backsub_both_sides(self._Lm, self.output_dim * np.eye(self.num_inducing) - self.DBi_plus_BiPBi)
+
+        # the partial derivative vector for the likelihood
+        self.partial_for_likelihood = -0.5 * self.num_data * self.output_dim * beta + 0.5 * self.trYYT * beta ** 2
+        self.partial_for_likelihood += 0.5 * self.output_dim * (self.psi0_sum * beta ** 2 - np.trace(self._A) * beta)
+        self.partial_for_likelihood += beta * (0.5 * np.sum(self._A * self.DBi_plus_BiPBi) - self.data_fit)
+
+    def log_likelihood(self):
+        """ Compute the (lower bound on the) log marginal likelihood """
+        beta = self.likelihood.precision
+        A = -0.5 * self.num_data * self.output_dim * (np.log(2.*np.pi) - np.log(beta)) - 0.5 * beta * self.trYYT
+        B = -0.5 * self.output_dim * (beta * self.psi0_sum - np.trace(self._A))
+        C = -self.output_dim * (np.sum(np.log(np.diag(self.LB))))
+        D = 0.5 * self.data_fit
+        return A + B + C + D
+
+    def _log_likelihood_gradients(self):
+        dL_dtheta, dL_dZ = self._sum_gradients()
+        dL_dtheta += self.kern.dK_dtheta(self.dL_dKmm, self.Z)
+        dL_dZ += self.kern.dK_dX(self.dL_dKmm, self.Z)
+        return np.hstack((dL_dZ.flatten(), dL_dtheta, self.likelihood._gradients(partial=self.partial_for_likelihood)))
+
+    def _predictive_matrices(self):
+        # psi1^T V is not kept, but Kmm^{-1} psi1 V is Cpsi1Vf
+        if self.Cpsi1V is None:
+            self.Cpsi1V = self.Cpsi1Vf
+        return SparseGP._predictive_matrices(self)
+
+def data_statistics(kern, Z, Y, X, X_variance=None):
+    """
+    The contribution of the data (X, Y) to the sums of
+    SparseGPFromStatistics: num_data, psi0, psi1^T Y, psi2 and trace(Y^T Y).
+    The inputs are uncertain, with variances X_variance, unless this is None.
+    """
+    if X_variance is None:
+        psi1 = kern.K(X, Z)
+        return X.shape[0], kern.Kdiag(X).sum(), np.dot(psi1.T, Y), tdot(psi1.T), np.sum(np.square(Y))
+    psi1 = kern.psi1(Z, X, X_variance)
+    return X.shape[0], kern.psi0(Z, X, X_variance).sum(), np.dot(psi1.T, Y), kern.psi2_sum(Z, X, X_variance), np.sum(np.square(Y))
+
+def data_gradients(kern, Z, Y, X, X_variance, dL_dpsi0, VCpsi1Vf, dL_dpsi2):
+    """
+    The contribution of the data (X, Y) to the gradients of the bound of
+    SparseGPFromStatistics wrt the kernel parameters and Z, given its shared
+    quantities dL_dpsi0, VCpsi1Vf and dL_dpsi2, and for uncertain inputs
+    the gradients wrt X and X_variance (None otherwise).
+
+    :rtype: dL_dtheta, dL_dZ, dL_dX, dL_dX_variance
+    """
+    dL_dpsi0 = dL_dpsi0 * np.ones(X.shape[0])
+    dL_dpsi1 = np.dot(Y, VCpsi1Vf.T)
+    if X_variance is None:
+        # psi2 = psi1^T psi1 is subsumed into psi1
+        dL_dpsi1 += 2. * np.dot(kern.K(X, Z), dL_dpsi2)
+        dL_dtheta = kern.dK_dtheta(dL_dpsi1, X, Z) + kern.dKdiag_dtheta(dL_dpsi0, X)
+        return dL_dtheta, kern.dK_dX(dL_dpsi1.T, Z, X), None, None
+    dL_dtheta = kern.dpsi0_dtheta(dL_dpsi0, Z, X, X_variance)
+    dL_dtheta += kern.dpsi1_dtheta(dL_dpsi1, Z, X, X_variance)
+    dL_dtheta += kern.dpsi2_dtheta(dL_dpsi2, Z, X, X_variance)
+    dL_dZ = kern.dpsi1_dZ(dL_dpsi1, Z, X, X_variance) + kern.dpsi2_dZ(dL_dpsi2, Z, X, X_variance)
+    dL_dX, dL_dX_variance = kern.dpsi0_dmuS(dL_dpsi0, Z, X, X_variance)
+    for dL_dmu, dL_dS in [kern.dpsi1_dmuS(dL_dpsi1, Z, X, X_variance), kern.dpsi2_dmuS(dL_dpsi2, Z, X, X_variance)]:
+        dL_dX += dL_dmu
+        dL_dX_variance += dL_dS
+    return dL_dtheta, dL_dZ, dL_dX, dL_dX_variance
+
+class DataShard(object):
+    """
+    A part (Y, X) of the data of a SparseGPFromStatistics, with a copy of its
+    kernel, whose contributions to the sums of the model are computed where
+    the shard is, e.g. in another process (see GPy.util.parallel). Only the
+    kernel parameters theta, Z and the other shared quantities are sent
+    for each evaluation.
+
+    :param kern: the kernel of the model
+    :param Y: the (normalized) outputs of the shard
+    :param X: the (normalized) inputs of the shard, None if they are parameters of the model (e.g. the latent means of a BayesianGPLVM)
+    """
+    def __init__(self, kern, Y, X=None):
+        self.kern = kern
+        self.Y, self.X = Y, X
+
+    def statistics(self, theta, Z, X=None, X_variance=None):
+        """data_statistics of the shard, for the kernel parameters theta."""
+        self.kern._set_params(theta)
+        return data_statistics(self.kern, Z, self.Y, self.X if X is None else X, X_variance)
+
+    def gradients(self, theta, Z, X, X_variance, dL_dpsi0, VCpsi1Vf, dL_dpsi2):
+        """data_gradients of the shard, for the kernel parameters theta."""
+        self.kern._set_params(theta)
+        return data_gradients(self.kern, Z, self.Y, self.X if X is None else X, X_variance, dL_dpsi0, VCpsi1Vf, dL_dpsi2)
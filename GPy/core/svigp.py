@@ -6,6 +6,7 @@ import pylab as pb
 from .. import kern
 from ..util.linalg import pdinv, mdot, tdot, dpotrs, dtrtrs, jitchol, backsub_both_sides
 from ..likelihoods import EP
+from ..util.minibatches import Minibatches
 from gp_base import GPBase
 from model import Model
 import time
@@ -28,12 +29,23 @@ class SVIGP(GPBase):
     :type kernel: a GPy kernel
     :param Z: inducing inputs
     :type Z: np.ndarray (num_inducing x num_inputs)
+    :param prefetch: the number of minibatches gathered ahead by a background thread, 0 for none (see GPy.util.minibatches)
+    :type prefetch: int
+    :param seed: the seed of the random order of the minibatches, drawn from np.random if None
+    :type seed: int | None
+    :param stream: a function returning an iterator over (X, Y) (or (X, Y, X_variance)) chunks, from which the minibatches are read instead of X and likelihood, which then only hold some of the data (e.g. the first chunk, for the normalization and plots). It is not pickled with the model.
+    :param num_data: the number of data the stream stands for, which the bound is scaled to (defaults to the number of rows of X)
+    :type num_data: int | None
 
     """
 
-    def __init__(self, X, likelihood, kernel, Z, q_u=None, batchsize=10, X_variance=None):
+    def __init__(self, X, likelihood, kernel, Z, q_u=None, batchsize=10, X_variance=None, prefetch=2, seed=None, stream=None, num_data=None):
         GPBase.__init__(self, X, likelihood, kernel, normalize_X=False)
+        if num_data is not None:
+            self.num_data = num_data
         self.batchsize=batchsize
+        self.prefetch, self.seed = prefetch, seed
+        self.stream = stream
         self.Y = self.likelihood.Y.copy()
         self.Z = Z
         self.num_inducing = Z.shape[0]
@@ -56,7 +68,8 @@ class SVIGP(GPBase):
              q_u = np.hstack((np.random.randn(self.num_inducing*self.output_dim),-.5*np.eye(self.num_inducing).flatten()))
         self.set_vb_param(q_u)
 
-        self._permutation = np.random.permutation(self.num_data)
+        # the minibatches, which order the data, are started when first used
+        self._batches = None
         self.load_batch()
 
         self._param_trace = []
@@ -101,13 +114,17 @@ class SVIGP(GPBase):
              self._ll_trace,
              self._grad_trace,
              self.Y,
-             self._permutation,
-             self.iterations
+             self.iterations,
+             self.prefetch,
+             self.seed
             ]
 
     def setstate(self, state):
+        self.seed = state.pop()
+        self.prefetch = state.pop()
+        self.stream = None
+        self._batches = None
         self.iterations = state.pop()
-        self._permutation = state.pop()
         self.Y = state.pop()
         self._grad_trace = state.pop()
         self._ll_trace = state.pop()
@@ -133,7 +150,9 @@ class SVIGP(GPBase):
 
     def _compute_kernel_matrices(self):
         # kernel computations, using BGPLVM notation
-        self.Kmm = self.kern.K(self.Z)
+        # Kmm only changes with the kernel parameters and Z, not between batches
+        if self._has_changed('Kmm', self.kern._get_params(), self.Z):
+            self.Kmm = self.kern.K(self.Z)
         if self.has_uncertain_inputs:
             self.psi0 = self.kern.psi0(self.Z, self.X_batch, self.X_variance_batch)
             self.psi1 = self.kern.psi1(self.Z, self.X_batch, self.X_variance_batch)
@@ -167,37 +186,60 @@ class SVIGP(GPBase):
     def _get_param_names(self):
         return self.kern._get_param_names_transformed() + self.likelihood._get_param_names()
 
-    def load_batch(self):
+    def _minibatches(self):
+        """The Minibatches of (X, Y[, X_variance]), started when first used."""
+        if self._batches is None:
+            if self.stream is not None:
+                source = self.stream
+            else:
+                source = [self.X, self.Y] + ([self.X_variance] if self.has_uncertain_inputs else [])
+            # the terms of the likelihood which only depend on the data are computed with the batch
+            preprocess = None
+            if hasattr(self.likelihood, 'data_terms'):
+                data_terms = self.likelihood.data_terms
+                preprocess = lambda X, Y, *X_variance: data_terms(Y)
+            self._batches = Minibatches(source, self.batchsize, prefetch=self.prefetch, seed=self.seed, preprocess=preprocess)
+            self._batches_epoch = 0
+        return self._batches
+
+    def load_batch(self, do_Kmm_grad=True):
         """
-        load a batch of data (set self.X_batch and self.likelihood.Y from self.X, self.Y)
+        load a batch of data (set self.X_batch and self.likelihood.Y from self.X, self.Y, or from the stream)
+
+        :param do_Kmm_grad: whether the gradients wrt the parameters will be needed for this batch
         """
+        batch, epoch, data_terms = self._minibatches().next()
+        # the buffers of the minibatches are refilled in place, while the
+        # kernel parts keep the inputs of their psi statistics by reference
+        batch = [b.copy() for b in batch]
 
-        #if we've seen all the data, start again with them in a new random order
-        if self.batchcounter+self.batchsize > self.num_data:
+        #if we've seen all the data, they start again in a new random order
+        if epoch > self._batches_epoch:
             self.batchcounter = 0
-            self.epochs += 1
-            self._permutation = np.random.permutation(self.num_data)
-
-        this_perm = self._permutation[self.batchcounter:self.batchcounter+self.batchsize]
+            self.epochs += epoch - self._batches_epoch
+            self._batches_epoch = epoch
 
-        self.X_batch = self.X[this_perm]
-        self.likelihood.set_data(self.Y[this_perm])
+        self.X_batch = batch[0]
+        if data_terms is None:
+            self.likelihood.set_data(batch[1])
+        else:
+            self.likelihood.set_data(batch[1], data_terms)
         if self.has_uncertain_inputs:
-            self.X_variance_batch = self.X_variance[this_perm]
+            self.X_variance_batch = batch[2]
 
         self.batchcounter += self.batchsize
 
         self.data_prop = float(self.batchsize)/self.num_data
 
         self._compute_kernel_matrices()
-        self._computations()
+        self._computations(do_Kmm_grad=do_Kmm_grad)
 
     def _computations(self,do_Kmm=True, do_Kmm_grad=True):
         """
         All of the computations needed. Some are optional, see kwargs.
         """
 
-        if do_Kmm:
+        if do_Kmm and self._has_changed('Lm', self.Kmm):
             self.Lm = jitchol(self.Kmm)
 
         # The rather complex computations of self.A
@@ -223,10 +265,12 @@ class SVIGP(GPBase):
 
         self.B = np.eye(self.num_inducing)*self.data_prop + self.A
         self.Lambda = backsub_both_sides(self.Lm, self.B.T)
-        self.LQL = backsub_both_sides(self.Lm,self.q_u_expectation[1].T,transpose='right')
+        # the terms of Kmm and q(u) only, which do not change between batches either when q(u) is fixed
+        if self._has_changed('q_u', self.Lm, self.q_u_canonical_flat):
+            self.LQL = backsub_both_sides(self.Lm,self.q_u_expectation[1].T,transpose='right')
+            self.Kmmi_m, _ = dpotrs(self.Lm, self.q_u_expectation[0], lower=1)
 
         self.trace_K = self.psi0.sum() - np.trace(self.A)/self.likelihood.precision
-        self.Kmmi_m, _ = dpotrs(self.Lm, self.q_u_expectation[0], lower=1)
         self.projected_mean = np.dot(self.psi1,self.Kmmi_m)
 
         # Compute dL_dpsi
@@ -236,7 +280,7 @@ class SVIGP(GPBase):
 
         dL_dpsi2 = -0.5 * self.likelihood.precision * backsub_both_sides(self.Lm, self.LQL - self.output_dim * np.eye(self.num_inducing))
         if self.has_uncertain_inputs:
-            self.dL_dpsi2 = np.repeat(dL_dpsi2[None,:,:],self.batchsize,axis=0)
+            self.dL_dpsi2 = dL_dpsi2
         else:
             self.dL_dpsi1 += 2.*np.dot(dL_dpsi2,self.psi1.T).T
             self.dL_dpsi2 = None
@@ -298,7 +342,15 @@ class SVIGP(GPBase):
         return np.hstack((dL_dm.flatten(),dL_dmmT_S.flatten())) , np.hstack((dL_dSim.flatten(), dL_dmhSi.flatten()))
 
 
-    def optimize(self, iterations, print_interval=10, callback=lambda:None, callback_interval=5):
+    def optimize(self, iterations, print_interval=10, callback=lambda:None, callback_interval=5, param_interval=1):
+        """
+        Stochastic optimization of q(u) by natural gradients, and of the
+        kernel and likelihood parameters by gradient steps with momentum.
+
+        :param iterations: the number of minibatches
+        :param param_interval: the number of minibatches between the steps in the kernel and likelihood parameters. Kmm and its factorization are only computed again after these steps, and their gradients only for the minibatches of the steps.
+        :type param_interval: int
+        """
 
         param_step = 0.
 
@@ -309,25 +361,30 @@ class SVIGP(GPBase):
             self._param_trace.append(self._get_params())
             self._ll_trace.append(self.log_likelihood() + self.log_prior())
 
+            #the parameters only move every param_interval batches
+            param_update = not (self.iterations % param_interval)
+
             #load a batch and do the appropriate computations (kernel matrices, etc)
-            self.load_batch()
+            self.load_batch(do_Kmm_grad=param_update)
 
             #compute the (stochastic) gradient
             natgrads = self.vb_grad_natgrad()
-            grads = self._transform_gradients(self._log_likelihood_gradients() + self._log_prior_gradients())
-            self._grad_trace.append(grads)
+            if param_update:
+                grads = self._transform_gradients(self._log_likelihood_gradients() + self._log_prior_gradients())
+                self._grad_trace.append(grads)
 
             #compute the steps in all parameters
             vb_step = self.vb_steplength*natgrads[0]
-            #only move the parameters after the first epoch and only if the steplength is nonzero
-            if (self.epochs>=1) and (self.param_steplength > 0):
-                param_step = self.momentum*param_step + self.param_steplength*grads
-            else:
-                param_step = 0.
-
             self.set_vb_param(self.get_vb_param() + vb_step)
-            #Note: don't recompute everything here, wait until the next iteration when we have a new batch
-            self._set_params(self._untransform_params(self._get_params_transformed() + param_step), computations=False)
+
+            if param_update:
+                #only move the parameters after the first epoch and only if the steplength is nonzero
+                if (self.epochs>=1) and (self.param_steplength > 0):
+                    param_step = self.momentum*param_step + self.param_steplength*grads
+                else:
+                    param_step = 0.
+                #Note: don't recompute everything here, wait until the next iteration when we have a new batch
+                self._set_params(self._untransform_params(self._get_params_transformed() + param_step), computations=False)
 
             #print messages if desired
             if i and (not i%print_interval):
@@ -341,21 +398,21 @@ class SVIGP(GPBase):
                 time.sleep(0.01)
 
             if self.epochs > 10:
-                self._adapt_steplength()
+                self._adapt_steplength(adapt_param_steplength=param_update)
             self._vb_steplength_trace.append(self.vb_steplength)
             self._param_steplength_trace.append(self.param_steplength)
 
             self.iterations += 1
 
 
-    def _adapt_steplength(self):
+    def _adapt_steplength(self, adapt_param_steplength=True):
         if self.adapt_vb_steplength:
             # self._adaptive_vb_steplength()
             self._adaptive_vb_steplength_KL()
         #self._vb_steplength_trace.append(self.vb_steplength)
         assert self.vb_steplength >= 0
 
-        if self.adapt_param_steplength:
+        if self.adapt_param_steplength and adapt_param_steplength:
             self._adaptive_param_steplength()
             # self._adaptive_param_steplength_log()
             # self._adaptive_param_steplength_from_vb()
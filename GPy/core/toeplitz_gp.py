@@ -0,0 +1,90 @@
+# Copyright (c) 2013, GPy authors (see AUTHORS.txt).
+# Licensed under the BSD 3-clause license (see LICENSE.txt)
+
+import numpy as np
+from ..util.toeplitz import embedding_lags, bttb_eig, bttb_dot, chan_eig, circulant_dot, lag_sums
+from iterative_gp import IterativeGP
+
+class ToeplitzGP(IterativeGP):
+    """
+    Gaussian Process model for regression on regularly spaced 1-D inputs,
+    with a stationary kernel.
+
+    The covariance matrix is then Toeplitz: only its first column is
+    computed, and products with it are computed by FFTs of its circulant
+    embedding in O(N log N). Linear systems are solved by conjugate
+    gradients preconditioned by Chan's circulant approximation of K, and
+    the log-determinant and the gradients are estimated as in IterativeGP.
+    The gradients only need the kernel at the 2N - 1 lags.
+
+    :param X: input observations, regularly spaced (in any order)
+    :param likelihood: a GPy likelihood, must be Gaussian
+    :param kernel: a stationary GPy kernel
+    :param normalize_X:  whether to normalize the input data before computing (predictions will be in original scales)
+    :type normalize_X: False|True
+    :param num_probes: the number of probe vectors of the stochastic estimators
+    :type num_probes: int
+    :param block_size: the number of prediction points handled at once
+    :type block_size: int
+    :param tol: relative tolerance of the conjugate gradient solves
+    :param maxiter: maximum number of conjugate gradient iterations (default: num_data)
+
+    .. Note:: the log likelihood and its gradients are stochastic estimates.
+    """
+    def __init__(self, X, likelihood, kernel, normalize_X=False, num_probes=20, block_size=500, tol=1e-6, maxiter=None):
+        assert X.shape[1] == 1, "Toeplitz inference is for 1-D inputs"
+        assert all([p.stationary for p in kernel.parts]), "Toeplitz inference needs a stationary kernel"
+        IterativeGP.__init__(self, X, likelihood, kernel, normalize_X=normalize_X, num_probes=num_probes, block_size=block_size, tol=tol, maxiter=maxiter)
+
+    def _update_operator(self):
+        """
+        Compute the kernel at all the lags, and the eigenvalues of the
+        circulant embedding and of the preconditioner.
+        """
+        if self._has_changed('toeplitz', self.X):
+            self._order = np.argsort(self.X[:, 0], kind='mergesort')
+            x = self.X[self._order]
+            assert self.num_data > 1, "Toeplitz inference needs more than one input"
+            step = (x[-1, 0] - x[0, 0]) / (self.num_data - 1)
+            assert step > 0 and np.allclose(np.diff(x[:, 0]), step), "the inputs must be regularly spaced"
+            self._x0 = x[:1]
+            self._lag_points = self._x0 + embedding_lags((self.num_data,)) * step
+        t = self.kern.K(self._lag_points, self._x0)[:, 0]
+        # cross covariances omit the white noise terms of the kernel
+        t[0] = self.kern.Kdiag(self._x0)[0] + self.likelihood._variance
+        self._eig = bttb_eig(t, (self.num_data,))
+        self._chan_eig = chan_eig(t, (self.num_data,))
+
+    def _K_dot(self, V):
+        KV = np.empty_like(V)
+        KV[self._order] = bttb_dot(self._eig, (self.num_data,), V[self._order])
+        return KV
+
+    def _precondition(self, R):
+        PR = np.empty_like(R)
+        PR[self._order] = circulant_dot(1. / self._chan_eig, R[self._order])
+        return PR
+
+    def _precondition_sqrt(self, R):
+        PR = np.empty_like(R)
+        PR[self._order] = circulant_dot(np.sqrt(self._chan_eig), R[self._order])
+        return PR
+
+    def _precondition_logdet(self):
+        return np.sum(np.log(self._chan_eig))
+
+    def _log_likelihood_gradients(self):
+        """
+        The gradient of all parameters.
+
+        The entries of dL_dK = dL_dK_A dL_dK_B^T are summed over each lag by
+        FFTs, so the kernel gradients only need the kernel at the 2N - 1
+        lags.
+        """
+        W = lag_sums(self.dL_dK_A[self._order], self.dL_dK_B[self._order], (self.num_data,))
+        # the zero lag goes through Kdiag, which includes the white noise terms
+        dL_dKdiag = W[:1].copy()
+        W[0] = 0.
+        dL_dtheta = self.kern.dK_dtheta(W[:, None], self._lag_points, self._x0) + self.kern.dKdiag_dtheta(dL_dKdiag, self._x0)
+        partial = np.sum(self.dL_dK_A * self.dL_dK_B, 1)
+        return np.hstack((dL_dtheta, self.likelihood._gradients(partial=partial)))
@@ -40,6 +40,27 @@ def rbf(input_dim,variance=1., lengthscale=None,ARD=False):
     part = parts.rbf.RBF(input_dim,variance,lengthscale,ARD)
     return kern(input_dim, [part])
 
+def rbf_rff(input_dim, variance=1., lengthscale=None, ARD=False, num_features=100, seed=None):
+    """
+    Construct a random Fourier feature approximation of the RBF kernel.
+
+    :param input_dim: dimensionality of the kernel, obligatory
+    :type input_dim: int
+    :param variance: the variance of the kernel
+    :type variance: float
+    :param lengthscale: the lengthscale of the kernel
+    :type lengthscale: float
+    :param ARD: Auto Relevance Determination (one lengthscale per dimension)
+    :type ARD: Boolean
+    :param num_features: the number of features (even)
+    :type num_features: int
+    :param seed: the seed of the random frequencies
+    :type seed: int
+
+    """
+    part = parts.rbf_rff.RBF_RFF(input_dim, variance, lengthscale, ARD, num_features, seed)
+    return kern(input_dim, [part])
+
 def linear(input_dim,variances=None,ARD=False):
     """
      Construct a linear kernel.
@@ -202,6 +223,29 @@ def Matern52(input_dim, variance=1., lengthscale=None, ARD=False):
     part = parts.Matern52.Matern52(input_dim, variance, lengthscale, ARD)
     return kern(input_dim, [part])
 
+def matern_rff(input_dim, variance=1., lengthscale=None, ARD=False, nu=1.5, num_features=100, seed=None):
+    """
+    Construct a random Fourier feature approximation of the Matern kernel.
+
+    :param input_dim: dimensionality of the kernel, obligatory
+    :type input_dim: int
+    :param variance: the variance of the kernel
+    :type variance: float
+    :param lengthscale: the lengthscale of the kernel
+    :type lengthscale: float
+    :param ARD: Auto Relevance Determination (one lengthscale per dimension)
+    :type ARD: Boolean
+    :param nu: the smoothness of the kernel (1.5 for Matern32, 2.5 for Matern52)
+    :type nu: float
+    :param num_features: the number of features (even)
+    :type num_features: int
+    :param seed: the seed of the random frequencies
+    :type seed: int
+
+    """
+    part = parts.matern_rff.Matern_RFF(input_dim, variance, lengthscale, ARD, nu, num_features, seed)
+    return kern(input_dim, [part])
+
 def bias(input_dim, variance=1.):
     """
      Construct a bias kernel.
@@ -8,6 +8,9 @@ from ..core.parameterized import Parameterized
 from parts.kernpart import Kernpart
 import itertools
 from parts.prod import Prod as prod
+from ..util.distances import DistanceCache
+from ..util.block_matrices import merge_labels
+from tiling import TileEngine
 from matplotlib.transforms import offset_copy
 
 class kern(Parameterized):
@@ -52,6 +55,10 @@ class kern(Parameterized):
             assert isinstance(p, Kernpart), "bad kernel part"
 
         self.compute_param_slices()
+        self.distances = DistanceCache()
+        self._share_distances()
+        # computes the covariance of large inputs tile by tile, in threads
+        self.engine = TileEngine()
 
         Parameterized.__init__(self)
 
@@ -75,8 +82,24 @@ class kern(Parameterized):
         self.num_params = state.pop()
         self.num_parts = state.pop()
         self.parts = state.pop()
+        self.distances = DistanceCache()
+        self._share_distances()
+        self.engine = TileEngine()
         Parameterized.setstate(self, state)
 
+    def _share_distances(self):
+        """
+        Hand the distance cache of the kernel to its parts (and to the
+        factors of products), so that stationary parts on the same inputs
+        share their squared distances.
+        """
+        parts = list(self.parts)
+        while len(parts):
+            p = parts.pop()
+            p.distances = self.distances
+            if isinstance(p, prod):
+                parts += [p.k1, p.k2]
+
 
     def plot_ARD(self, fignum=None, ax=None, title='', legend=False):
         """If an ARD kernel is present, plot a bar representation using matplotlib
@@ -317,7 +340,7 @@ class kern(Parameterized):
 
         return sum([[name + '_' + n for n in k._get_param_names()] for name, k in zip(names, self.parts)], [])
 
-    def K(self, X, X2=None, which_parts='all'):
+    def K(self, X, X2=None, which_parts='all', target=None):
         """
         Compute the kernel function.
 
@@ -328,18 +351,58 @@ class kern(Parameterized):
         :param which_parts: a list of booleans detailing whether to include
                             each of the part functions. By default, 'all'
                             indicates [True]*self.num_parts
+        :param target: (optional) an array of the right shape to store the
+                       result in, so that its memory can be reused.
         """
         if which_parts == 'all':
             which_parts = [True] * self.num_parts
         assert X.shape[1] == self.input_dim
-        if X2 is None:
-            target = np.zeros((X.shape[0], X.shape[0]))
-            [p.K(X[:, i_s], None, target=target) for p, i_s, part_i_used in zip(self.parts, self.input_slices, which_parts) if part_i_used]
+        if target is None:
+            target = np.zeros((X.shape[0], X.shape[0] if X2 is None else X2.shape[0]))
         else:
-            target = np.zeros((X.shape[0], X2.shape[0]))
-            [p.K(X[:, i_s], X2[:, i_s], target=target) for p, i_s, part_i_used in zip(self.parts, self.input_slices, which_parts) if part_i_used]
+            target[:] = 0.
+        self.engine.K([(p, i_s) for p, i_s, part_i_used in zip(self.parts, self.input_slices, which_parts) if part_i_used], X, X2, target)
         return target
 
+    def K_and_cache(self, X, X2=None, target=None):
+        """
+        Compute the covariance matrix like K (with all the parts), together
+        with the intermediate results of each part (distances,
+        exponentials...) which dK_dtheta_from_cache reuses, so that an
+        objective and gradient evaluation computes them once. The parts
+        which the engine computes tile by tile in threads keep none, and
+        their gradient is computed tile by tile as well.
+
+        :param X: the first set of inputs to the kernel
+        :param X2: (optional) the second set of arguments to the kernel. If X2 is None, this is passed throgh to the 'part' object, which handles this as X2 == X.
+        :param target: (optional) an array of the right size, to compute the covariance matrix in
+        :returns: K, cache
+        """
+        assert X.shape[1] == self.input_dim
+        shape = (X.shape[0], X.shape[0] if X2 is None else X2.shape[0])
+        if target is None:
+            target = np.zeros(shape)
+        else:
+            target[:] = 0.
+        cache = self.engine.K_and_cache(zip(self.parts, self.input_slices), X, X2, target)
+        return target, (X, X2, cache)
+
+    def dK_dtheta_from_cache(self, dL_dK, cache):
+        """
+        Compute the gradient of the covariance function with respect to the
+        parameters, from the cache returned by K_and_cache (for the current
+        parameters).
+
+        :param dL_dK: An array of gradients of the objective function with respect to the covariance function.
+        :param cache: the cache returned by K_and_cache
+
+        returns: dL_dtheta
+        """
+        X, X2, cache = cache
+        target = np.zeros(self.num_params)
+        self.engine.dK_dtheta_from_cache(zip(self.parts, self.input_slices, self.param_slices), dL_dK, X, X2, cache, target)
+        return self._transform_gradients(target)
+
     def dK_dtheta(self, dL_dK, X, X2=None):
         """
         Compute the gradient of the covariance function with respect to the parameters.
@@ -355,13 +418,72 @@ class kern(Parameterized):
         """
         assert X.shape[1] == self.input_dim
         target = np.zeros(self.num_params)
-        if X2 is None:
-            [p.dK_dtheta(dL_dK, X[:, i_s], None, target[ps]) for p, i_s, ps, in zip(self.parts, self.input_slices, self.param_slices)]
-        else:
-            [p.dK_dtheta(dL_dK, X[:, i_s], X2[:, i_s], target[ps]) for p, i_s, ps, in zip(self.parts, self.input_slices, self.param_slices)]
+        self.engine.dK_dtheta(zip(self.parts, self.input_slices, self.param_slices), dL_dK, X, X2, target)
+        return self._transform_gradients(target)
+
+    def block_labels(self, X):
+        """
+        The blocks of the covariance matrix of X, when the kernel makes it
+        block diagonal up to a permutation of the rows (e.g. independent
+        outputs): an array of ints labelling the rows, such that the
+        covariance of rows with different labels is zero. None when some
+        part couples all the rows.
+
+        :param X: the inputs
+        :type X: np.ndarray (num_samples x input_dim)
+        """
+        labels = [p.block_labels(X[:, i_s]) for p, i_s in zip(self.parts, self.input_slices)]
+        if any([l is None for l in labels]):
+            return None
+        return merge_labels(labels)
+
+    def features(self, X, which_parts='all'):
+        """
+        The explicit feature map of the kernel, Phi such that
+        K(X, X2) = Phi(X) Phi(X2)^T, for kernels whose parts all have one.
+        The features of the parts are concatenated; the columns of the
+        parts which are not in which_parts are zero.
+
+        :param X: the inputs
+        :type X: np.ndarray (num_samples x input_dim)
+        :param which_parts: a list of booleans detailing whether to include each of the part functions. By default, 'all' indicates [True]*self.num_parts
+        :rtype: np.ndarray (num_samples x num_features)
+        """
+        assert X.shape[1] == self.input_dim
+        if which_parts == 'all':
+            which_parts = [True] * self.num_parts
+        target = np.zeros((X.shape[0], self.num_features))
+        for p, i_s, fs, part_on in zip(self.parts, self.input_slices, self._feature_slices(), which_parts):
+            if part_on:
+                target[:, fs] = p.features(X[:, i_s])
+        return target
+
+    def dfeatures_dtheta(self, dL_dfeatures, X):
+        """
+        Compute the gradient of the parameters given the gradient of the
+        objective function with respect to the features of X.
 
+        :param dL_dfeatures: the gradient of the objective function wrt the features
+        :type dL_dfeatures: np.ndarray (num_samples x num_features)
+        :param X: the inputs
+        :type X: np.ndarray (num_samples x input_dim)
+
+        returns: dL_dtheta
+        """
+        assert X.shape[1] == self.input_dim
+        target = np.zeros(self.num_params)
+        [p.dfeatures_dtheta(dL_dfeatures[:, fs], X[:, i_s], target[ps]) for p, i_s, ps, fs in zip(self.parts, self.input_slices, self.param_slices, self._feature_slices())]
         return self._transform_gradients(target)
 
+    @property
+    def num_features(self):
+        return sum([p.num_features for p in self.parts])
+
+    def _feature_slices(self):
+        """The columns of the features of each part."""
+        ends = np.cumsum([p.num_features for p in self.parts])
+        return [slice(end - p.num_features, end) for p, end in zip(self.parts, ends)]
+
     def dK_dX(self, dL_dK, X, X2=None):
         """Compute the gradient of the objective function with respect to X.
 
@@ -373,10 +495,7 @@ class kern(Parameterized):
         :type X2: np.ndarray (num_inducing x input_dim)"""
 
         target = np.zeros_like(X)
-        if X2 is None: 
-            [p.dK_dX(dL_dK, X[:, i_s], None, target[:, i_s]) for p, i_s in zip(self.parts, self.input_slices)]
-        else:
-            [p.dK_dX(dL_dK, X[:, i_s], X2[:, i_s], target[:, i_s]) for p, i_s in zip(self.parts, self.input_slices)]
+        self.engine.dK_dX(zip(self.parts, self.input_slices), dL_dK, X, X2, target)
         return target
 
     def Kdiag(self, X, which_parts='all'):
@@ -385,7 +504,7 @@ class kern(Parameterized):
             which_parts = [True] * self.num_parts
         assert X.shape[1] == self.input_dim
         target = np.zeros(X.shape[0])
-        [p.Kdiag(X[:, i_s], target=target) for p, i_s, part_on in zip(self.parts, self.input_slices, which_parts) if part_on]
+        self.engine.Kdiag([(p, i_s) for p, i_s, part_on in zip(self.parts, self.input_slices, which_parts) if part_on], X, target)
         return target
 
     def dKdiag_dtheta(self, dL_dKdiag, X):
@@ -468,35 +587,71 @@ class kern(Parameterized):
                 target += p1.variance * (p2._psi1[:, :, None] + p2._psi1[:, None, :])
             elif isinstance(p2, (Bias, Fixed)) and isinstance(p1, (RBF, RBFInv)):
                 target += p2.variance * (p1._psi1[:, :, None] + p1._psi1[:, None, :])
-            # linear X bias
-            elif isinstance(p1, (Bias, Fixed)) and isinstance(p2, (Linear, RBF, RBFInv)):
+            # bias X any other
+            elif isinstance(p1, (Bias, Fixed)):
                 tmp = np.zeros((mu.shape[0], Z.shape[0]))
                 p2.psi1(Z, mu, S, tmp)
                 target += p1.variance * (tmp[:, :, None] + tmp[:, None, :])
-            elif isinstance(p2, (Bias, Fixed)) and isinstance(p1, (Linear, RBF, RBFInv)):
+            elif isinstance(p2, (Bias, Fixed)):
                 tmp = np.zeros((mu.shape[0], Z.shape[0]))
                 p1.psi1(Z, mu, S, tmp)
                 target += p2.variance * (tmp[:, :, None] + tmp[:, None, :])
-            # rbf X any
-            elif False:#isinstance(p1, (RBF, RBFInv)) or isinstance(p2, (RBF, RBFInv)):
-                if isinstance(p2, (RBF, RBFInv)) and not isinstance(p1, (RBF, RBFInv)):
-                    p1t = p1; p1 = p2; p2 = p1t; del p1t  
-                N, M = mu.shape[0], Z.shape[0]; NM=N*M
-                psi11 = np.zeros((N, M))
-                psi12 = np.zeros((NM, M))
-                p1.psi1(Z, mu, S, psi11)
-                Mu, Sigma = p1._crossterm_mu_S(Z, mu, S)
-                Mu, Sigma = Mu.reshape(NM,self.input_dim), Sigma.reshape(NM,self.input_dim)
-
-                p2.psi1(Z, Mu, Sigma, psi12)
-                eK2 = psi12.reshape(N, M, M)
-                crossterms = eK2 * (psi11[:, :, None] + psi11[:, None, :])
-                target += crossterms
+            # any other pair, by quadrature
             else:
-                raise NotImplementedError, "psi2 cannot be computed for this kernel"
-        return target        
+                p1.psi_quadrature.psi2_cross((p1, i1), (p2, i2), Z, mu, S, target)
+        return target
+
+    def psi2_sum(self, Z, mu, S):
+        """
+        The sum of psi2 over the data, which is all a model with a
+        homoscedastic likelihood needs. Parts which can, accumulate it
+        without forming the N x M x M statistics.
+
+        :param Z: np.ndarray of inducing inputs (M x Q)
+        :param mu, S: np.ndarrays of means and variances (each N x Q)
+        :returns psi2_sum: np.ndarray (M,M)
+        """
+        target = np.zeros((Z.shape[0], Z.shape[0]))
+        [p.psi2_sum(Z[:, i_s], mu[:, i_s], S[:, i_s], target) for p, i_s in zip(self.parts, self.input_slices)]
+
+        from parts.white import White
+        from parts.rbf import RBF
+        from parts.rbf_inv import RBFInv
+        from parts.bias import Bias
+        from parts.linear import Linear
+        from parts.fixed import Fixed
+
+        # the cross terms, summed over the data (see psi2)
+        for (p1, i1), (p2, i2) in itertools.combinations(itertools.izip(self.parts, self.input_slices), 2):
+            if isinstance(p1, White) or isinstance(p2, White):
+                continue
+            if isinstance(p2, (Bias, Fixed)):
+                p1, p2 = p2, p1
+            if isinstance(p1, (Bias, Fixed)):
+                psi1 = np.zeros((mu.shape[0], Z.shape[0]))
+                p2.psi1(Z, mu, S, psi1)
+                psi1_sum = psi1.sum(0)
+                target += p1.variance * (psi1_sum[:, None] + psi1_sum[None, :])
+            else:
+                p1.psi_quadrature.psi2_cross((p1, i1), (p2, i2), Z, mu, S, target)
+        return target
+
+    def _dL_dpsi2_sum(self, dL_dpsi2, num_data):
+        """
+        The sums of dL_dpsi2 over the first inducing input, num_data x M, for
+        the cross terms. dL_dpsi2 is either num_data x M x M or, when it is
+        the same for all the data, M x M.
+        """
+        if dL_dpsi2.ndim == 2:
+            return np.repeat(dL_dpsi2.sum(0)[None, :], num_data, 0)
+        return dL_dpsi2.sum(1)
 
     def dpsi2_dtheta(self, dL_dpsi2, Z, mu, S):
+        """
+        The gradient of the parameters given dL_dpsi2, which is either
+        N x M x M or, when it is the same for all the data (homoscedastic
+        likelihoods), M x M. The latter avoids forming N identical slices.
+        """
         target = np.zeros(self.num_params)
         [p.dpsi2_dtheta(dL_dpsi2, Z[:, i_s], mu[:, i_s], S[:, i_s], target[ps]) for p, i_s, ps in zip(self.parts, self.input_slices, self.param_slices)]
 
@@ -506,6 +661,7 @@ class kern(Parameterized):
         from parts.bias import Bias
         from parts.linear import Linear
         from parts.fixed import Fixed
+        dL_dpsi2_sum = self._dL_dpsi2_sum(dL_dpsi2, mu.shape[0])
 
         # compute the "cross" terms
         # TODO: better looping, input_slices
@@ -517,66 +673,26 @@ class kern(Parameterized):
                 pass
             # rbf X bias
             elif isinstance(p1, (Bias, Fixed)) and isinstance(p2, (RBF, RBFInv)):
-                p2.dpsi1_dtheta(dL_dpsi2.sum(1) * p1.variance * 2., Z, mu, S, target[ps2])
-                p1.dpsi1_dtheta(dL_dpsi2.sum(1) * p2._psi1 * 2., Z, mu, S, target[ps1])
+                p2.dpsi1_dtheta(dL_dpsi2_sum * p1.variance * 2., Z, mu, S, target[ps2])
+                p1.dpsi1_dtheta(dL_dpsi2_sum * p2._psi1 * 2., Z, mu, S, target[ps1])
             elif isinstance(p2, (Bias, Fixed)) and isinstance(p1, (RBF, RBFInv)):
-                p1.dpsi1_dtheta(dL_dpsi2.sum(1) * p2.variance * 2., Z, mu, S, target[ps1])
-                p2.dpsi1_dtheta(dL_dpsi2.sum(1) * p1._psi1 * 2., Z, mu, S, target[ps2])
-            # linear X bias
-            elif isinstance(p1, (Bias, Fixed)) and isinstance(p2, Linear):
-                p2.dpsi1_dtheta(dL_dpsi2.sum(1) * p1.variance * 2., Z, mu, S, target[ps2]) # [ps1])
+                p1.dpsi1_dtheta(dL_dpsi2_sum * p2.variance * 2., Z, mu, S, target[ps1])
+                p2.dpsi1_dtheta(dL_dpsi2_sum * p1._psi1 * 2., Z, mu, S, target[ps2])
+            # bias X any other
+            elif isinstance(p1, (Bias, Fixed)):
+                p2.dpsi1_dtheta(dL_dpsi2_sum * p1.variance * 2., Z, mu, S, target[ps2]) # [ps1])
                 psi1 = np.zeros((mu.shape[0], Z.shape[0]))
                 p2.psi1(Z, mu, S, psi1)
-                p1.dpsi1_dtheta(dL_dpsi2.sum(1) * psi1 * 2., Z, mu, S, target[ps1])
-            elif isinstance(p2, (Bias, Fixed)) and isinstance(p1, Linear):
-                p1.dpsi1_dtheta(dL_dpsi2.sum(1) * p2.variance * 2., Z, mu, S, target[ps1])
+                p1.dpsi1_dtheta(dL_dpsi2_sum * psi1 * 2., Z, mu, S, target[ps1])
+            elif isinstance(p2, (Bias, Fixed)):
+                p1.dpsi1_dtheta(dL_dpsi2_sum * p2.variance * 2., Z, mu, S, target[ps1])
                 psi1 = np.zeros((mu.shape[0], Z.shape[0]))
                 p1.psi1(Z, mu, S, psi1)
-                p2.dpsi1_dtheta(dL_dpsi2.sum(1) * psi1 * 2., Z, mu, S, target[ps2])
-            # rbf X any
-            elif False:#isinstance(p1, (RBF, RBFInv)) or isinstance(p2, (RBF, RBFInv)):
-                if isinstance(p2, (RBF, RBFInv)) and not isinstance(p1, (RBF, RBFInv)):
-                    # turn around to have rbf in front
-                    p1, p2 = self.parts[i2], self.parts[i1]
-                    ps1, ps2 = self.param_slices[i2], self.param_slices[i1]  
-
-                N, M = mu.shape[0], Z.shape[0]; NM=N*M
-
-                psi11 = np.zeros((N, M))
-                p1.psi1(Z, mu, S, psi11)
-
-                Mu, Sigma = p1._crossterm_mu_S(Z, mu, S)
-                Mu, Sigma = Mu.reshape(NM,self.input_dim), Sigma.reshape(NM,self.input_dim)
-
-                tmp1 = np.zeros_like(target[ps1])
-                tmp2 = np.zeros_like(target[ps2])
-#                 for n in range(N):
-#                     for m in range(M):
-#                         for m_prime in range(M):
-#                             p1.dpsi1_dtheta((dL_dpsi2[n:n+1,m:m+1,m_prime:m_prime+1]*psi12_t.reshape(N,M,M)[n:n+1,m:m+1,m_prime:m_prime+1])[0], Z[m:m+1], mu[n:n+1], S[n:n+1], tmp2)#Z[m_prime:m_prime+1], mu[n:n+1], S[n:n+1], tmp2)
-#                             p1.dpsi1_dtheta((dL_dpsi2[n:n+1,m:m+1,m_prime:m_prime+1]*psi12_t.reshape(N,M,M)[n:n+1,m_prime:m_prime+1,m:m+1])[0], Z[m_prime:m_prime+1], mu[n:n+1], S[n:n+1], tmp2)
-#                             Mu, Sigma= Mu.reshape(N,M,self.input_dim), Sigma.reshape(N,M,self.input_dim)
-#                             p2.dpsi1_dtheta((dL_dpsi2[n:n+1,m:m+1,m_prime:m_prime+1]*(psi11[n:n+1,m_prime:m_prime+1]))[0], Z[m:m+1], Mu[n:n+1,m], Sigma[n:n+1,m], target[ps2])
-#                             p2.dpsi1_dtheta((dL_dpsi2[n:n+1,m:m+1,m_prime:m_prime+1]*(psi11[n:n+1,m:m+1]))[0], Z[m_prime:m_prime+1], Mu[n:n+1, m_prime], Sigma[n:n+1, m_prime], target[ps2])#Z[m_prime:m_prime+1], Mu[n+m:(n+m)+1], Sigma[n+m:(n+m)+1], target[ps2])
-
-                if isinstance(p1, RBF) and isinstance(p2, RBF):
-                    psi12 = np.zeros((N, M))
-                    p2.psi1(Z, mu, S, psi12)
-                    Mu2, Sigma2 = p2._crossterm_mu_S(Z, mu, S)
-                    Mu2, Sigma2 = Mu2.reshape(NM,self.input_dim), Sigma2.reshape(NM,self.input_dim)
-                    p1.dpsi1_dtheta((dL_dpsi2*(psi12[:,:,None] + psi12[:,None,:])).reshape(NM,M), Z, Mu2, Sigma2, tmp1)
-                    pass
-
-                if isinstance(p1, RBF) and isinstance(p2, Linear):
-                    #import ipdb;ipdb.set_trace()
-                    pass
-
-                p2.dpsi1_dtheta((dL_dpsi2*(psi11[:,:,None] + psi11[:,None,:])).reshape(NM,M), Z, Mu, Sigma, tmp2)
-
-                target[ps1] += tmp1
-                target[ps2] += tmp2
+                p2.dpsi1_dtheta(dL_dpsi2_sum * psi1 * 2., Z, mu, S, target[ps2])
+            # any other pair, by quadrature
             else:
-                raise NotImplementedError, "psi2 cannot be computed for this kernel"
+                p1.psi_quadrature.dpsi2_cross_dtheta(dL_dpsi2, (p1, self.input_slices[i1]), (p2, self.input_slices[i2]),
+                                                     Z, mu, S, target[ps1], target[ps2])
 
         return self._transform_gradients(target)
 
@@ -590,45 +706,26 @@ class kern(Parameterized):
         from parts.bias import Bias
         from parts.linear import Linear
         from parts.fixed import Fixed
+        dL_dpsi2_sum = self._dL_dpsi2_sum(dL_dpsi2, mu.shape[0])
 
         # compute the "cross" terms
         # TODO: better looping, input_slices
-        for p1, p2 in itertools.combinations(self.parts, 2):
+        for (p1, i1), (p2, i2) in itertools.combinations(itertools.izip(self.parts, self.input_slices), 2):
             if isinstance(p1, White) or isinstance(p2, White):
                 pass
             # rbf X bias
             elif isinstance(p1, (Bias, Fixed)) and isinstance(p2, (RBF, RBFInv)):
-                p2.dpsi1_dZ(dL_dpsi2.sum(1) * p1.variance, Z, mu, S, target)
+                p2.dpsi1_dZ(dL_dpsi2_sum * p1.variance, Z, mu, S, target)
             elif isinstance(p2, (Bias, Fixed)) and isinstance(p1, (RBF, RBFInv)):
-                p1.dpsi1_dZ(dL_dpsi2.sum(1) * p2.variance, Z, mu, S, target)
-            # linear X bias
-            elif isinstance(p1, (Bias, Fixed)) and isinstance(p2, Linear):
-                p2.dpsi1_dZ(dL_dpsi2.sum(1) * p1.variance, Z, mu, S, target)
-            elif isinstance(p2, (Bias, Fixed)) and isinstance(p1, Linear):
-                p1.dpsi1_dZ(dL_dpsi2.sum(1) * p2.variance, Z, mu, S, target)
-            # rbf X any
-            elif False:#isinstance(p1, (RBF, RBFInv)) or isinstance(p2, (RBF, RBFInv)):
-                if isinstance(p2, (RBF, RBFInv)) and not isinstance(p1, (RBF, RBFInv)):
-                    p1t = p1; p1 = p2; p2 = p1t; del p1t  
-                N, M = mu.shape[0], Z.shape[0]; NM=N*M
-                psi11 = np.zeros((N, M))
-                psi12 = np.zeros((NM, M))
-                #psi12_t = np.zeros((N,M))
-
-                p1.psi1(Z, mu, S, psi11)
-                Mu, Sigma = p1._crossterm_mu_S(Z, mu, S)
-                Mu, Sigma = Mu.reshape(NM,self.input_dim), Sigma.reshape(NM,self.input_dim)
-
-                p2.psi1(Z, Mu, Sigma, psi12)
-                tmp1 = np.zeros_like(target)
-                p1.dpsi1_dZ((dL_dpsi2*psi12.reshape(N,M,M)).sum(1), Z, mu, S, tmp1)
-                p1.dpsi1_dZ((dL_dpsi2*psi12.reshape(N,M,M)).sum(2), Z, mu, S, tmp1)
-                target += tmp1
-
-                #p2.dpsi1_dtheta((dL_dpsi2*(psi11[:,:,None] + psi11[:,None,:])).reshape(NM,M), Z, Mu, Sigma, target)
-                p2.dpsi1_dZ((dL_dpsi2*(psi11[:,:,None] + psi11[:,None,:])).reshape(NM,M), Z, Mu, Sigma, target)
+                p1.dpsi1_dZ(dL_dpsi2_sum * p2.variance, Z, mu, S, target)
+            # bias X any other
+            elif isinstance(p1, (Bias, Fixed)):
+                p2.dpsi1_dZ(dL_dpsi2_sum * p1.variance, Z, mu, S, target)
+            elif isinstance(p2, (Bias, Fixed)):
+                p1.dpsi1_dZ(dL_dpsi2_sum * p2.variance, Z, mu, S, target)
+            # any other pair, by quadrature
             else:
-                raise NotImplementedError, "psi2 cannot be computed for this kernel"
+                p1.psi_quadrature.dpsi2_cross_dZ(dL_dpsi2, (p1, i1), (p2, i2), Z, mu, S, target)
         return target * 2
 
     def dpsi2_dmuS(self, dL_dpsi2, Z, mu, S):
@@ -641,43 +738,26 @@ class kern(Parameterized):
         from parts.bias import Bias
         from parts.linear import Linear
         from parts.fixed import Fixed
+        dL_dpsi2_sum = self._dL_dpsi2_sum(dL_dpsi2, mu.shape[0])
 
         # compute the "cross" terms
         # TODO: better looping, input_slices
-        for p1, p2 in itertools.combinations(self.parts, 2):
+        for (p1, i1), (p2, i2) in itertools.combinations(itertools.izip(self.parts, self.input_slices), 2):
             if isinstance(p1, White) or isinstance(p2, White):
                 pass
             # rbf X bias
             elif isinstance(p1, (Bias, Fixed)) and isinstance(p2, (RBF, RBFInv)):
-                p2.dpsi1_dmuS(dL_dpsi2.sum(1) * p1.variance * 2., Z, mu, S, target_mu, target_S)
+                p2.dpsi1_dmuS(dL_dpsi2_sum * p1.variance * 2., Z, mu, S, target_mu, target_S)
             elif isinstance(p2, (Bias, Fixed)) and isinstance(p1, (RBF, RBFInv)):
-                p1.dpsi1_dmuS(dL_dpsi2.sum(1) * p2.variance * 2., Z, mu, S, target_mu, target_S)
-            # linear X bias
-            elif isinstance(p1, (Bias, Fixed)) and isinstance(p2, Linear):
-                p2.dpsi1_dmuS(dL_dpsi2.sum(1) * p1.variance * 2., Z, mu, S, target_mu, target_S)
-            elif isinstance(p2, (Bias, Fixed)) and isinstance(p1, Linear):
-                p1.dpsi1_dmuS(dL_dpsi2.sum(1) * p2.variance * 2., Z, mu, S, target_mu, target_S)
-            # rbf X any
-            elif False:#isinstance(p1, (RBF, RBFInv)) or isinstance(p2, (RBF, RBFInv)):
-                if isinstance(p2, (RBF, RBFInv)) and not isinstance(p1, (RBF, RBFInv)):
-                    p1t = p1; p1 = p2; p2 = p1t; del p1t  
-                N, M = mu.shape[0], Z.shape[0]; NM=N*M
-                psi11 = np.zeros((N, M))
-                psi12 = np.zeros((NM, M))
-                #psi12_t = np.zeros((N,M))
-
-                p1.psi1(Z, mu, S, psi11)
-                Mu, Sigma = p1._crossterm_mu_S(Z, mu, S)
-                Mu, Sigma = Mu.reshape(NM,self.input_dim), Sigma.reshape(NM,self.input_dim)
-
-                p2.psi1(Z, Mu, Sigma, psi12)
-                p1.dpsi1_dmuS((dL_dpsi2*psi12.reshape(N,M,M)).sum(1), Z, mu, S, target_mu, target_S)
-                p1.dpsi1_dmuS((dL_dpsi2*psi12.reshape(N,M,M)).sum(2), Z, mu, S, target_mu, target_S)
-
-                #p2.dpsi1_dtheta((dL_dpsi2*(psi11[:,:,None] + psi11[:,None,:])).reshape(NM,M), Z, Mu, Sigma, target)
-                p2.dpsi1_dmuS((dL_dpsi2*(psi11[:,:,None])).sum(1)*2, Z, Mu.reshape(N,M,self.input_dim).sum(1), Sigma.reshape(N,M,self.input_dim).sum(1), target_mu, target_S)
+                p1.dpsi1_dmuS(dL_dpsi2_sum * p2.variance * 2., Z, mu, S, target_mu, target_S)
+            # bias X any other
+            elif isinstance(p1, (Bias, Fixed)):
+                p2.dpsi1_dmuS(dL_dpsi2_sum * p1.variance * 2., Z, mu, S, target_mu, target_S)
+            elif isinstance(p2, (Bias, Fixed)):
+                p1.dpsi1_dmuS(dL_dpsi2_sum * p2.variance * 2., Z, mu, S, target_mu, target_S)
+            # any other pair, by quadrature
             else:
-                raise NotImplementedError, "psi2 cannot be computed for this kernel"
+                p1.psi_quadrature.dpsi2_cross_dmuS(dL_dpsi2, (p1, i1), (p2, i2), Z, mu, S, target_mu, target_S)
         return target_mu, target_S
 
     def plot(self, x=None, plot_limits=None, which_parts='all', resolution=None, *args, **kwargs):
@@ -63,3 +63,11 @@ class Brownian(Kernpart):
     def dKdiag_dX(self,dL_dKdiag,X,target):
         target += self.variance*dL_dKdiag[:,None]
 
+    def sde(self):
+        """Return the state space form of the kernel, see Kernpart.sde"""
+        F = np.zeros((1, 1))
+        L = np.ones((1, 1))
+        Qc = np.array([[float(self.variance)]])
+        H = np.ones((1, 1))
+        P0 = np.zeros((1, 1))
+        return F, L, Qc, H, P0, np.zeros((1, 1, 1)), np.ones((1, 1, 1)), np.zeros((1, 1, 1))
@@ -6,6 +6,7 @@ from kernpart import Kernpart
 import numpy as np
 import hashlib
 from scipy import integrate
+from ...util.distances import sqdiff_sums, diff_sums
 
 class Matern52(Kernpart):
     """
@@ -26,6 +27,9 @@ class Matern52(Kernpart):
     :rtype: kernel object
 
     """
+
+    stationary = True
+
     def __init__(self,input_dim,variance=1.,lengthscale=None,ARD=False):
         self.input_dim = input_dim
         self.ARD = ARD
@@ -66,9 +70,19 @@ class Matern52(Kernpart):
 
     def K(self,X,X2,target):
         """Compute the covariance matrix between X and X2."""
-        if X2 is None: X2 = X
-        dist = np.sqrt(np.sum(np.square((X[:,None,:]-X2[None,:,:])/self.lengthscale),-1))
-        np.add(self.variance*(1+np.sqrt(5.)*dist+5./3*dist**2)*np.exp(-np.sqrt(5.)*dist), target,target)
+        self.K_and_cache(X, X2, target)
+
+    def K_and_cache(self,X,X2,target):
+        """Compute the covariance matrix, keeping the distances and exponentials for dK_dtheta_from_cache."""
+        return self._K_and_cache_stationary(X, X2, target)
+
+    def _K_from_cache(self,cache):
+        X, X2, dist, expdist = cache
+        return self.variance*(1+np.sqrt(5.)*dist+5./3*dist**2)*expdist
+
+    def _cache(self,X,X2,r2):
+        dist = np.sqrt(r2)
+        return X, X2, dist, np.exp(-np.sqrt(5.)*dist)
 
     def Kdiag(self,X,target):
         """Compute the diagonal of the covariance matrix associated to X."""
@@ -76,21 +90,18 @@ class Matern52(Kernpart):
 
     def dK_dtheta(self,dL_dK,X,X2,target):
         """derivative of the covariance matrix with respect to the parameters."""
-        if X2 is None: X2 = X
-        dist = np.sqrt(np.sum(np.square((X[:,None,:]-X2[None,:,:])/self.lengthscale),-1))
-        invdist = 1./np.where(dist!=0.,dist,np.inf)
-        dist2M = np.square(X[:,None,:]-X2[None,:,:])/self.lengthscale**3
-        dvar = (1+np.sqrt(5.)*dist+5./3*dist**2)*np.exp(-np.sqrt(5.)*dist)
-        dl = (self.variance * 5./3 * dist * (1 + np.sqrt(5.)*dist ) * np.exp(-np.sqrt(5.)*dist))[:,:,np.newaxis] * dist2M*invdist[:,:,np.newaxis]
-        target[0] += np.sum(dvar*dL_dK)
+        self._dK_dtheta_stationary(dL_dK, X, X2, target)
+
+    def dK_dtheta_from_cache(self,dL_dK,cache,target):
+        """derivative of the covariance matrix with respect to the parameters, see K_and_cache."""
+        X, X2, dist, expdist = cache
+        target[0] += np.sum((1+np.sqrt(5.)*dist+5./3*dist**2)*expdist*dL_dK)
+        # dk/dl_i = 5/3 variance (1 + sqrt(5) r) exp(-sqrt(5) r) (x_i - y_i)^2 / l_i^3
+        G = self.variance * 5./3 * (1 + np.sqrt(5.)*dist) * expdist * dL_dK
         if self.ARD:
-            dl = (self.variance * 5./3 * dist * (1 + np.sqrt(5.)*dist ) * np.exp(-np.sqrt(5.)*dist))[:,:,np.newaxis] * dist2M*invdist[:,:,np.newaxis]
-            #dl = (self.variance* 3 * dist * np.exp(-np.sqrt(3.)*dist))[:,:,np.newaxis] * dist2M*invdist[:,:,np.newaxis]
-            target[1:] += (dl*dL_dK[:,:,None]).sum(0).sum(0)
+            target[1:] += sqdiff_sums(G, X, X2) / self.lengthscale**3
         else:
-            dl = (self.variance * 5./3 * dist * (1 + np.sqrt(5.)*dist ) * np.exp(-np.sqrt(5.)*dist)) * dist2M.sum(-1)*invdist
-            #dl = (self.variance* 3 * dist * np.exp(-np.sqrt(3.)*dist)) * dist2M.sum(-1)*invdist
-            target[1] += np.sum(dl*dL_dK)
+            target[1] += np.sum(G*np.square(dist)) / self.lengthscale
 
     def dKdiag_dtheta(self,dL_dKdiag,X,target):
         """derivative of the diagonal of the covariance matrix with respect to the parameters."""
@@ -98,18 +109,38 @@ class Matern52(Kernpart):
 
     def dK_dX(self,dL_dK,X,X2,target):
         """derivative of the covariance matrix with respect to X."""
+        dist = np.sqrt(self._scaled_sqdist(X, X2))
+        # dk/dx = -5/3 variance (1 + sqrt(5) r) exp(-sqrt(5) r) (x - y) / l^2
+        G = -self.variance*5./3*(1+np.sqrt(5)*dist)*np.exp(-np.sqrt(5)*dist) * dL_dK
         if X2 is None:
-            dist = np.sqrt(np.sum(np.square((X[:,None,:]-X[None,:,:])/self.lengthscale),-1))[:,:,None]
-            ddist_dX = 2*(X[:,None,:]-X[None,:,:])/self.lengthscale**2/np.where(dist!=0.,dist,np.inf)
-        else:
-            dist = np.sqrt(np.sum(np.square((X[:,None,:]-X2[None,:,:])/self.lengthscale),-1))[:,:,None]
-            ddist_dX = (X[:,None,:]-X2[None,:,:])/self.lengthscale**2/np.where(dist!=0.,dist,np.inf)
-        dK_dX = -  np.transpose(self.variance*5./3*dist*(1+np.sqrt(5)*dist)*np.exp(-np.sqrt(5)*dist)*ddist_dX,(1,0,2))
-        target += np.sum(dK_dX*dL_dK.T[:,:,None],0)
+            G = 2*G
+        target += diff_sums(G, X, X2) / self.lengthscale**2
 
     def dKdiag_dX(self,dL_dKdiag,X,target):
         pass
 
+    def sde(self):
+        """Return the state space form of the kernel, see Kernpart.sde"""
+        assert self.input_dim == 1, "state space forms are for 1-D inputs"
+        variance, lengthscale = float(self.variance), float(self.lengthscale)
+        lamda = np.sqrt(5.) / lengthscale
+        kappa = variance * lamda ** 2 / 3.
+        F = np.array([[0., 1., 0.], [0., 0., 1.], [-lamda ** 3, -3. * lamda ** 2, -3. * lamda]])
+        L = np.array([[0.], [0.], [1.]])
+        Qc = np.array([[16. / 3. * variance * lamda ** 5]])
+        H = np.array([[1., 0., 0.]])
+        P0 = np.array([[variance, 0., -kappa], [0., kappa, 0.], [-kappa, 0., variance * lamda ** 4]])
+        # d lamda / d lengthscale = -lamda / lengthscale
+        dF = np.zeros((2, 3, 3))
+        dF[1, 2] = [3. * lamda ** 3, 6. * lamda ** 2, 3. * lamda]
+        dF[1] /= lengthscale
+        dQc = np.array([[[16. / 3. * lamda ** 5]], [[-80. / 3. * variance * lamda ** 5 / lengthscale]]])
+        dP0 = np.zeros((2, 3, 3))
+        dP0[0] = P0 / variance
+        dP0[1] = [[0., 0., 2. * kappa], [0., -2. * kappa, 0.], [2. * kappa, 0., -4. * variance * lamda ** 4]]
+        dP0[1] /= lengthscale
+        return F, L, Qc, H, P0, dF, dQc, dP0
+
     def Gram_matrix(self,F,F1,F2,F3,lower,upper):
         """
         Return the Gram matrix of the vector of functions F with respect to the RKHS norm. The use of this function is limited to input_dim=1.
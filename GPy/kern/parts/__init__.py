@@ -12,6 +12,7 @@ import independent_outputs
 import linear
 import Matern32
 import Matern52
+import matern_rff
 import mlp
 # import ODE_1
 # import ODE_UY
@@ -25,6 +26,7 @@ import rational_quadratic
 import rbfcos
 import rbf
 import rbf_inv
+import rbf_rff
 import spline
 import symmetric
 import sympy_helpers
@@ -7,6 +7,8 @@ import numpy as np
 import hashlib
 
 class Bias(Kernpart):
+    stationary = True
+
     def __init__(self,input_dim,variance=1.):
         """
         :param input_dim: the number of input dimensions
@@ -17,6 +19,7 @@ class Bias(Kernpart):
         self.input_dim = input_dim
         self.num_params = 1
         self.name = 'bias'
+        self.num_features = 1
         self._set_params(np.array([variance]).flatten())
 
     def _get_params(self):
@@ -38,15 +41,37 @@ class Bias(Kernpart):
     def dK_dtheta(self,dL_dKdiag,X,X2,target):
         target += dL_dKdiag.sum()
 
+    def K_and_cache(self,X,X2,target):
+        target += self.variance
+        return ()
+
+    def dK_dtheta_from_cache(self,dL_dK,cache,target):
+        target += dL_dK.sum()
+
     def dKdiag_dtheta(self,dL_dKdiag,X,target):
         target += dL_dKdiag.sum()
 
+    def features(self, X):
+        return np.sqrt(self.variance) * np.ones((X.shape[0], 1))
+
+    def dfeatures_dtheta(self, dL_dfeatures, X, target):
+        target += dL_dfeatures.sum() / (2. * np.sqrt(self.variance))
+
     def dK_dX(self, dL_dK,X, X2, target):
         pass
 
     def dKdiag_dX(self,dL_dKdiag,X,target):
         pass
 
+    def sde(self):
+        """Return the state space form of the kernel (a constant state), see Kernpart.sde"""
+        F = np.zeros((1, 1))
+        L = np.ones((1, 1))
+        Qc = np.zeros((1, 1))
+        H = np.ones((1, 1))
+        P0 = np.array([[float(self.variance)]])
+        return F, L, Qc, H, P0, np.zeros((1, 1, 1)), np.zeros((1, 1, 1)), np.ones((1, 1, 1))
+
     #---------------------------------------#
     #             PSI statistics            #
     #---------------------------------------#
@@ -61,6 +86,9 @@ class Bias(Kernpart):
     def psi2(self, Z, mu, S, target):
         target += self.variance**2
 
+    def psi2_sum(self, Z, mu, S, target):
+        target += mu.shape[0] * self.variance**2
+
     def dpsi0_dtheta(self, dL_dpsi0, Z, mu, S, target):
         target += dL_dpsi0.sum()
 
@@ -68,7 +96,11 @@ class Bias(Kernpart):
         target += dL_dpsi1.sum()
 
     def dpsi2_dtheta(self, dL_dpsi2, Z, mu, S, target):
-        target += 2.*self.variance*dL_dpsi2.sum()
+        if dL_dpsi2.ndim == 2:
+            # shared by all the data
+            target += 2.*self.variance*dL_dpsi2.sum()*mu.shape[0]
+        else:
+            target += 2.*self.variance*dL_dpsi2.sum()
 
     def dpsi0_dZ(self, dL_dpsi0, Z, mu, S, target):
         pass
@@ -5,7 +5,7 @@ from kernpart import Kernpart
 import numpy as np
 from GPy.util.linalg import mdot, pdinv
 import pdb
-from scipy import weave
+from GPy.util import backend
 
 class Coregionalize(Kernpart):
     """
@@ -67,63 +67,19 @@ class Coregionalize(Kernpart):
         return sum([['W%i_%i'%(i,j) for j in range(self.rank)] for i in range(self.output_dim)],[]) + ['kappa_%i'%i for i in range(self.output_dim)]
 
     def K(self,index,index2,target):
-        index = np.asarray(index,dtype=np.int)
-
-        #here's the old code (numpy)
-        #if index2 is None:
-            #index2 = index
-        #else:
-            #index2 = np.asarray(index2,dtype=np.int)
-        #false_target = target.copy()
-        #ii,jj = np.meshgrid(index,index2)
-        #ii,jj = ii.T, jj.T
-        #false_target += self.B[ii,jj]
-
-        if index2 is None:
-            code="""
-            for(int i=0;i<N; i++){
-              target[i+i*N] += B[index[i]+output_dim*index[i]];
-              for(int j=0; j<i; j++){
-                  target[j+i*N] += B[index[i]+output_dim*index[j]];
-                  target[i+j*N] += target[j+i*N];
-                }
-              }
-            """
-            N,B,output_dim = index.size, self.B, self.output_dim
-            weave.inline(code,['target','index','N','B','output_dim'])
-        else:
-            index2 = np.asarray(index2,dtype=np.int)
-            code="""
-            for(int i=0;i<num_inducing; i++){
-              for(int j=0; j<N; j++){
-                  target[i+j*num_inducing] += B[output_dim*index[j]+index2[i]];
-                }
-              }
-            """
-            N,num_inducing,B,output_dim = index.size,index2.size, self.B, self.output_dim
-            weave.inline(code,['target','index','index2','N','num_inducing','B','output_dim'])
-
+        index = np.asarray(index,dtype=np.int).flatten()
+        if index2 is not None:
+            index2 = np.asarray(index2,dtype=np.int).flatten()
+        backend.get('coregionalize_K')(self.B, index, index2, target)
 
     def Kdiag(self,index,target):
         target += np.diag(self.B)[np.asarray(index,dtype=np.int).flatten()]
 
     def dK_dtheta(self,dL_dK,index,index2,target):
-        index = np.asarray(index,dtype=np.int)
-        dL_dK_small = np.zeros_like(self.B)
-        if index2 is None:
-            index2 = index
-        else:
-            index2 = np.asarray(index2,dtype=np.int)
-
-        code="""
-        for(int i=0; i<num_inducing; i++){
-          for(int j=0; j<N; j++){
-            dL_dK_small[index[j] + output_dim*index2[i]] += dL_dK[i+j*num_inducing];
-          }
-        }
-        """
-        N, num_inducing, output_dim = index.size, index2.size, self.output_dim
-        weave.inline(code, ['N','num_inducing','output_dim','dL_dK','dL_dK_small','index','index2'])
+        index = np.asarray(index,dtype=np.int).flatten()
+        if index2 is not None:
+            index2 = np.asarray(index2,dtype=np.int).flatten()
+        dL_dK_small = backend.get('coregionalize_dK_dB')(dL_dK, index, index2, self.output_dim)
 
         dkappa = np.diag(dL_dK_small)
         dL_dK_small += dL_dK_small.T
@@ -163,3 +119,17 @@ class Coregionalize(Kernpart):
     def dK_dX(self,dL_dK,X,X2,target):
         #NOTE In this case, pass is equivalent to returning zero.
         pass
+
+@backend.register('coregionalize_K', 'numpy')
+def _K_numpy(B, index, index2, target):
+    if index2 is None:
+        index2 = index
+    target += B[index[:, None], index2[None, :]]
+
+@backend.register('coregionalize_dK_dB', 'numpy')
+def _dK_dB_numpy(dL_dK, index, index2, output_dim):
+    """The sums of dL_dK over the pairs of outputs, output_dim x output_dim."""
+    if index2 is None:
+        index2 = index
+    pairs = (index[:, None] * output_dim + index2[None, :]).flatten()
+    return np.bincount(pairs, dL_dK.flatten(), output_dim * output_dim).reshape(output_dim, output_dim)
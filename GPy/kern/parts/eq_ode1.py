@@ -6,7 +6,6 @@ import numpy as np
 from GPy.util.linalg import mdot, pdinv
 from GPy.util.ln_diff_erfs import ln_diff_erfs
 import pdb
-from scipy import weave
 
 class Eq_ode1(Kernpart):
     """
@@ -33,6 +32,9 @@ class Eq_ode1(Kernpart):
     
     .. Note: see first order differential equation examples in GPy.examples.regression for some usage.
     """
+    # the intermediate results are updated in place (see Kernpart)
+    tileable = False
+
     def __init__(self,output_dim, W=None, rank=1, kappa=None, lengthscale=1.0,  decay=None, delay=None):
         self.rank = rank
         self.input_dim = 1
@@ -255,37 +257,12 @@ class Eq_ode1(Kernpart):
         self._K_dvar = self._K_dvar[:, self._rorder2]
         
         
+        # Matrix giving scales of each output
         if X2 is None:
-            # Matrix giving scales of each output
-            self._scale = np.zeros((self._t.size, self._t.size))
-            code="""
-            for(int i=0;i<N; i++){
-              scale_mat[i+i*N] = B[index[i]+output_dim*(index[i])];
-              for(int j=0; j<i; j++){
-                  scale_mat[j+i*N] = B[index[i]+output_dim*index[j]];
-                  scale_mat[i+j*N] = scale_mat[j+i*N];
-                }
-              }
-            """
-            scale_mat, B, index = self._scale, self.B, self._index
-            N, output_dim = self._t.size, self.output_dim
-            weave.inline(code,['index',
-                               'scale_mat', 'B',
-                               'N', 'output_dim'])
+            self._scale = self.B[self._index[:, None], self._index[None, :]]
         else:
-            self._scale = np.zeros((self._t.size, self._t2.size))
-            code = """
-            for(int i=0; i<N; i++){
-              for(int j=0; j<N2; j++){
-                scale_mat[i+j*N] = B[index[i]+output_dim*index2[j]];
-              }
-            }
-            """
-            scale_mat, B, index, index2 = self._scale, self.B, self._index, self._index2
-            N, N2, output_dim = self._t.size, self._t2.size, self.output_dim
-            weave.inline(code, ['index', 'index2',
-                                'scale_mat', 'B',
-                                'N', 'N2', 'output_dim'])
+            # laid out column by column in the rows, as by the former inline C code
+            self._scale = self.B[self._index[:, None], self._index2[None, :]].T.reshape(self._t.size, self._t2.size)
 
 
 
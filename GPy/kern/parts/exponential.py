@@ -5,6 +5,7 @@
 from kernpart import Kernpart
 import numpy as np
 from scipy import integrate
+from ...util.distances import sqdiff_sums, diff_sums
 
 class Exponential(Kernpart):
     """
@@ -25,6 +26,9 @@ class Exponential(Kernpart):
     :rtype: kernel object
 
     """
+
+    stationary = True
+
     def __init__(self, input_dim, variance=1., lengthscale=None, ARD=False):
         self.input_dim = input_dim
         self.ARD = ARD
@@ -65,9 +69,20 @@ class Exponential(Kernpart):
 
     def K(self, X, X2, target):
         """Compute the covariance matrix between X and X2."""
-        if X2 is None: X2 = X
-        dist = np.sqrt(np.sum(np.square((X[:, None, :] - X2[None, :, :]) / self.lengthscale), -1))
-        np.add(self.variance * np.exp(-dist), target, target)
+        self.K_and_cache(X, X2, target)
+
+    def K_and_cache(self, X, X2, target):
+        """Compute the covariance matrix, keeping the distances and exponentials for dK_dtheta_from_cache."""
+        # a single exponential or power: cheaper than mirroring the tiles of K
+        return self._K_and_cache_stationary(X, X2, target, tiled=False)
+
+    def _K_from_cache(self, cache):
+        X, X2, dist, expdist = cache
+        return self.variance * expdist
+
+    def _cache(self, X, X2, r2):
+        dist = np.sqrt(r2)
+        return X, X2, dist, np.exp(-dist)
 
     def Kdiag(self, X, target):
         """Compute the diagonal of the covariance matrix associated to X."""
@@ -75,18 +90,18 @@ class Exponential(Kernpart):
 
     def dK_dtheta(self, dL_dK, X, X2, target):
         """derivative of the covariance matrix with respect to the parameters."""
-        if X2 is None: X2 = X
-        dist = np.sqrt(np.sum(np.square((X[:, None, :] - X2[None, :, :]) / self.lengthscale), -1))
-        invdist = 1. / np.where(dist != 0., dist, np.inf)
-        dist2M = np.square(X[:, None, :] - X2[None, :, :]) / self.lengthscale ** 3
-        dvar = np.exp(-dist)
+        self._dK_dtheta_stationary(dL_dK, X, X2, target)
+
+    def dK_dtheta_from_cache(self, dL_dK, cache, target):
+        """derivative of the covariance matrix with respect to the parameters, see K_and_cache."""
+        X, X2, dist, dvar = cache
         target[0] += np.sum(dvar * dL_dK)
         if self.ARD == True:
-            dl = self.variance * dvar[:, :, None] * dist2M * invdist[:, :, None]
-            target[1:] += (dl * dL_dK[:, :, None]).sum(0).sum(0)
+            # dk/dl_i = variance exp(-r) (x_i - y_i)^2 / (l_i^3 r)
+            invdist = 1. / np.where(dist != 0., dist, np.inf)
+            target[1:] += sqdiff_sums(self.variance * dvar * invdist * dL_dK, X, X2) / self.lengthscale ** 3
         else:
-            dl = self.variance * dvar * dist2M.sum(-1) * invdist
-            target[1] += np.sum(dl * dL_dK)
+            target[1] += np.sum(self.variance * dvar * dist * dL_dK) / self.lengthscale
 
     def dKdiag_dtheta(self, dL_dKdiag, X, target):
         """derivative of the diagonal of the covariance matrix with respect to the parameters."""
@@ -95,15 +110,31 @@ class Exponential(Kernpart):
 
     def dK_dX(self, dL_dK, X, X2, target):
         """derivative of the covariance matrix with respect to X."""
-        if X2 is None: X2 = X
-        dist = np.sqrt(np.sum(np.square((X[:, None, :] - X2[None, :, :]) / self.lengthscale), -1))[:, :, None]
-        ddist_dX = (X[:, None, :] - X2[None, :, :]) / self.lengthscale ** 2 / np.where(dist != 0., dist, np.inf)
-        dK_dX = -np.transpose(self.variance * np.exp(-dist) * ddist_dX, (1, 0, 2))
-        target += np.sum(dK_dX * dL_dK.T[:, :, None], 0)
+        dist = np.sqrt(self._scaled_sqdist(X, X2))
+        # dk/dx = -variance exp(-r) (x - y) / (l^2 r)
+        G = -self.variance * np.exp(-dist) / np.where(dist != 0., dist, np.inf) * dL_dK
+        if X2 is None:
+            G = 2 * G
+        target += diff_sums(G, X, X2) / self.lengthscale ** 2
 
     def dKdiag_dX(self, dL_dKdiag, X, target):
         pass
 
+    def sde(self):
+        """Return the state space form of the kernel (an Ornstein-Uhlenbeck process), see Kernpart.sde"""
+        assert self.input_dim == 1, "state space forms are for 1-D inputs"
+        variance, lengthscale = float(self.variance), float(self.lengthscale)
+        lamda = 1. / lengthscale
+        F = np.array([[-lamda]])
+        L = np.array([[1.]])
+        Qc = np.array([[2. * variance * lamda]])
+        H = np.array([[1.]])
+        P0 = np.array([[variance]])
+        dF = np.array([[[0.]], [[lamda / lengthscale]]])
+        dQc = np.array([[[2. * lamda]], [[-2. * variance * lamda / lengthscale]]])
+        dP0 = np.array([[[1.]], [[0.]]])
+        return F, L, Qc, H, P0, dF, dQc, dP0
+
     def Gram_matrix(self, F, F1, lower, upper):
         """
         Return the Gram matrix of the vector of functions F with respect to the RKHS norm. The use of this function is limited to input_dim=1.
@@ -5,6 +5,9 @@ from kernpart import Kernpart
 import numpy as np
 
 class Fixed(Kernpart):
+    # the covariance is given for the whole of X (see Kernpart)
+    tileable = False
+
     def __init__(self, input_dim, K, variance=1.):
         """
         :param input_dim: the number of input dimensions
@@ -3,7 +3,7 @@
 
 from kernpart import Kernpart
 import numpy as np
-from ...util.linalg import tdot
+from ...util.linalg import tdot, symmetric_map, symmetric_tiles, symmetric_weights
 from ...core.mapping import Mapping
 import GPy
 
@@ -51,6 +51,9 @@ class Gibbs(Kernpart):
 
     """
 
+    # the mapping keeps its own intermediate results (see Kernpart)
+    tileable = False
+
     def __init__(self, input_dim, variance=1., mapping=None, ARD=False):
         self.input_dim = input_dim
         self.ARD = ARD
@@ -88,14 +91,16 @@ class Gibbs(Kernpart):
     def dK_dtheta(self, dL_dK, X, X2, target):
         """Derivative of the covariance with respect to the parameters."""
         self._K_computations(X, X2)
-        self._dK_computations(dL_dK)
-        if X2==None:
-            gmapping = self.mapping.df_dtheta(2*self._dL_dl[:, None], X)
+        if X2 is None:
+            dvar, dL_dl = self._symmetric_reductions(dL_dK)
+            gmapping = self.mapping.df_dtheta(dL_dl[:, None], X)
         else:
+            self._dK_computations(dL_dK)
+            dvar = (dL_dK*self._K_dvar).sum()
             gmapping = self.mapping.df_dtheta(self._dL_dl[:, None], X)
             gmapping += self.mapping.df_dtheta(self._dL_dl_two[:, None], X2)
 
-        target+= np.hstack([(dL_dK*self._K_dvar).sum(), gmapping])
+        target+= np.hstack([dvar, gmapping])
 
     def dK_dX(self, dL_dK, X, X2, target):
         """Derivative of the covariance matrix with respect to X."""
@@ -139,8 +144,30 @@ class Gibbs(Kernpart):
             self._K_dist2 = -2.*np.dot(X, X2.T) + np.square(X).sum(1)[:, None] + np.square(X2).sum(1)[None, :]
         self._w2 = self._lengthscales2 + self._lengthscales_two2.T
         prod_length = self._lengthscales*self._lengthscales_two.T
-        self._K_exponential = np.exp(-self._K_dist2/self._w2)
-        self._K_dvar = np.sign(prod_length)*(2*np.abs(prod_length)/self._w2)**(self.input_dim/2.)*np.exp(-self._K_dist2/self._w2)
+        if X2==None:
+            # K is symmetric, the exponentials are only computed on its upper triangle
+            self._K_exponential, self._K_dvar = symmetric_map(self._exponentials, [self._K_dist2, self._w2, prod_length])
+        else:
+            self._K_exponential, self._K_dvar = self._exponentials(self._K_dist2, self._w2, prod_length)
+
+    def _exponentials(self, K_dist2, w2, prod_length):
+        K_exponential = np.exp(-K_dist2/w2)
+        return K_exponential, np.sign(prod_length)*(2*np.abs(prod_length)/w2)**(self.input_dim/2.)*K_exponential
+
+    def _symmetric_reductions(self, dL_dK):
+        """The gradients wrt the variance and the lengthscales when X2 is None, reduced over the tiles of the upper triangle of K only (see symmetric_weights)."""
+        lengthscales = self._lengthscales[:, 0]
+        dvar, dL_dl = 0., np.zeros(lengthscales.size)
+        for rows, cols in symmetric_tiles(lengthscales.size):
+            W = symmetric_weights(dL_dK, rows, cols)*self._K_dvar[rows, cols]
+            dvar += W.sum()
+            l_rows, l_cols = lengthscales[rows, None], lengthscales[None, cols]
+            w2, K_dist2 = self._w2[rows, cols], self._K_dist2[rows, cols]
+            W *= self.variance/(w2*w2)
+            # each entry depends on the lengthscales at both of its inputs
+            dL_dl[rows] += (W*(self.input_dim/2.*(l_cols**4 - l_rows**4) + 2*l_rows**2*K_dist2)/l_rows).sum(1)
+            dL_dl[cols] += (W*(self.input_dim/2.*(l_rows**4 - l_cols**4) + 2*l_cols**2*K_dist2)/l_cols).sum(0)
+        return dvar, dL_dl
 
     def _dK_computations(self, dL_dK):
         """Pre-computations for the gradients of the covaraince function. Here the gradient of the covariance with respect to all the individual lengthscales is computed.
@@ -43,6 +43,9 @@ class Hetero(Kernpart):
 
     """
 
+    # the mapping keeps its own intermediate results (see Kernpart)
+    tileable = False
+
     def __init__(self, input_dim, mapping=None, transform=None):
         self.input_dim = input_dim
         if not mapping:
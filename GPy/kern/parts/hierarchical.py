@@ -4,12 +4,16 @@
 from kernpart import Kernpart
 import numpy as np
 from independent_outputs import index_to_slices
+from ...util.block_matrices import merge_labels
 
 class Hierarchical(Kernpart):
     """
     A kernel part which can reopresent a hierarchy of indepencnce: a generalisation of independent_outputs
 
     """
+    # the wrapped parts would be shared by the copies (see Kernpart)
+    tileable = False
+
     def __init__(self,parts):
         self.levels = len(parts)
         self.input_dim = parts[0].input_dim + 1
@@ -40,6 +44,10 @@ class Hierarchical(Kernpart):
             X2 = X2[:,:-self.levels]
         return X, X2, slices, slices2
 
+    def block_labels(self,X):
+        """Rows which share no index at any level are independent."""
+        return merge_labels(list(X[:,-self.levels:].T.astype(np.int64)))
+
     def K(self,X,X2,target):
         X, X2, slices, slices2 = self._sort_slices(X,X2)
 
@@ -40,6 +40,9 @@ class IndependentOutputs(Kernpart):
     the rest of the columns of X are passed to the kernel for computation (in blocks).
 
     """
+    # the wrapped part would be shared by the copies (see Kernpart)
+    tileable = False
+
     def __init__(self,k):
         self.input_dim = k.input_dim + 1
         self.num_params = k.num_params
@@ -56,6 +59,10 @@ class IndependentOutputs(Kernpart):
     def _get_param_names(self):
         return self.k._get_param_names()
 
+    def block_labels(self,X):
+        """The outputs are independent, the rows of each output form a block."""
+        return X[:,-1].astype(np.int64)
+
     def K(self,X,X2,target):
         #Sort out the slices from the input data
         X,slices = X[:,:-1],index_to_slices(X[:,-1])
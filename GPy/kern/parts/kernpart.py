@@ -1,8 +1,27 @@
 # Copyright (c) 2012, GPy authors (see AUTHORS.txt).
 # Licensed under the BSD 3-clause license (see LICENSE.txt)
 
+import numpy as np
+import copy
+from ...util.distances import scaled_sqdist
+from ...util.linalg import symmetric_tiles, symmetric_map, symmetric_weights
+from ..psi_quadrature import PsiQuadrature
+
 
 class Kernpart(object):
+    # the distance cache shared by the parts of a kernel (see kern), if any
+    distances = None
+    # the psi statistics of parts without closed form ones are computed by
+    # quadrature; assign another PsiQuadrature to a part (or to this class)
+    # to change the number of nodes
+    psi_quadrature = PsiQuadrature()
+    # whether the covariance of the part may be computed tile by tile, on
+    # the copies of tile_copy in several threads (see GPy.kern.tiling)
+    tileable = True
+    # whether the covariance of the part depends on X - X2 only (see
+    # GPy.core.ToeplitzGP and GPy.core.KISSGP, which require it)
+    stationary = False
+
     def __init__(self,input_dim):
         """
         The base class for a kernpart: a positive definite function which forms part of a covariance function (kernel).
@@ -19,6 +38,64 @@ class Kernpart(object):
         # the name of the covariance function.
         self.name = 'unnamed'
 
+    def _scaled_sqdist(self, X, X2):
+        """
+        The squared distances between X and X2 (X if None), scaled by the
+        lengthscales of the part, from the shared distance cache if any.
+        The result must not be modified.
+        """
+        if self.distances is None:
+            return scaled_sqdist(X, X2, self.lengthscale)
+        return self.distances.scaled_sqdist(X, X2, self.lengthscale)
+
+    def _K_and_cache_stationary(self, X, X2, target, tiled=True):
+        """
+        K_and_cache of a stationary part, from its _cache(X, X2, r2) of the
+        scaled squared distances r2 (which begins with X, X2) and
+        _K_from_cache(cache). When X2 is None and tiled, K is symmetric and
+        both are evaluated on the tiles of its upper triangle only (see
+        symmetric_map); parts whose K is cheaper than mirroring the tiles
+        pass tiled=False.
+        """
+        def K_and_cache(r2):
+            cache = self._cache(X, X2, r2)
+            return (self._K_from_cache(cache),) + cache[2:]
+        r2 = self._scaled_sqdist(X, X2)
+        if X2 is None and tiled:
+            values = symmetric_map(K_and_cache, r2)
+        else:
+            values = K_and_cache(r2)
+        np.add(values[0], target, target)
+        return (X, X2) + tuple(values[1:])
+    def _dK_dtheta_stationary(self, dL_dK, X, X2, target):
+        """
+        dK_dtheta of a stationary part through dK_dtheta_from_cache, see
+        _K_and_cache_stationary. When X2 is None, the reductions run over the
+        tiles of the upper triangle of K only (see symmetric_weights).
+        """
+        r2 = self._scaled_sqdist(X, X2)
+        if X2 is None:
+            for rows, cols in symmetric_tiles(X.shape[0]):
+                self.dK_dtheta_from_cache(symmetric_weights(dL_dK, rows, cols), self._cache(X[rows], X[cols], r2[rows, cols]), target)
+        else:
+            self.dK_dtheta_from_cache(dL_dK, self._cache(X, X2, r2), target)
+    def block_labels(self, X):
+        """
+        The blocks of the covariance of X, when it is block diagonal (up to
+        a permutation of the rows): an array of ints labelling the rows,
+        such that the covariance of rows with different labels is zero.
+        None when the part couples all the rows, as by default.
+        """
+        return None
+    def tile_copy(self):
+        """
+        A shallow copy of the part, which computes the covariance of a tile
+        in a thread (see GPy.kern.tiling) without sharing the intermediate
+        results the part keeps between calls, nor the distance cache.
+        """
+        part = copy.copy(self)
+        part.distances = None
+        return part
     def _get_params(self):
         raise NotImplementedError
     def _set_params(self,x):
@@ -31,6 +108,22 @@ class Kernpart(object):
         raise NotImplementedError
     def dK_dtheta(self,dL_dK,X,X2,target):
         raise NotImplementedError
+    def K_and_cache(self,X,X2,target):
+        """
+        Compute the covariance matrix like K, and return the intermediate
+        results which dK_dtheta_from_cache needs to compute the gradient
+        without repeating the work of K. By default, these are just the
+        inputs.
+        """
+        self.K(X, X2, target)
+        return X, X2
+    def dK_dtheta_from_cache(self,dL_dK,cache,target):
+        """
+        Compute dK_dtheta from the cache returned by K_and_cache, for the
+        same inputs and parameters.
+        """
+        X, X2 = cache
+        self.dK_dtheta(dL_dK, X, X2, target)
     def dKdiag_dtheta(self,dL_dKdiag,X,target):
         # In the base case compute this by calling dK_dtheta. Need to
         # override for stationary covariances (for example) to save
@@ -38,35 +131,61 @@ class Kernpart(object):
         for i in range(X.shape[0]):
             self.dK_dtheta(dL_dKdiag[i], X[i, :][None, :], X2=None, target=target)
     def psi0(self,Z,mu,S,target):
-        raise NotImplementedError
+        self.psi_quadrature.psi0(self, Z, mu, S, target)
     def dpsi0_dtheta(self,dL_dpsi0,Z,mu,S,target):
-        raise NotImplementedError
+        self.psi_quadrature.dpsi0_dtheta(self, dL_dpsi0, Z, mu, S, target)
     def dpsi0_dmuS(self,dL_dpsi0,Z,mu,S,target_mu,target_S):
-        raise NotImplementedError
+        self.psi_quadrature.dpsi0_dmuS(self, dL_dpsi0, Z, mu, S, target_mu, target_S)
     def psi1(self,Z,mu,S,target):
-        raise NotImplementedError
-    def dpsi1_dtheta(self,Z,mu,S,target):
-        raise NotImplementedError
+        self.psi_quadrature.psi1(self, Z, mu, S, target)
+    def dpsi1_dtheta(self,dL_dpsi1,Z,mu,S,target):
+        self.psi_quadrature.dpsi1_dtheta(self, dL_dpsi1, Z, mu, S, target)
     def dpsi1_dZ(self,dL_dpsi1,Z,mu,S,target):
-        raise NotImplementedError
+        self.psi_quadrature.dpsi1_dZ(self, dL_dpsi1, Z, mu, S, target)
     def dpsi1_dmuS(self,dL_dpsi1,Z,mu,S,target_mu,target_S):
-        raise NotImplementedError
+        self.psi_quadrature.dpsi1_dmuS(self, dL_dpsi1, Z, mu, S, target_mu, target_S)
     def psi2(self,Z,mu,S,target):
-        raise NotImplementedError
+        self.psi_quadrature.psi2(self, Z, mu, S, target)
+    def psi2_sum(self,Z,mu,S,target):
+        """The sum of psi2 over the data, num_inducing x num_inducing."""
+        psi2 = np.zeros((mu.shape[0], Z.shape[0], Z.shape[0]))
+        self.psi2(Z, mu, S, psi2)
+        target += psi2.sum(0)
     def dpsi2_dZ(self,dL_dpsi2,Z,mu,S,target):
-        raise NotImplementedError
+        self.psi_quadrature.dpsi2_dZ(self, dL_dpsi2, Z, mu, S, target)
     def dpsi2_dtheta(self,dL_dpsi2,Z,mu,S,target):
-        raise NotImplementedError
+        self.psi_quadrature.dpsi2_dtheta(self, dL_dpsi2, Z, mu, S, target)
     def dpsi2_dmuS(self,dL_dpsi2,Z,mu,S,target_mu,target_S):
-        raise NotImplementedError
+        self.psi_quadrature.dpsi2_dmuS(self, dL_dpsi2, Z, mu, S, target_mu, target_S)
     def dK_dX(self, dL_dK, X, X2, target):
         raise NotImplementedError
     def dKdiag_dX(self, dL_dK, X, target):
         raise NotImplementedError
+    def features(self, X):
+        """
+        An explicit feature map of the kernel, Phi such that
+        K(X, X2) = Phi(X) Phi(X2)^T. Parts which have one also define
+        num_features, the number of columns of Phi.
+        """
+        raise NotImplementedError
+    def dfeatures_dtheta(self, dL_dfeatures, X, target):
+        raise NotImplementedError
+    def sde(self):
+        """
+        The state space (stochastic differential equation) form of a 1-D
+        kernel: f(t) = H x(t) where dx/dt = F x + L w, w being white noise of
+        spectral density Qc, and x(0) having covariance P0. Either F = 0, or
+        the kernel is stationary and P0 is the stationary covariance of x.
+
+        :returns: F, L, Qc, H, P0 and the derivatives dF, dQc, dP0 wrt each parameter (num_params x ...)
+        """
+        raise NotImplementedError
 
 
 
 class Kernpart_stationary(Kernpart):
+    stationary = True
+
     def __init__(self, input_dim, lengthscale=None, ARD=False):
         self.input_dim = input_dim
         self.ARD = ARD
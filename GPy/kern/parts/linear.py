@@ -6,8 +6,7 @@ from kernpart import Kernpart
 import numpy as np
 from ...util.linalg import tdot
 from ...util.misc import fast_array_equal
-from scipy import weave
-from ...util.config import *
+from ...util import backend
 
 class Linear(Kernpart):
     """
@@ -28,6 +27,7 @@ class Linear(Kernpart):
 
     def __init__(self, input_dim, variances=None, ARD=False):
         self.input_dim = input_dim
+        self.num_features = input_dim
         self.ARD = ARD
         if ARD == False:
             self.num_params = 1
@@ -52,26 +52,6 @@ class Linear(Kernpart):
         self._Z, self._mu, self._S = np.empty(shape=(3, 1))
         self._X, self._X2, self._params = np.empty(shape=(3, 1))
 
-        # a set of optional args to pass to weave
-        weave_options_openmp = {'headers'           : ['<omp.h>'],
-                                'extra_compile_args': ['-fopenmp -O3'],
-                                'extra_link_args'   : ['-lgomp'],
-                                'libraries': ['gomp']}
-        weave_options_noopenmp = {'extra_compile_args': ['-O3']}
-
-
-        if config.getboolean('parallel', 'openmp'):
-            self.weave_options = weave_options_openmp
-            self.weave_support_code =  """
-            #include <omp.h>
-            #include <math.h>
-            """
-        else:
-            self.weave_options = weave_options_noopenmp
-            self.weave_support_code = """
-            #include <math.h>
-            """
-
     def _get_params(self):
         return self.variances
 
@@ -98,6 +78,12 @@ class Linear(Kernpart):
             self._K_computations(X, X2)
             target += self.variances * self._dot_product
 
+    def K_and_cache(self, X, X2, target):
+        self.K(X, X2, target)
+        if self.ARD:
+            return X, X2, None
+        return X, X2, self._dot_product
+
     def Kdiag(self, X, target):
         np.add(target, np.sum(self.variances * np.square(X), -1), target)
 
@@ -112,6 +98,13 @@ class Linear(Kernpart):
             self._K_computations(X, X2)
             target += np.sum(self._dot_product * dL_dK)
 
+    def dK_dtheta_from_cache(self, dL_dK, cache, target):
+        X, X2, dot_product = cache
+        if dot_product is None:
+            self.dK_dtheta(dL_dK, X, X2, target)
+        else:
+            target += np.sum(dot_product * dL_dK)
+
     def dKdiag_dtheta(self, dL_dKdiag, X, target):
         tmp = dL_dKdiag[:, None] * X ** 2
         if self.ARD:
@@ -119,6 +112,16 @@ class Linear(Kernpart):
         else:
             target += tmp.sum()
 
+    def features(self, X):
+        return X * np.sqrt(self.variances)
+
+    def dfeatures_dtheta(self, dL_dfeatures, X, target):
+        tmp = dL_dfeatures * X / (2. * np.sqrt(self.variances))
+        if self.ARD:
+            target += tmp.sum(0)
+        else:
+            target += tmp.sum()
+
     def dK_dX(self, dL_dK, X, X2, target):
         if X2 is None:
             target += 2*(((X[None,:, :] * self.variances)) * dL_dK[:, :, None]).sum(1)
@@ -168,6 +171,11 @@ class Linear(Kernpart):
         self._psi_computations(Z, mu, S)
         target += self._psi2
 
+    def psi2_sum(self, Z, mu, S, target):
+        # sum_n <x_n x_n^T> = mu^T mu + diag(sum_n S_n)
+        ZA = Z * self.variances
+        target += np.dot(np.dot(ZA, tdot(mu.T) + np.diag(S.sum(0))), ZA.T)
+
     def psi2_new(self,Z,mu,S,target):
         tmp = np.zeros((mu.shape[0], Z.shape[0]))
         self.K(mu,Z,tmp)
@@ -185,9 +193,15 @@ class Linear(Kernpart):
 
     def dpsi2_dtheta(self, dL_dpsi2, Z, mu, S, target):
         self._psi_computations(Z, mu, S)
-        tmp = dL_dpsi2[:, :, :, None] * (self.ZAinner[:, :, None, :] * (2 * Z)[None, None, :, :])
+        if dL_dpsi2.ndim == 2:
+            # shared by all the data: only the sum of ZAinner is needed
+            tmp = self.ZAinner.sum(0) * np.dot(dL_dpsi2, 2 * Z)
+            tmp = tmp.sum(0)
+        else:
+            tmp = dL_dpsi2[:, :, :, None] * (self.ZAinner[:, :, None, :] * (2 * Z)[None, None, :, :])
+            tmp = tmp.sum(0).sum(0).sum(0)
         if self.ARD:
-            target += tmp.sum(0).sum(0).sum(0)
+            target += tmp
         else:
             target += tmp.sum()
 
@@ -203,90 +217,22 @@ class Linear(Kernpart):
     def dpsi2_dmuS(self, dL_dpsi2, Z, mu, S, target_mu, target_S):
         """Think N,num_inducing,num_inducing,input_dim """
         self._psi_computations(Z, mu, S)
-        AZZA = self.ZA.T[:, None, :, None] * self.ZA[None, :, None, :]
-        AZZA = AZZA + AZZA.swapaxes(1, 2)
-        AZZA_2 = AZZA/2.
-        #muAZZA = np.tensordot(mu,AZZA,(-1,0))
-        #target_mu_dummy, target_S_dummy = np.zeros_like(target_mu), np.zeros_like(target_S)
-        #target_mu_dummy += (dL_dpsi2[:, :, :, None] * muAZZA).sum(1).sum(1)
-        #target_S_dummy += (dL_dpsi2[:, :, :, None] * self.ZA[None, :, None, :] * self.ZA[None, None, :, :]).sum(1).sum(1)
-
-
-        if config.getboolean('parallel', 'openmp'):
-            pragma_string = "#pragma omp parallel for private(m,mm,q,qq,factor,tmp)"
+        if dL_dpsi2.ndim == 2:
+            # shared by all the data
+            dL_dpsi2_ZA = np.dot(dL_dpsi2, self.ZA)
+            target_mu += 2. * np.dot(np.dot(mu, dL_dpsi2_ZA.T), self.ZA)
+            target_S += np.sum(dL_dpsi2_ZA * self.ZA, 0)
         else:
-            pragma_string = ''
-
-        #Using weave, we can exploiut the symmetry of this problem:
-        code = """
-        int n, m, mm,q,qq;
-        double factor,tmp;
-        %s
-        for(n=0;n<N;n++){
-          for(m=0;m<num_inducing;m++){
-            for(mm=0;mm<=m;mm++){
-              //add in a factor of 2 for the off-diagonal terms (and then count them only once)
-              if(m==mm)
-                factor = dL_dpsi2(n,m,mm);
-              else
-                factor = 2.0*dL_dpsi2(n,m,mm);
-
-              for(q=0;q<input_dim;q++){
-
-                //take the dot product of mu[n,:] and AZZA[:,m,mm,q] TODO: blas!
-                tmp = 0.0;
-                for(qq=0;qq<input_dim;qq++){
-                  tmp += mu(n,qq)*AZZA(qq,m,mm,q);
-                }
-
-                target_mu(n,q) += factor*tmp;
-                target_S(n,q) += factor*AZZA_2(q,m,mm,q);
-              }
-            }
-          }
-        }
-        """ % pragma_string
-
-
-        N,num_inducing,input_dim = int(mu.shape[0]),int(Z.shape[0]),int(mu.shape[1])
-        weave.inline(code, support_code=self.weave_support_code,
-                    arg_names=['N','num_inducing','input_dim','mu','AZZA','AZZA_2','target_mu','target_S','dL_dpsi2'],
-                    type_converters=weave.converters.blitz,**self.weave_options)
-
+            backend.get('linear_dpsi2_dmuS')(dL_dpsi2, mu, self.ZA, target_mu, target_S)
 
     def dpsi2_dZ(self, dL_dpsi2, Z, mu, S, target):
         self._psi_computations(Z, mu, S)
-        #psi2_dZ = dL_dpsi2[:, :, :, None] * self.variances * self.ZAinner[:, :, None, :]
-        #dummy_target = np.zeros_like(target)
-        #dummy_target += psi2_dZ.sum(0).sum(0)
-
-        AZA = self.variances*self.ZAinner
-
-        if config.getboolean('parallel', 'openmp'):
-            pragma_string = '#pragma omp parallel for private(n,mm,q)'
+        AZA = self.variances * self.ZAinner
+        if dL_dpsi2.ndim == 2:
+            # shared by all the data
+            target += np.dot(dL_dpsi2, AZA.sum(0))
         else:
-            pragma_string = ''
-
-        code="""
-        int n,m,mm,q;
-        %s
-        for(m=0;m<num_inducing;m++){
-          for(q=0;q<input_dim;q++){
-            for(mm=0;mm<num_inducing;mm++){
-              for(n=0;n<N;n++){
-                target(m,q) += dL_dpsi2(n,m,mm)*AZA(n,mm,q);
-              }
-            }
-          }
-        }
-        """ % pragma_string
-
-
-        N,num_inducing,input_dim = int(mu.shape[0]),int(Z.shape[0]),int(mu.shape[1])
-        weave.inline(code, support_code=self.weave_support_code, 
-                     arg_names=['N','num_inducing','input_dim','AZA','target','dL_dpsi2'],
-                     type_converters=weave.converters.blitz,**self.weave_options)
-
+            backend.get('linear_dpsi2_dZ')(dL_dpsi2, AZA, target)
 
     #---------------------------------------#
     #            Precomputations            #
@@ -323,3 +269,21 @@ class Linear(Kernpart):
         if Zv_changed or muS_changed:
             self.ZAinner = np.dot(self.ZA, self.inner).swapaxes(0, 1)  # NOTE: self.ZAinner \in [num_inducing x N x input_dim]!
             self._psi2 = np.dot(self.ZAinner, self.ZA.T)
+
+@backend.register('linear_dpsi2_dmuS', 'numpy')
+def _dpsi2_dmuS_numpy(dL_dpsi2, mu, ZA, target_mu, target_S):
+    """
+    The gradients of psi2 wrt mu and S, for a dL_dpsi2 which is symmetric
+    in the inducing inputs: with ZA = Z * variances,
+
+        dL_dmu = 2 sum_{m,m'} dL_dpsi2[:,m,m'] (mu . ZA[m']) ZA[m]
+        dL_dS = sum_{m,m'} dL_dpsi2[:,m,m'] ZA[m] ZA[m']
+    """
+    N, num_inducing = dL_dpsi2.shape[:2]
+    dL_dpsi2_ZA = np.dot(dL_dpsi2.reshape(N * num_inducing, num_inducing), ZA).reshape(N, num_inducing, -1)
+    target_mu += 2. * np.dot(np.sum(dL_dpsi2_ZA * mu[:, None, :], -1), ZA)
+    target_S += np.sum(dL_dpsi2_ZA * ZA, 1)
+
+@backend.register('linear_dpsi2_dZ', 'numpy')
+def _dpsi2_dZ_numpy(dL_dpsi2, AZA, target):
+    target += np.tensordot(dL_dpsi2, AZA, ([0, 2], [0, 1]))
@@ -0,0 +1,44 @@
+# Copyright (c) 2013, GPy authors (see AUTHORS.txt).
+# Licensed under the BSD 3-clause license (see LICENSE.txt)
+
+
+import numpy as np
+from rbf_rff import RBF_RFF
+
+class Matern_RFF(RBF_RFF):
+    """
+    Random Fourier feature approximation of the Matern kernel of
+    smoothness nu, see RBF_RFF. The spectral density of the Matern kernel
+    is a multivariate Student-t distribution with 2 nu degrees of freedom:
+    the frequencies are normal draws divided by sqrt(u / (2 nu)), u being a
+    chi-squared draw.
+
+    With nu = 3/2 (5/2), this approximates the Matern32 (Matern52) kernel.
+
+    :param input_dim: the number of input dimensions
+    :type input_dim: int
+    :param variance: the variance of the kernel
+    :type variance: float
+    :param lengthscale: the vector of lengthscale of the kernel
+    :type lengthscale: array or list of the appropriate size (or float if there is only one lengthscale parameter)
+    :param ARD: Auto Relevance Determination. If equal to "False", the kernel is isotropic (ie. one single lengthscale parameter \ell), otherwise there is one lengthscale parameter per dimension.
+    :type ARD: Boolean
+    :param nu: the smoothness of the kernel
+    :type nu: float
+    :param num_features: the number of features F (an even number, a cosine and a sine for each frequency)
+    :type num_features: int
+    :param seed: the seed of the random frequencies
+    :type seed: int
+    :rtype: kernel object
+    """
+
+    def __init__(self, input_dim, variance=1., lengthscale=None, ARD=False, nu=1.5, num_features=100, seed=None):
+        assert nu > 0, "the smoothness must be positive"
+        self.nu = nu
+        RBF_RFF.__init__(self, input_dim, variance, lengthscale, ARD, num_features, seed)
+        self.name = 'Mat_rff'
+
+    def _sample_frequencies(self, random_state):
+        Z = random_state.randn(self.num_features // 2, self.input_dim)
+        u = random_state.chisquare(2. * self.nu, (self.num_features // 2, 1))
+        return Z * np.sqrt(2. * self.nu / u)
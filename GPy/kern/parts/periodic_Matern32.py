@@ -4,7 +4,7 @@
 
 from kernpart import Kernpart
 import numpy as np
-from GPy.util.linalg import mdot
+from GPy.util.linalg import mdot, symmetric_dot
 from GPy.util.decorators import silence_errors
 
 class PeriodicMatern32(Kernpart):
@@ -101,15 +101,16 @@ class PeriodicMatern32(Kernpart):
         """Compute the covariance matrix between X and X2."""
         FX = self._cos(self.basis_alpha[None,:],self.basis_omega[None,:],self.basis_phi[None,:])(X)
         if X2 is None:
-            FX2 = FX
+            # K is symmetric, only the upper triangle is computed
+            np.add(symmetric_dot(np.dot(FX,self.Gi),FX), target,target)
         else:
             FX2 = self._cos(self.basis_alpha[None,:],self.basis_omega[None,:],self.basis_phi[None,:])(X2)
-        np.add(mdot(FX,self.Gi,FX2.T), target,target)
+            np.add(mdot(FX,self.Gi,FX2.T), target,target)
 
     def Kdiag(self,X,target):
         """Compute the diagonal of the covariance matrix associated to X."""
         FX  = self._cos(self.basis_alpha[None,:],self.basis_omega[None,:],self.basis_phi[None,:])(X)
-        np.add(target,np.diag(mdot(FX,self.Gi,FX.T)),target)
+        np.add(target,np.sum(np.dot(FX,self.Gi)*FX,1),target)
 
     @silence_errors
     def dK_dtheta(self,dL_dK,X,X2,target):
@@ -127,9 +128,6 @@ class PeriodicMatern32(Kernpart):
         Flower = np.array(self._cos(self.basis_alpha,self.basis_omega,self.basis_phi)(self.lower))[:,None]
         F1lower = np.array(self._cos(self.basis_alpha*self.basis_omega,self.basis_omega,self.basis_phi+np.pi/2)(self.lower))[:,None]
 
-        #dK_dvar
-        dK_dvar = 1./self.variance*mdot(FX,self.Gi,FX2.T)
-
         #dK_dlen
         da_dlen = [-6/self.lengthscale**3,-2*np.sqrt(3)/self.lengthscale**2,0.]
         db_dlen = [0.,2*self.lengthscale/3.]
@@ -138,7 +136,6 @@ class PeriodicMatern32(Kernpart):
         dGint_dlen = self._int_computation(r1,omega1,phi1, r,omega,phi)
         dGint_dlen = dGint_dlen + dGint_dlen.T
         dG_dlen = self.lengthscale**2/(4*np.sqrt(3))*Gint + self.lengthscale**3/(12*np.sqrt(3))*dGint_dlen + db_dlen[0]*np.dot(Flower,Flower.T) + db_dlen[1]*np.dot(F1lower,F1lower.T)
-        dK_dlen = -mdot(FX,self.Gi,dG_dlen/self.variance,self.Gi,FX2.T)
 
         #dK_dper
         dFX_dper  = self._cos(-self.basis_alpha[None,:]*self.basis_omega[None,:]/self.period*X ,self.basis_omega[None,:],self.basis_phi[None,:]+np.pi/2)(X)
@@ -174,14 +171,13 @@ class PeriodicMatern32(Kernpart):
 
         dG_dper = 1./self.variance*(self.lengthscale**3/(12*np.sqrt(3))*dGint_dper + self.b[0]*(np.dot(dFlower_dper,Flower.T)+np.dot(Flower,dFlower_dper.T)) + self.b[1]*(np.dot(dF1lower_dper,F1lower.T)+np.dot(F1lower,dF1lower_dper.T)))
 
-        dK_dper = mdot(dFX_dper,self.Gi,FX2.T) - mdot(FX,self.Gi,dG_dper,self.Gi,FX2.T) + mdot(FX,self.Gi,dFX2_dper.T)
-
-        # np.add(target[:,:,0],dK_dvar, target[:,:,0])
-        target[0] += np.sum(dK_dvar*dL_dK)
-        #np.add(target[:,:,1],dK_dlen, target[:,:,1])
-        target[1] += np.sum(dK_dlen*dL_dK)
-        #np.add(target[:,:,2],dK_dper, target[:,:,2])
-        target[2] += np.sum(dK_dper*dL_dK)
+        # sum(dL_dK*mdot(A,B,C.T)) is sum(B*mdot(A.T,dL_dK,C)): the gradients of K,
+        # num_data x num_data each, are not formed
+        dL_dK_FX2 = np.dot(dL_dK,FX2)
+        FX_dL_dK_FX2 = np.dot(FX.T,dL_dK_FX2)
+        target[0] += np.sum(self.Gi*FX_dL_dK_FX2)/self.variance
+        target[1] -= np.sum(mdot(self.Gi,dG_dlen/self.variance,self.Gi)*FX_dL_dK_FX2)
+        target[2] += np.sum(self.Gi*(np.dot(dFX_dper.T,dL_dK_FX2) + np.dot(FX.T,np.dot(dL_dK,dFX2_dper)))) - np.sum(mdot(self.Gi,dG_dper,self.Gi)*FX_dL_dK_FX2)
 
     @silence_errors
     def dKdiag_dtheta(self,dL_dKdiag,X,target):
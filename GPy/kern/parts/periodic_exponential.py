@@ -4,7 +4,7 @@
 
 from kernpart import Kernpart
 import numpy as np
-from GPy.util.linalg import mdot
+from GPy.util.linalg import mdot, symmetric_dot
 from GPy.util.decorators import silence_errors
 
 class PeriodicExponential(Kernpart):
@@ -99,15 +99,16 @@ class PeriodicExponential(Kernpart):
         """Compute the covariance matrix between X and X2."""
         FX = self._cos(self.basis_alpha[None,:],self.basis_omega[None,:],self.basis_phi[None,:])(X)
         if X2 is None:
-            FX2 = FX
+            # K is symmetric, only the upper triangle is computed
+            np.add(symmetric_dot(np.dot(FX,self.Gi),FX), target,target)
         else:
             FX2 = self._cos(self.basis_alpha[None,:],self.basis_omega[None,:],self.basis_phi[None,:])(X2)
-        np.add(mdot(FX,self.Gi,FX2.T), target,target)
+            np.add(mdot(FX,self.Gi,FX2.T), target,target)
 
     def Kdiag(self,X,target):
         """Compute the diagonal of the covariance matrix associated to X."""
         FX  = self._cos(self.basis_alpha[None,:],self.basis_omega[None,:],self.basis_phi[None,:])(X)
-        np.add(target,np.diag(mdot(FX,self.Gi,FX.T)),target)
+        np.add(target,np.sum(np.dot(FX,self.Gi)*FX,1),target)
 
     @silence_errors
     def dK_dtheta(self,dL_dK,X,X2,target):
@@ -124,9 +125,6 @@ class PeriodicExponential(Kernpart):
 
         Flower = np.array(self._cos(self.basis_alpha,self.basis_omega,self.basis_phi)(self.lower))[:,None]
 
-        #dK_dvar
-        dK_dvar = 1./self.variance*mdot(FX,self.Gi,FX2.T)
-
         #dK_dlen
         da_dlen = [-1./self.lengthscale**2,0.]
         dLa_dlen =  np.column_stack((da_dlen[0]*np.ones((self.n_basis,1)),da_dlen[1]*self.basis_omega))
@@ -134,7 +132,6 @@ class PeriodicExponential(Kernpart):
         dGint_dlen = self._int_computation(r1,omega1,phi1, r,omega,phi)
         dGint_dlen = dGint_dlen + dGint_dlen.T
         dG_dlen = 1./2*Gint + self.lengthscale/2*dGint_dlen
-        dK_dlen = -mdot(FX,self.Gi,dG_dlen/self.variance,self.Gi,FX2.T)
 
         #dK_dper
         dFX_dper  = self._cos(-self.basis_alpha[None,:]*self.basis_omega[None,:]/self.period*X ,self.basis_omega[None,:],self.basis_phi[None,:]+np.pi/2)(X)
@@ -169,11 +166,13 @@ class PeriodicExponential(Kernpart):
 
         dG_dper = 1./self.variance*(self.lengthscale/2*dGint_dper + self.b[0]*(np.dot(dFlower_dper,Flower.T)+np.dot(Flower,dFlower_dper.T)))
 
-        dK_dper = mdot(dFX_dper,self.Gi,FX2.T) - mdot(FX,self.Gi,dG_dper,self.Gi,FX2.T) + mdot(FX,self.Gi,dFX2_dper.T)
-
-        target[0] += np.sum(dK_dvar*dL_dK)
-        target[1] += np.sum(dK_dlen*dL_dK)
-        target[2] += np.sum(dK_dper*dL_dK)
+        # sum(dL_dK*mdot(A,B,C.T)) is sum(B*mdot(A.T,dL_dK,C)): the gradients of K,
+        # num_data x num_data each, are not formed
+        dL_dK_FX2 = np.dot(dL_dK,FX2)
+        FX_dL_dK_FX2 = np.dot(FX.T,dL_dK_FX2)
+        target[0] += np.sum(self.Gi*FX_dL_dK_FX2)/self.variance
+        target[1] -= np.sum(mdot(self.Gi,dG_dlen/self.variance,self.Gi)*FX_dL_dK_FX2)
+        target[2] += np.sum(self.Gi*(np.dot(dFX_dper.T,dL_dK_FX2) + np.dot(FX.T,np.dot(dL_dK,dFX2_dper)))) - np.sum(mdot(self.Gi,dG_dper,self.Gi)*FX_dL_dK_FX2)
 
     @silence_errors
     def dKdiag_dtheta(self,dL_dKdiag,X,target):
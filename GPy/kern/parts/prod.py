@@ -5,6 +5,7 @@ from kernpart import Kernpart
 from coregionalize import Coregionalize
 import numpy as np
 import hashlib
+from ...util.block_matrices import intersect_labels
 
 class Prod(Kernpart):
     """
@@ -36,8 +37,23 @@ class Prod(Kernpart):
             self.slice2 = slice(0,self.input_dim)
 
         self._X, self._X2, self._params = np.empty(shape=(3,1))
+        self.tileable = k1.tileable and k2.tileable
+        self.stationary = k1.stationary and k2.stationary
         self._set_params(np.hstack((k1._get_params(),k2._get_params())))
 
+    def block_labels(self,X):
+        """The product is zero where either factor is."""
+        labels1 = self.k1.block_labels(X[:,self.slice1])
+        labels2 = self.k2.block_labels(X[:,self.slice2])
+        if labels1 is None or labels2 is None:
+            return labels2 if labels1 is None else labels1
+        return intersect_labels(labels1, labels2)
+
+    def tile_copy(self):
+        part = Kernpart.tile_copy(self)
+        part.k1, part.k2 = self.k1.tile_copy(), self.k2.tile_copy()
+        return part
+
     def _get_params(self):
         """return the value of the parameters."""
         return np.hstack((self.k1._get_params(), self.k2._get_params()))
@@ -75,6 +91,25 @@ class Prod(Kernpart):
             self.k1.dK_dtheta(dL_dK*self._K2, X[:,self.slice1], X2[:,self.slice1], target[:self.k1.num_params])
             self.k2.dK_dtheta(dL_dK*self._K1, X[:,self.slice2], X2[:,self.slice2], target[self.k1.num_params:])
 
+    def K_and_cache(self,X,X2,target):
+        """Compute the covariance matrix, keeping the caches of both factors for dK_dtheta_from_cache."""
+        K1 = np.zeros(target.shape)
+        K2 = np.zeros(target.shape)
+        if X2 is None:
+            cache1 = self.k1.K_and_cache(X[:,self.slice1], None, K1)
+            cache2 = self.k2.K_and_cache(X[:,self.slice2], None, K2)
+        else:
+            cache1 = self.k1.K_and_cache(X[:,self.slice1], X2[:,self.slice1], K1)
+            cache2 = self.k2.K_and_cache(X[:,self.slice2], X2[:,self.slice2], K2)
+        target += K1 * K2
+        return K1, K2, cache1, cache2
+
+    def dK_dtheta_from_cache(self,dL_dK,cache,target):
+        """Derivative of the covariance matrix with respect to the parameters, see K_and_cache."""
+        K1, K2, cache1, cache2 = cache
+        self.k1.dK_dtheta_from_cache(dL_dK*K2, cache1, target[:self.k1.num_params])
+        self.k2.dK_dtheta_from_cache(dL_dK*K1, cache2, target[self.k1.num_params:])
+
     def Kdiag(self,X,target):
         """Compute the diagonal of the covariance matrix associated to X."""
         target1 = np.zeros(X.shape[0])
@@ -113,8 +148,8 @@ class Prod(Kernpart):
         self.k1.Kdiag(X[:,self.slice1],K1)
         self.k2.Kdiag(X[:,self.slice2],K2)
 
-        self.k1.dK_dX(dL_dKdiag*K2, X[:,self.slice1], target[:,self.slice1])
-        self.k2.dK_dX(dL_dKdiag*K1, X[:,self.slice2], target[:,self.slice2])
+        self.k1.dKdiag_dX(dL_dKdiag*K2, X[:,self.slice1], target[:,self.slice1])
+        self.k2.dKdiag_dX(dL_dKdiag*K1, X[:,self.slice2], target[:,self.slice2])
 
     def _K_computations(self,X,X2):
         if not (np.array_equal(X,self._X) and np.array_equal(X2,self._X2) and np.array_equal(self._params , self._get_params())):
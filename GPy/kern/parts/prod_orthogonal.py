@@ -15,12 +15,16 @@ class prod_orthogonal(Kernpart):
     :rtype: kernel object
 
     """
+    # the wrapped parts would be shared by the copies (see Kernpart)
+    tileable = False
+
     def __init__(self,k1,k2):
         self.input_dim = k1.input_dim + k2.input_dim
         self.num_params = k1.num_params + k2.num_params
         self.name = k1.name + '<times>' + k2.name
         self.k1 = k1
         self.k2 = k2
+        self.stationary = k1.stationary and k2.stationary
         self._X, self._X2, self._params = np.empty(shape=(3,1))
         self._set_params(np.hstack((k1._get_params(),k2._get_params())))
 
@@ -24,6 +24,9 @@ class RationalQuadratic(Kernpart):
     :rtype: Kernpart object
 
     """
+
+    stationary = True
+
     def __init__(self,input_dim,variance=1.,lengthscale=1.,power=1.):
         assert input_dim == 1, "For this kernel we assume input_dim=1"
         self.input_dim = input_dim
@@ -45,20 +48,29 @@ class RationalQuadratic(Kernpart):
         return ['variance','lengthscale','power']
 
     def K(self,X,X2,target):
-        if X2 is None: X2 = X
-        dist2 = np.square((X-X2.T)/self.lengthscale)
-        target += self.variance*(1 + dist2/2.)**(-self.power)
+        self.K_and_cache(X, X2, target)
+
+    def K_and_cache(self,X,X2,target):
+        # a single exponential or power: cheaper than mirroring the tiles of K
+        return self._K_and_cache_stationary(X, X2, target, tiled=False)
+
+    def _K_from_cache(self,cache):
+        return self.variance*cache[-1]
+
+    def _cache(self,X,X2,r2):
+        logbase = np.log(1 + r2/2.)
+        return X, X2, r2, logbase, np.exp(-self.power*logbase)
 
     def Kdiag(self,X,target):
         target += self.variance
 
     def dK_dtheta(self,dL_dK,X,X2,target):
-        if X2 is None: X2 = X
-        dist2 = np.square((X-X2.T)/self.lengthscale)
+        self._dK_dtheta_stationary(dL_dK, X, X2, target)
 
-        dvar = (1 + dist2/2.)**(-self.power)
-        dl = self.power * self.variance * dist2 / self.lengthscale * (1 + dist2/2.)**(-self.power-1)
-        dp = - self.variance * np.log(1 + dist2/2.) * (1 + dist2/2.)**(-self.power)
+    def dK_dtheta_from_cache(self,dL_dK,cache,target):
+        X, X2, dist2, logbase, dvar = cache
+        dl = self.power * self.variance * dist2 / self.lengthscale * dvar / (1 + dist2/2.)
+        dp = - self.variance * logbase * dvar
 
         target[0] += np.sum(dvar*dL_dK)
         target[1] += np.sum(dl*dL_dK)
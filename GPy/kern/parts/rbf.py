@@ -4,10 +4,9 @@
 
 from kernpart import Kernpart
 import numpy as np
-from scipy import weave
 from ...util.linalg import tdot
 from ...util.misc import fast_array_equal
-from ...util.config import *
+from ...util import backend
 
 class RBF(Kernpart):
     """
@@ -30,8 +29,17 @@ class RBF(Kernpart):
     :rtype: kernel object
 
     .. Note: this object implements both the ARD and 'spherical' version of the function
+
+    The psi2 statistics and their gradients are computed in blocks of
+    psi2_block_size rows of mu and S (by default, as many as fit in about
+    8MB per num_inducing x num_inducing x input_dim array), so that no
+    N x num_inducing x num_inducing x input_dim array is formed.
     """
 
+    stationary = True
+
+    psi2_block_size = None
+
     def __init__(self, input_dim, variance=1., lengthscale=None, ARD=False):
         self.input_dim = input_dim
         self.name = 'rbf'
@@ -57,28 +65,6 @@ class RBF(Kernpart):
         self._Z, self._mu, self._S = np.empty(shape=(3, 1))
         self._X, self._X2, self._params = np.empty(shape=(3, 1))
 
-        # a set of optional args to pass to weave
-        weave_options_openmp = {'headers'           : ['<omp.h>'],
-                                'extra_compile_args': ['-fopenmp -O3'],
-                                'extra_link_args'   : ['-lgomp'],
-                                'libraries': ['gomp']}
-        weave_options_noopenmp = {'extra_compile_args': ['-O3']}
-
-
-
-        if config.getboolean('parallel', 'openmp'):
-            self.weave_options = weave_options_openmp
-            self.weave_support_code =  """
-            #include <omp.h>
-            #include <math.h>
-            """
-        else:
-            self.weave_options = weave_options_noopenmp
-            self.weave_support_code = """
-            #include <math.h>
-            """
-
-
     def _get_params(self):
         return np.hstack((self.variance, self.lengthscale))
 
@@ -90,6 +76,7 @@ class RBF(Kernpart):
         # reset cached results
         self._X, self._X2, self._params = np.empty(shape=(3, 1))
         self._Z, self._mu, self._S = np.empty(shape=(3, 1)) # cached versions of Z,mu,S
+        self._dpsi2_inputs = None
 
     def _get_param_names(self):
         if self.num_params == 2:
@@ -101,52 +88,26 @@ class RBF(Kernpart):
         self._K_computations(X, X2)
         target += self.variance * self._K_dvar
 
+    def K_and_cache(self, X, X2, target):
+        self._K_computations(X, X2)
+        target += self.variance * self._K_dvar
+        return X, X2, self._K_dist2, self._K_dvar
+
     def Kdiag(self, X, target):
         np.add(target, self.variance, target)
 
     def dK_dtheta(self, dL_dK, X, X2, target):
         self._K_computations(X, X2)
-        target[0] += np.sum(self._K_dvar * dL_dK)
+        self.dK_dtheta_from_cache(dL_dK, (X, X2, self._K_dist2, self._K_dvar), target)
+
+    def dK_dtheta_from_cache(self, dL_dK, cache, target):
+        X, X2, dist2, dvar = cache
+        target[0] += np.sum(dvar * dL_dK)
         if self.ARD:
-            dvardLdK = self._K_dvar * dL_dK
             var_len3 = self.variance / np.power(self.lengthscale, 3)
-            if X2 is None:
-                # save computation for the symmetrical case
-                dvardLdK = dvardLdK + dvardLdK.T
-                code = """
-                int q,i,j;
-                double tmp;
-                for(q=0; q<input_dim; q++){
-                  tmp = 0;
-                  for(i=0; i<num_data; i++){
-                    for(j=0; j<i; j++){
-                      tmp += (X(i,q)-X(j,q))*(X(i,q)-X(j,q))*dvardLdK(i,j);
-                    }
-                  }
-                  target(q+1) += var_len3(q)*tmp;
-                }
-                """
-                num_data, num_inducing, input_dim = int(X.shape[0]), int(X.shape[0]), int(self.input_dim)
-                weave.inline(code, arg_names=['num_data', 'num_inducing', 'input_dim', 'X', 'X2', 'target', 'dvardLdK', 'var_len3'], type_converters=weave.converters.blitz, **self.weave_options)
-            else:
-                code = """
-                int q,i,j;
-                double tmp;
-                for(q=0; q<input_dim; q++){
-                  tmp = 0;
-                  for(i=0; i<num_data; i++){
-                    for(j=0; j<num_inducing; j++){
-                      tmp += (X(i,q)-X2(j,q))*(X(i,q)-X2(j,q))*dvardLdK(i,j);
-                    }
-                  }
-                  target(q+1) += var_len3(q)*tmp;
-                }
-                """
-                num_data, num_inducing, input_dim = int(X.shape[0]), int(X2.shape[0]), int(self.input_dim)
-                # [np.add(target[1+q:2+q],var_len3[q]*np.sum(dvardLdK*np.square(X[:,q][:,None]-X2[:,q][None,:])),target[1+q:2+q]) for q in range(self.input_dim)]
-                weave.inline(code, arg_names=['num_data', 'num_inducing', 'input_dim', 'X', 'X2', 'target', 'dvardLdK', 'var_len3'], type_converters=weave.converters.blitz, **self.weave_options)
+            target[1:] += var_len3 * backend.get('sqdiff_sums')(dvar * dL_dK, X, X2)
         else:
-            target[1] += (self.variance / self.lengthscale) * np.sum(self._K_dvar * self._K_dist2 * dL_dK)
+            target[1] += (self.variance / self.lengthscale) * np.sum(dvar * dist2 * dL_dK)
 
     def dKdiag_dtheta(self, dL_dKdiag, X, target):
         # NB: derivative of diagonal elements wrt lengthscale is 0
@@ -205,8 +166,12 @@ class RBF(Kernpart):
         target_S += np.sum(dL_dpsi1[:, :, None] * 0.5 * tmp * (self._psi1_dist_sq - 1), 1)
 
     def psi2(self, Z, mu, S, target):
-        self._psi_computations(Z, mu, S)
-        target += self._psi2
+        for rows, denom, mudist, mudist_sq, psi2 in self._psi2_blocks(Z, mu, S):
+            target[rows] += psi2
+
+    def psi2_sum(self, Z, mu, S, target):
+        for rows, denom, mudist, mudist_sq, psi2 in self._psi2_blocks(Z, mu, S):
+            target += psi2.sum(0)
 
     def _crossterm_mu_S(self, Z, mu, S):
         # compute the crossterm expectation for K as the other kernel:
@@ -218,29 +183,18 @@ class RBF(Kernpart):
 
     def dpsi2_dtheta(self, dL_dpsi2, Z, mu, S, target):
         """Shape N,num_inducing,num_inducing,Ntheta"""
-        self._psi_computations(Z, mu, S)
-        d_var = 2.*self._psi2 / self.variance
-        d_length = 2.*self._psi2[:, :, :, None] * (self._psi2_Zdist_sq * self._psi2_denom + self._psi2_mudist_sq + S[:, None, None, :] / self.lengthscale2) / (self.lengthscale * self._psi2_denom)
-        target[0] += np.sum(dL_dpsi2 * d_var)
-        dpsi2_dlength = d_length * dL_dpsi2[:, :, :, None]
-        if not self.ARD:
-            target[1] += dpsi2_dlength.sum()
-        else:
-            target[1:] += dpsi2_dlength.sum(0).sum(0).sum(0)
+        self._dpsi2_computations(dL_dpsi2, Z, mu, S)
+        target += self._dpsi2_dtheta
 
     def dpsi2_dZ(self, dL_dpsi2, Z, mu, S, target):
-        self._psi_computations(Z, mu, S)
-        term1 = self._psi2_Zdist / self.lengthscale2 # num_inducing, num_inducing, input_dim
-        term2 = self._psi2_mudist / self._psi2_denom / self.lengthscale2 # N, num_inducing, num_inducing, input_dim
-        dZ = self._psi2[:, :, :, None] * (term1[None] + term2)
-        target += (dL_dpsi2[:, :, :, None] * dZ).sum(0).sum(0)
+        self._dpsi2_computations(dL_dpsi2, Z, mu, S)
+        target += self._dpsi2_dZ
 
     def dpsi2_dmuS(self, dL_dpsi2, Z, mu, S, target_mu, target_S):
         """Think N,num_inducing,num_inducing,input_dim """
-        self._psi_computations(Z, mu, S)
-        tmp = self._psi2[:, :, :, None] / self.lengthscale2 / self._psi2_denom
-        target_mu += -2.*(dL_dpsi2[:, :, :, None] * tmp * self._psi2_mudist).sum(1).sum(1)
-        target_S += (dL_dpsi2[:, :, :, None] * tmp * (2.*self._psi2_mudist_sq - 1)).sum(1).sum(1)
+        self._dpsi2_computations(dL_dpsi2, Z, mu, S)
+        target_mu += self._dpsi2_dmu
+        target_S += self._dpsi2_dS
 
     #---------------------------------------#
     #            Precomputations            #
@@ -251,16 +205,8 @@ class RBF(Kernpart):
         if not (fast_array_equal(X, self._X) and fast_array_equal(X2, self._X2) and fast_array_equal(self._params , params)):
             self._X = X.copy()
             self._params = params.copy()
-            if X2 is None:
-                self._X2 = None
-                X = X / self.lengthscale
-                Xsquare = np.sum(np.square(X), 1)
-                self._K_dist2 = -2.*tdot(X) + (Xsquare[:, None] + Xsquare[None, :])
-            else:
-                self._X2 = X2.copy()
-                X = X / self.lengthscale
-                X2 = X2 / self.lengthscale
-                self._K_dist2 = -2.*np.dot(X, X2.T) + (np.sum(np.square(X), 1)[:, None] + np.sum(np.square(X2), 1)[None, :])
+            self._X2 = None if X2 is None else X2.copy()
+            self._K_dist2 = self._scaled_sqdist(X, X2)
             self._K_dvar = np.exp(-0.5 * self._K_dist2)
 
     def _psi_computations(self, Z, mu, S):
@@ -282,88 +228,80 @@ class RBF(Kernpart):
             self._psi1_exponent = -0.5 * np.sum(self._psi1_dist_sq + np.log(self._psi1_denom), -1)
             self._psi1 = self.variance * np.exp(self._psi1_exponent)
 
-            # psi2
-            self._psi2_denom = 2.*S[:, None, None, :] / self.lengthscale2 + 1. # N,M,M,Q
-            self._psi2_mudist, self._psi2_mudist_sq, self._psi2_exponent, _ = self.weave_psi2(mu, self._psi2_Zhat)
-            # self._psi2_mudist = mu[:,None,None,:]-self._psi2_Zhat #N,M,M,Q
-            # self._psi2_mudist_sq = np.square(self._psi2_mudist)/(self.lengthscale2*self._psi2_denom)
-            # self._psi2_exponent = np.sum(-self._psi2_Zdist_sq -self._psi2_mudist_sq -0.5*np.log(self._psi2_denom),-1) #N,M,M,Q
-            self._psi2 = np.square(self.variance) * np.exp(self._psi2_exponent) # N,M,M,Q
-
             # store matrices for caching
             self._Z, self._mu, self._S = Z, mu, S
 
-    def weave_psi2(self, mu, Zhat):
-        N, input_dim = mu.shape
-        num_inducing = Zhat.shape[0]
-
-        mudist = np.empty((N, num_inducing, num_inducing, input_dim))
-        mudist_sq = np.empty((N, num_inducing, num_inducing, input_dim))
-        psi2_exponent = np.zeros((N, num_inducing, num_inducing))
-        psi2 = np.empty((N, num_inducing, num_inducing))
-
-        psi2_Zdist_sq = self._psi2_Zdist_sq
-        _psi2_denom = self._psi2_denom.squeeze().reshape(-1, input_dim)
-        half_log_psi2_denom = 0.5 * np.log(self._psi2_denom).squeeze().reshape(-1, input_dim)
-        variance_sq = float(np.square(self.variance))
+    def _psi2_blocks(self, Z, mu, S):
+        """
+        Iterate over blocks of rows of mu and S, yielding the rows, the
+        denominators 2 S / lengthscale2 + 1, the differences between mu and
+        the midpoints of the pairs of inducing inputs, their scaled squares
+        and psi2, for the rows of the block only.
+        """
+        self._psi_computations(Z, mu, S)
+        num_inducing, input_dim = Z.shape
+        block_size = self.psi2_block_size or max(1, 2 ** 20 // (num_inducing * num_inducing * input_dim))
+        denom = 2. * S / self.lengthscale2 + 1.
+        for start in range(0, mu.shape[0], block_size):
+            rows = slice(start, start + block_size)
+            mudist, mudist_sq, exponent = backend.get('rbf_psi2')(mu[rows], self._psi2_Zhat, self._psi2_Zdist_sq, denom[rows], self.lengthscale2)
+            yield rows, denom[rows], mudist, mudist_sq, np.square(self.variance) * np.exp(exponent)
+
+    def _dpsi2_computations(self, dL_dpsi2, Z, mu, S):
+        """
+        The gradients of psi2 wrt the parameters, Z, mu and S, in a single
+        pass over the blocks of the data. They are kept until the inputs
+        change, as the model asks for them one after the other.
+        """
+        inputs = (dL_dpsi2, Z, mu, S)
+        if self._dpsi2_inputs is not None and all([fast_array_equal(a, b) for a, b in zip(inputs, self._dpsi2_inputs)]):
+            return
+        self._dpsi2_dtheta = np.zeros(self.num_params)
+        self._dpsi2_dZ = np.zeros(Z.shape)
+        self._dpsi2_dmu, self._dpsi2_dS = np.zeros((2,) + mu.shape)
+        d_length = np.zeros(self.input_dim)
+        shared = dL_dpsi2.ndim == 2
+        for rows, denom, mudist, mudist_sq, psi2 in self._psi2_blocks(Z, mu, S):
+            dL_dpsi2_psi2 = (dL_dpsi2 if shared else dL_dpsi2[rows]) * psi2 # B,M,M
+            dL_dpsi2_psi2_sum = dL_dpsi2_psi2.sum(0)
+            self._dpsi2_dtheta[0] += 2. * np.sum(dL_dpsi2_psi2) / self.variance
+
+            # lengthscale
+            d_length += np.sum(dL_dpsi2_psi2_sum[:, :, None] * self._psi2_Zdist_sq, 0).sum(0)
+            tmp = dL_dpsi2_psi2[:, :, :, None] / denom[:, None, None, :] # B,M,M,Q
+            d_length += np.sum(tmp * mudist_sq, 1).sum(0).sum(0)
+            d_length += np.sum(tmp.sum(1).sum(1) * S[rows], 0) / self.lengthscale2
+
+            # Z
+            self._dpsi2_dZ += np.sum(dL_dpsi2_psi2_sum[:, :, None] * self._psi2_Zdist, 0) / self.lengthscale2
+            tmp *= mudist
+            self._dpsi2_dZ += tmp.sum(0).sum(0) / self.lengthscale2
+
+            # mu and S
+            self._dpsi2_dmu[rows] += -2. * tmp.sum(1).sum(1) / self.lengthscale2
+            tmp = dL_dpsi2_psi2[:, :, :, None] * (2. * mudist_sq - 1.)
+            self._dpsi2_dS[rows] += tmp.sum(1).sum(1) / (self.lengthscale2 * denom)
+
+        d_length *= 2. / self.lengthscale
         if self.ARD:
-            lengthscale2 = self.lengthscale2
-        else:
-            lengthscale2 = np.ones(input_dim) * self.lengthscale2
-
-        if config.getboolean('parallel', 'openmp'):
-            pragma_string = '#pragma omp parallel for private(tmp)'
+            self._dpsi2_dtheta[1:] += d_length
         else:
-            pragma_string = ''
-
-        code = """
-        double tmp;
-
-        %s
-        for (int n=0; n<N; n++){
-            for (int m=0; m<num_inducing; m++){
-               for (int mm=0; mm<(m+1); mm++){
-                   for (int q=0; q<input_dim; q++){
-                       //compute mudist
-                       tmp = mu(n,q) - Zhat(m,mm,q);
-                       mudist(n,m,mm,q) = tmp;
-                       mudist(n,mm,m,q) = tmp;
-
-                       //now mudist_sq
-                       tmp = tmp*tmp/lengthscale2(q)/_psi2_denom(n,q);
-                       mudist_sq(n,m,mm,q) = tmp;
-                       mudist_sq(n,mm,m,q) = tmp;
-
-                       //now psi2_exponent
-                       tmp = -psi2_Zdist_sq(m,mm,q) - tmp - half_log_psi2_denom(n,q);
-                       psi2_exponent(n,mm,m) += tmp;
-                       if (m !=mm){
-                           psi2_exponent(n,m,mm) += tmp;
-                       }
-                   //psi2 would be computed like this, but np is faster
-                   //tmp = variance_sq*exp(psi2_exponent(n,m,mm));
-                   //psi2(n,m,mm) = tmp;
-                   //psi2(n,mm,m) = tmp;
-                   }
-                }
-            }
-        }
-
-        """ % pragma_string
-
-        if config.getboolean('parallel', 'openmp'):
-            pragma_string = '#include <omp.h>'
-        else:
-            pragma_string = ''
-
-        support_code = """
-        %s
-        #include <math.h>
-        """ % pragma_string
+            self._dpsi2_dtheta[1] += d_length.sum()
+        self._dpsi2_inputs = tuple([a.copy() for a in inputs])
 
-        N, num_inducing, input_dim = int(N), int(num_inducing), int(input_dim)
-        weave.inline(code, support_code=support_code,
-                     arg_names=['N', 'num_inducing', 'input_dim', 'mu', 'Zhat', 'mudist_sq', 'mudist', 'lengthscale2', '_psi2_denom', 'psi2_Zdist_sq', 'psi2_exponent', 'half_log_psi2_denom', 'psi2', 'variance_sq'],
-                     type_converters=weave.converters.blitz, **self.weave_options)
+@backend.register('rbf_psi2', 'numpy')
+def _psi2_numpy(mu, Zhat, Zdist_sq, denom, lengthscale2):
+    """
+    The differences between mu and the midpoints Zhat of the pairs of
+    inducing inputs, their scaled squares and the exponent of psi2.
 
-        return mudist, mudist_sq, psi2_exponent, psi2
+    :param denom: 2 S / lengthscale2 + 1, N x input_dim
+    :rtype: N x num_inducing x num_inducing (x input_dim) arrays
+    """
+    mudist = mu[:, None, None, :] - Zhat
+    mudist_sq = np.square(mudist)
+    mudist_sq /= (lengthscale2 * denom)[:, None, None, :]
+    psi2_exponent = -mudist_sq.sum(-1)
+    psi2_exponent -= Zdist_sq.sum(-1)
+    psi2_exponent -= 0.5 * np.log(denom).sum(-1)[:, None, None]
+    return mudist, mudist_sq, psi2_exponent
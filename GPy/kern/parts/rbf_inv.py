@@ -5,9 +5,8 @@
 from rbf import RBF
 import numpy as np
 import hashlib
-from scipy import weave
 from ...util.linalg import tdot
-from ...util.config import *
+from ...util import backend
 
 
 class RBFInv(RBF):
@@ -59,25 +58,6 @@ class RBFInv(RBF):
         self._Z, self._mu, self._S = np.empty(shape=(3, 1))
         self._X, self._X2, self._params = np.empty(shape=(3, 1))
 
-        # a set of optional args to pass to weave
-        weave_options_openmp = {'headers'           : ['<omp.h>'],
-                                'extra_compile_args': ['-fopenmp -O3'],
-                                'extra_link_args'   : ['-lgomp'],
-                                'libraries': ['gomp']}
-        weave_options_noopenmp = {'extra_compile_args': ['-O3']}
-
-        if config.getboolean('parallel', 'openmp'):
-            self.weave_options = weave_options_openmp
-            self.weave_support_code =  """
-            #include <omp.h>
-            #include <math.h>
-            """
-        else:
-            self.weave_options = weave_options_noopenmp
-            self.weave_support_code = """
-            #include <math.h>
-            """
-
     def _get_params(self):
         return np.hstack((self.variance, self.inv_lengthscale))
 
@@ -104,44 +84,8 @@ class RBFInv(RBF):
         self._K_computations(X, X2)
         target[0] += np.sum(self._K_dvar * dL_dK)
         if self.ARD:
-            dvardLdK = self._K_dvar * dL_dK
             var_len3 = self.variance / np.power(self.lengthscale, 3)
-            len2 = self.lengthscale2
-            if X2 is None:
-                # save computation for the symmetrical case
-                dvardLdK = dvardLdK + dvardLdK.T
-                code = """
-                int q,i,j;
-                double tmp;
-                for(q=0; q<input_dim; q++){
-                  tmp = 0;
-                  for(i=0; i<num_data; i++){
-                    for(j=0; j<i; j++){
-                      tmp += (X(i,q)-X(j,q))*(X(i,q)-X(j,q))*dvardLdK(i,j);
-                    }
-                  }
-                  target(q+1) += var_len3(q)*tmp*(-len2(q));
-                }
-                """
-                num_data, num_inducing, input_dim = int(X.shape[0]), int(X.shape[0]), int(self.input_dim)
-                weave.inline(code, arg_names=['num_data', 'num_inducing', 'input_dim', 'X', 'X2', 'target', 'dvardLdK', 'var_len3', 'len2'], type_converters=weave.converters.blitz, **self.weave_options)
-            else:
-                code = """
-                int q,i,j;
-                double tmp;
-                for(q=0; q<input_dim; q++){
-                  tmp = 0;
-                  for(i=0; i<num_data; i++){
-                    for(j=0; j<num_inducing; j++){
-                      tmp += (X(i,q)-X2(j,q))*(X(i,q)-X2(j,q))*dvardLdK(i,j);
-                    }
-                  }
-                  target(q+1) += var_len3(q)*tmp*(-len2(q));
-                }
-                """
-                num_data, num_inducing, input_dim = int(X.shape[0]), int(X2.shape[0]), int(self.input_dim)
-                # [np.add(target[1+q:2+q],var_len3[q]*np.sum(dvardLdK*np.square(X[:,q][:,None]-X2[:,q][None,:])),target[1+q:2+q]) for q in range(self.input_dim)]
-                weave.inline(code, arg_names=['num_data', 'num_inducing', 'input_dim', 'X', 'X2', 'target', 'dvardLdK', 'var_len3', 'len2'], type_converters=weave.converters.blitz, **self.weave_options)
+            target[1:] += var_len3 * (-self.lengthscale2) * backend.get('sqdiff_sums')(self._K_dvar * dL_dK, X, X2)
         else:
             target[1] += (self.variance / self.lengthscale) * np.sum(self._K_dvar * self._K_dist2 * dL_dK) * (-self.lengthscale2)
 
@@ -202,6 +146,7 @@ class RBFInv(RBF):
     def dpsi2_dtheta(self, dL_dpsi2, Z, mu, S, target):
         """Shape N,num_inducing,num_inducing,Ntheta"""
         self._psi_computations(Z, mu, S)
+        dL_dpsi2 = dL_dpsi2.reshape((-1,) + dL_dpsi2.shape[-2:]) # shared by all the data if M x M
         d_var = 2.*self._psi2 / self.variance
         # d_length = 2.*self._psi2[:, :, :, None] * (self._psi2_Zdist_sq * self._psi2_denom + self._psi2_mudist_sq + S[:, None, None, :] / self.lengthscale2) / (self.lengthscale * self._psi2_denom)
         d_length = -2.*self._psi2[:, :, :, None] * (self._psi2_Zdist_sq * self._psi2_denom + self._psi2_mudist_sq + S[:, None, None, :] * self.inv_lengthscale2) / (self.inv_lengthscale * self._psi2_denom)
@@ -215,6 +160,7 @@ class RBFInv(RBF):
 
     def dpsi2_dZ(self, dL_dpsi2, Z, mu, S, target):
         self._psi_computations(Z, mu, S)
+        dL_dpsi2 = dL_dpsi2.reshape((-1,) + dL_dpsi2.shape[-2:]) # shared by all the data if M x M
         term1 = self._psi2_Zdist * self.inv_lengthscale2 # num_inducing, num_inducing, input_dim
         term2 = (self._psi2_mudist * self.inv_lengthscale2) / self._psi2_denom # N, num_inducing, num_inducing, input_dim
         dZ = self._psi2[:, :, :, None] * (term1[None] + term2)
@@ -223,6 +169,7 @@ class RBFInv(RBF):
     def dpsi2_dmuS(self, dL_dpsi2, Z, mu, S, target_mu, target_S):
         """Think N,num_inducing,num_inducing,input_dim """
         self._psi_computations(Z, mu, S)
+        dL_dpsi2 = dL_dpsi2.reshape((-1,) + dL_dpsi2.shape[-2:]) # shared by all the data if M x M
         tmp = (self.inv_lengthscale2 * self._psi2[:, :, :, None]) / self._psi2_denom
         target_mu += -2.*(dL_dpsi2[:, :, :, None] * tmp * self._psi2_mudist).sum(1).sum(1)
         target_S += (dL_dpsi2[:, :, :, None] * tmp * (2.*self._psi2_mudist_sq - 1)).sum(1).sum(1)
@@ -267,75 +214,8 @@ class RBFInv(RBF):
 
             # psi2
             self._psi2_denom = 2.*S[:, None, None, :] * self.inv_lengthscale2 + 1. # N,M,M,Q
-            self._psi2_mudist, self._psi2_mudist_sq, self._psi2_exponent, _ = self.weave_psi2(mu, self._psi2_Zhat)
-            # self._psi2_mudist = mu[:,None,None,:]-self._psi2_Zhat #N,M,M,Q
-            # self._psi2_mudist_sq = np.square(self._psi2_mudist)/(self.lengthscale2*self._psi2_denom)
-            # self._psi2_exponent = np.sum(-self._psi2_Zdist_sq -self._psi2_mudist_sq -0.5*np.log(self._psi2_denom),-1) #N,M,M,Q
+            self._psi2_mudist, self._psi2_mudist_sq, self._psi2_exponent = backend.get('rbf_psi2')(mu, self._psi2_Zhat, self._psi2_Zdist_sq, self._psi2_denom[:, 0, 0, :], self.lengthscale2)
             self._psi2 = np.square(self.variance) * np.exp(self._psi2_exponent) # N,M,M,Q
 
             # store matrices for caching
             self._Z, self._mu, self._S = Z, mu, S
-
-    def weave_psi2(self, mu, Zhat):
-        N, input_dim = int(mu.shape[0]), int(mu.shape[1])
-        num_inducing = int(Zhat.shape[0])
-
-        mudist = np.empty((N, num_inducing, num_inducing, input_dim))
-        mudist_sq = np.empty((N, num_inducing, num_inducing, input_dim))
-        psi2_exponent = np.zeros((N, num_inducing, num_inducing))
-        psi2 = np.empty((N, num_inducing, num_inducing))
-
-        psi2_Zdist_sq = self._psi2_Zdist_sq
-        _psi2_denom = self._psi2_denom.squeeze().reshape(N, self.input_dim)
-        half_log_psi2_denom = 0.5 * np.log(self._psi2_denom).squeeze().reshape(N, self.input_dim)
-        variance_sq = float(np.square(self.variance))
-        if self.ARD:
-            inv_lengthscale2 = self.inv_lengthscale2
-        else:
-            inv_lengthscale2 = np.ones(input_dim) * self.inv_lengthscale2
-
-        if config.getboolean('parallel', 'openmp'):
-            pragma_string = '#pragma omp parallel for private(tmp)'
-        else:
-            pragma_string = ''
-
-        code = """
-        double tmp;
-
-        %s
-        for (int n=0; n<N; n++){
-            for (int m=0; m<num_inducing; m++){
-               for (int mm=0; mm<(m+1); mm++){
-                   for (int q=0; q<input_dim; q++){
-                       //compute mudist
-                       tmp = mu(n,q) - Zhat(m,mm,q);
-                       mudist(n,m,mm,q) = tmp;
-                       mudist(n,mm,m,q) = tmp;
-
-                       //now mudist_sq
-                       tmp = tmp*tmp*inv_lengthscale2(q)/_psi2_denom(n,q);
-                       mudist_sq(n,m,mm,q) = tmp;
-                       mudist_sq(n,mm,m,q) = tmp;
-
-                       //now psi2_exponent
-                       tmp = -psi2_Zdist_sq(m,mm,q) - tmp - half_log_psi2_denom(n,q);
-                       psi2_exponent(n,mm,m) += tmp;
-                       if (m !=mm){
-                           psi2_exponent(n,m,mm) += tmp;
-                       }
-                   //psi2 would be computed like this, but np is faster
-                   //tmp = variance_sq*exp(psi2_exponent(n,m,mm));
-                   //psi2(n,m,mm) = tmp;
-                   //psi2(n,mm,m) = tmp;
-                   }
-                }
-            }
-        }
-
-        """ % pragma_string
-
-        weave.inline(code, support_code=self.weave_support_code,
-                     arg_names=['N', 'num_inducing', 'input_dim', 'mu', 'Zhat', 'mudist_sq', 'mudist', 'inv_lengthscale2', '_psi2_denom', 'psi2_Zdist_sq', 'psi2_exponent', 'half_log_psi2_denom', 'psi2', 'variance_sq'],
-                     type_converters=weave.converters.blitz, **self.weave_options)
-
-        return mudist, mudist_sq, psi2_exponent, psi2
@@ -0,0 +1,133 @@
+# Copyright (c) 2013, GPy authors (see AUTHORS.txt).
+# Licensed under the BSD 3-clause license (see LICENSE.txt)
+
+
+from kernpart import Kernpart
+import numpy as np
+
+class RBF_RFF(Kernpart):
+    """
+    Random Fourier feature approximation of the Radial Basis Function kernel:
+
+    .. math::
+
+       k(x, y) \\approx \\phi(x)^\\top \\phi(y), \\ \\ \\ \\phi(x) = \\sqrt{\\frac{2 \\sigma^2}{F}} \\big[\\cos(\\Omega (x / \\ell)), \\sin(\\Omega (x / \\ell))\\big]
+
+    where the F/2 rows of :math:`\\Omega` are frequencies drawn once from the
+    spectral density of the kernel with unit lengthscale (a standard normal
+    for the RBF). The frequencies are fixed, so that the lengthscales only
+    rescale them and the approximation is a smooth function of the
+    parameters. The explicit feature map (see features) gives models whose
+    cost is linear in the number of data.
+
+    :param input_dim: the number of input dimensions
+    :type input_dim: int
+    :param variance: the variance of the kernel
+    :type variance: float
+    :param lengthscale: the vector of lengthscale of the kernel
+    :type lengthscale: array or list of the appropriate size (or float if there is only one lengthscale parameter)
+    :param ARD: Auto Relevance Determination. If equal to "False", the kernel is isotropic (ie. one single lengthscale parameter \ell), otherwise there is one lengthscale parameter per dimension.
+    :type ARD: Boolean
+    :param num_features: the number of features F (an even number, a cosine and a sine for each frequency)
+    :type num_features: int
+    :param seed: the seed of the random frequencies
+    :type seed: int
+    :rtype: kernel object
+    """
+
+    def __init__(self, input_dim, variance=1., lengthscale=None, ARD=False, num_features=100, seed=None):
+        self.input_dim = input_dim
+        self.name = 'rbf_rff'
+        self.ARD = ARD
+        if not ARD:
+            self.num_params = 2
+            if lengthscale is not None:
+                lengthscale = np.asarray(lengthscale)
+                assert lengthscale.size == 1, "Only one lengthscale needed for non-ARD kernel"
+            else:
+                lengthscale = np.ones(1)
+        else:
+            self.num_params = self.input_dim + 1
+            if lengthscale is not None:
+                lengthscale = np.asarray(lengthscale)
+                assert lengthscale.size == self.input_dim, "bad number of lengthscales"
+            else:
+                lengthscale = np.ones(self.input_dim)
+        assert num_features > 0 and num_features % 2 == 0, "the number of features must be even"
+        self.num_features = num_features
+        self.frequencies = self._sample_frequencies(np.random.RandomState(seed))
+        self._set_params(np.hstack((variance, lengthscale.flatten())))
+
+    def _sample_frequencies(self, random_state):
+        """The frequencies of the features, for a unit lengthscale."""
+        return random_state.randn(self.num_features // 2, self.input_dim)
+
+    def _get_params(self):
+        return np.hstack((self.variance, self.lengthscale))
+
+    def _set_params(self, x):
+        assert x.size == (self.num_params)
+        self.variance = x[0]
+        self.lengthscale = x[1:]
+
+    def _get_param_names(self):
+        if self.num_params == 2:
+            return ['variance', 'lengthscale']
+        else:
+            return ['variance'] + ['lengthscale_%i' % i for i in range(self.lengthscale.size)]
+
+    def features(self, X):
+        """The feature map of X, N x num_features."""
+        Z = np.dot(X / self.lengthscale, self.frequencies.T)
+        return np.sqrt(2. * self.variance / self.num_features) * np.hstack((np.cos(Z), np.sin(Z)))
+
+    def dfeatures_dtheta(self, dL_dfeatures, X, target):
+        """
+        The gradient of the parameters given the gradient of the features
+        of X.
+        """
+        Phi = self.features(X)
+        target[0] += np.sum(dL_dfeatures * Phi) / (2. * self.variance)
+        # d cos(z) = -sin(z) dz and d sin(z) = cos(z) dz, with dz/dl = -z/l
+        F = self.num_features // 2
+        H = dL_dfeatures[:, :F] * Phi[:, F:] - dL_dfeatures[:, F:] * Phi[:, :F]
+        dl = np.sum(np.dot(X.T, H) * self.frequencies.T, 1) / np.square(self.lengthscale)
+        if self.ARD:
+            target[1:] += dl
+        else:
+            target[1] += np.sum(dl)
+
+    def K(self, X, X2, target):
+        Phi = self.features(X)
+        if X2 is None:
+            target += np.dot(Phi, Phi.T)
+        else:
+            target += np.dot(Phi, self.features(X2).T)
+
+    def Kdiag(self, X, target):
+        # cos^2 + sin^2 = 1
+        target += self.variance
+
+    def dK_dtheta(self, dL_dK, X, X2, target):
+        # dL_dfeatures, through K = Phi Phi2^T
+        if X2 is None:
+            self.dfeatures_dtheta(np.dot(dL_dK + dL_dK.T, self.features(X)), X, target)
+        else:
+            self.dfeatures_dtheta(np.dot(dL_dK, self.features(X2)), X, target)
+            self.dfeatures_dtheta(np.dot(dL_dK.T, self.features(X)), X2, target)
+
+    def dKdiag_dtheta(self, dL_dKdiag, X, target):
+        target[0] += np.sum(dL_dKdiag)
+
+    def dK_dX(self, dL_dK, X, X2, target):
+        if X2 is None:
+            G = np.dot(dL_dK + dL_dK.T, self.features(X))
+        else:
+            G = np.dot(dL_dK, self.features(X2))
+        Phi = self.features(X)
+        F = self.num_features // 2
+        H = G[:, F:] * Phi[:, :F] - G[:, :F] * Phi[:, F:]
+        target += np.dot(H, self.frequencies) / self.lengthscale
+
+    def dKdiag_dX(self, dL_dKdiag, X, target):
+        pass
@@ -15,6 +15,9 @@ class Symmetric(Kernpart):
     :rtype: Kernpart
 
     """
+    # the wrapped part would be shared by the copies (see Kernpart)
+    tileable = False
+
     def __init__(self,k,transform=None):
         if transform is None:
             transform = np.eye(k.input_dim)*-1.
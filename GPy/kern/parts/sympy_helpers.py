@@ -1,5 +1,4 @@
 # Code for testing functions written in sympy_helpers.cpp
-from scipy import weave
 import tempfile
 import os
 import numpy as np
@@ -29,6 +28,7 @@ def erfcx(x):
     x = np.asarray(x)
     arg_names = ['target','x']
     target = np.zeros_like(x)
+    from scipy import weave # imported when used, GPy does not require it
     weave.inline(code=code, arg_names=arg_names,**weave_kwargs)
     return target
 
@@ -48,6 +48,7 @@ def ln_diff_erf(x, y):
     assert(x.shape==y.shape)
     target = np.zeros_like(x)
     arg_names = ['target','x', 'y']
+    from scipy import weave # imported when used, GPy does not require it
     weave.inline(code=code, arg_names=arg_names,**weave_kwargs)
     return target
 
@@ -67,5 +68,6 @@ def h(t, tprime, d_i, d_j, l):
     assert(tprime.shape==t.shape)
     target = np.zeros_like(t)
     arg_names = ['target','t', 'tprime', 'd_i', 'd_j', 'l']
+    from scipy import weave # imported when used, GPy does not require it
     weave.inline(code=code, arg_names=arg_names,**weave_kwargs)
     return target
@@ -2,7 +2,6 @@ import numpy as np
 import sympy as sp
 from sympy.utilities.codegen import codegen
 from sympy.core.cache import clear_cache
-from scipy import weave
 import re
 import os
 import sys
@@ -28,6 +27,9 @@ class spkern(Kernpart):
      - to handle multiple inputs, call them x_1, z_1, etc
      - to handle multpile correlated outputs, you'll need to add parameters with an index, such as lengthscale_i and lengthscale_j.
     """
+    # the inline code is compiled on first use (see Kernpart)
+    tileable = False
+
     def __init__(self, input_dim, k=None, output_dim=1, name=None, param=None):
         if name is None:
             self.name='sympykern'
@@ -366,6 +368,7 @@ class spkern(Kernpart):
         return arg_names
         
     def _weave_inline(self, code, X, target, Z=None, partial=None):
+        from scipy import weave # imported when used, GPy does not require it
         output_dim = self.output_dim
         for shared_params in self._sp_theta:
             locals()[shared_params.name] = getattr(self, shared_params.name)
@@ -13,6 +13,9 @@ class White(Kernpart):
     :param variance:
     :type variance: float
     """
+
+    stationary = True
+
     def __init__(self,input_dim,variance=1.):
         self.input_dim = input_dim
         self.num_params = 1
@@ -37,10 +40,21 @@ class White(Kernpart):
     def Kdiag(self,X,target):
         target += self.variance
 
+    def block_labels(self,X):
+        return np.arange(X.shape[0])
+
     def dK_dtheta(self,dL_dK,X,X2,target):
         if X2 is None:
             target += np.trace(dL_dK)
 
+    def K_and_cache(self,X,X2,target):
+        self.K(X, X2, target)
+        return X2 is None
+
+    def dK_dtheta_from_cache(self,dL_dK,cache,target):
+        if cache:
+            target += np.trace(dL_dK)
+
     def dKdiag_dtheta(self,dL_dKdiag,X,target):
         target += np.sum(dL_dKdiag)
 
@@ -74,6 +88,9 @@ class White(Kernpart):
     def psi2(self,Z,mu,S,target):
         pass
 
+    def psi2_sum(self,Z,mu,S,target):
+        pass
+
     def dpsi2_dZ(self,dL_dpsi2,Z,mu,S,target):
         pass
 
@@ -0,0 +1,275 @@
+# Copyright (c) 2013, GPy authors (see AUTHORS.txt).
+# Licensed under the BSD 3-clause license (see LICENSE.txt)
+
+"""
+Psi statistics by quadrature, for the kernel parts (and the cross terms of
+pairs of parts) which have no closed form ones.
+
+The psi statistics are expectations under the distributions N(mu_n, diag(S_n))
+of the inputs::
+
+    psi0_n = <k(x, x)>,  psi1_nm = <k(x, z_m)>,  psi2_nmm' = <k(x, z_m) k(x, z_m')>
+
+which are approximated by weighted sums over the nodes
+x_np = mu_n + sqrt(S_n) xi_p, xi_p being a tensor Gauss-Hermite grid or, when
+the grid would be too large, the sigma points of the unscented transform
+(see GPy.util.quadrature). A part is only evaluated through K, Kdiag and
+their gradients, for blocks of data and all the nodes at once. The gradients
+wrt mu and S need dK_dX (and dKdiag_dX) and require S > 0.
+"""
+
+import warnings
+import numpy as np
+from ..util import quadrature
+
+class PsiQuadrature(object):
+    """
+    Quadrature of the psi statistics of kernel parts. The methods take the
+    part first, then the arguments of the corresponding Kernpart methods.
+    The cross terms take (part, input_slice) pairs, the inputs being those of
+    the whole kernel.
+
+    The tensor Gauss-Hermite grid integrates polynomials of degree up to
+    2 degree - 1 in each dimension exactly, but has degree^input_dim nodes;
+    with the defaults it is used up to input_dim = 4. Above max_nodes, the
+    2 input_dim + 1 unscented points are used instead (with a warning),
+    which are only exact for polynomials of degree 3, so the psi statistics
+    of strongly nonlinear parts become rough approximations: raise
+    max_nodes (at the cost of the memory and time of the grid) when the
+    accuracy matters.
+
+    :param degree: the number of Gauss-Hermite nodes in each input dimension
+    :type degree: int
+    :param max_nodes: the size of the largest grid, above which the unscented points are used
+    :type max_nodes: int
+    :param block_size: the number of kernel evaluations of each block of data
+    :type block_size: int
+    """
+    def __init__(self, degree=5, max_nodes=1000, block_size=2 ** 20):
+        self.degree = degree
+        self.max_nodes = max_nodes
+        self.block_size = block_size
+
+    def nodes(self, input_dim):
+        """The nodes (P x input_dim) and the weights (P) of the quadrature."""
+        if self.degree ** input_dim <= self.max_nodes:
+            return quadrature.gauss_hermite(input_dim, self.degree)
+        warnings.warn("%i Gauss-Hermite nodes exceed max_nodes=%i, the psi statistics use the %i less accurate unscented points" % (self.degree ** input_dim, self.max_nodes, 2 * input_dim + 1))
+        return quadrature.unscented(input_dim)
+
+    def _blocks(self, num_data, size):
+        # the rows of the blocks of data, each needing size kernel evaluations per data point
+        step = max(1, self.block_size // max(1, size))
+        for start in xrange(0, num_data, step):
+            yield slice(start, min(start + step, num_data))
+
+    def _inputs(self, mu, S, xi):
+        # the inputs at the nodes, (num_data * P) x input_dim
+        X = mu[:, None, :] + np.sqrt(S)[:, None, :] * xi[None, :, :]
+        return X.reshape(-1, mu.shape[1])
+
+    def _dmuS(self, dL_dX, S, xi, target_mu, target_S):
+        # the chain rule through x_np = mu_n + sqrt(S_n) xi_p
+        dL_dX = dL_dX.reshape(S.shape[0], xi.shape[0], S.shape[1])
+        target_mu += dL_dX.sum(1)
+        target_S += 0.5 * np.sum(dL_dX * xi[None, :, :], 1) / np.sqrt(S)
+
+    def _weighted(self, dL_dpsi1, weights):
+        # the gradient wrt the kernel at the nodes, (num_data * P) x M
+        return (dL_dpsi1[:, None, :] * weights[None, :, None]).reshape(-1, dL_dpsi1.shape[1])
+
+    def psi0(self, part, Z, mu, S, target):
+        xi, weights = self.nodes(mu.shape[1])
+        for rows in self._blocks(mu.shape[0], weights.size):
+            Kdiag = np.zeros((rows.stop - rows.start) * weights.size)
+            part.Kdiag(self._inputs(mu[rows], S[rows], xi), Kdiag)
+            target[rows] += np.dot(Kdiag.reshape(-1, weights.size), weights)
+
+    def dpsi0_dtheta(self, part, dL_dpsi0, Z, mu, S, target):
+        xi, weights = self.nodes(mu.shape[1])
+        for rows in self._blocks(mu.shape[0], weights.size):
+            dL_dKdiag = (dL_dpsi0[rows, None] * weights[None, :]).flatten()
+            part.dKdiag_dtheta(dL_dKdiag, self._inputs(mu[rows], S[rows], xi), target)
+
+    def dpsi0_dmuS(self, part, dL_dpsi0, Z, mu, S, target_mu, target_S):
+        xi, weights = self.nodes(mu.shape[1])
+        for rows in self._blocks(mu.shape[0], weights.size):
+            X = self._inputs(mu[rows], S[rows], xi)
+            dL_dX = np.zeros_like(X)
+            part.dKdiag_dX((dL_dpsi0[rows, None] * weights[None, :]).flatten(), X, dL_dX)
+            self._dmuS(dL_dX, S[rows], xi, target_mu[rows], target_S[rows])
+
+    def _psi1_blocks(self, part, Z, mu, S):
+        # the blocks of data, with the inputs and the kernel (num_data x P x M) at the nodes
+        xi, weights = self.nodes(mu.shape[1])
+        for rows in self._blocks(mu.shape[0], weights.size * Z.shape[0]):
+            X = self._inputs(mu[rows], S[rows], xi)
+            K = np.zeros((X.shape[0], Z.shape[0]))
+            part.K(X, Z, K)
+            yield rows, xi, weights, X, K.reshape(-1, weights.size, Z.shape[0])
+
+    def psi1(self, part, Z, mu, S, target):
+        for rows, xi, weights, X, K in self._psi1_blocks(part, Z, mu, S):
+            target[rows] += np.tensordot(K, weights, (1, 0))
+
+    def dpsi1_dtheta(self, part, dL_dpsi1, Z, mu, S, target):
+        xi, weights = self.nodes(mu.shape[1])
+        for rows in self._blocks(mu.shape[0], weights.size * Z.shape[0]):
+            part.dK_dtheta(self._weighted(dL_dpsi1[rows], weights), self._inputs(mu[rows], S[rows], xi), Z, target)
+
+    def dpsi1_dZ(self, part, dL_dpsi1, Z, mu, S, target):
+        # the kernel being symmetric, the gradient wrt Z is that wrt the first input of K(Z, X)
+        xi, weights = self.nodes(mu.shape[1])
+        for rows in self._blocks(mu.shape[0], weights.size * Z.shape[0]):
+            part.dK_dX(self._weighted(dL_dpsi1[rows], weights).T, Z, self._inputs(mu[rows], S[rows], xi), target)
+
+    def dpsi1_dmuS(self, part, dL_dpsi1, Z, mu, S, target_mu, target_S):
+        xi, weights = self.nodes(mu.shape[1])
+        for rows in self._blocks(mu.shape[0], weights.size * Z.shape[0]):
+            X = self._inputs(mu[rows], S[rows], xi)
+            dL_dX = np.zeros_like(X)
+            part.dK_dX(self._weighted(dL_dpsi1[rows], weights), X, Z, dL_dX)
+            self._dmuS(dL_dX, S[rows], xi, target_mu[rows], target_S[rows])
+
+    # psi2, of a part (term1 is term2) or the cross terms of two parts,
+    # each term being a (part, input_slice)
+
+    def _psi2_blocks(self, term1, term2, Z, mu, S):
+        # as _psi1_blocks, with the kernels of both terms, the nodes spanning the inputs of both
+        input_dim = mu.shape[1]
+        dims = np.union1d(_dims(term1[1], input_dim), _dims(term2[1], input_dim))
+        xi_dims, weights = self.nodes(dims.size)
+        xi = np.zeros((weights.size, input_dim))
+        xi[:, dims] = xi_dims
+        for rows in self._blocks(mu.shape[0], 2 * weights.size * Z.shape[0]):
+            X = self._inputs(mu[rows], S[rows], xi)
+            K1 = _K(term1, X, Z).reshape(-1, weights.size, Z.shape[0])
+            K2 = K1 if term2 is term1 else _K(term2, X, Z).reshape(K1.shape)
+            yield rows, xi, weights, X, K1, K2
+
+    def _dpsi2_dK(self, dL_dpsi2, rows, weights, K):
+        # the gradient wrt one kernel at the nodes given the other one, K, (num_data * P) x M
+        if dL_dpsi2.ndim == 2:
+            dL_dK = np.dot(K, dL_dpsi2 + dL_dpsi2.T)
+        else:
+            dL_dpsi2 = dL_dpsi2[rows]
+            dL_dK = np.einsum('npk,nmk->npm', K, dL_dpsi2 + dL_dpsi2.swapaxes(1, 2))
+        return (dL_dK * weights[None, :, None]).reshape(-1, K.shape[2])
+
+    def _independent(self, term1, term2, input_dim):
+        return np.intersect1d(_dims(term1[1], input_dim), _dims(term2[1], input_dim)).size == 0
+
+    def _psi1_pair(self, term1, term2, Z, mu, S):
+        psi1 = []
+        for part, input_slice in (term1, term2):
+            psi1.append(np.zeros((mu.shape[0], Z.shape[0])))
+            part.psi1(Z[:, input_slice], mu[:, input_slice], S[:, input_slice], psi1[-1])
+        return psi1
+
+    def _dpsi2_dpsi1(self, dL_dpsi2, psi1):
+        # the gradient wrt one psi1 of independent terms given the other one
+        if dL_dpsi2.ndim == 2:
+            return np.dot(psi1, dL_dpsi2 + dL_dpsi2.T)
+        return np.sum((dL_dpsi2 + dL_dpsi2.swapaxes(1, 2)) * psi1[:, None, :], 2)
+
+    def psi2(self, part, Z, mu, S, target):
+        term = (part, slice(None))
+        self._psi2(term, term, Z, mu, S, target)
+
+    def psi2_cross(self, term1, term2, Z, mu, S, target):
+        """
+        The cross terms <k1(x, z_m) k2(x, z_m') + k2(x, z_m) k1(x, z_m')>
+        of two parts. target is N x M x M, or M x M for the sum over the data.
+        Parts on disjoint inputs are independent: the closed form of the
+        product of their psi1 is used then.
+        """
+        if self._independent(term1, term2, mu.shape[1]):
+            psi1_1, psi1_2 = self._psi1_pair(term1, term2, Z, mu, S)
+            if target.ndim == 2:
+                psi2 = np.dot(psi1_1.T, psi1_2)
+            else:
+                psi2 = psi1_1[:, :, None] * psi1_2[:, None, :]
+            target += psi2 + psi2.swapaxes(-1, -2)
+        else:
+            self._psi2(term1, term2, Z, mu, S, target)
+
+    def _psi2(self, term1, term2, Z, mu, S, target):
+        for rows, xi, weights, X, K1, K2 in self._psi2_blocks(term1, term2, Z, mu, S):
+            K1 = K1 * weights[None, :, None]
+            if target.ndim == 2:
+                psi2 = np.tensordot(K1, K2, ([0, 1], [0, 1]))
+            else:
+                psi2 = np.einsum('npm,npk->nmk', K1, K2)
+            if term2 is not term1:
+                psi2 = psi2 + psi2.swapaxes(-1, -2)
+            if target.ndim == 2:
+                target += psi2
+            else:
+                target[rows] += psi2
+
+    def dpsi2_dtheta(self, part, dL_dpsi2, Z, mu, S, target):
+        term = (part, slice(None))
+        self._dpsi2_dtheta(dL_dpsi2, term, term, Z, mu, S, target, target)
+
+    def dpsi2_cross_dtheta(self, dL_dpsi2, term1, term2, Z, mu, S, target1, target2):
+        """The gradients of the parameters of both parts (see psi2_cross)."""
+        if self._independent(term1, term2, mu.shape[1]):
+            psi1_1, psi1_2 = self._psi1_pair(term1, term2, Z, mu, S)
+            for (part, input_slice), psi1, target in ((term1, psi1_2, target1), (term2, psi1_1, target2)):
+                part.dpsi1_dtheta(self._dpsi2_dpsi1(dL_dpsi2, psi1), Z[:, input_slice], mu[:, input_slice], S[:, input_slice], target)
+        else:
+            self._dpsi2_dtheta(dL_dpsi2, term1, term2, Z, mu, S, target1, target2)
+
+    def _dpsi2_dtheta(self, dL_dpsi2, term1, term2, Z, mu, S, target1, target2):
+        for rows, xi, weights, X, K1, K2 in self._psi2_blocks(term1, term2, Z, mu, S):
+            for (part, input_slice), K, target in _pairs(term1, term2, K1, K2, target1, target2):
+                part.dK_dtheta(self._dpsi2_dK(dL_dpsi2, rows, weights, K), X[:, input_slice], Z[:, input_slice], target)
+
+    # as the closed forms, dpsi2_dZ gives half of the gradient (see kern.dpsi2_dZ)
+
+    def dpsi2_dZ(self, part, dL_dpsi2, Z, mu, S, target):
+        term = (part, slice(None))
+        self.dpsi2_cross_dZ(dL_dpsi2, term, term, Z, mu, S, target)
+
+    def dpsi2_cross_dZ(self, dL_dpsi2, term1, term2, Z, mu, S, target):
+        if term1 is not term2 and self._independent(term1, term2, mu.shape[1]):
+            psi1_1, psi1_2 = self._psi1_pair(term1, term2, Z, mu, S)
+            for (part, input_slice), psi1 in ((term1, psi1_2), (term2, psi1_1)):
+                part.dpsi1_dZ(0.5 * self._dpsi2_dpsi1(dL_dpsi2, psi1), Z[:, input_slice], mu[:, input_slice], S[:, input_slice], target[:, input_slice])
+            return
+        for rows, xi, weights, X, K1, K2 in self._psi2_blocks(term1, term2, Z, mu, S):
+            for (part, input_slice), K, _ in _pairs(term1, term2, K1, K2, None, None):
+                dL_dK = 0.5 * self._dpsi2_dK(dL_dpsi2, rows, weights, K)
+                part.dK_dX(dL_dK.T, Z[:, input_slice], X[:, input_slice], target[:, input_slice])
+
+    def dpsi2_dmuS(self, part, dL_dpsi2, Z, mu, S, target_mu, target_S):
+        term = (part, slice(None))
+        self.dpsi2_cross_dmuS(dL_dpsi2, term, term, Z, mu, S, target_mu, target_S)
+
+    def dpsi2_cross_dmuS(self, dL_dpsi2, term1, term2, Z, mu, S, target_mu, target_S):
+        if term1 is not term2 and self._independent(term1, term2, mu.shape[1]):
+            psi1_1, psi1_2 = self._psi1_pair(term1, term2, Z, mu, S)
+            for (part, input_slice), psi1 in ((term1, psi1_2), (term2, psi1_1)):
+                part.dpsi1_dmuS(self._dpsi2_dpsi1(dL_dpsi2, psi1), Z[:, input_slice], mu[:, input_slice], S[:, input_slice],
+                                target_mu[:, input_slice], target_S[:, input_slice])
+            return
+        for rows, xi, weights, X, K1, K2 in self._psi2_blocks(term1, term2, Z, mu, S):
+            dL_dX = np.zeros_like(X)
+            for (part, input_slice), K, _ in _pairs(term1, term2, K1, K2, None, None):
+                part.dK_dX(self._dpsi2_dK(dL_dpsi2, rows, weights, K), X[:, input_slice], Z[:, input_slice], dL_dX[:, input_slice])
+            self._dmuS(dL_dX, S[rows], xi, target_mu[rows], target_S[rows])
+
+def _dims(input_slice, input_dim):
+    return np.arange(input_dim)[input_slice]
+
+def _K(term, X, Z):
+    part, input_slice = term
+    K = np.zeros((X.shape[0], Z.shape[0]))
+    part.K(X[:, input_slice], Z[:, input_slice], K)
+    return K
+
+def _pairs(term1, term2, K1, K2, target1, target2):
+    # each term with the kernel of the other one (and a target), a single term for psi2 of a part
+    if term2 is term1:
+        return [(term1, K1, target1)]
+    return [(term1, K2, target1), (term2, K1, target2)]
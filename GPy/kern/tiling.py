@@ -0,0 +1,168 @@
+# Copyright (c) 2013, GPy authors (see AUTHORS.txt).
+# Licensed under the BSD 3-clause license (see LICENSE.txt)
+
+import numpy as np
+from ..util.linalg import symmetric_tiles, matrix_tiles, symmetrify
+from ..util.parallel import thread_map, configured_num_threads, configured_tile_size
+
+class TileEngine(object):
+    """
+    Computes the covariance of the parts of a kernel, and its gradients,
+    tile by tile (blocks of rows of X and of columns of X2) on a pool of
+    threads, which write into the preallocated target. Each tile is
+    computed by a copy of the part (see Kernpart.tile_copy), and the
+    reductions over the tiles (dK_dtheta) by partial sums.
+
+    When X2 is None, only the tiles of the upper triangle of K are
+    computed. The parts which are not tileable, and all the parts when
+    there is one thread or a single tile, are computed as a whole.
+
+    :param num_threads: the number of threads, [parallel] num_threads by default
+    :type num_threads: int
+    :param tile_size: the size of the tiles, [parallel] tile_size by default
+    :type tile_size: int
+    """
+    def __init__(self, num_threads=None, tile_size=None):
+        self.num_threads = num_threads
+        self.tile_size = tile_size
+
+    def _settings(self):
+        num_threads = configured_num_threads() if self.num_threads is None else self.num_threads
+        tile_size = configured_tile_size() if self.tile_size is None else self.tile_size
+        return num_threads, tile_size
+
+    def _split(self, parts, num_rows, num_cols=0):
+        """The parts to compute tile by tile, and the others."""
+        num_threads, tile_size = self._settings()
+        if num_threads > 1 and max(num_rows, num_cols) > tile_size:
+            return [pi for pi in parts if pi[0].tileable], [pi for pi in parts if not pi[0].tileable]
+        return [], parts
+
+    def _map(self, compute, tiles):
+        return thread_map(compute, tiles, self._settings()[0])
+
+    def _row_blocks(self, num_rows):
+        tile_size = self._settings()[1]
+        return [slice(i, min(i + tile_size, num_rows)) for i in range(0, num_rows, tile_size)]
+
+    def _symmetric_tiles(self, num_data):
+        return symmetric_tiles(num_data, self._settings()[1])
+
+    def _matrix_tiles(self, num_rows, num_cols):
+        return matrix_tiles(num_rows, num_cols, self._settings()[1])
+
+    def K(self, parts, X, X2, target):
+        """
+        Add the covariance of the (part, input_slice) pairs parts to target.
+        """
+        tiled, whole = self._split(parts, X.shape[0], 0 if X2 is None else X2.shape[0])
+        if len(tiled):
+            if X2 is None:
+                K = np.zeros_like(target)
+                def compute(tile):
+                    rows, cols = tile
+                    for p, i_s in tiled:
+                        p.tile_copy().K(X[rows, i_s], None if rows == cols else X[cols, i_s], K[rows, cols])
+                self._map(compute, self._symmetric_tiles(X.shape[0]))
+                symmetrify(K, upper=True)
+                target += K
+            else:
+                def compute(tile):
+                    rows, cols = tile
+                    for p, i_s in tiled:
+                        p.tile_copy().K(X[rows, i_s], X2[cols, i_s], target[rows, cols])
+                self._map(compute, self._matrix_tiles(X.shape[0], X2.shape[0]))
+        for p, i_s in whole:
+            p.K(X[:, i_s], None if X2 is None else X2[:, i_s], target)
+
+    def K_and_cache(self, parts, X, X2, target):
+        """
+        Add the covariance of the (part, input_slice) pairs parts to target
+        like K, and return the cache of each part for dK_dtheta_from_cache
+        (see Kernpart.K_and_cache). The parts computed tile by tile keep no
+        intermediate results: their cache is None.
+        """
+        tiled, whole = self._split([(p, i_s, n) for n, (p, i_s) in enumerate(parts)], X.shape[0], 0 if X2 is None else X2.shape[0])
+        if len(tiled):
+            self.K([(p, i_s) for p, i_s, n in tiled], X, X2, target)
+        caches = [None] * len(parts)
+        for p, i_s, n in whole:
+            caches[n] = p.K_and_cache(X[:, i_s], None if X2 is None else X2[:, i_s], target)
+        return caches
+
+    def dK_dtheta_from_cache(self, parts, dL_dK, X, X2, caches, target):
+        """
+        Add the gradients of the parameters of the (part, input_slice,
+        param_slice) triples parts to target, from the caches returned by
+        K_and_cache, tile by tile for the parts without one.
+        """
+        tiled = [pi for pi, c in zip(parts, caches) if c is None]
+        if len(tiled):
+            self.dK_dtheta(tiled, dL_dK, X, X2, target)
+        for (p, i_s, ps), c in zip(parts, caches):
+            if c is not None:
+                p.dK_dtheta_from_cache(dL_dK, c, target[ps])
+
+    def Kdiag(self, parts, X, target):
+        """
+        Add the diagonal of the covariance of the (part, input_slice) pairs
+        parts to target.
+        """
+        tiled, whole = self._split(parts, X.shape[0])
+        if len(tiled):
+            def compute(rows):
+                for p, i_s in tiled:
+                    p.tile_copy().Kdiag(X[rows, i_s], target[rows])
+            self._map(compute, self._row_blocks(X.shape[0]))
+        for p, i_s in whole:
+            p.Kdiag(X[:, i_s], target)
+
+    def dK_dtheta(self, parts, dL_dK, X, X2, target):
+        """
+        Add the gradients of the parameters of the (part, input_slice,
+        param_slice) triples parts to target.
+        """
+        tiled, whole = self._split(parts, X.shape[0], 0 if X2 is None else X2.shape[0])
+        if len(tiled):
+            if X2 is None:
+                def compute(tile):
+                    rows, cols = tile
+                    partial = np.zeros_like(target)
+                    for p, i_s, ps in tiled:
+                        if rows == cols:
+                            p.tile_copy().dK_dtheta(dL_dK[rows, cols], X[rows, i_s], None, partial[ps])
+                        else:
+                            # the tile and its mirror image
+                            p.tile_copy().dK_dtheta(dL_dK[rows, cols] + dL_dK[cols, rows].T, X[rows, i_s], X[cols, i_s], partial[ps])
+                    return partial
+                tiles = self._symmetric_tiles(X.shape[0])
+            else:
+                def compute(tile):
+                    rows, cols = tile
+                    partial = np.zeros_like(target)
+                    for p, i_s, ps in tiled:
+                        p.tile_copy().dK_dtheta(dL_dK[rows, cols], X[rows, i_s], X2[cols, i_s], partial[ps])
+                    return partial
+                tiles = self._matrix_tiles(X.shape[0], X2.shape[0])
+            target += np.sum(self._map(compute, tiles), 0)
+        for p, i_s, ps in whole:
+            p.dK_dtheta(dL_dK, X[:, i_s], None if X2 is None else X2[:, i_s], target[ps])
+
+    def dK_dX(self, parts, dL_dK, X, X2, target):
+        """
+        Add the gradient with respect to X of the (part, input_slice)
+        pairs parts to target, by blocks of rows of X.
+        """
+        tiled, whole = self._split(parts, X.shape[0], 0 if X2 is None else X2.shape[0])
+        if len(tiled):
+            def compute(rows):
+                if X2 is None:
+                    # the rows appear in both arguments of the covariance
+                    dL_dK_rows, X_other = dL_dK[rows] + dL_dK[:, rows].T, X
+                else:
+                    dL_dK_rows, X_other = dL_dK[rows], X2
+                for p, i_s in tiled:
+                    p.tile_copy().dK_dX(dL_dK_rows, X[rows, i_s], X_other[:, i_s], target[rows, i_s])
+            self._map(compute, self._row_blocks(X.shape[0]))
+        for p, i_s in whole:
+            p.dK_dX(dL_dK, X[:, i_s], None if X2 is None else X2[:, i_s], target[:, i_s])
@@ -36,19 +36,32 @@ class Gaussian(likelihood):
 
         super(Gaussian, self).__init__()
 
-    def set_data(self, data):
-        self.data = data
-        self.N, D = data.shape
+    def data_terms(self, data):
+        """
+        The normalized data Y, with YYT, trYYT and YYT_factor: the terms of
+        set_data which only depend on the data, which may be computed
+        beforehand (e.g. in another thread).
+        """
+        N, D = data.shape
         assert D == self.output_dim
-        self.Y = (self.data - self._offset) / self._scale
-        if D > self.N:
-            self.YYT = np.dot(self.Y, self.Y.T)
-            self.trYYT = np.trace(self.YYT)
-            self.YYT_factor = jitchol(self.YYT)
-        else:
-            self.YYT = None
-            self.trYYT = np.sum(np.square(self.Y))
-            self.YYT_factor = self.Y
+        Y = (data - self._offset) / self._scale
+        if D > N:
+            YYT = np.dot(Y, Y.T)
+            return Y, YYT, np.trace(YYT), jitchol(YYT)
+        return Y, None, np.sum(np.square(Y)), Y
+
+    def set_data(self, data, data_terms=None):
+        """
+        :param data_terms: the result of self.data_terms(data), computed if None
+        """
+        self.data = data
+        self.N = data.shape[0]
+        if data_terms is None:
+            data_terms = self.data_terms(data)
+        self.Y, self.YYT, self.trYYT, self.YYT_factor = data_terms
+        if hasattr(self, '_variance'):
+            # the noise dependent terms must follow the new data
+            self._set_noise_terms()
 
     def _get_params(self):
         return np.asarray(self._variance)
@@ -59,15 +72,26 @@ class Gaussian(likelihood):
     def _set_params(self, x):
         x = np.float64(x)
         if np.all(self._variance != x):
-            if x == 0.:#special case of zero noise
-                self.precision = np.inf
-                self.V = None
-            else:
-                self.precision = 1. / x
-                self.V = (self.precision) * self.Y
-                self.VVT_factor = self.precision * self.YYT_factor
-            self.covariance_matrix = np.eye(self.N) * x
             self._variance = x
+            self._set_noise_terms()
+
+    def _set_noise_terms(self):
+        x = self._variance
+        if x == 0.:#special case of zero noise
+            self.precision = np.inf
+            self.V = None
+        else:
+            self.precision = 1. / x
+            self.V = (self.precision) * self.Y
+            self.VVT_factor = self.precision * self.YYT_factor
+
+    @property
+    def covariance_matrix(self):
+        """
+        The (dense) noise covariance, built on demand: models which only need
+        the noise variance should use self._variance instead.
+        """
+        return np.eye(self.N) * self._variance
 
     def predictive_values(self, mu, var, full_cov, **likelihood_args):
         """
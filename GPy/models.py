@@ -16,8 +16,17 @@ __updated__ = '2013-11-28'
 
 from models_modules.bayesian_gplvm import BayesianGPLVM, BayesianGPLVMWithMissingData
 from models_modules.gp_regression import GPRegression
+from models_modules.iterative_gp_regression import IterativeGPRegression
+from models_modules.toeplitz_gp_regression import ToeplitzGPRegression
+from models_modules.kiss_gp_regression import KISSGPRegression
+from models_modules.spectral_gp_regression import SpectralGPRegression
+from models_modules.grid_gp_regression import GridGPRegression
+from models_modules.rff_regression import RFFRegression
+from models_modules.state_space_gp_regression import StateSpaceGPRegression
 from models_modules.gp_classification import GPClassification#; _gp_classification = gp_classification ; del gp_classification 
 from models_modules.sparse_gp_regression import SparseGPRegression#; _sparse_gp_regression = sparse_gp_regression ; del sparse_gp_regression 
+from models_modules.chunked_sparse_gp_regression import ChunkedSparseGPRegression
+from models_modules.distributed_sparse_gp_regression import DistributedSparseGPRegression
 from models_modules.svigp_regression import SVIGPRegression#; _svigp_regression = svigp_regression ; del svigp_regression 
 from models_modules.sparse_gp_classification import SparseGPClassification#; _sparse_gp_classification = sparse_gp_classification ; del sparse_gp_classification 
 from models_modules.fitc_classification import FITCClassification#; _fitc_classification = fitc_classification ; del fitc_classification 
@@ -26,6 +35,7 @@ from models_modules.bcgplvm import BCGPLVM#; _bcgplvm = bcgplvm; del bcgplvm
 from models_modules.sparse_gplvm import SparseGPLVM#; _sparse_gplvm = sparse_gplvm ; del sparse_gplvm 
 from models_modules.warped_gp import WarpedGP#; _warped_gp = warped_gp ; del warped_gp 
 from models_modules.bayesian_gplvm import BayesianGPLVM#; _bayesian_gplvm = bayesian_gplvm ; del bayesian_gplvm 
+from models_modules.distributed_bayesian_gplvm import DistributedBayesianGPLVM
 from models_modules.mrd import MRD#; _mrd = mrd; del mrd 
 from models_modules.gradient_checker import GradientChecker#; _gradient_checker = gradient_checker ; del gradient_checker 
 from models_modules.gp_multioutput_regression import GPMultioutputRegression#; _gp_multioutput_regression = gp_multioutput_regression ; del gp_multioutput_regression 
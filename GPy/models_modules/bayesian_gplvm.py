@@ -128,7 +128,10 @@ class BayesianGPLVM(SparseGP, GPLVM):
         covars = np.zeros((N_test, input_dim))
 
         dpsi0 = -0.5 * self.input_dim * self.likelihood.precision
-        dpsi2 = self.dL_dpsi2[0][None, :, :] # TODO: this may change if we ignore het. likelihoods
+        if self.dL_dpsi2.ndim == 2:
+            dpsi2 = self.dL_dpsi2[None, :, :] # shared by all the data, the likelihood being homoscedastic
+        else:
+            dpsi2 = self.dL_dpsi2[0][None, :, :] # TODO: this may change if we ignore het. likelihoods
         V = self.likelihood.precision * Y
 
         #compute CPsi1V
@@ -0,0 +1,95 @@
+# Copyright (c) 2013, GPy authors (see AUTHORS.txt).
+# Licensed under the BSD 3-clause license (see LICENSE.txt)
+
+
+import numpy as np
+from ..core import SparseGPFromStatistics
+from ..core.sparse_gp_statistics import data_statistics, data_gradients
+from .. import likelihoods
+from .. import kern
+from ..util.data_chunks import DataChunks
+
+class ChunkedSparseGPRegression(SparseGPFromStatistics):
+    """
+    Sparse GP regression for data sets which do not fit in memory, read
+    chunk by chunk from arrays (e.g. np.memmap) or from a function which
+    returns an iterator over (X, Y) chunks (see GPy.util.data_chunks).
+
+    The collapsed bound of SparseGPRegression only depends on the data
+    through the sums
+
+        psi0 = sum_n k(x_n, x_n),  psi1^T Y,  psi2 = psi1^T psi1,  trace(Y^T Y)
+
+    which are accumulated in a pass over the chunks whenever the kernel or Z
+    change (see GPy.core.SparseGPFromStatistics). The gradients wrt the
+    kernel and Z take a second pass. Changes
+    of the noise alone need no pass over the data. The memory is
+    O(num_inducing^2 + chunk_size num_inducing), whatever the number of data.
+
+    :param X: input observations (num_data x input_dim), or a function returning an iterator over the (X, Y) chunks, or a DataChunks
+    :param Y: observed values (num_data x output_dim), None if X is a function
+    :param kernel: a GPy kernel, defaults to rbf
+    :param Z: inducing inputs, defaults to a subset of the first chunk
+    :type Z: np.ndarray (num_inducing x input_dim) | None
+    :param num_inducing: Number of inducing points (ignored if Z is not None)
+    :type num_inducing: int
+    :param chunk_size: the number of rows of the chunks of X and Y (arrays only)
+    :type chunk_size: int
+    :param normalize_X:  whether to normalize the input data before computing (predictions will be in original scales)
+    :type normalize_X: False|True
+    :param normalize_Y:  whether to normalize the output data before computing (predictions will be in original scales)
+    :type normalize_Y: False|True
+
+    .. Note:: Gaussian likelihood and certain inputs only. self.X and self.likelihood only hold the first chunk of the data.
+    """
+    def __init__(self, X, Y=None, kernel=None, Z=None, num_inducing=10, chunk_size=10000, normalize_X=False, normalize_Y=False):
+        self.data = X if isinstance(X, DataChunks) else DataChunks(X, Y, chunk_size)
+        X_first, Y_first = self.data.first()
+        if normalize_X or normalize_Y:
+            X_offset, X_scale, Y_offset, Y_scale = self.data.moments()
+
+        if kernel is None:
+            kernel = kern.rbf(self.data.input_dim)
+
+        # Z defaults to a subset of the first chunk
+        if Z is None:
+            i = np.random.permutation(X_first.shape[0])[:num_inducing]
+            Z = X_first[i].copy()
+        else:
+            assert Z.shape[1] == self.data.input_dim
+
+        likelihood = likelihoods.Gaussian(Y_first)
+        if normalize_Y:
+            # Don't scale outputs which have zero variance to zero.
+            Y_scale[np.nonzero(Y_scale == 0.)] = 1.0e-3
+            likelihood._offset, likelihood._scale = Y_offset, Y_scale
+            likelihood.set_data(Y_first)
+
+        SparseGPFromStatistics.__init__(self, X_first, likelihood, kernel, Z=Z)
+        if normalize_X:
+            self._Xoffset, self._Xscale = X_offset, X_scale
+            self.X = (X_first - X_offset) / X_scale
+            self.Z = (self.Z - X_offset) / X_scale
+        self.ensure_default_constraints()
+        self._set_params(self._get_params())
+
+    def _chunks(self):
+        """The normalized (X, Y) chunks."""
+        for X, Y in self.data:
+            yield (X - self._Xoffset) / self._Xscale, (Y - self.likelihood._offset) / self.likelihood._scale
+            # the cached distances of a chunk are of no use for the next ones
+            self.kern.distances.clear()
+
+    def _sum_statistics(self):
+        statistics = [0, 0., 0., 0., 0.]
+        for X, Y in self._chunks():
+            statistics = [a + b for a, b in zip(statistics, data_statistics(self.kern, self.Z, Y, X))]
+        return statistics
+
+    def _sum_gradients(self):
+        dL_dtheta, dL_dZ = 0., 0.
+        for X, Y in self._chunks():
+            dL_dtheta_chunk, dL_dZ_chunk, _, _ = data_gradients(self.kern, self.Z, Y, X, None, self.dL_dpsi0, self.VCpsi1Vf, self.dL_dpsi2)
+            dL_dtheta += dL_dtheta_chunk
+            dL_dZ += dL_dZ_chunk
+        return dL_dtheta, dL_dZ
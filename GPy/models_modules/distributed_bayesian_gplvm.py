@@ -0,0 +1,93 @@
+# Copyright (c) 2013, GPy authors (see AUTHORS.txt).
+# Licensed under the BSD 3-clause license (see LICENSE.txt)
+
+import numpy as np
+import multiprocessing
+from ..core.sparse_gp_statistics import SparseGPFromStatistics, DataShard
+from ..likelihoods import Gaussian
+from ..util import parallel
+from bayesian_gplvm import BayesianGPLVM
+
+class DistributedBayesianGPLVM(BayesianGPLVM, SparseGPFromStatistics):
+    """
+    Bayesian Gaussian Process Latent Variable Model with the rows of Y spread
+    over several processes, of this machine or of others (see
+    GPy.util.parallel.serve).
+
+    Each process holds a shard of Y, and computes its part of the psi
+    statistics and of their gradients (see GPy.core.SparseGPFromStatistics)
+    for the kernel parameters, Z and the latent means and variances of the
+    shard sent at each evaluation, which this model adds up.
+
+    :param Y: observed data (np.ndarray) or GPy.likelihood
+    :type Y: np.ndarray| GPy.likelihood instance
+    :param input_dim: latent dimensionality
+    :type input_dim: int
+    :param num_workers: the number of processes of this machine, defaults to the number of cpus (ignored if addresses is not None)
+    :type num_workers: int
+    :param addresses: the (host, port) of the processes serving the shards, None for processes of this machine
+    :param authkey: the key of the processes at addresses, required with them
+
+    The other arguments are those of BayesianGPLVM.
+
+    .. Note:: homoscedastic Gaussian likelihood only. The psi statistics of the data are not kept in the model. The processes of this machine are stopped by close().
+    """
+    def __init__(self, likelihood_or_Y, input_dim, num_workers=None, addresses=None, authkey=None, **kwargs):
+        if addresses is not None:
+            num_workers = len(addresses)
+        elif num_workers is None:
+            num_workers = multiprocessing.cpu_count()
+        self.addresses, self.authkey = addresses, authkey
+        self._workers = None
+        num_data = likelihood_or_Y.shape[0] if type(likelihood_or_Y) is np.ndarray else likelihood_or_Y.N
+        bounds = np.linspace(0, num_data, min(num_workers, num_data) + 1).astype(int)
+        self._slices = [slice(i, j) for i, j in zip(bounds[:-1], bounds[1:])]
+        BayesianGPLVM.__init__(self, likelihood_or_Y, input_dim, **kwargs)
+        assert isinstance(self.likelihood, Gaussian) and self.likelihood.is_heteroscedastic is False
+
+    def _shards(self):
+        """The shards of Y, sent to the workers when first used."""
+        if self._workers is None:
+            shards = [DataShard(self.kern, self.likelihood.Y[s]) for s in self._slices]
+            if self.addresses is None:
+                self._workers = parallel.process_objects(shards)
+            else:
+                self._workers = parallel.socket_objects(shards, self.addresses[:len(shards)], self.authkey)
+        return self._workers
+
+    def close(self):
+        """Stop the workers, which are started again if needed."""
+        if self._workers is not None:
+            self._workers.close()
+            self._workers = None
+
+    def _varying_data(self):
+        return [self.X, self.X_variance]
+
+    def _sum_statistics(self):
+        theta = self.kern._get_params()
+        args = [(theta, self.Z, self.X[s], self.X_variance[s]) for s in self._slices]
+        statistics = self._shards().map('statistics', args)
+        return [sum(s) for s in zip(*statistics)]
+
+    def _sum_gradients(self):
+        theta = self.kern._get_params()
+        args = [(theta, self.Z, self.X[s], self.X_variance[s], self.dL_dpsi0, self.VCpsi1Vf, self.dL_dpsi2) for s in self._slices]
+        gradients = self._shards().map('gradients', args)
+        # the gradients wrt the latent means and variances are kept for dL_dmuS
+        self._dL_dmu = np.vstack([g[2] for g in gradients])
+        self._dL_dS = np.vstack([g[3] for g in gradients])
+        return sum(g[0] for g in gradients), sum(g[1] for g in gradients)
+
+    def dL_dmuS(self):
+        return self._dL_dmu, self._dL_dS
+
+    def log_likelihood(self):
+        return SparseGPFromStatistics.log_likelihood(self) - self.KL_divergence()
+
+    def _log_likelihood_gradients(self):
+        self.dbound_dZtheta = SparseGPFromStatistics._log_likelihood_gradients(self)
+        dKL_dmu, dKL_dS = self.dKL_dmuS()
+        dL_dmu, dL_dS = self.dL_dmuS()
+        self.dbound_dmuS = np.hstack(((dL_dmu - dKL_dmu).flatten(), (dL_dS - dKL_dS).flatten()))
+        return np.hstack((self.dbound_dmuS, self.dbound_dZtheta))
@@ -0,0 +1,76 @@
+# Copyright (c) 2013, GPy authors (see AUTHORS.txt).
+# Licensed under the BSD 3-clause license (see LICENSE.txt)
+
+
+import numpy as np
+import multiprocessing
+from ..core.sparse_gp_statistics import DataShard
+from ..util import parallel
+from chunked_sparse_gp_regression import ChunkedSparseGPRegression
+
+class DistributedSparseGPRegression(ChunkedSparseGPRegression):
+    """
+    Sparse GP regression with the data spread over several processes, of
+    this machine or of others (see GPy.util.parallel.serve).
+
+    Each process holds a shard of the data, and computes its part of the
+    sums of the bound and of their gradients (see
+    GPy.core.SparseGPFromStatistics) for the kernel parameters and Z sent
+    at each evaluation, which this model adds up. The messages are
+    O(num_inducing^2 output_dim), whatever the number of data.
+
+    :param X: input observations (num_data x input_dim)
+    :param Y: observed values (num_data x output_dim)
+    :param kernel: a GPy kernel, defaults to rbf
+    :param Z: inducing inputs, defaults to a subset of the first shard
+    :type Z: np.ndarray (num_inducing x input_dim) | None
+    :param num_inducing: Number of inducing points (ignored if Z is not None)
+    :type num_inducing: int
+    :param num_workers: the number of processes of this machine, defaults to the number of cpus (ignored if addresses is not None)
+    :type num_workers: int
+    :param addresses: the (host, port) of the processes serving the shards, None for processes of this machine
+    :param authkey: the key of the processes at addresses, required with them
+    :param normalize_X:  whether to normalize the input data before computing (predictions will be in original scales)
+    :type normalize_X: False|True
+    :param normalize_Y:  whether to normalize the output data before computing (predictions will be in original scales)
+    :type normalize_Y: False|True
+
+    .. Note:: Gaussian likelihood and certain inputs only. self.X and self.likelihood only hold the first shard of the data. The processes of this machine are stopped by close().
+    """
+    def __init__(self, X, Y, kernel=None, Z=None, num_inducing=10, num_workers=None, addresses=None, authkey=None, normalize_X=False, normalize_Y=False):
+        if addresses is not None:
+            num_workers = len(addresses)
+        elif num_workers is None:
+            num_workers = multiprocessing.cpu_count()
+        self.addresses, self.authkey = addresses, authkey
+        self._workers = None
+        chunk_size = int(np.ceil(X.shape[0] / float(num_workers)))
+        ChunkedSparseGPRegression.__init__(self, X, Y, kernel=kernel, Z=Z, num_inducing=num_inducing, chunk_size=chunk_size,
+                                           normalize_X=normalize_X, normalize_Y=normalize_Y)
+
+    def _shards(self):
+        """The shards of the data, sent to the workers when first used."""
+        if self._workers is None:
+            shards = [DataShard(self.kern, Y, X) for X, Y in self._chunks()]
+            if self.addresses is None:
+                self._workers = parallel.process_objects(shards)
+            else:
+                self._workers = parallel.socket_objects(shards, self.addresses[:len(shards)], self.authkey)
+        return self._workers
+
+    def close(self):
+        """Stop the workers, which are started again if needed."""
+        if self._workers is not None:
+            self._workers.close()
+            self._workers = None
+
+    def _sum_statistics(self):
+        shards = self._shards()
+        statistics = shards.map('statistics', [(self.kern._get_params(), self.Z)] * len(shards))
+        return [sum(s) for s in zip(*statistics)]
+
+    def _sum_gradients(self):
+        shards = self._shards()
+        args = (self.kern._get_params(), self.Z, None, None, self.dL_dpsi0, self.VCpsi1Vf, self.dL_dpsi2)
+        gradients = shards.map('gradients', [args] * len(shards))
+        return sum(g[0] for g in gradients), sum(g[1] for g in gradients)
@@ -0,0 +1,183 @@
+# Copyright (c) 2013, GPy authors (see AUTHORS.txt).
+# Licensed under the BSD 3-clause license (see LICENSE.txt)
+
+
+import numpy as np
+from gp_regression import GPRegression
+from .. import kern
+from ..kern.parts.prod import Prod
+from ..util.kronecker import kron_mvprod, kron_vec, khatri_rao, unfold, grid_structure
+
+def tensor_factors(kernel):
+    """
+    Split a kernel made of tensor products (see kern.prod(..., tensor=True))
+    into its factors.
+
+    :returns: a list of (part, columns, param_slice), the Kernpart of each
+        factor, the input columns it acts on and the slice of its parameters
+        in the parameters of the kernel.
+    """
+    assert kernel.num_parts == 1, "the kernel must be a single (tensor) product"
+    factors = []
+    def split(part, columns, start):
+        if isinstance(part, Prod) and part.slice1 != part.slice2:
+            split(part.k1, columns[part.slice1], start)
+            split(part.k2, columns[part.slice2], start + part.k1.num_params)
+        else:
+            factors.append((part, columns, slice(start, start + part.num_params)))
+    split(kernel.parts[0], np.arange(kernel.input_dim)[kernel.input_slices[0]], kernel.param_slices[0].start)
+    return factors
+
+class GridGPRegression(GPRegression):
+    """
+    Gaussian Process model for regression with inputs on a Cartesian grid
+    and a kernel which is a tensor product of kernels, one for each
+    dimension of the grid (e.g. kern.rbf(1) ** kern.rbf(1)).
+
+    The covariance matrix is then the Kronecker product of the covariance
+    matrices of each dimension, K = K_1 x ... x K_D, whose
+    eigendecomposition is the Kronecker product of the eigendecompositions
+    of the K_d. Inference only uses these, and costs O(D N^(1+1/D)) for N
+    points on a grid of D dimensions of equal sizes, instead of O(N^3).
+    The N x N matrices are never formed (except by the Ki and dL_dK
+    properties, for compatibility).
+
+    :param X: input observations, all the combinations of the points of each dimension, in any order
+    :param Y: observed values
+    :param kernel: a GPy kernel, a tensor product of kernels. Defaults to a product of 1-D rbf kernels.
+    :param normalize_X:  whether to normalize the input data before computing (predictions will be in original scales)
+    :type normalize_X: False|True
+    :param normalize_Y:  whether to normalize the input data before computing (predictions will be in original scales)
+    :type normalize_Y: False|True
+
+    .. Note:: Gaussian likelihoods only. Multiple independent outputs are allowed using columns of Y
+    """
+    def __init__(self, X, Y, kernel=None, normalize_X=False, normalize_Y=False):
+        if kernel is None:
+            kernel = reduce(lambda k1, k2: k1 ** k2, [kern.rbf(1) for i in range(X.shape[1])])
+        assert not (len(kernel.tied_indices) or len(kernel.fixed_indices)), "constrain the model, not the kernel"
+        GPRegression.__init__(self, X, Y, kernel=kernel, normalize_X=normalize_X, normalize_Y=normalize_Y)
+
+    def update_likelihood_approximation(self, **kwargs):
+        """
+        The likelihood is Gaussian, so no approximation is required: this
+        only updates the model, without forming the covariance matrix.
+        """
+        self._set_params(self._get_params())
+
+    def _set_params(self, p):
+        self.kern._set_params_transformed(p[:self.kern.num_params_transformed()])
+        self.likelihood._set_params_transformed(p[self.kern.num_params_transformed():])
+
+        if self._has_changed('grid', self.X):
+            self._factors = tensor_factors(self.kern)
+            self.Ks, self.Qs, self.Lambdas = [[None] * len(self._factors) for i in range(3)]
+            grid = grid_structure(self.X, [columns for part, columns, ps in self._factors])
+            assert grid is not None, "the inputs are not a grid matching the factors of the kernel"
+            self.points, self._perm = grid
+            self.grid_shape = [points.shape[0] for points in self.points]
+
+        # the eigendecomposition of each factor is only updated with its parameters
+        for d, (part, columns, ps) in enumerate(self._factors):
+            if self._has_changed(('grid_factor', d), part._get_params()) or self.Ks[d] is None:
+                self.Ks[d] = np.zeros((self.grid_shape[d], self.grid_shape[d]))
+                part.K(self.points[d], None, self.Ks[d])
+                Lambda, self.Qs[d] = np.linalg.eigh(self.Ks[d])
+                self.Lambdas[d] = np.clip(Lambda, 0., np.inf)
+
+        # the eigenvalues of K, and Q^T K^{-1} Y, in the order of the grid
+        self.spectrum = kron_vec(self.Lambdas) + self.likelihood._variance
+        self.QTY = kron_mvprod([Q.T for Q in self.Qs], self.likelihood.Y[self._perm])
+        self.QTalpha = self.QTY / self.spectrum[:, None]
+        self.K_logdet = np.sum(np.log(self.spectrum))
+
+    def _model_fit_term(self):
+        return -0.5 * np.sum(self.QTY * self.QTalpha)
+
+    @property
+    def alpha(self):
+        alpha = np.empty((self.num_data, self.output_dim))
+        alpha[self._perm] = kron_mvprod(self.Qs, self.QTalpha)
+        return alpha
+
+    @property
+    def Ki(self):
+        Q = reduce(np.kron, self.Qs)
+        Ki = np.empty((self.num_data, self.num_data))
+        Ki[np.ix_(self._perm, self._perm)] = np.dot(Q / self.spectrum, Q.T)
+        return Ki
+
+    @property
+    def dL_dK(self):
+        alpha = self.alpha
+        return 0.5 * (np.dot(alpha, alpha.T) - self.output_dim * self.Ki)
+
+    def _log_likelihood_gradients(self):
+        """
+        The gradient of all parameters.
+
+        The gradient of the parameters of factor d only needs the n_d x n_d
+        matrix dL_dK_d such that trace(dL_dK dK_dtheta) = trace(dL_dK_d dK_d_dtheta),
+            dL_dK_d = 0.5 * (A_d W_d^T - output_dim * Q_d diag(c_d) Q_d^T)
+        where A_d is the unfolding of alpha along dimension d, W_d the one
+        of alpha multiplied by the other factors, and c_d the sum of the
+        other eigenvalues over the spectrum of K.
+        """
+        alpha = kron_mvprod(self.Qs, self.QTalpha)
+        w = (1. / self.spectrum).reshape(self.grid_shape)
+        D = len(self._factors)
+        dL_dtheta = np.zeros(self.kern.num_params)
+        for d, (part, columns, ps) in enumerate(self._factors):
+            W = kron_mvprod([None if e == d else Ke for e, Ke in enumerate(self.Ks)], alpha)
+            M = np.dot(unfold(alpha, self.grid_shape, d), unfold(W, self.grid_shape, d).T)
+            c = w
+            for e in range(D):
+                if e != d:
+                    shape = [1] * D
+                    shape[e] = self.grid_shape[e]
+                    c = c * self.Lambdas[e].reshape(shape)
+            c = unfold(c, self.grid_shape, d).sum(1)
+            dL_dKd = 0.5 * (M - self.output_dim * np.dot(self.Qs[d] * c, self.Qs[d].T))
+            part.dK_dtheta(dL_dKd, self.points[d], None, dL_dtheta[ps])
+        dL_dnoise = -0.5 * self.output_dim * np.sum(1. / self.spectrum) + 0.5 * np.sum(np.square(alpha))
+        return np.hstack((self.kern._transform_gradients(dL_dtheta), dL_dnoise))
+
+    def _raw_predict(self, _Xnew, which_parts='all', full_cov=False, stop=False):
+        """
+        Internal helper function for making predictions, does not account
+        for normalization or likelihood
+
+        The cross covariances are products over the dimensions of the grid,
+        so that Q^T Kx is formed from the factors in O(N) per point.
+        """
+        num_new = _Xnew.shape[0]
+        chunksize = self._predict_chunksize()
+        mu = np.empty((num_new, self.output_dim))
+        if full_cov:
+            QTKx_all = np.empty((self.num_data, num_new))
+        else:
+            var = np.empty((num_new, 1))
+        for start in range(0, num_new, chunksize):
+            s = slice(start, min(start + chunksize, num_new))
+            QTKx_factors = []
+            for d, (part, columns, ps) in enumerate(self._factors):
+                Kx = np.zeros((self.grid_shape[d], s.stop - s.start))
+                part.K(self.points[d], _Xnew[s][:, columns], Kx)
+                QTKx_factors.append(np.dot(self.Qs[d].T, Kx))
+            QTKx = khatri_rao(QTKx_factors)
+            mu[s] = np.dot(QTKx.T, self.QTalpha)
+            if full_cov:
+                QTKx_all[:, s] = QTKx
+            else:
+                var[s, 0] = self.kern.Kdiag(_Xnew[s], which_parts=which_parts) - np.sum(np.square(QTKx) / self.spectrum[:, None], 0)
+        if full_cov:
+            var = self.kern.K(_Xnew, which_parts=which_parts) - np.dot(QTKx_all.T / self.spectrum, QTKx_all)
+        if stop:
+            debug_this # @UndefinedVariable
+        return mu, var
+
+    def getstate(self):
+        return GPRegression.getstate(self)
+
+    def setstate(self, state):
+        GPRegression.setstate(self, state)
@@ -0,0 +1,47 @@
+# Copyright (c) 2013, GPy authors (see AUTHORS.txt).
+# Licensed under the BSD 3-clause license (see LICENSE.txt)
+
+
+from ..core import IterativeGP
+from .. import likelihoods
+from .. import kern
+
+class IterativeGPRegression(IterativeGP):
+    """
+    Gaussian Process model for regression with matrix-free inference, for
+    datasets too large to store (or factorize) the covariance matrix.
+
+    This is a thin wrapper around the core.IterativeGP class, with a set of sensible defaults
+
+    :param X: input observations
+    :param Y: observed values
+    :param kernel: a GPy kernel, defaults to rbf
+    :param normalize_X:  whether to normalize the input data before computing (predictions will be in original scales)
+    :type normalize_X: False|True
+    :param normalize_Y:  whether to normalize the input data before computing (predictions will be in original scales)
+    :type normalize_Y: False|True
+    :param num_probes: the number of probe vectors of the stochastic estimators
+    :type num_probes: int
+    :param block_size: the number of rows of K computed at once
+    :type block_size: int
+    :param tol: relative tolerance of the conjugate gradient solves
+    :param maxiter: maximum number of conjugate gradient iterations (default: num_data)
+
+    .. Note:: Multiple independent outputs are allowed using columns of Y
+
+    """
+
+    def __init__(self, X, Y, kernel=None, normalize_X=False, normalize_Y=False, num_probes=20, block_size=500, tol=1e-6, maxiter=None):
+        if kernel is None:
+            kernel = kern.rbf(X.shape[1])
+
+        likelihood = likelihoods.Gaussian(Y, normalize=normalize_Y)
+
+        IterativeGP.__init__(self, X, likelihood, kernel, normalize_X=normalize_X, num_probes=num_probes, block_size=block_size, tol=tol, maxiter=maxiter)
+        self.ensure_default_constraints()
+
+    def getstate(self):
+        return IterativeGP.getstate(self)
+
+    def setstate(self, state):
+        return IterativeGP.setstate(self, state)
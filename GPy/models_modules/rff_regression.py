@@ -0,0 +1,109 @@
+# Copyright (c) 2013, GPy authors (see AUTHORS.txt).
+# Licensed under the BSD 3-clause license (see LICENSE.txt)
+
+
+import numpy as np
+from gp_regression import GPRegression
+from .. import kern
+from ..util.linalg import jitchol, dpotrs, dtrtrs
+
+class RFFRegression(GPRegression):
+    """
+    Gaussian Process regression with a kernel which has an explicit,
+    finite feature map Phi (e.g. kern.rbf_rff, kern.matern_rff, or sums
+    with the bias and linear kernels), as Bayesian linear regression in
+    feature space:
+
+        Y = Phi(X) w + noise,   w ~ N(0, I)
+
+    The N x N covariance matrix K = Phi Phi^T + noise * I is never formed:
+    the marginal likelihood and the posterior of w only need the F x F
+    matrix A = Phi^T Phi + noise * I (Woodbury), so a likelihood evaluation
+    costs O(N F^2) for F features, linear in the number of data. Phi^T Phi
+    is only recomputed when the kernel parameters change, so changes of the
+    noise alone cost O(F^3).
+
+    :param X: input observations
+    :param Y: observed values
+    :param kernel: a GPy kernel with features, defaults to rbf_rff
+    :param normalize_X:  whether to normalize the input data before computing (predictions will be in original scales)
+    :type normalize_X: False|True
+    :param normalize_Y:  whether to normalize the input data before computing (predictions will be in original scales)
+    :type normalize_Y: False|True
+
+    .. Note:: Gaussian likelihoods only. Multiple independent outputs are allowed using columns of Y
+    """
+    def __init__(self, X, Y, kernel=None, normalize_X=False, normalize_Y=False):
+        if kernel is None:
+            kernel = kern.rbf_rff(X.shape[1])
+        GPRegression.__init__(self, X, Y, kernel=kernel, normalize_X=normalize_X, normalize_Y=normalize_Y)
+
+    def update_likelihood_approximation(self, **kwargs):
+        """
+        The likelihood is Gaussian, so no approximation is required: this
+        only updates the model, without forming the covariance matrix.
+        """
+        self._set_params(self._get_params())
+
+    def _set_params(self, p):
+        self.kern._set_params_transformed(p[:self.kern.num_params_transformed()])
+        self.likelihood._set_params_transformed(p[self.kern.num_params_transformed():])
+
+        if self._has_changed('features', self.kern._get_params(), self.X, self.likelihood.Y):
+            self.Phi = self.kern.features(self.X)
+            self.PhiTPhi = np.dot(self.Phi.T, self.Phi)
+            self.PhiTY = np.dot(self.Phi.T, self.likelihood.Y)
+            self._trYYT = np.sum(np.square(self.likelihood.Y))
+
+        noise = self.likelihood._variance
+        num_features = self.Phi.shape[1]
+        A = self.PhiTPhi + noise * np.eye(num_features)
+        self.LA = jitchol(A)
+        # the posterior mean of the weights
+        self.w_mean, _ = dpotrs(self.LA, np.asfortranarray(self.PhiTY), lower=1)
+        self.K_logdet = (self.num_data - num_features) * np.log(noise) + 2. * np.sum(np.log(np.diag(self.LA)))
+
+    def _model_fit_term(self):
+        return -0.5 * (self._trYYT - np.sum(self.PhiTY * self.w_mean)) / self.likelihood._variance
+
+    @property
+    def alpha(self):
+        return (self.likelihood.Y - np.dot(self.Phi, self.w_mean)) / self.likelihood._variance
+
+    def _log_likelihood_gradients(self):
+        """
+        The gradient of all parameters.
+
+        With dL_dK = 0.5 * (alpha alpha^T - D K^{-1}) and K^{-1} Phi = Phi A^{-1},
+        dL_dPhi = alpha (alpha^T Phi) - D Phi A^{-1}, which the kernel turns
+        into the gradient of its parameters.
+        """
+        noise = self.likelihood._variance
+        num_features = self.Phi.shape[1]
+        alpha = self.alpha
+        PhiAi, _ = dpotrs(self.LA, np.asfortranarray(self.Phi.T), lower=1)
+        dL_dPhi = np.dot(alpha, np.dot(alpha.T, self.Phi)) - self.output_dim * PhiAi.T
+        # trace(K^{-1}) = (N - F) / noise + trace(A^{-1})
+        LAi, _ = dtrtrs(self.LA, np.eye(num_features), lower=1)
+        trKi = (self.num_data - num_features) / noise + np.sum(np.square(LAi))
+        dL_dnoise = 0.5 * (np.sum(np.square(alpha)) - self.output_dim * trKi)
+        return np.hstack((self.kern.dfeatures_dtheta(dL_dPhi, self.X), dL_dnoise))
+
+    def _raw_predict(self, _Xnew, which_parts='all', full_cov=False, stop=False):
+        """
+        Internal helper function for making predictions, does not account
+        for normalization or likelihood
+
+        The posterior of the weights has mean w_mean and covariance
+        noise * A^{-1}, so predictions cost O(F^2) per point.
+        """
+        Phi_new = self.kern.features(_Xnew, which_parts=which_parts)
+        mu = np.dot(Phi_new, self.w_mean)
+        tmp, _ = dtrtrs(self.LA, np.asfortranarray(Phi_new.T), lower=1)
+        if full_cov:
+            var = self.likelihood._variance * np.dot(tmp.T, tmp)
+        else:
+            var = self.likelihood._variance * np.sum(np.square(tmp), 0)[:, None]
+        if stop:
+            debug_this # @UndefinedVariable
+        return mu, var
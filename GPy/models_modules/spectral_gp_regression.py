@@ -0,0 +1,180 @@
+# Copyright (c) 2013, GPy authors (see AUTHORS.txt).
+# Licensed under the BSD 3-clause license (see LICENSE.txt)
+
+
+import numpy as np
+from scipy import optimize
+from gp_regression import GPRegression
+from .. import kern
+
+class SpectralGPRegression(GPRegression):
+    """
+    Gaussian Process model for regression which caches the
+    eigendecomposition of the kernel matrix.
+
+    Writing K = s * Q diag(lambda) Q^T + noise * I, where s is an overall
+    variance of the kernel, neither s nor the noise variance change the
+    eigenvectors Q. The eigendecomposition is only recomputed when the other
+    kernel parameters (or X) change; otherwise the log likelihood and its
+    gradients wrt s and the noise cost O(N) (O(N D) for D outputs).
+
+    The gradients of the other kernel parameters need a dense dL_dK, which
+    is only formed when some of them are not fixed.
+
+    :param X: input observations
+    :param Y: observed values
+    :param kernel: a GPy kernel, defaults to rbf
+    :param normalize_X:  whether to normalize the input data before computing (predictions will be in original scales)
+    :type normalize_X: False|True
+    :param normalize_Y:  whether to normalize the input data before computing (predictions will be in original scales)
+    :type normalize_Y: False|True
+    :param scale: the name (a regular expression) of the overall kernel variance, which must multiply the whole kernel. Defaults to the variance of single part kernels; if None is found, only the noise variance benefits from the cached eigendecomposition.
+    :type scale: str
+
+    .. Note:: Gaussian likelihoods only. Multiple independent outputs are allowed using columns of Y
+    """
+    def __init__(self, X, Y, kernel=None, normalize_X=False, normalize_Y=False, scale=None):
+        if kernel is None:
+            kernel = kern.rbf(X.shape[1])
+        assert not (len(kernel.tied_indices) or len(kernel.fixed_indices)), "constrain the model, not the kernel"
+
+        self._scale_index = None
+        if scale is None:
+            names = kernel._get_param_names()
+            if kernel.num_parts == 1 and len(names) and names[0].endswith('_variance'):
+                self._scale_index = 0
+        else:
+            matches = kernel.grep_param_names(scale)
+            assert matches.size == 1, "the scale must be a single parameter"
+            self._scale_index = matches[0]
+
+        GPRegression.__init__(self, X, Y, kernel=kernel, normalize_X=normalize_X, normalize_Y=normalize_Y)
+
+    def _set_params(self, p):
+        self.kern._set_params_transformed(p[:self.kern.num_params_transformed()])
+        self.likelihood._set_params_transformed(p[self.kern.num_params_transformed():])
+
+        theta = self.kern._get_params()
+        if self._scale_index is None:
+            self._scale = 1.
+            other_theta = theta
+        else:
+            self._scale = theta[self._scale_index]
+            other_theta = np.delete(theta, self._scale_index)
+
+        if self._has_changed('spectral', other_theta, self.X):
+            # the eigendecomposition of the kernel matrix with unit scale
+            Lambda, self.Q = np.linalg.eigh(self.kern.K(self.X) / self._scale)
+            self.Lambda = np.clip(Lambda, 0., np.inf)
+            self.QTY = np.dot(self.Q.T, self.likelihood.Y)
+
+        # the eigenvalues of K, and Q^T K^{-1} Y
+        self.spectrum = self._scale * self.Lambda + self.likelihood._variance
+        self.QTalpha = self.QTY / self.spectrum[:, None]
+        self.K_logdet = np.sum(np.log(self.spectrum))
+
+    def _model_fit_term(self):
+        return -0.5 * np.sum(self.QTY * self.QTalpha)
+
+    def _other_params_free(self):
+        """
+        Whether any kernel parameter besides the scale is optimized, so that
+        the dense gradient is needed.
+        """
+        others = set(range(self.kern.num_params))
+        others.discard(self._scale_index)
+        if len(self.fixed_indices):
+            others -= set(np.hstack(self.fixed_indices))
+        return len(others) > 0
+
+    @property
+    def alpha(self):
+        return np.dot(self.Q, self.QTalpha)
+
+    @property
+    def Ki(self):
+        return np.dot(self.Q / self.spectrum, self.Q.T)
+
+    @property
+    def dL_dK(self):
+        alpha = self.alpha
+        return 0.5 * (np.dot(alpha, alpha.T) - self.output_dim * self.Ki)
+
+    def _log_likelihood_gradients(self):
+        # sum over the outputs of (Q^T K^{-1} Y)^2
+        r = np.sum(np.square(self.QTalpha), 1)
+        dL_dnoise = -0.5 * self.output_dim * np.sum(1. / self.spectrum) + 0.5 * np.sum(r)
+        if self._other_params_free():
+            dL_dtheta = self.kern.dK_dtheta(self.dL_dK, self.X)
+        else:
+            dL_dtheta = np.zeros(self.kern.num_params)
+            if self._scale_index is not None:
+                dL_dtheta[self._scale_index] = -0.5 * self.output_dim * np.sum(self.Lambda / self.spectrum) + 0.5 * np.sum(self.Lambda * r)
+            dL_dtheta = self.kern._transform_gradients(dL_dtheta)
+        return np.hstack((dL_dtheta, dL_dnoise))
+
+    def _raw_predict(self, _Xnew, which_parts='all', full_cov=False, stop=False):
+        """
+        Internal helper function for making predictions, does not account
+        for normalization or likelihood
+        """
+        num_new = _Xnew.shape[0]
+        chunksize = self._predict_chunksize()
+        mu = np.empty((num_new, self.output_dim))
+        if full_cov:
+            QTKx_all = np.empty((self.num_data, num_new))
+        else:
+            var = np.empty((num_new, 1))
+        for start in range(0, num_new, chunksize):
+            s = slice(start, min(start + chunksize, num_new))
+            QTKx = np.dot(self.Q.T, self.kern.K(self.X, _Xnew[s], which_parts=which_parts))
+            mu[s] = np.dot(QTKx.T, self.QTalpha)
+            if full_cov:
+                QTKx_all[:, s] = QTKx
+            else:
+                var[s, 0] = self.kern.Kdiag(_Xnew[s], which_parts=which_parts) - np.sum(np.square(QTKx) / self.spectrum[:, None], 0)
+        if full_cov:
+            var = self.kern.K(_Xnew, which_parts=which_parts) - np.dot(QTKx_all.T / self.spectrum, QTKx_all)
+        if stop:
+            debug_this # @UndefinedVariable
+        return mu, var
+
+    def profile_noise(self, noise_variances=None, bounds=(1e-6, 1e2)):
+        """
+        The log likelihood as a function of the noise variance, all the other
+        parameters being fixed. Each evaluation costs O(N), as the
+        eigendecomposition of the kernel matrix is reused.
+
+        If noise_variances is None, the noise variance maximizing the log
+        likelihood is found by a bounded 1-D optimization (in log space,
+        within bounds, relative to the variance of the data). Priors are not
+        taken into account.
+
+        The model is left at the best noise variance found.
+
+        :param noise_variances: the noise variances to evaluate (optional)
+        :type noise_variances: np.ndarray
+        :param bounds: bounds of the optimization, relative to the variance of (normalized) Y
+        :returns: noise_variances, log_likelihoods
+        """
+        x = self._get_params()
+        def f(noise):
+            x[-1] = noise
+            self._set_params(x)
+            return self.log_likelihood()
+
+        if noise_variances is None:
+            Yvar = np.mean(np.var(self.likelihood.Y, 0))
+            log_noise = optimize.fminbound(lambda n: -f(np.exp(n)), np.log(bounds[0] * Yvar), np.log(bounds[1] * Yvar))
+            noise_variances = np.array([np.exp(log_noise)])
+        noise_variances = np.asarray(noise_variances, dtype=np.float64).flatten()
+        log_likelihoods = np.array([f(noise) for noise in noise_variances])
+        f(noise_variances[np.argmax(log_likelihoods)])
+        return noise_variances, log_likelihoods
+
+    def getstate(self):
+        return GPRegression.getstate(self) + [self._scale_index]
+
+    def setstate(self, state):
+        self._scale_index = state.pop()
+        return GPRegression.setstate(self, state)
@@ -0,0 +1,252 @@
+# Copyright (c) 2013, GPy authors (see AUTHORS.txt).
+# Licensed under the BSD 3-clause license (see LICENSE.txt)
+
+
+import numpy as np
+from scipy import linalg
+from gp_regression import GPRegression
+from .. import kern
+
+class StateSpaceGPRegression(GPRegression):
+    """
+    Gaussian Process model for regression on 1-D inputs (time series), by
+    Kalman filtering and Rauch-Tung-Striebel smoothing.
+
+    Kernels with a state space form (see Kernpart.sde: Matern32, Matern52,
+    exponential, Brownian, bias, and sums of them) are the covariances of
+    the output of linear stochastic differential equations. Sorting the
+    inputs, the log likelihood is computed by a Kalman filter and its
+    gradients by the sensitivity equations of the filter, in O(N) for N
+    data. Predictions add the new points to the filter as unobserved steps
+    and smooth the states.
+
+    The discretized transition of the states is computed once for each
+    distinct time step, so regularly sampled data is cheaper.
+
+    :param X: input observations (times), N x 1
+    :param Y: observed values
+    :param kernel: a GPy kernel with a state space form, defaults to Matern32
+    :param normalize_X:  whether to normalize the input data before computing (predictions will be in original scales)
+    :type normalize_X: False|True
+    :param normalize_Y:  whether to normalize the input data before computing (predictions will be in original scales)
+    :type normalize_Y: False|True
+
+    .. Note:: Gaussian likelihoods only. Multiple independent outputs are allowed using columns of Y
+    """
+    def __init__(self, X, Y, kernel=None, normalize_X=False, normalize_Y=False):
+        assert X.shape[1] == 1, "state space inference is for 1-D inputs"
+        if kernel is None:
+            kernel = kern.Matern32(1)
+        GPRegression.__init__(self, X, Y, kernel=kernel, normalize_X=normalize_X, normalize_Y=normalize_Y)
+
+    def update_likelihood_approximation(self, **kwargs):
+        """
+        The likelihood is Gaussian, so no approximation is required: this
+        only updates the model, without forming the covariance matrix.
+        """
+        self._set_params(self._get_params())
+
+    def _sde(self):
+        """
+        The state space form of the kernel, the parts of a sum having
+        independent blocks of states.
+        """
+        self._blocks = []
+        start = 0
+        for part, ps in zip(self.kern.parts, self.kern.param_slices):
+            F, L, Qc, H, P0, dF, dQc, dP0 = part.sde()
+            LQL = np.dot(np.dot(L, Qc), L.T)
+            dLQL = np.array([np.dot(np.dot(L, dQc_j), L.T) for dQc_j in dQc])
+            s = slice(start, start + F.shape[0])
+            self._blocks.append((s, ps, F, LQL, P0, dF, dLQL, dP0))
+            start = s.stop
+        self.num_states = start
+        self.H = np.hstack([part.sde()[3] for part in self.kern.parts])[0]
+        self.P0 = np.zeros((self.num_states, self.num_states))
+        for s, ps, F, LQL, P0, dF, dLQL, dP0 in self._blocks:
+            self.P0[s, s] = P0
+
+    def _discretize(self, dts, gradients=False):
+        """
+        The transition matrices A and the covariances Q of the process noise
+        of the states over the time steps dts, and their derivatives wrt the
+        kernel parameters (and the noise variance, which is zero).
+
+        Parts with F = 0 have A = I and Q = L Qc L^T dt; the others are
+        stationary, with Q = P0 - A P0 A^T, P0 being the stationary
+        covariance of the states.
+        """
+        num_dts, n = dts.size, self.num_states
+        A = np.zeros((num_dts, n, n))
+        Q = np.zeros((num_dts, n, n))
+        if gradients:
+            dA = np.zeros((num_dts, self.kern.num_params + 1, n, n))
+            dQ = np.zeros((num_dts, self.kern.num_params + 1, n, n))
+        for s, ps, F, LQL, P0, dF, dLQL, dP0 in self._blocks:
+            if not np.any(F):
+                A[:, s, s] = np.eye(F.shape[0])
+                Q[:, s, s] = dts[:, None, None] * LQL
+                if gradients:
+                    dQ[:, ps, s, s] = dts[:, None, None, None] * dLQL
+                continue
+            n_s = F.shape[0]
+            # only the first step can go back in time, from the stationary
+            # prior, which is left unchanged by any step
+            for i, dt in enumerate(np.abs(dts)):
+                As = linalg.expm(F * dt)
+                A[i, s, s] = As
+                Q[i, s, s] = P0 - np.dot(np.dot(As, P0), As.T)
+                if gradients:
+                    # the derivative of expm(F dt) is the upper right block of
+                    # the exponential of [[F, dF], [0, F]] dt
+                    block = np.zeros((2 * n_s, 2 * n_s))
+                    block[:n_s, :n_s] = block[n_s:, n_s:] = F * dt
+                    for j, (dF_j, dP0_j) in enumerate(zip(dF, dP0)):
+                        block[:n_s, n_s:] = dF_j * dt
+                        dAs = linalg.expm(block)[:n_s, n_s:]
+                        dAP0A = np.dot(np.dot(dAs, P0), As.T)
+                        dA[i, ps.start + j, s, s] = dAs
+                        dQ[i, ps.start + j, s, s] = dP0_j - dAP0A - dAP0A.T - np.dot(np.dot(As, dP0_j), As.T)
+        if gradients:
+            return A, Q, dA, dQ
+        return A, Q
+
+    def _kalman_filter(self, t, Y, observed=None, gradients=False, smooth=False):
+        """
+        Run the Kalman filter over the (sorted) times t.
+
+        :param t: the times, sorted
+        :param Y: the observations, len(t) x output_dim
+        :param observed: which times have an observation (default: all)
+        :param gradients: whether to compute the gradients of the log likelihood wrt the kernel parameters and the noise variance, by the sensitivity equations of the filter
+        :param smooth: whether to keep the predicted and filtered states, for the smoother
+        :returns: the log likelihood (and its gradients)
+        """
+        num_steps, n = t.size, self.num_states
+        if observed is None:
+            observed = np.ones(num_steps, dtype=bool)
+        # the states start from their prior at time zero
+        dts = np.diff(np.hstack((0., t)))
+        dts, self._dt_index = np.unique(dts, return_inverse=True)
+        if gradients:
+            A, Q, dA, dQ = self._discretize(dts, gradients=True)
+            num_params = self.kern.num_params + 1
+            dm = np.zeros((num_params, n, self.output_dim))
+            dP = np.zeros((num_params, n, n))
+            for s, ps, F, LQL, P0, dF, dLQL, dP0 in self._blocks:
+                dP[ps, s, s] = dP0
+            dnoise = np.zeros(num_params)
+            dnoise[-1] = 1.
+            dlog_likelihood = np.zeros(num_params)
+        else:
+            A, Q = self._discretize(dts)
+        if smooth:
+            self._A = A
+            self._m_pred, self._P_pred = np.empty((num_steps, n, self.output_dim)), np.empty((num_steps, n, n))
+            self._m_filt, self._P_filt = np.empty((num_steps, n, self.output_dim)), np.empty((num_steps, n, n))
+
+        H, noise = self.H, self.likelihood._variance
+        m, P = np.zeros((n, self.output_dim)), self.P0.copy()
+        log_likelihood = 0.
+        for k in range(num_steps):
+            # prediction
+            Ak = A[self._dt_index[k]]
+            if gradients:
+                dAk = dA[self._dt_index[k]]
+                dAPA = np.dot(np.dot(dAk, P), Ak.T)
+                dm = np.dot(dAk, m) + np.dot(Ak, dm).transpose(1, 0, 2)
+                dP = dAPA + dAPA.transpose(0, 2, 1) + np.dot(np.dot(Ak, dP).transpose(1, 0, 2), Ak.T) + dQ[self._dt_index[k]]
+            m = np.dot(Ak, m)
+            P = np.dot(np.dot(Ak, P), Ak.T) + Q[self._dt_index[k]]
+            if smooth:
+                self._m_pred[k], self._P_pred[k] = m, P
+
+            # update
+            if observed[k]:
+                PH = np.dot(P, H)
+                S = np.dot(H, PH) + noise
+                gain = PH / S
+                v = Y[k] - np.dot(H, m)
+                log_likelihood -= 0.5 * (self.output_dim * np.log(2. * np.pi * S) + np.sum(np.square(v)) / S)
+                if gradients:
+                    dPH = np.dot(dP, H)
+                    dS = np.dot(dPH, H) + dnoise
+                    dv = -np.dot(H, dm)
+                    dlog_likelihood -= 0.5 * (self.output_dim * dS / S + 2. * np.dot(dv, v) / S - np.sum(np.square(v)) * dS / S ** 2)
+                    dgain = (dPH - dS[:, None] * gain) / S
+                    dm = dm + dgain[:, :, None] * v + gain[:, None] * dv[:, None, :]
+                    dgaingain = S * dgain[:, :, None] * gain
+                    dP = dP - dgaingain - dgaingain.transpose(0, 2, 1) - dS[:, None, None] * np.outer(gain, gain)
+                m = m + np.outer(gain, v)
+                P = P - S * np.outer(gain, gain)
+                P = 0.5 * (P + P.T)
+            if smooth:
+                self._m_filt[k], self._P_filt[k] = m, P
+
+        if gradients:
+            return log_likelihood, dlog_likelihood
+        return log_likelihood
+
+    def _rts_smoother(self):
+        """
+        Smooth the states kept by the last run of the Kalman filter (with
+        smooth=True).
+
+        :returns: the means and covariances of the states given all the observations
+        """
+        m_smooth, P_smooth = self._m_filt.copy(), self._P_filt.copy()
+        for k in range(self._m_filt.shape[0] - 2, -1, -1):
+            Ak = self._A[self._dt_index[k + 1]]
+            # G = P_filt A^T P_pred^{-1}
+            G = np.linalg.solve(self._P_pred[k + 1], np.dot(Ak, self._P_filt[k])).T
+            m_smooth[k] += np.dot(G, m_smooth[k + 1] - self._m_pred[k + 1])
+            P_smooth[k] += np.dot(np.dot(G, P_smooth[k + 1] - self._P_pred[k + 1]), G.T)
+        return m_smooth, P_smooth
+
+    def _set_params(self, p):
+        self.kern._set_params_transformed(p[:self.kern.num_params_transformed()])
+        self.likelihood._set_params_transformed(p[self.kern.num_params_transformed():])
+        if self._has_changed('state_space', self.X):
+            self._order = np.argsort(self.X[:, 0], kind='mergesort')
+        self._sde()
+        self._log_likelihood = self._kalman_filter(self.X[self._order, 0], self.likelihood.Y[self._order])
+
+    def log_likelihood(self):
+        return self._log_likelihood + self.likelihood.Z
+
+    def _log_likelihood_gradients(self):
+        log_likelihood, dlog_likelihood = self._kalman_filter(self.X[self._order, 0], self.likelihood.Y[self._order], gradients=True)
+        return np.hstack((self.kern._transform_gradients(dlog_likelihood[:-1]), dlog_likelihood[-1]))
+
+    def _raw_predict(self, _Xnew, which_parts='all', full_cov=False, stop=False):
+        """
+        Internal helper function for making predictions, does not account
+        for normalization or likelihood
+
+        The new points are merged into the time series as unobserved steps
+        of the Kalman filter, and the states are smoothed.
+        """
+        if full_cov:
+            raise NotImplementedError, "state space predictions are marginal (full_cov=False)"
+        if which_parts == 'all':
+            which_parts = [True] * self.kern.num_parts
+        H = self.H.copy()
+        for (s, ps, F, LQL, P0, dF, dLQL, dP0), used in zip(self._blocks, which_parts):
+            if not used:
+                H[s] = 0.
+
+        t = np.hstack((self.X[:, 0], _Xnew[:, 0]))
+        order = np.argsort(t, kind='mergesort')
+        observed = order < self.num_data
+        Y = np.zeros((t.size, self.output_dim))
+        Y[observed] = self.likelihood.Y[order[observed]]
+        self._kalman_filter(t[order], Y, observed, smooth=True)
+        m_smooth, P_smooth = self._rts_smoother()
+
+        new = order[~observed] - self.num_data
+        mu, var = np.empty((_Xnew.shape[0], self.output_dim)), np.empty((_Xnew.shape[0], 1))
+        mu[new] = np.dot(H, m_smooth[~observed])
+        var[new, 0] = np.dot(np.dot(P_smooth[~observed], H), H)
+        if stop:
+            debug_this # @UndefinedVariable
+        return mu, var
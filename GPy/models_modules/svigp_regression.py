@@ -19,13 +19,20 @@ class SVIGPRegression(SVIGP):
     :type normalize_X: False|True
     :param normalize_Y:  whether to normalize the input data before computing (predictions will be in original scales)
     :type normalize_Y: False|True
+    :param prefetch: the number of minibatches gathered ahead by a background thread, 0 for none
+    :type prefetch: int
+    :param seed: the seed of the random order of the minibatches, drawn from np.random if None
+    :type seed: int | None
+    :param stream: a function returning an iterator over (X, Y) chunks, to read the minibatches from instead of X and Y (see GPy.core.SVIGP)
+    :param num_data: the number of data the stream stands for (defaults to the number of rows of X)
+    :type num_data: int | None
     :rtype: model object
 
     .. Note:: Multiple independent outputs are allowed using columns of Y
 
     """
 
-    def __init__(self, X, Y, kernel=None, Z=None, num_inducing=10, q_u=None, batchsize=10, normalize_Y=False):
+    def __init__(self, X, Y, kernel=None, Z=None, num_inducing=10, q_u=None, batchsize=10, normalize_Y=False, prefetch=2, seed=None, stream=None, num_data=None):
         # kern defaults to rbf (plus white for stability)
         if kernel is None:
             kernel = kern.rbf(X.shape[1], variance=1., lengthscale=4.) + kern.white(X.shape[1], 1e-3)
@@ -40,7 +47,7 @@ class SVIGPRegression(SVIGP):
         # likelihood defaults to Gaussian
         likelihood = likelihoods.Gaussian(Y, normalize=normalize_Y)
 
-        SVIGP.__init__(self, X, likelihood, kernel, Z, q_u=q_u, batchsize=batchsize)
+        SVIGP.__init__(self, X, likelihood, kernel, Z, q_u=q_u, batchsize=batchsize, prefetch=prefetch, seed=seed, stream=stream, num_data=num_data)
         self.load_batch()
 
     def getstate(self):
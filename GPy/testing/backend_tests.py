@@ -0,0 +1,99 @@
+# Copyright (c) 2013, GPy authors (see AUTHORS.txt).
+# Licensed under the BSD 3-clause license (see LICENSE.txt)
+
+import unittest
+import copy
+import os
+import sys
+import subprocess
+import numpy as np
+import GPy
+from GPy.util import backend
+
+def _symmetric(A):
+    return A + A.swapaxes(-1, -2)
+
+def _same(a, b):
+    if isinstance(a, tuple):
+        return len(a) == len(b) and all([_same(ai, bi) for ai, bi in zip(a, b)])
+    elif isinstance(a, np.ndarray):
+        return a.shape == b.shape and np.allclose(a, b)
+    return a == b
+
+class BackendTests(unittest.TestCase):
+    """Every backend of each routine gives the results of numpy."""
+    def setUp(self):
+        N, M, Q, D = 12, 5, 3, 4
+        X, X2 = np.random.randn(N, Q), np.random.randn(M, Q)
+        L = np.linalg.cholesky(np.dot(X, X.T) + np.eye(N))
+        Z = np.random.randn(M, Q)
+        index, index2 = np.random.randint(0, D, N), np.random.randint(0, D, M)
+        self.arguments = {
+            'symmetrify': [(np.random.randn(N, N), False), (np.random.randn(N, N), True),
+                           (np.asfortranarray(np.random.randn(N, N)), False),
+                           (np.random.randn(2 * N, 2 * N)[::2, ::2], True)],
+            'cholupdate': [(L, np.random.randn(N))],
+            'array_equal': [(X, X.copy()), (X, X + 1e-12), (X, None), (None, None),
+                            (X, X[:-1]), (np.random.randn(N, M, Q), np.random.randn(N, M, Q))],
+            'sqdiff_sums': [(np.random.randn(N, N), X, None), (np.random.randn(N, M), X, X2)],
+            'rbf_psi2': [(X, 0.5 * (Z[:, None, :] + Z[None, :, :]), np.square(0.5 * (Z[:, None, :] - Z[None, :, :])),
+                          np.random.rand(N, Q) + 1., np.random.rand(Q) + 0.5)],
+            'linear_dpsi2_dmuS': [(_symmetric(np.random.randn(N, M, M)), X, Z, np.zeros((N, Q)), np.zeros((N, Q)))],
+            'linear_dpsi2_dZ': [(np.random.randn(N, M, M), np.random.randn(N, M, Q), np.zeros((M, Q)))],
+            'coregionalize_K': [(np.random.randn(D, D), index, None, np.zeros((N, N))),
+                                (np.random.randn(D, D), index, index2, np.zeros((N, M)))],
+            'coregionalize_dK_dB': [(np.random.randn(N, N), index, None, D),
+                                    (np.random.randn(N, M), index, index2, D)],
+            'std_norm_cdf': [(np.random.randn(N, Q) * 3.,), (np.array([0., -1e-3, 40.]),)],
+            }
+
+    def test_all_routines_have_arguments(self):
+        self.assertEqual(sorted(self.arguments.keys()), backend.routines())
+
+    def test_conformance(self):
+        for name in backend.routines():
+            implementations = backend.implementations(name)
+            self.assertTrue('numpy' in implementations)
+            for args in self.arguments[name]:
+                ref_args = copy.deepcopy(args)
+                ref = implementations['numpy'](*ref_args)
+                for backend_name, f in implementations.items():
+                    test_args = copy.deepcopy(args)
+                    result = f(*test_args)
+                    msg = '%s differs in the %s backend' % (name, backend_name)
+                    self.assertTrue(_same(result, ref), msg)
+                    # the arguments modified in place
+                    self.assertTrue(_same(test_args, ref_args), msg)
+
+    def test_import_without_weave(self):
+        # GPy, and the numpy backend, work when scipy.weave cannot be imported
+        code = """
+import sys
+class BlockWeave(object):
+    def find_module(self, name, path=None):
+        if name == 'scipy.weave' or name.startswith('scipy.weave.'):
+            return self
+    def load_module(self, name):
+        raise ImportError('scipy.weave is blocked')
+sys.meta_path.insert(0, BlockWeave())
+import numpy as np
+import GPy
+assert 'scipy.weave' not in sys.modules
+assert all(['weave' not in GPy.util.backend.implementations(name) for name in GPy.util.backend.routines()])
+assert np.allclose(GPy.util.univariate_Gaussian.std_norm_cdf([0., 10.]), [0.5, 1.])
+"""
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join([root] + [p for p in [os.environ.get('PYTHONPATH')] if p]), MPLBACKEND='Agg')
+        process = subprocess.Popen([sys.executable, '-c', code], env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out, err = process.communicate()
+        self.assertEqual(process.returncode, 0, err)
+
+    def test_selection(self):
+        self.assertTrue(backend.selected('symmetrify') in backend.implementations('symmetrify'))
+        A = np.random.randn(5, 5)
+        GPy.util.linalg.symmetrify(A)
+        self.assertTrue(np.all(A == A.T))
+
+if __name__ == "__main__":
+    print "Running unit tests, please be (very) patient..."
+    unittest.main()
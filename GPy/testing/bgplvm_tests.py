@@ -79,6 +79,40 @@ class BGPLVMTests(unittest.TestCase):
         m.randomize()
         self.assertTrue(m.checkgrad())
 
+    def test_distributed(self):
+        N, num_inducing, input_dim, D = 20, 4, 2, 5
+        X = np.random.rand(N, input_dim)
+        k = GPy.kern.rbf(input_dim) + GPy.kern.white(input_dim, 0.00001)
+        K = k.K(X)
+        Y = np.random.multivariate_normal(np.zeros(N),K,D).T
+        Y -= Y.mean(axis=0)
+        k = GPy.kern.rbf(input_dim, ARD=True) + GPy.kern.linear(input_dim) + GPy.kern.white(input_dim, 0.00001)
+        m_ref = BayesianGPLVM(Y, input_dim, kernel=k.copy(), num_inducing=num_inducing)
+        m_ref.randomize()
+        m = GPy.models.DistributedBayesianGPLVM(Y, input_dim, num_workers=3, kernel=k.copy(), X=m_ref.X.copy(), X_variance=m_ref.X_variance.copy(), Z=m_ref.Z.copy())
+        try:
+            m._set_params(m_ref._get_params())
+            self.assertTrue(np.allclose(m.log_likelihood(), m_ref.log_likelihood()))
+            self.assertTrue(np.allclose(m._log_likelihood_gradients(), m_ref._log_likelihood_gradients()))
+            self.assertTrue(m.checkgrad())
+        finally:
+            m.close()
+
+    def test_test_latents(self):
+        N, num_inducing, input_dim, D = 20, 5, 2, 4
+        X = np.random.rand(N, input_dim)
+        k = GPy.kern.rbf(input_dim) + GPy.kern.white(input_dim, 0.00001)
+        K = k.K(X)
+        Y = np.random.multivariate_normal(np.zeros(N),K,D).T
+        Y -= Y.mean(axis=0)
+        m = BayesianGPLVM(Y, input_dim, kernel=k, num_inducing=num_inducing)
+        means, covars = m.do_test_latents(Y[:3])
+        # the same latents from a dL_dpsi2 per data point (as for EP)
+        m.dL_dpsi2 = np.repeat(m.dL_dpsi2[None, :, :], N, 0)
+        means_N, covars_N = m.do_test_latents(Y[:3])
+        self.assertTrue(np.allclose(means, means_N))
+        self.assertTrue(np.allclose(covars, covars_N))
+
 
 if __name__ == "__main__":
     print "Running unit tests, please be (very) patient..."
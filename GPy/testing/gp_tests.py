@@ -0,0 +1,506 @@
+# Copyright (c) 2013, GPy authors (see AUTHORS.txt).
+# Licensed under the BSD 3-clause license (see LICENSE.txt)
+
+import unittest
+import os
+import shutil
+import tempfile
+import time
+import multiprocessing
+import multiprocessing.connection
+import numpy as np
+import GPy
+
+class _CreatesFile(object):
+    """An object whose unpickling creates the file at path."""
+    def __init__(self, path):
+        self.path = path
+
+    def __reduce__(self):
+        return (open, (self.path, 'w'))
+
+class GPTests(unittest.TestCase):
+    def setUp(self):
+        self.X = np.random.uniform(-3., 3., (30, 1))
+        self.Y = np.sin(self.X) + np.random.randn(30, 1) * 0.05
+        self.Xnew = np.linspace(-4., 4., 25)[:, None]
+
+    def test_chunked_prediction(self):
+        m = GPy.models.GPRegression(self.X, self.Y)
+        mu, var = m._raw_predict(self.Xnew)
+        mu_full, var_full = m._raw_predict(self.Xnew, full_cov=True)
+        m.predict_memory = 16 * m.num_data * 4 # four points at a time
+        mu_c, var_c = m._raw_predict(self.Xnew)
+        _, var_full_c = m._raw_predict(self.Xnew, full_cov=True)
+        self.assertTrue(np.allclose(mu, mu_c))
+        self.assertTrue(np.allclose(mu, mu_full))
+        self.assertTrue(np.allclose(var, var_c))
+        self.assertTrue(np.allclose(var_full, var_full_c))
+        self.assertTrue(np.allclose(var[:, 0], np.diag(var_full)))
+        # the full covariance solves for chunks of the points only
+        solve, half_solve = m._block_solve, m._block_half_solve
+        num_columns = []
+        m._block_solve = lambda B: num_columns.append(B.shape[1]) or solve(B)
+        m._block_half_solve = lambda B: num_columns.append(B.shape[1]) or half_solve(B)
+        m.predict_memory = 24 * m.num_data * 4
+        _, var_full_c = m._raw_predict(self.Xnew, full_cov=True)
+        self.assertTrue(np.allclose(var_full, var_full_c))
+        self.assertEqual(max(num_columns), 4)
+
+        # compare with the direct computation
+        Kx = m.kern.K(m.X, self.Xnew)
+        self.assertTrue(np.allclose(mu, np.dot(Kx.T, np.dot(m.Ki, m.likelihood.Y))))
+        self.assertTrue(np.allclose(var_full, m.kern.K(self.Xnew) - np.dot(Kx.T, np.dot(m.Ki, Kx))))
+
+    def check_same_posterior(self, m, m_ref):
+        self.assertTrue(np.allclose(m.log_likelihood(), m_ref.log_likelihood()))
+        self.assertTrue(np.allclose(m._log_likelihood_gradients(), m_ref._log_likelihood_gradients()))
+        self.assertTrue(np.allclose(m.Ki, m_ref.Ki))
+        self.assertTrue(np.allclose(m.Li, m_ref.Li))
+        mu, var = m._raw_predict(self.Xnew)
+        mu_ref, var_ref = m_ref._raw_predict(self.Xnew)
+        self.assertTrue(np.allclose(mu, mu_ref))
+        self.assertTrue(np.allclose(var, var_ref))
+
+    def test_append_data(self):
+        m = GPy.models.GPRegression(self.X[:20], self.Y[:20], normalize_X=True)
+        m.append_data(self.X[20:25], self.Y[20:25])
+        m.append_data(self.X[25:], self.Y[25:])
+        m_ref = GPy.models.GPRegression(self.X, self.Y, normalize_X=True)
+        m_ref._Xoffset, m_ref._Xscale = m._Xoffset, m._Xscale
+        m_ref.X = (self.X - m._Xoffset) / m._Xscale
+        m_ref._set_params(m._get_params())
+        self.check_same_posterior(m, m_ref)
+
+    def test_remove_data(self):
+        m = GPy.models.GPRegression(self.X, self.Y)
+        m.remove_data([0, 3, 4, 17, 29])
+        keep = np.setdiff1d(np.arange(30), [0, 3, 4, 17, 29])
+        m_ref = GPy.models.GPRegression(self.X[keep], self.Y[keep])
+        m_ref._set_params(m._get_params())
+        self.check_same_posterior(m, m_ref)
+
+    def test_sliding_window(self):
+        m = GPy.models.GPRegression(self.X[:10], self.Y[:10])
+        for i in range(10, 30, 5):
+            m.append_data(self.X[i:i + 5], self.Y[i:i + 5])
+            m.remove_data(slice(0, 5))
+        m_ref = GPy.models.GPRegression(self.X[20:], self.Y[20:])
+        self.check_same_posterior(m, m_ref)
+
+    def test_lean(self):
+        m = GPy.models.GPRegression(self.X, self.Y, kernel=GPy.kern.rbf(1) + GPy.kern.bias(1))
+        m.randomize()
+        m_lean = m.copy()
+        m_lean.lean = True
+        m_lean._set_params(m._get_params())
+        self.assertTrue(m_lean.K is None)
+        self.assertTrue(m_lean._dL_dK is None)
+        self.assertEqual(len(m_lean.kern.distances._entries), 0)
+        self.check_same_posterior(m_lean, m)
+        self.assertTrue(np.allclose(m_lean.dL_dK, m.dL_dK))
+
+        # the buffers are reused
+        L, dL_dK = m_lean.L, m_lean.dL_dK
+        m_lean.randomize()
+        m_lean._log_likelihood_gradients()
+        self.assertTrue(m_lean.L is L)
+        self.assertTrue(m_lean.dL_dK is dL_dK)
+        self.assertEqual(len(m_lean.kern.distances._entries), 0)
+        self.assertTrue(m_lean.checkgrad())
+
+    def test_threaded(self):
+        # the training computes K and its gradients tile by tile in threads
+        from GPy.kern.tiling import TileEngine
+        k = GPy.kern.rbf(1) + GPy.kern.Matern32(1) + GPy.kern.linear(1)
+        m = GPy.models.GPRegression(self.X, self.Y, kernel=k.copy())
+        m.randomize()
+        k.engine = TileEngine(num_threads=3, tile_size=8)
+        m_threaded = GPy.models.GPRegression(self.X, self.Y, kernel=k)
+        m_threaded._set_params(m._get_params())
+        self.assertTrue(all([c is None for c in m_threaded._kern_cache[2][2]]))
+        self.assertTrue(np.allclose(m_threaded.log_likelihood(), m.log_likelihood()))
+        self.assertTrue(np.allclose(m_threaded._log_likelihood_gradients(), m._log_likelihood_gradients()))
+
+    def test_noise_only_update(self):
+        m = GPy.models.GPRegression(self.X, self.Y)
+        m.randomize()
+        calls = []
+        def counting(f):
+            def counting_f(*args, **kwargs):
+                calls.append(args)
+                return f(*args, **kwargs)
+            return counting_f
+        m.kern.K, m.kern.K_and_cache = counting(m.kern.K), counting(m.kern.K_and_cache)
+        x = m._get_params()
+        x[-1] *= 2.
+        m._set_params(x)
+        self.assertEqual(len(calls), 0)
+        m_ref = GPy.models.GPRegression(self.X, self.Y)
+        m_ref._set_params(x)
+        self.check_same_posterior(m, m_ref)
+        del calls[:]
+        x[0] *= 2.
+        m._set_params(x)
+        self.assertEqual(len(calls), 1)
+
+    def test_block_diagonal(self):
+        # three independent outputs, with their rows interleaved
+        index = np.repeat([0, 1, 2, 1, 0, 2], 10)[:, None]
+        X = np.hstack((np.random.uniform(-3., 3., (60, 1)), index))
+        Y = np.sin(X[:, :1]) + index + np.random.randn(60, 1) * 0.1
+        k = GPy.kern.independent_outputs(GPy.kern.rbf(1) + GPy.kern.Matern32(1)) + GPy.kern.white(2)
+        m = GPy.models.GPRegression(X, Y, kernel=k.copy())
+        m.randomize()
+        self.assertEqual(sorted([len(b) for b in m._K_blocks]), [20, 20, 20])
+        k_ref = k.copy()
+        k_ref.block_labels = lambda X: None
+        m_ref = GPy.models.GPRegression(X, Y, kernel=k_ref)
+        m_ref._set_params(m._get_params())
+        self.assertTrue(m_ref._K_blocks is None)
+        Xnew = np.hstack((np.random.uniform(-3., 3., (10, 1)), np.arange(10)[:, None] % 3))
+        def check_same_posterior():
+            self.assertTrue(np.allclose(m.log_likelihood(), m_ref.log_likelihood()))
+            self.assertTrue(np.allclose(m._log_likelihood_gradients(), m_ref._log_likelihood_gradients()))
+            self.assertTrue(np.allclose(m.Ki, m_ref.Ki))
+            for full_cov in [False, True]:
+                mu, var = m._raw_predict(Xnew, full_cov=full_cov)
+                mu_ref, var_ref = m_ref._raw_predict(Xnew, full_cov=full_cov)
+                self.assertTrue(np.allclose(mu, mu_ref))
+                self.assertTrue(np.allclose(var, var_ref))
+        check_same_posterior()
+        self.assertTrue(m.checkgrad())
+        # the factors of the blocks are replaced by the dense one
+        m.append_data(Xnew[:2], Y[:2])
+        m_ref.append_data(Xnew[:2], Y[:2])
+        check_same_posterior()
+
+    def test_sparse_partial_update(self):
+        Z = np.random.uniform(-3., 3., (5, 1))
+        X_variance = np.random.uniform(0.01, 0.1, self.X.shape)
+        m = GPy.models.SparseGPRegression(self.X, self.Y, Z=Z.copy(), X_variance=X_variance)
+        m.randomize()
+        calls = []
+        def counting(name, f):
+            def counting_f(*args, **kwargs):
+                calls.append(name)
+                return f(*args, **kwargs)
+            return counting_f
+        for name in ['K', 'psi0', 'psi1', 'psi2', 'psi2_sum']:
+            setattr(m.kern, name, counting(name, getattr(m.kern, name)))
+        x = m._get_params()
+        x[-1] *= 2.
+        m._set_params(x)
+        self.assertEqual(calls, [])
+        x[0] += .1
+        m._set_params(x)
+        self.assertEqual(sorted(calls), ['K', 'psi1', 'psi2_sum'])
+        m_ref = GPy.models.SparseGPRegression(self.X, self.Y, Z=Z.copy(), X_variance=X_variance)
+        m_ref._set_params(x)
+        self.assertTrue(np.allclose(m.log_likelihood(), m_ref.log_likelihood()))
+        self.assertTrue(np.allclose(m._log_likelihood_gradients(), m_ref._log_likelihood_gradients()))
+
+    def test_sparse_cached_prediction(self):
+        # well spread inducing inputs, for the accuracy of the direct computation
+        Z = np.linspace(-3., 3., 5)[:, None]
+        m = GPy.models.SparseGPRegression(self.X, self.Y, Z=Z.copy())
+        mu, var = m._raw_predict(self.Xnew)
+        _, var_full = m._raw_predict(self.Xnew, full_cov=True)
+        Kmmi_LmiBLmi = m._Kmmi_LmiBLmi
+        m.predict_memory = 16 * m.num_inducing * 4 # four points at a time
+        mu_c, var_c = m._raw_predict(self.Xnew)
+        _, var_full_c = m._raw_predict(self.Xnew, full_cov=True)
+        self.assertTrue(m._Kmmi_LmiBLmi is Kmmi_LmiBLmi)
+        self.assertTrue(np.allclose(mu, mu_c))
+        self.assertTrue(np.allclose(var, var_c))
+        self.assertTrue(np.allclose(var_full, var_full_c))
+        self.assertTrue(np.allclose(var[:, 0], np.diag(var_full[:, 0])))
+
+        # compare with the direct computation
+        Kmm, Kx = m.kern.K(m.Z), m.kern.K(m.Z, self.Xnew)
+        beta = m.likelihood.precision
+        Sigma = np.linalg.inv(Kmm + beta * np.dot(m.psi1.T, m.psi1))
+        self.assertTrue(np.allclose(mu, beta * np.dot(Kx.T, np.dot(Sigma, np.dot(m.psi1.T, m.likelihood.Y))), atol=1e-6))
+        Qxx = np.dot(Kx.T, np.linalg.solve(Kmm, Kx)) - np.dot(Kx.T, np.dot(Sigma, Kx))
+        self.assertTrue(np.allclose(var[:, 0], m.kern.Kdiag(self.Xnew) - np.diag(Qxx), atol=1e-6))
+
+        # the cache follows the parameters
+        m.randomize()
+        m_ref = GPy.models.SparseGPRegression(self.X, self.Y, Z=Z)
+        m_ref._set_params(m._get_params())
+        mu_ref, var_ref = m_ref._raw_predict(self.Xnew)
+        mu, var = m._raw_predict(self.Xnew)
+        self.assertTrue(np.allclose(mu, mu_ref))
+        self.assertTrue(np.allclose(var, var_ref))
+
+        X_variance = np.random.uniform(0.01, 0.1, self.Xnew.shape)
+        m.predict_memory = 2 ** 27
+        mu_u, var_u = m._raw_predict(self.Xnew, X_variance)
+        m.predict_memory = 16 * m.num_inducing ** 2 * 4
+        mu_uc, var_uc = m._raw_predict(self.Xnew, X_variance)
+        self.assertTrue(np.allclose(mu_u, mu_uc))
+        self.assertTrue(np.allclose(var_u, var_uc))
+
+    def test_chunked_sparse(self):
+        Z = np.random.uniform(-3., 3., (5, 1))
+        m_ref = GPy.models.SparseGPRegression(self.X, self.Y, Z=Z.copy(), normalize_X=True, normalize_Y=True)
+        m_ref.randomize()
+        Xnew = np.random.uniform(-3., 3., (10, 1))
+        def check_same_posterior(m):
+            m._set_params(m_ref._get_params())
+            self.assertEqual(m.num_data, 30)
+            self.assertTrue(np.allclose(m.log_likelihood(), m_ref.log_likelihood()))
+            self.assertTrue(np.allclose(m._log_likelihood_gradients(), m_ref._log_likelihood_gradients()))
+            for a, b in zip(m.predict(Xnew), m_ref.predict(Xnew)):
+                self.assertTrue(np.allclose(a, b))
+
+        # memory mapped arrays
+        tmpdir = tempfile.mkdtemp()
+        try:
+            X = np.memmap(os.path.join(tmpdir, 'X'), dtype=np.float64, mode='w+', shape=self.X.shape)
+            Y = np.memmap(os.path.join(tmpdir, 'Y'), dtype=np.float64, mode='w+', shape=self.Y.shape)
+            X[:], Y[:] = self.X, self.Y
+            m = GPy.models.ChunkedSparseGPRegression(X, Y, Z=Z.copy(), chunk_size=7, normalize_X=True, normalize_Y=True)
+            check_same_posterior(m)
+            self.assertTrue(m.checkgrad())
+            del X, Y, m
+        finally:
+            shutil.rmtree(tmpdir)
+
+        # a generator of chunks
+        def chunks():
+            for i in range(0, 30, 4):
+                yield self.X[i:i + 4], self.Y[i:i + 4]
+        check_same_posterior(GPy.models.ChunkedSparseGPRegression(chunks, Z=Z.copy(), normalize_X=True, normalize_Y=True))
+
+    def test_distributed_sparse(self):
+        Z = np.random.uniform(-3., 3., (5, 1))
+        m_ref = GPy.models.SparseGPRegression(self.X, self.Y, Z=Z.copy(), normalize_Y=True)
+        m_ref.randomize()
+        Xnew = np.random.uniform(-3., 3., (10, 1))
+        def check_same_posterior(m):
+            try:
+                m._set_params(m_ref._get_params())
+                self.assertTrue(np.allclose(m.log_likelihood(), m_ref.log_likelihood()))
+                self.assertTrue(np.allclose(m._log_likelihood_gradients(), m_ref._log_likelihood_gradients()))
+                for a, b in zip(m.predict(Xnew), m_ref.predict(Xnew)):
+                    self.assertTrue(np.allclose(a, b))
+                self.assertTrue(m.checkgrad())
+            finally:
+                m.close()
+
+        # processes of this machine
+        check_same_posterior(GPy.models.DistributedSparseGPRegression(self.X, self.Y, Z=Z.copy(), num_workers=3, normalize_Y=True))
+
+        # processes serving at local sockets
+        addresses, servers = [], []
+        for i in range(2):
+            listener = multiprocessing.connection.Listener(('localhost', 0), authkey='test')
+            addresses.append(listener.address)
+            listener.close()
+            servers.append(multiprocessing.Process(target=GPy.util.parallel.serve, args=('test', addresses[-1])))
+            servers[-1].daemon = True
+            servers[-1].start()
+        time.sleep(0.5)
+        tmpdir = tempfile.mkdtemp()
+        try:
+            # clients without the key are turned away, before their pickles are loaded
+            marker = os.path.join(tmpdir, 'unpickled')
+            client = multiprocessing.connection.Client(addresses[0])
+            client.send(_CreatesFile(marker))
+            client.close()
+            self.assertRaises(multiprocessing.AuthenticationError, multiprocessing.connection.Client, addresses[1], authkey='wrong')
+            time.sleep(0.2)
+            self.assertFalse(os.path.exists(marker))
+            # and the servers go on
+            check_same_posterior(GPy.models.DistributedSparseGPRegression(self.X, self.Y, Z=Z.copy(), addresses=addresses, authkey='test', normalize_Y=True))
+        finally:
+            for server in servers:
+                server.terminate()
+            shutil.rmtree(tmpdir)
+
+        # the key is required
+        self.assertRaises(ValueError, GPy.util.parallel.serve, None)
+        self.assertRaises(ValueError, GPy.models.DistributedSparseGPRegression, self.X, self.Y, addresses=addresses)
+
+    def test_svigp_minibatches(self):
+        X = np.random.randn(100, 2)
+        Y = np.hstack((np.sin(X[:, :1]), np.cos(X[:, 1:])))
+        Z = X[:5].copy()
+        q_u = np.hstack((np.zeros(10), -.5 * np.eye(5).flatten()))
+        # the same seed gives the same minibatches, with or without prefetching
+        traces = []
+        for prefetch in [0, 3]:
+            m = GPy.models.SVIGPRegression(X, Y, Z=Z.copy(), q_u=q_u.copy(), batchsize=30, prefetch=prefetch, seed=1)
+            batches = []
+            for i in range(7):
+                m.load_batch()
+                batches.append(np.hstack((m.X_batch, m.likelihood.Y)))
+                self.assertTrue(np.allclose(m.likelihood.trYYT, np.sum(np.square(m.likelihood.Y))))
+            traces.append(batches)
+            # each epoch visits distinct rows, of which 10 wait for the next one
+            self.assertEqual(m.epochs, 2)
+            rows = np.vstack(batches[1:4])
+            self.assertEqual(len(set(map(tuple, rows))), 90)
+        for a, b in zip(*traces):
+            self.assertTrue(np.allclose(a, b))
+
+        # the psi statistics follow the batches, whose buffers are refilled in place
+        k = GPy.kern.rbf(2) + GPy.kern.white(2, 1e-3)
+        for prefetch in [0, 2]:
+            m = GPy.core.SVIGP(X, GPy.likelihoods.Gaussian(Y), k.copy(), Z.copy(), q_u=q_u.copy(), batchsize=10, X_variance=np.random.uniform(0.1, 0.5, X.shape), prefetch=prefetch)
+            for i in range(4):
+                m.load_batch()
+                self.assertTrue(np.allclose(m.psi1, k.copy().psi1(Z, m.X_batch, m.X_variance_batch)))
+
+        # minibatches across the chunks of a stream
+        def stream():
+            for i in range(0, 100, 40):
+                yield X[i:i + 40], Y[i:i + 40]
+        m = GPy.models.SVIGPRegression(X[:40], Y[:40], Z=Z.copy(), batchsize=30, stream=stream, num_data=100)
+        # two of them are loaded by the constructors
+        for i in range(2):
+            m.load_batch()
+        self.assertTrue(np.allclose(m.X_batch, np.vstack((X[90:], X[:20]))))
+        self.assertEqual(m.epochs, 1)
+        self.assertEqual(m.data_prop, 0.3)
+
+    def test_svigp_param_interval(self):
+        X = np.random.randn(100, 2)
+        Y = np.hstack((np.sin(X[:, :1]), np.cos(X[:, 1:])))
+        m = GPy.models.SVIGPRegression(X, Y, Z=X[:5].copy(), batchsize=10, prefetch=0)
+        # Kmm and its factorization are kept between batches while the parameters stay
+        Kmm, Lm = m.Kmm, m.Lm
+        m.load_batch()
+        self.assertTrue(m.Kmm is Kmm and m.Lm is Lm)
+        # but the terms of q(u) follow it
+        m.set_vb_param(m.get_vb_param() * 0.9)
+        m.load_batch()
+        self.assertTrue(m.Lm is Lm)
+        self.assertTrue(np.allclose(m.Kmmi_m, np.linalg.solve(m.Kmm, m.q_u_mean)))
+        self.assertTrue(np.allclose(np.dot(Lm, np.dot(m.LQL, Lm.T)), m.q_u_expectation[1]))
+
+        # the parameters only move every param_interval batches
+        m.epochs = 1
+        m.param_steplength = 1e-3
+        m.optimize(9, print_interval=100, callback=lambda m: None, param_interval=3)
+        steps = [not np.allclose(a, b) for a, b in zip(m._param_trace[1:], m._param_trace[:-1])]
+        self.assertEqual(steps, [(m.iterations - 9 + i) % 3 == 0 for i in range(8)])
+        self.assertEqual(len(m._grad_trace), 3)
+
+    def test_spectral(self):
+        m = GPy.models.SpectralGPRegression(self.X, self.Y)
+        m.randomize()
+        m_ref = GPy.models.GPRegression(self.X, self.Y)
+        m_ref._set_params(m._get_params())
+        self.assertTrue(np.allclose(m.log_likelihood(), m_ref.log_likelihood()))
+        self.assertTrue(np.allclose(m._log_likelihood_gradients(), m_ref._log_likelihood_gradients()))
+        self.assertTrue(np.allclose(m.Ki, m_ref.Ki))
+        for full_cov in [False, True]:
+            mu, var = m._raw_predict(self.Xnew, full_cov=full_cov)
+            mu_ref, var_ref = m_ref._raw_predict(self.Xnew, full_cov=full_cov)
+            self.assertTrue(np.allclose(mu, mu_ref))
+            self.assertTrue(np.allclose(var, var_ref))
+        self.assertTrue(m.checkgrad())
+
+        # with the lengthscale fixed, the eigendecomposition is reused
+        m.constrain_fixed('rbf_lengthscale')
+        m_ref.constrain_fixed('rbf_lengthscale')
+        K = m.kern.K
+        calls = []
+        def counting_K(*args, **kwargs):
+            calls.append(args)
+            return K(*args, **kwargs)
+        m.kern.K = counting_K
+        x = m._get_params()
+        x[0] *= 1.5
+        x[-1] *= 0.5
+        m._set_params(x)
+        m_ref._set_params(x)
+        self.assertEqual(len(calls), 0)
+        self.assertTrue(np.allclose(m.log_likelihood(), m_ref.log_likelihood()))
+        x = m._get_params_transformed()
+        self.assertTrue(np.allclose(m.objective_function_gradients(x), m_ref.objective_function_gradients(x)))
+        self.assertTrue(m.checkgrad())
+
+        noise_variances, log_likelihoods = m.profile_noise(np.logspace(-3, 1, 50))
+        self.assertEqual(len(calls), 0)
+        x = m_ref._get_params()
+        for noise, ll in zip(noise_variances, log_likelihoods):
+            x[-1] = noise
+            m_ref._set_params(x)
+            self.assertTrue(np.allclose(ll, m_ref.log_likelihood()))
+        self.assertEqual(m._get_params()[-1], noise_variances[np.argmax(log_likelihoods)])
+
+        noise, ll = m.profile_noise()
+        self.assertTrue(ll[0] >= log_likelihoods.max() - 1e-6)
+
+    def test_grid(self):
+        # a shuffled 6 x 5 x 4 grid, the last dimension with 2-D points
+        x1, x2 = np.linspace(-3., 3., 6), np.random.uniform(-3., 3., 5)
+        x3 = np.random.uniform(-3., 3., (4, 2))
+        i1, i2, i3 = [i.flatten() for i in np.meshgrid(range(6), range(5), range(4), indexing='ij')]
+        X = np.hstack((x1[i1, None], x2[i2, None], x3[i3]))[np.random.permutation(120)]
+        Y = np.hstack((np.sin(X[:, :1]) * np.cos(X[:, 1:2]) + X[:, 2:3], X[:, 3:])) + np.random.randn(120, 2) * 0.1
+        k = GPy.kern.rbf(1) ** GPy.kern.Matern32(1) ** GPy.kern.rbf(2, ARD=True)
+        m = GPy.models.GridGPRegression(X, Y, kernel=k.copy())
+        m.randomize()
+        m_ref = GPy.models.GPRegression(X, Y, kernel=k.copy())
+        m_ref._set_params(m._get_params())
+        self.assertTrue(np.allclose(m.log_likelihood(), m_ref.log_likelihood()))
+        self.assertTrue(np.allclose(m._log_likelihood_gradients(), m_ref._log_likelihood_gradients()))
+        self.assertTrue(np.allclose(m.alpha, m_ref.alpha))
+        self.assertTrue(np.allclose(m.Ki, m_ref.Ki))
+        Xnew = np.random.uniform(-3., 3., (20, 4))
+        for full_cov in [False, True]:
+            mu, var = m._raw_predict(Xnew, full_cov=full_cov)
+            mu_ref, var_ref = m_ref._raw_predict(Xnew, full_cov=full_cov)
+            self.assertTrue(np.allclose(mu, mu_ref))
+            self.assertTrue(np.allclose(var, var_ref))
+        self.assertTrue(m.checkgrad())
+
+        # inputs which are not a grid are rejected
+        self.assertRaises(AssertionError, GPy.models.GridGPRegression, X[1:], Y[1:], k.copy())
+
+    def test_state_space(self):
+        X = self.X + 3. # Brownian motion starts at zero
+        Y = np.hstack((self.Y, np.cos(X)))
+        Xnew = np.vstack((self.Xnew + 4., X[:3]))
+        for k in [GPy.kern.exponential(1), GPy.kern.Matern52(1),
+                  GPy.kern.Matern32(1) + GPy.kern.Brownian(1) + GPy.kern.bias(1)]:
+            m = GPy.models.StateSpaceGPRegression(X, Y, kernel=k.copy())
+            m.randomize()
+            m_ref = GPy.models.GPRegression(X, Y, kernel=k.copy())
+            m_ref._set_params(m._get_params())
+            self.assertTrue(np.allclose(m.log_likelihood(), m_ref.log_likelihood()))
+            self.assertTrue(np.allclose(m._log_likelihood_gradients(), m_ref._log_likelihood_gradients()))
+            for which_parts in ['all', [True] + [False] * (k.num_parts - 1)]:
+                mu, var = m._raw_predict(Xnew, which_parts=which_parts)
+                mu_ref, var_ref = m_ref._raw_predict(Xnew, which_parts=which_parts)
+                self.assertTrue(np.allclose(mu, mu_ref))
+                self.assertTrue(np.allclose(var, var_ref))
+            self.assertTrue(m.checkgrad())
+
+    def test_rff(self):
+        # with a finite feature map, Bayesian linear regression is the exact GP
+        X = np.random.randn(30, 2)
+        Y = np.hstack((np.sin(X[:, :1]), np.cos(X[:, 1:])))
+        k = GPy.kern.rbf_rff(2, ARD=True, num_features=20) + GPy.kern.linear(2) + GPy.kern.bias(2)
+        m = GPy.models.RFFRegression(X, Y, kernel=k.copy())
+        m.randomize()
+        m_ref = GPy.models.GPRegression(X, Y, kernel=k.copy())
+        m_ref._set_params(m._get_params())
+        self.assertTrue(np.allclose(m.log_likelihood(), m_ref.log_likelihood()))
+        self.assertTrue(np.allclose(m._log_likelihood_gradients(), m_ref._log_likelihood_gradients()))
+        Xnew = np.random.randn(10, 2)
+        for full_cov in [False, True]:
+            for which_parts in ['all', [True, False, False]]:
+                mu, var = m._raw_predict(Xnew, which_parts=which_parts, full_cov=full_cov)
+                mu_ref, var_ref = m_ref._raw_predict(Xnew, which_parts=which_parts, full_cov=full_cov)
+                self.assertTrue(np.allclose(mu, mu_ref))
+                self.assertTrue(np.allclose(var, var_ref))
+        self.assertTrue(m.checkgrad())
+
+if __name__ == "__main__":
+    print "Running unit tests, please be (very) patient..."
+    unittest.main()
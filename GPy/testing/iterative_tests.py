@@ -0,0 +1,137 @@
+# Copyright (c) 2013, GPy authors (see AUTHORS.txt).
+# Licensed under the BSD 3-clause license (see LICENSE.txt)
+
+import unittest
+import numpy as np
+import GPy
+from GPy.util.iterative import pcg, lanczos_quadrature
+from GPy.util.toeplitz import embedding_lags, bttb_eig, bttb_dot, lag_sums
+from GPy.util.interpolation import regular_grid, cubic_interpolation_weights
+
+class IterativeTests(unittest.TestCase):
+    def setUp(self):
+        self.N = 40
+        self.X = np.random.uniform(-3., 3., (self.N, 2))
+        self.Y = np.sin(self.X[:, :1]) * np.cos(self.X[:, 1:]) + np.random.randn(self.N, 1) * 0.1
+
+    def test_pcg(self):
+        A = np.random.randn(self.N, self.N)
+        A = np.dot(A, A.T) / self.N + np.eye(self.N)
+        B = np.random.randn(self.N, 3)
+        d = np.diag(A)
+        X, alphas, betas, iterations = pcg(lambda V: np.dot(A, V), B, lambda R: R / d[:, None], tol=1e-10)
+        self.assertTrue(np.allclose(X, np.linalg.solve(A, B)))
+
+    def test_lanczos_logdet(self):
+        # probes spanning the whole space make the estimate exact
+        A = np.random.randn(self.N, self.N)
+        A = np.dot(A, A.T) / self.N + np.eye(self.N)
+        Z = np.eye(self.N)
+        X, alphas, betas, iterations = pcg(lambda V: np.dot(A, V), Z, tol=1e-12)
+        logdet = np.sum(lanczos_quadrature(alphas, betas, iterations))
+        self.assertTrue(np.allclose(logdet, np.linalg.slogdet(A)[1]))
+
+    def test_exact_probes(self):
+        k = GPy.kern.rbf(2, ARD=True) + GPy.kern.white(2, 0.1)
+        m = GPy.models.IterativeGPRegression(self.X, self.Y, kernel=k.copy(), block_size=15, tol=1e-12)
+        m.probes = np.sqrt(self.N) * np.eye(self.N)
+        m.randomize()
+        m_ref = GPy.models.GPRegression(self.X, self.Y, kernel=k.copy())
+        m_ref._set_params(m._get_params())
+        self.assertTrue(np.allclose(m.log_likelihood(), m_ref.log_likelihood()))
+        self.assertTrue(np.allclose(m._log_likelihood_gradients(), m_ref._log_likelihood_gradients()))
+        Xnew = np.random.uniform(-3., 3., (20, 2))
+        for full_cov in [False, True]:
+            mu, var = m._raw_predict(Xnew, full_cov=full_cov)
+            mu_ref, var_ref = m_ref._raw_predict(Xnew, full_cov=full_cov)
+            self.assertTrue(np.allclose(mu, mu_ref))
+            self.assertTrue(np.allclose(var, var_ref))
+
+    def test_stochastic_estimate(self):
+        m = GPy.models.IterativeGPRegression(self.X, self.Y, num_probes=200)
+        m_ref = GPy.models.GPRegression(self.X, self.Y)
+        self.assertTrue(np.abs(m.log_likelihood() - m_ref.log_likelihood()) < 0.05 * np.abs(m_ref.log_likelihood()))
+
+    def test_toeplitz_algebra(self):
+        shape = (5, 4)
+        x = np.array(np.meshgrid(np.arange(5) * .3, np.arange(4) * .7, indexing='ij')).reshape(2, -1).T
+        k = GPy.kern.rbf(2, ARD=True)
+        t = k.K(x[:1] + embedding_lags(shape) * [.3, .7], x[:1])[:, 0]
+        K = k.K(x)
+        V = np.random.randn(20, 3)
+        self.assertTrue(np.allclose(bttb_dot(bttb_eig(t, shape), shape, V), np.dot(K, V)))
+        A, B = np.random.randn(20, 2), np.random.randn(20, 2)
+        dL_dK = np.dot(A, B.T)
+        W = lag_sums(A, B, shape)
+        self.assertTrue(np.allclose(np.dot(W, t), np.sum(dL_dK * K)))
+        self.assertTrue(np.allclose(k.dK_dtheta(W[:, None], x[:1] + embedding_lags(shape) * [.3, .7], x[:1]), k.dK_dtheta(dL_dK, x)))
+
+    def test_toeplitz(self):
+        X = np.linspace(0., 5., self.N)[np.random.permutation(self.N), None]
+        Y = np.sin(X) + np.random.randn(self.N, 1) * 0.1
+        k = GPy.kern.Matern52(1) + GPy.kern.white(1, 0.1)
+        m = GPy.models.ToeplitzGPRegression(X, Y, kernel=k.copy(), tol=1e-12)
+        m.probes = np.sqrt(self.N) * np.eye(self.N)
+        m.randomize()
+        m_ref = GPy.models.GPRegression(X, Y, kernel=k.copy())
+        m_ref._set_params(m._get_params())
+        self.assertTrue(np.allclose(m.log_likelihood(), m_ref.log_likelihood()))
+        self.assertTrue(np.allclose(m._log_likelihood_gradients(), m_ref._log_likelihood_gradients()))
+        Xnew = np.random.uniform(-1., 6., (20, 1))
+        mu, var = m._raw_predict(Xnew)
+        mu_ref, var_ref = m_ref._raw_predict(Xnew)
+        self.assertTrue(np.allclose(mu, mu_ref))
+        self.assertTrue(np.allclose(var, var_ref))
+
+        # irregular inputs are rejected
+        self.assertRaises(AssertionError, GPy.models.ToeplitzGPRegression, self.X[:, :1], self.Y)
+        # and so are non-stationary kernels
+        self.assertRaises(AssertionError, GPy.models.ToeplitzGPRegression, X, Y, kernel=GPy.kern.linear(1))
+        self.assertRaises(AssertionError, GPy.models.ToeplitzGPRegression, X, Y, kernel=GPy.kern.rbf(1) * GPy.kern.linear(1))
+
+    def test_interpolation(self):
+        start, step = regular_grid(self.X, [20, 15])
+        W = cubic_interpolation_weights(self.X, start, step, [20, 15])
+        grid = np.array(np.meshgrid(start[0] + np.arange(20) * step[0], start[1] + np.arange(15) * step[1], indexing='ij')).reshape(2, -1).T
+        # cubic interpolation is exact for quadratic functions
+        f = lambda X: 1. + X[:, 0] - 2. * X[:, 1] + X[:, 0] * X[:, 1] + X[:, 1] ** 2
+        self.assertTrue(np.allclose(W.dot(f(grid)), f(self.X)))
+
+    def test_kiss(self):
+        k = GPy.kern.Matern32(2, ARD=True)
+        m = GPy.models.KISSGPRegression(self.X, self.Y, kernel=k.copy(), grid_size=[12, 10], tol=1e-12)
+        m.probes = np.sqrt(self.N) * np.eye(self.N)
+        m.randomize()
+        # the exact log likelihood of the interpolated covariance
+        grid = np.array(np.meshgrid(*[m._grid_start[d] + np.arange(m.grid_size[d]) * m._grid_step[d] for d in range(2)], indexing='ij')).reshape(2, -1).T
+        W = m.W.toarray()
+        K = np.dot(np.dot(W, m.kern.K(grid)), W.T) + m.likelihood._variance * np.eye(self.N)
+        log_likelihood = -0.5 * (self.N * np.log(2. * np.pi) + np.linalg.slogdet(K)[1] + np.dot(self.Y.T, np.linalg.solve(K, self.Y)))
+        self.assertTrue(np.allclose(m.log_likelihood(), log_likelihood))
+        self.assertTrue(m.checkgrad())
+        Xnew = np.random.uniform(-3., 3., (20, 2))
+        Wnew = cubic_interpolation_weights(Xnew, m._grid_start, m._grid_step, m.grid_size).toarray()
+        Kx = np.dot(np.dot(W, m.kern.K(grid)), Wnew.T)
+        Kxx = np.dot(np.dot(Wnew, m.kern.K(grid)), Wnew.T)
+        mu, var = m._raw_predict(Xnew, full_cov=True)
+        self.assertTrue(np.allclose(mu, np.dot(Kx.T, np.linalg.solve(K, self.Y))))
+        self.assertTrue(np.allclose(var, Kxx - np.dot(Kx.T, np.linalg.solve(K, Kx))))
+        mu_diag, var_diag = m._raw_predict(Xnew)
+        self.assertTrue(np.allclose(var_diag[:, 0], np.diag(var)))
+
+        # a fine grid approaches the exact GP, within the range of the inputs
+        Xnew = np.random.uniform(self.X.min(0), self.X.max(0), (20, 2))
+        m = GPy.models.KISSGPRegression(self.X, self.Y, grid_size=60, num_probes=100)
+        m_ref = GPy.models.GPRegression(self.X, self.Y)
+        m_ref._set_params(m._get_params())
+        self.assertTrue(np.abs(m.log_likelihood() - m_ref.log_likelihood()) < 0.05 * np.abs(m_ref.log_likelihood()))
+        self.assertTrue(np.allclose(m._raw_predict(Xnew)[0], m_ref._raw_predict(Xnew)[0], atol=1e-2))
+
+        # the interpolated covariance is only Toeplitz for stationary kernels
+        self.assertRaises(AssertionError, GPy.models.KISSGPRegression, self.X, self.Y, kernel=GPy.kern.rbf(2) + GPy.kern.linear(2))
+        # and white noise parts, which interpolation would smear
+        self.assertRaises(AssertionError, GPy.models.KISSGPRegression, self.X, self.Y, kernel=GPy.kern.rbf(2) + GPy.kern.white(2))
+
+if __name__ == "__main__":
+    print "Running unit tests, please be (very) patient..."
+    unittest.main()
@@ -55,6 +55,179 @@ class KernelTests(unittest.TestCase):
         kern = GPy.kern.Matern52(5)
         self.assertTrue(GPy.kern.kern_test(kern, verbose=verbose))
 
+    def test_rffkernels(self):
+        for kern in [GPy.kern.rbf_rff(5, ARD=True, num_features=50), GPy.kern.matern_rff(5, nu=2.5, num_features=50)]:
+            self.assertTrue(GPy.kern.kern_test(kern, verbose=verbose))
+
+    def test_rff_approximation(self):
+        X = np.random.randn(20, 2)
+        for kern, kern_rff in [(GPy.kern.rbf(2, lengthscale=[1.5, .7], ARD=True), GPy.kern.rbf_rff(2, lengthscale=[1.5, .7], ARD=True, num_features=20000, seed=0)),
+                               (GPy.kern.Matern32(2, lengthscale=2.), GPy.kern.matern_rff(2, lengthscale=2., nu=1.5, num_features=20000, seed=0))]:
+            self.assertTrue(np.abs(kern.K(X) - kern_rff.K(X)).max() < 0.05)
+        # features of sums are concatenated
+        k = GPy.kern.rbf_rff(2, num_features=10) + GPy.kern.linear(2, ARD=True) + GPy.kern.bias(2)
+        Phi = k.features(X)
+        self.assertEqual(Phi.shape, (20, 13))
+        self.assertTrue(np.allclose(np.dot(Phi, Phi.T), k.K(X)))
+
+    def test_stationary_ARD(self):
+        X = np.random.randn(20, 3)
+        Y = np.sin(X[:, :1]) + np.random.randn(20, 1) * 0.1
+        for kern in [GPy.kern.Matern32(3, ARD=True), GPy.kern.Matern52(3, ARD=True), GPy.kern.exponential(3, ARD=True)]:
+            m = GPy.models.GPRegression(X, Y, kernel=kern)
+            m.randomize()
+            self.assertTrue(m.checkgrad())
+
+    def test_distance_cache(self):
+        X, X2 = np.random.randn(10, 3), np.random.randn(8, 3)
+        k = GPy.kern.rbf(3) + GPy.kern.Matern32(3, lengthscale=2.) + GPy.kern.Matern52(3, ARD=True) * GPy.kern.exponential(3)
+        self.assertTrue(all([p.distances is k.distances for p in k.parts]))
+        K = k.K(X, X2)
+        # a copy of the inputs hits the same entries
+        num_entries = len(k.distances._entries)
+        self.assertTrue(np.allclose(k.K(X.copy(), X2.copy()), K))
+        self.assertEqual(len(k.distances._entries), num_entries)
+        k.distances.clear()
+        for p in k.parts:
+            p.distances = None
+        self.assertTrue(np.allclose(k.K(X, X2), K))
+        # the cache is bounded
+        cache = GPy.util.distances.DistanceCache(max_bytes=X.shape[0] * X2.shape[0] * 8 * 2)
+        for l in [1., 2., 3.]:
+            r2 = cache.scaled_sqdist(X, X2, l)
+            self.assertTrue(np.allclose(r2, np.sum(np.square(X[:, None, :] - X2[None, :, :]), -1) / l ** 2))
+        self.assertEqual(len(cache._entries), 2)
+        # small inputs keep the precision of nearly coincident points, large ones are clipped at zero
+        X = np.random.randn(10, 3) * 1e3
+        self.assertTrue(np.allclose(np.diag(GPy.util.distances.sqdist(X, X + 1e-6)), 3e-12, rtol=1e-3, atol=0.))
+        X = np.random.randn(200, 3) * 1e3
+        self.assertTrue(np.all(GPy.util.distances.sqdist(X, X + 1e-6) >= 0.))
+
+    def test_K_and_cache(self):
+        X, X2 = np.random.randn(10, 2), np.random.randn(8, 2)
+        index, index2 = np.random.randint(0, 3, (10, 1)), np.random.randint(0, 3, (8, 1))
+        kernels = [GPy.kern.rbf(2, ARD=True) + GPy.kern.Matern32(2) + GPy.kern.Matern52(2, ARD=True) + GPy.kern.exponential(2) + GPy.kern.linear(2, ARD=True) + GPy.kern.linear(2) + GPy.kern.bias(2) + GPy.kern.white(2),
+                   GPy.kern.rbf(2) * GPy.kern.Matern32(2) + GPy.kern.rbf(1) ** GPy.kern.linear(1),
+                   GPy.kern.rational_quadratic(1)]
+        for k in kernels:
+            k._set_params(np.random.uniform(0.5, 2., k.num_params))
+            XX, XX2 = X[:, :k.input_dim], X2[:, :k.input_dim]
+            for Xa, Xb, dL_dK in [(XX, None, np.random.randn(10, 10)), (XX, XX2, np.random.randn(10, 8))]:
+                K, cache = k.K_and_cache(Xa, Xb)
+                self.assertTrue(np.allclose(K, k.K(Xa, Xb)))
+                self.assertTrue(np.allclose(k.dK_dtheta_from_cache(dL_dK, cache), k.dK_dtheta(dL_dK, Xa, Xb)))
+        k = GPy.kern.coregionalize(3, 2)
+        K, cache = k.K_and_cache(index, index2)
+        dL_dK = np.random.randn(10, 8)
+        self.assertTrue(np.allclose(K, k.K(index, index2)))
+        self.assertTrue(np.allclose(k.dK_dtheta_from_cache(dL_dK, cache), k.dK_dtheta(dL_dK, index, index2)))
+
+    def test_psi2_blocks(self):
+        Z, mu, S = np.random.randn(6, 3), np.random.randn(20, 3), np.random.rand(20, 3)
+        dL_dpsi2 = np.random.randn(20, 6, 6)
+        dL_dpsi2 += dL_dpsi2.swapaxes(1, 2)
+        results = []
+        for block_size in [1, 7, 20]:
+            k = GPy.kern.rbf(3, 1.5, [.5, 1., 2.], ARD=True) + GPy.kern.bias(3)
+            k.parts[0].psi2_block_size = block_size
+            results.append([k.psi2(Z, mu, S), k.dpsi2_dtheta(dL_dpsi2, Z, mu, S), k.dpsi2_dZ(dL_dpsi2, Z, mu, S)] + list(k.dpsi2_dmuS(dL_dpsi2, Z, mu, S)))
+            self.assertTrue(np.allclose(k.psi2_sum(Z, mu, S), results[-1][0].sum(0)))
+        for result in results[:-1]:
+            for a, b in zip(result, results[-1]):
+                self.assertTrue(np.allclose(a, b))
+        k = GPy.kern.linear(3, ARD=True) + GPy.kern.bias(3) + GPy.kern.white(3)
+        self.assertTrue(np.allclose(k.psi2_sum(Z, mu, S), k.psi2(Z, mu, S).sum(0)))
+
+    def test_psi_quadrature(self):
+        # the quadrature agrees with the closed forms, where these exist
+        from GPy.kern.psi_quadrature import PsiQuadrature
+        Z, mu, S = np.random.randn(4, 2), np.random.randn(8, 2), np.random.rand(8, 2) + 0.1
+        dL_dpsi2 = np.random.randn(8, 4, 4)
+        dL_dpsi2 += dL_dpsi2.swapaxes(1, 2)
+        quadrature = PsiQuadrature(degree=30)
+        for part in [GPy.kern.rbf(2, ARD=True, lengthscale=[1., 2.]).parts[0], GPy.kern.linear(2, ARD=True).parts[0]]:
+            for which in ['psi0', 'psi1', 'psi2']:
+                target = np.zeros((8, 4, 4)[:int(which[-1]) + 1])
+                getattr(part, which)(Z, mu, S, target)
+                approximation = np.zeros_like(target)
+                getattr(quadrature, which)(part, Z, mu, S, approximation)
+                self.assertTrue(np.allclose(target, approximation))
+            for which, shape in [('dpsi2_dtheta', part.num_params), ('dpsi2_dZ', Z.shape)]:
+                target, approximation = np.zeros(shape), np.zeros(shape)
+                getattr(part, which)(dL_dpsi2, Z, mu, S, target)
+                getattr(quadrature, which)(part, dL_dpsi2, Z, mu, S, approximation)
+                self.assertTrue(np.allclose(target, approximation))
+
+        # falling back to the unscented points warns
+        import warnings
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            PsiQuadrature().nodes(4)
+            self.assertEqual(len(caught), 0)
+            xi, weights = PsiQuadrature().nodes(5)
+            self.assertEqual(len(caught), 1)
+        self.assertEqual(xi.shape, (11, 5))
+
+    def test_psi2_shared_gradients(self):
+        Z, mu, S = np.random.randn(6, 3), np.random.randn(20, 3), np.random.rand(20, 3)
+        dL_dpsi2 = np.random.randn(6, 6)
+        dL_dpsi2 += dL_dpsi2.T
+        dL_dpsi2_repeated = np.repeat(dL_dpsi2[None], 20, 0)
+        kernels = [GPy.kern.rbf(3, ARD=True) + GPy.kern.bias(3) + GPy.kern.white(3),
+                   GPy.kern.linear(3, ARD=True) + GPy.kern.bias(3),
+                   GPy.kern.linear(3), GPy.kern.rbf_inv(3, ARD=True)]
+        for k in kernels:
+            k._set_params(np.random.uniform(0.5, 2., k.num_params))
+            self.assertTrue(np.allclose(k.dpsi2_dtheta(dL_dpsi2, Z, mu, S), k.dpsi2_dtheta(dL_dpsi2_repeated, Z, mu, S)))
+            self.assertTrue(np.allclose(k.dpsi2_dZ(dL_dpsi2, Z, mu, S), k.dpsi2_dZ(dL_dpsi2_repeated, Z, mu, S)))
+            for a, b in zip(k.dpsi2_dmuS(dL_dpsi2, Z, mu, S), k.dpsi2_dmuS(dL_dpsi2_repeated, Z, mu, S)):
+                self.assertTrue(np.allclose(a, b))
+
+    def test_symmetric_tiles(self):
+        # with X2 None, K and dK_dtheta use the tiles of the upper triangle only
+        X = np.random.randn(300, 1)
+        dL_dK = np.random.randn(300, 300)
+        dL_dK += dL_dK.T
+        for k in [GPy.kern.Matern32(1), GPy.kern.Matern52(1), GPy.kern.exponential(1), GPy.kern.rational_quadratic(1),
+                  GPy.kern.periodic_Matern32(1)]:
+            self.assertTrue(np.allclose(k.K(X), k.K(X, X.copy())))
+            self.assertTrue(np.allclose(k.dK_dtheta(dL_dK, X), k.dK_dtheta(dL_dK, X, X.copy())))
+        k = GPy.kern.gibbs(1)
+        self.assertTrue(np.allclose(k.K(X), k.K(X, X.copy())))
+        # the tiles count both the rows and the columns of an asymmetric dL_dK
+        dL_dK = np.random.randn(300, 300)
+        self.assertTrue(np.allclose(k.dK_dtheta(dL_dK, X), k.dK_dtheta(dL_dK, X, X.copy())))
+
+    def test_tile_engine(self):
+        # the tiles computed in threads give the covariance computed as a whole
+        from GPy.kern.tiling import TileEngine
+        X, X2 = np.random.randn(50, 2), np.random.randn(40, 2)
+        dL_dK, dL_dK2 = np.random.randn(50, 50), np.random.randn(50, 40)
+        dL_dK = dL_dK + dL_dK.T
+        for k in [GPy.kern.rbf(2, ARD=True) + GPy.kern.linear(2) + GPy.kern.white(2) + GPy.kern.bias(2),
+                  GPy.kern.Matern32(2) * GPy.kern.rbf(2) + GPy.kern.exponential(2, ARD=True) + GPy.kern.gibbs(2)]:
+            results = []
+            for engine in [TileEngine(num_threads=1), TileEngine(num_threads=3, tile_size=16)]:
+                k.engine = engine
+                results.append([k.K(X), k.K(X, X2), k.Kdiag(X), k.dK_dtheta(dL_dK, X), k.dK_dtheta(dL_dK2, X, X2),
+                                k.dK_dX(dL_dK, X), k.dK_dX(dL_dK2, X, X2)])
+            for a, b in zip(*results):
+                self.assertTrue(np.allclose(a, b))
+
+    def test_block_labels(self):
+        X = np.hstack((np.random.randn(12, 1), np.arange(12)[:, None] % 3, np.arange(12)[:, None] % 2))
+        for k, num_blocks in [(GPy.kern.independent_outputs(GPy.kern.rbf(1)) ** GPy.kern.white(1), 12),
+                              (GPy.kern.independent_outputs(GPy.kern.rbf(2)) * GPy.kern.independent_outputs(GPy.kern.rbf(2)), 2),
+                              (GPy.kern.hierarchical(GPy.kern.rbf(1) + GPy.kern.rbf(1)), 1),
+                              (GPy.kern.rbf(3) + GPy.kern.white(3), None)]:
+            labels = k.block_labels(X)
+            if num_blocks is None:
+                self.assertTrue(labels is None)
+                continue
+            self.assertEqual(labels.max() + 1, num_blocks)
+            # the covariance across the blocks is zero
+            self.assertTrue(np.all(k.K(X)[labels[:, None] != labels[None, :]] == 0.))
+
     def test_linearkernel(self):
         kern = GPy.kern.linear(5)
         self.assertTrue(GPy.kern.kern_test(kern, verbose=verbose))
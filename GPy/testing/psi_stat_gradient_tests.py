@@ -113,6 +113,34 @@ class DPsiStatTest(unittest.TestCase):
         m.randomize()
         assert m.checkgrad(), "{} x psi2".format("+".join(map(lambda x: x.name, k.parts)))
 
+class DPsiStatQuadratureTest(unittest.TestCase):
+    """The psi statistics computed by quadrature (see GPy.kern.psi_quadrature)."""
+    N = 10
+    num_inducing = 4
+    input_dim = 2
+    X = numpy.random.randn(N, input_dim)
+    X_var = .5 * numpy.ones_like(X) + .4 * numpy.clip(numpy.random.randn(*X.shape), 0, 1)
+    Z = numpy.random.permutation(X)[:num_inducing]
+
+    kernels = [GPy.kern.Matern32(input_dim, ARD=True), GPy.kern.Matern52(input_dim) + GPy.kern.bias(input_dim),
+               GPy.kern.rbf(input_dim) + GPy.kern.linear(input_dim) + GPy.kern.white(input_dim),
+               GPy.kern.rbf(1).add(GPy.kern.Matern32(1), tensor=True),
+               GPy.kern.rbf(input_dim) * GPy.kern.exponential(input_dim)]
+
+    def check(self, which):
+        for k in self.kernels:
+            m = PsiStatModel(which, X=self.X, X_variance=self.X_var, Z=self.Z,
+                             num_inducing=self.num_inducing, kernel=k)
+            m.ensure_default_constraints()
+            m.randomize()
+            assert m.checkgrad(), "{} x {}".format("+".join(map(lambda x: x.name, k.parts)), which)
+
+    def testPsi1(self):
+        self.check('psi1')
+
+    def testPsi2(self):
+        self.check('psi2')
+
 
 if __name__ == "__main__":
     import sys
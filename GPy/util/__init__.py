@@ -2,13 +2,22 @@
 # Licensed under the BSD 3-clause license (see LICENSE.txt)
 
 
+import parallel
 import linalg
+import iterative
+import kronecker
+import toeplitz
+import interpolation
+import distances
+import quadrature
 import misc
 import plot
 import squashers
 import Tango
 import warping_functions
 import datasets
+import data_chunks
+import minibatches
 import mocap
 import visualize
 import decorators
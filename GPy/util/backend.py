@@ -0,0 +1,61 @@
+# Copyright (c) 2013, GPy authors (see AUTHORS.txt).
+# Licensed under the BSD 3-clause license (see LICENSE.txt)
+
+"""
+Backends for the numerical hot spots of GPy (symmetrify, fast_array_equal,
+the ARD gradients and the psi statistics of some kernels, ...).
+
+Each routine has a vectorized numpy implementation, which is always
+available and is registered next to the code which uses it, and may have
+accelerated ones, e.g. inline C through scipy.weave (see backend_weave).
+The backend is chosen in the [backend] section of the configuration
+file, for all routines or for one of them::
+
+    [backend]
+    default=numpy
+    symmetrify=weave
+
+A routine which has no implementation in the chosen backend, or whose
+backend cannot be imported, uses numpy.
+"""
+
+from config import config
+
+# the implementations of each routine, {name: {backend: function}}
+_implementations = {}
+
+def register(name, backend_name):
+    """
+    A decorator which registers the decorated function as the
+    implementation of the routine name in the given backend.
+    """
+    def decorator(f):
+        _implementations.setdefault(name, {})[backend_name] = f
+        return f
+    return decorator
+
+def implementations(name):
+    """The implementations of the routine name, as a dict {backend: function}."""
+    return dict(_implementations[name])
+
+def routines():
+    """The names of the registered routines."""
+    return sorted(_implementations.keys())
+
+def selected(name):
+    """The backend configured for the routine name."""
+    if config.has_option('backend', name):
+        return config.get('backend', name)
+    elif config.has_option('backend', 'default'):
+        return config.get('backend', 'default')
+    return 'numpy'
+
+def get(name):
+    """The implementation of the routine name in the configured backend."""
+    impl = _implementations[name]
+    return impl.get(selected(name), impl['numpy'])
+
+try:
+    import backend_weave
+except ImportError:
+    pass
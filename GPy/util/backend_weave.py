@@ -0,0 +1,351 @@
+# Copyright (c) 2013, GPy authors (see AUTHORS.txt).
+# Licensed under the BSD 3-clause license (see LICENSE.txt)
+
+"""
+The weave backend: inline C implementations of the routines of
+GPy.util.backend. OpenMP is used if enabled in the [parallel] section of
+the configuration file.
+"""
+
+import numpy as np
+from scipy import weave
+from config import config
+from backend import register, implementations
+
+def _openmp():
+    return config.getboolean('parallel', 'openmp')
+
+def _options():
+    if _openmp():
+        return {'headers'           : ['<omp.h>'],
+                'extra_compile_args': ['-fopenmp -O3'],
+                'extra_link_args'   : ['-lgomp'],
+                'libraries'         : ['gomp']}
+    return {'extra_compile_args': ['-O3']}
+
+def _support_code():
+    if _openmp():
+        return """
+        #include <omp.h>
+        #include <math.h>
+        """
+    return """
+    #include <math.h>
+    """
+
+def _pragma(private):
+    if _openmp():
+        return '#pragma omp parallel for private(%s)' % private
+    return ''
+
+@register('symmetrify', 'weave')
+def symmetrify(A, upper=False):
+    c_contig_code = """
+    int iN;
+    for (int i=1; i<N; i++){
+      iN = i*N;
+      for (int j=0; j<i; j++){
+        A[i+j*N] = A[iN+j];
+      }
+    }
+    """
+    f_contig_code = """
+    int iN;
+    for (int i=1; i<N; i++){
+      iN = i*N;
+      for (int j=0; j<i; j++){
+        A[iN+j] = A[i+j*N];
+      }
+    }
+    """
+    N = int(A.shape[0])
+    if A.flags['C_CONTIGUOUS'] and upper:
+        weave.inline(f_contig_code, ['A', 'N'], extra_compile_args=['-O3'])
+    elif A.flags['C_CONTIGUOUS'] and not upper:
+        weave.inline(c_contig_code, ['A', 'N'], extra_compile_args=['-O3'])
+    elif A.flags['F_CONTIGUOUS'] and upper:
+        weave.inline(c_contig_code, ['A', 'N'], extra_compile_args=['-O3'])
+    elif A.flags['F_CONTIGUOUS'] and not upper:
+        weave.inline(f_contig_code, ['A', 'N'], extra_compile_args=['-O3'])
+    else:
+        implementations('symmetrify')['numpy'](A, upper)
+
+@register('cholupdate', 'weave')
+def cholupdate(L, x):
+    code = """
+    double r,c,s;
+    int j,i;
+    for(j=0; j<N; j++){
+      r = sqrt(L(j,j)*L(j,j) + x(j)*x(j));
+      c = r / L(j,j);
+      s = x(j) / L(j,j);
+      L(j,j) = r;
+      for (i=j+1; i<N; i++){
+        L(i,j) = (L(i,j) + s*x(i))/c;
+        x(i) = c*x(i) - s*L(i,j);
+      }
+    }
+    """
+    x = np.array(x, dtype=np.float64).flatten()
+    N = int(x.size)
+    weave.inline(code, support_code="#include <math.h>", arg_names=['N', 'L', 'x'], type_converters=weave.converters.blitz)
+
+@register('array_equal', 'weave')
+def array_equal(A, B):
+    if A is None or B is None:
+        return A is None and B is None
+    if A.shape != B.shape:
+        return False
+    if A.ndim == 2:
+        code = """
+        int i, j;
+        return_val = 1;
+        %s
+        for(i=0;i<N;i++){
+           for(j=0;j<D;j++){
+              if(A(i, j) != B(i, j)){
+                  return_val = 0;
+                  break;
+              }
+           }
+        }
+        """ % _pragma('i, j')
+        N, D = [int(i) for i in A.shape]
+        return bool(weave.inline(code, support_code=_support_code(),
+                                 arg_names=['A', 'B', 'N', 'D'],
+                                 type_converters=weave.converters.blitz, **_options()))
+    elif A.ndim == 3:
+        code = """
+        int i, j, z;
+        return_val = 1;
+        %s
+        for(i=0;i<N;i++){
+           for(j=0;j<D;j++){
+             for(z=0;z<Q;z++){
+                if(A(i, j, z) != B(i, j, z)){
+                   return_val = 0;
+                   break;
+                }
+              }
+           }
+        }
+        """ % _pragma('i, j, z')
+        N, D, Q = [int(i) for i in A.shape]
+        return bool(weave.inline(code, support_code=_support_code(),
+                                 arg_names=['A', 'B', 'N', 'D', 'Q'],
+                                 type_converters=weave.converters.blitz, **_options()))
+    return np.array_equal(A, B)
+
+@register('sqdiff_sums', 'weave')
+def sqdiff_sums(G, X, X2=None):
+    input_dim = int(X.shape[1])
+    target = np.zeros(input_dim)
+    if X2 is None:
+        # save computation for the symmetrical case
+        code = """
+        int q,i,j;
+        double tmp;
+        for(q=0; q<input_dim; q++){
+          tmp = 0;
+          for(i=0; i<num_data; i++){
+            for(j=0; j<i; j++){
+              tmp += (X(i,q)-X(j,q))*(X(i,q)-X(j,q))*(G(i,j)+G(j,i));
+            }
+          }
+          target(q) = tmp;
+        }
+        """
+        num_data = int(X.shape[0])
+        weave.inline(code, arg_names=['num_data', 'input_dim', 'X', 'target', 'G'], type_converters=weave.converters.blitz, **_options())
+    else:
+        code = """
+        int q,i,j;
+        double tmp;
+        for(q=0; q<input_dim; q++){
+          tmp = 0;
+          for(i=0; i<num_data; i++){
+            for(j=0; j<num_data2; j++){
+              tmp += (X(i,q)-X2(j,q))*(X(i,q)-X2(j,q))*G(i,j);
+            }
+          }
+          target(q) = tmp;
+        }
+        """
+        num_data, num_data2 = int(X.shape[0]), int(X2.shape[0])
+        weave.inline(code, arg_names=['num_data', 'num_data2', 'input_dim', 'X', 'X2', 'target', 'G'], type_converters=weave.converters.blitz, **_options())
+    return target
+
+@register('rbf_psi2', 'weave')
+def rbf_psi2(mu, Zhat, Zdist_sq, denom, lengthscale2):
+    N, input_dim = int(mu.shape[0]), int(mu.shape[1])
+    num_inducing = int(Zhat.shape[0])
+    mudist = np.empty((N, num_inducing, num_inducing, input_dim))
+    mudist_sq = np.empty((N, num_inducing, num_inducing, input_dim))
+    psi2_exponent = np.zeros((N, num_inducing, num_inducing))
+    half_log_denom = 0.5 * np.log(denom)
+    lengthscale2 = np.ones(input_dim) * lengthscale2
+
+    code = """
+    double tmp;
+
+    %s
+    for (int n=0; n<N; n++){
+        for (int m=0; m<num_inducing; m++){
+           for (int mm=0; mm<(m+1); mm++){
+               for (int q=0; q<input_dim; q++){
+                   //compute mudist
+                   tmp = mu(n,q) - Zhat(m,mm,q);
+                   mudist(n,m,mm,q) = tmp;
+                   mudist(n,mm,m,q) = tmp;
+
+                   //now mudist_sq
+                   tmp = tmp*tmp/lengthscale2(q)/denom(n,q);
+                   mudist_sq(n,m,mm,q) = tmp;
+                   mudist_sq(n,mm,m,q) = tmp;
+
+                   //now psi2_exponent
+                   tmp = -Zdist_sq(m,mm,q) - tmp - half_log_denom(n,q);
+                   psi2_exponent(n,mm,m) += tmp;
+                   if (m !=mm){
+                       psi2_exponent(n,m,mm) += tmp;
+                   }
+               }
+            }
+        }
+    }
+    """ % _pragma('tmp')
+
+    weave.inline(code, support_code=_support_code(),
+                 arg_names=['N', 'num_inducing', 'input_dim', 'mu', 'Zhat', 'mudist_sq', 'mudist', 'lengthscale2', 'denom', 'Zdist_sq', 'psi2_exponent', 'half_log_denom'],
+                 type_converters=weave.converters.blitz, **_options())
+    return mudist, mudist_sq, psi2_exponent
+
+@register('linear_dpsi2_dmuS', 'weave')
+def linear_dpsi2_dmuS(dL_dpsi2, mu, ZA, target_mu, target_S):
+    AZZA = ZA.T[:, None, :, None] * ZA[None, :, None, :]
+    AZZA = AZZA + AZZA.swapaxes(1, 2)
+    AZZA_2 = AZZA / 2.
+
+    #Using weave, we can exploit the symmetry of this problem:
+    code = """
+    int n, m, mm,q,qq;
+    double factor,tmp;
+    %s
+    for(n=0;n<N;n++){
+      for(m=0;m<num_inducing;m++){
+        for(mm=0;mm<=m;mm++){
+          //add in a factor of 2 for the off-diagonal terms (and then count them only once)
+          if(m==mm)
+            factor = dL_dpsi2(n,m,mm);
+          else
+            factor = 2.0*dL_dpsi2(n,m,mm);
+
+          for(q=0;q<input_dim;q++){
+
+            //take the dot product of mu[n,:] and AZZA[:,m,mm,q]
+            tmp = 0.0;
+            for(qq=0;qq<input_dim;qq++){
+              tmp += mu(n,qq)*AZZA(qq,m,mm,q);
+            }
+
+            target_mu(n,q) += factor*tmp;
+            target_S(n,q) += factor*AZZA_2(q,m,mm,q);
+          }
+        }
+      }
+    }
+    """ % _pragma('m,mm,q,qq,factor,tmp')
+
+    N, num_inducing, input_dim = int(mu.shape[0]), int(ZA.shape[0]), int(mu.shape[1])
+    weave.inline(code, support_code=_support_code(),
+                 arg_names=['N', 'num_inducing', 'input_dim', 'mu', 'AZZA', 'AZZA_2', 'target_mu', 'target_S', 'dL_dpsi2'],
+                 type_converters=weave.converters.blitz, **_options())
+
+@register('linear_dpsi2_dZ', 'weave')
+def linear_dpsi2_dZ(dL_dpsi2, AZA, target):
+    code = """
+    int n,m,mm,q;
+    %s
+    for(m=0;m<num_inducing;m++){
+      for(q=0;q<input_dim;q++){
+        for(mm=0;mm<num_inducing;mm++){
+          for(n=0;n<N;n++){
+            target(m,q) += dL_dpsi2(n,m,mm)*AZA(n,mm,q);
+          }
+        }
+      }
+    }
+    """ % _pragma('n,mm,q')
+
+    N, num_inducing, input_dim = [int(i) for i in AZA.shape]
+    weave.inline(code, support_code=_support_code(),
+                 arg_names=['N', 'num_inducing', 'input_dim', 'AZA', 'target', 'dL_dpsi2'],
+                 type_converters=weave.converters.blitz, **_options())
+
+@register('coregionalize_K', 'weave')
+def coregionalize_K(B, index, index2, target):
+    if index2 is None:
+        code = """
+        for(int i=0; i<N; i++){
+          target(i,i) += B((int)index(i),(int)index(i));
+          for(int j=0; j<i; j++){
+            target(i,j) += B((int)index(i),(int)index(j));
+            target(j,i) += B((int)index(j),(int)index(i));
+          }
+        }
+        """
+        N = int(index.size)
+        weave.inline(code, ['target', 'index', 'N', 'B'], type_converters=weave.converters.blitz)
+    else:
+        code = """
+        for(int i=0; i<N; i++){
+          for(int j=0; j<N2; j++){
+            target(i,j) += B((int)index(i),(int)index2(j));
+          }
+        }
+        """
+        N, N2 = int(index.size), int(index2.size)
+        weave.inline(code, ['target', 'index', 'index2', 'N', 'N2', 'B'], type_converters=weave.converters.blitz)
+
+@register('coregionalize_dK_dB', 'weave')
+def coregionalize_dK_dB(dL_dK, index, index2, output_dim):
+    if index2 is None:
+        index2 = index
+    dL_dB = np.zeros((output_dim, output_dim))
+    code = """
+    for(int i=0; i<N; i++){
+      for(int j=0; j<N2; j++){
+        dL_dB((int)index(i),(int)index2(j)) += dL_dK(i,j);
+      }
+    }
+    """
+    N, N2 = int(index.size), int(index2.size)
+    weave.inline(code, ['N', 'N2', 'dL_dK', 'dL_dB', 'index', 'index2'], type_converters=weave.converters.blitz)
+    return dL_dB
+
+@register('std_norm_cdf', 'weave')
+def std_norm_cdf(x):
+    x = np.asarray(x, dtype=np.float64).copy()
+    cdf_x = np.zeros_like(x)
+    N = x.size
+    support_code = "#include <math.h>"
+    code = """
+
+    double sign, t, erf;
+    for (int i=0; i<N; i++){
+        sign = 1.0;
+        if (x[i] < 0.0){
+            sign = -1.0;
+            x[i] = -x[i];
+        }
+        x[i] = x[i]/sqrt(2.0);
+
+        t = 1.0/(1.0 +  0.3275911*x[i]);
+
+        erf = 1. - exp(-x[i]*x[i])*t*(0.254829592 + t*(-0.284496736 + t*(1.421413741 + t*(-1.453152027 + t*(1.061405429)))));
+
+        cdf_x[i] = 0.5*(1.0 + sign*erf);
+    }
+    """
+    weave.inline(code, arg_names=['x', 'cdf_x', 'N'], support_code=support_code)
+    return cdf_x
@@ -1,4 +1,6 @@
 import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
 
 def get_blocks(A, blocksizes):
     assert (A.shape[0]==A.shape[1]) and len(A.shape)==2, "can;t blockify this non-square matrix"
@@ -16,6 +18,39 @@ def get_blocks(A, blocksizes):
     return B
 
 
+def merge_labels(labels):
+    """
+    The finest partition of the rows coarser than each of the given ones:
+    rows are in the same block when they share a label in any of the
+    labellings (the connected components of these relations).
+
+    :param labels: the labellings, arrays of ints of the same length
+    :returns: the block of each row, as ints from 0
+    """
+    labels = [np.unique(l, return_inverse=True)[1] for l in labels]
+    num_rows = labels[0].size
+    # a graph whose vertices are the rows, and the labels of each labelling
+    offsets = np.cumsum([num_rows] + [l.max() + 1 for l in labels])
+    rows = np.hstack([np.arange(num_rows)] * len(labels))
+    cols = np.hstack([l + offset for l, offset in zip(labels, offsets)])
+    graph = coo_matrix((np.ones(rows.size), (rows, cols)), shape=(offsets[-1], offsets[-1]))
+    _, components = connected_components(graph, directed=False)
+    return np.unique(components[:num_rows], return_inverse=True)[1]
+
+def intersect_labels(labels1, labels2):
+    """
+    The coarsest partition of the rows finer than both of the given ones:
+    rows are in the same block when they share both labels.
+    """
+    labels1, labels2 = [np.unique(l, return_inverse=True)[1] for l in (labels1, labels2)]
+    pairs = labels1 * (labels2.max() + 1) + labels2
+    return np.unique(pairs, return_inverse=True)[1]
+
+def label_blocks(labels):
+    """The rows of each block of the labelling, as a list of arrays of indices."""
+    order = np.argsort(labels, kind='mergesort')
+    return np.split(order, np.nonzero(np.diff(labels[order]))[0] + 1)
+
 
 if __name__=='__main__':
     A = np.zeros((5,5))
@@ -0,0 +1,85 @@
+# Copyright (c) 2013, GPy authors (see AUTHORS.txt).
+# Licensed under the BSD 3-clause license (see LICENSE.txt)
+
+"""
+Data sets which are read chunk by chunk, for the models which only need
+sums over the data (see GPy.models.ChunkedSparseGPRegression), so that the
+whole of X and Y never has to be in memory.
+"""
+
+import numpy as np
+
+class DataChunks(object):
+    """
+    The rows of (X, Y), in chunks of at most chunk_size rows.
+
+    X and Y may be any arrays which support slicing, e.g. np.memmap (or
+    h5py datasets): only one chunk at a time is read into memory.
+    Alternatively, X is a function which takes no argument and returns a
+    new iterator over the (X, Y) chunks (e.g. a generator function reading
+    a file), as the models go over the data once per evaluation; Y is then
+    None.
+
+    :param X: inputs, num_data x input_dim, or a function returning an iterator over (X, Y) chunks
+    :param Y: outputs, num_data x output_dim (None if X is a function)
+    :param chunk_size: the number of rows of the chunks (arrays only)
+    :type chunk_size: int
+    """
+    def __init__(self, X, Y=None, chunk_size=10000):
+        if callable(X):
+            assert Y is None, "the chunks of Y come with those of X"
+            self._chunks = X
+            # the sizes are those of the first pass over the data
+            self.num_data = None
+            X, Y = iter(X()).next()
+            self.input_dim, self.output_dim = X.shape[1], Y.shape[1]
+        else:
+            assert X.ndim == 2 and Y.ndim == 2 and X.shape[0] == Y.shape[0]
+            self._chunks = None
+            self.num_data, self.input_dim = X.shape
+            self.output_dim = Y.shape[1]
+        self.X, self.Y = X, Y
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        """Iterate over the (X, Y) chunks, as float arrays in memory."""
+        if self._chunks is None:
+            chunks = ((self.X[i:i + self.chunk_size], self.Y[i:i + self.chunk_size]) for i in xrange(0, self.num_data, self.chunk_size))
+        else:
+            chunks = self._chunks()
+        num_data = 0
+        for X, Y in chunks:
+            X, Y = np.array(X, dtype=np.float64), np.array(Y, dtype=np.float64)
+            if X.ndim == 1:
+                X = X[:, None]
+            if Y.ndim == 1:
+                Y = Y[:, None]
+            assert X.shape[0] == Y.shape[0]
+            num_data += X.shape[0]
+            yield X, Y
+        self.num_data = num_data
+
+    def first(self):
+        """The first (X, Y) chunk."""
+        return iter(self).next()
+
+    def moments(self):
+        """
+        The means and standard deviations of the columns of X and Y, in a
+        single pass over the data.
+
+        :rtype: X mean, X std, Y mean, Y std (1 x input_dim or 1 x output_dim each)
+        """
+        num_data = 0
+        sums = [np.zeros(self.input_dim), np.zeros(self.input_dim), np.zeros(self.output_dim), np.zeros(self.output_dim)]
+        for X, Y in self:
+            num_data += X.shape[0]
+            # shifted by the first rows, for the accuracy of the variances
+            if num_data == X.shape[0]:
+                shift_X, shift_Y = X[0], Y[0]
+            for s, A in zip(sums, [X - shift_X, np.square(X - shift_X), Y - shift_Y, np.square(Y - shift_Y)]):
+                s += A.sum(0)
+        mean_X, mean_Y = sums[0] / num_data, sums[2] / num_data
+        std_X = np.sqrt(np.maximum(sums[1] / num_data - np.square(mean_X), 0.))
+        std_Y = np.sqrt(np.maximum(sums[3] / num_data - np.square(mean_Y), 0.))
+        return (mean_X + shift_X)[None, :], std_X[None, :], (mean_Y + shift_Y)[None, :], std_Y[None, :]
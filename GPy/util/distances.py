@@ -0,0 +1,142 @@
+# Copyright (c) 2013, GPy authors (see AUTHORS.txt).
+# Licensed under the BSD 3-clause license (see LICENSE.txt)
+
+"""
+Pairwise distances for stationary kernels, and a cache to share them
+between the parts of a kernel.
+
+Distances are computed with matrix products,
+|x - y|^2 = |x|^2 + |y|^2 - 2 x^T y, so that no num_data x num_data x
+input_dim array is formed, except for small inputs: the expansion loses
+the precision of the distances between nearly coincident points.
+"""
+
+import numpy as np
+from linalg import tdot
+import backend
+
+# the size of the largest num_data x num_data2 x input_dim array of
+# differences, below which the distances are computed from the differences
+max_differences = 2 ** 16
+
+def sqdist(X, X2=None):
+    """
+    The squared euclidean distances between the rows of X and X2 (X if
+    None), clipped at zero. The diagonal is exactly zero when X2 is None.
+    """
+    if X.shape[0] * (X.shape[0] if X2 is None else X2.shape[0]) * X.shape[1] <= max_differences:
+        return np.sum(np.square(X[:, None, :] - (X if X2 is None else X2)[None, :, :]), -1)
+    Xsquare = np.sum(np.square(X), 1)
+    if X2 is None:
+        r2 = -2. * tdot(X) + (Xsquare[:, None] + Xsquare[None, :])
+        np.fill_diagonal(r2, 0.)
+    else:
+        r2 = -2. * np.dot(X, X2.T) + (Xsquare[:, None] + np.sum(np.square(X2), 1)[None, :])
+    return np.maximum(r2, 0., r2)
+
+def scaled_sqdist(X, X2, lengthscale):
+    """
+    The squared distances between X / lengthscale and X2 / lengthscale.
+    """
+    return sqdist(X / lengthscale, None if X2 is None else X2 / lengthscale)
+
+@backend.register('sqdiff_sums', 'numpy')
+def sqdiff_sums(G, X, X2=None):
+    """
+    The sums over all pairs, weighted by G, of the squared differences of
+    the inputs in each dimension: sum_ij G_ij (X_id - X2_jd)^2, as needed by
+    the gradients of ARD lengthscales.
+
+    :param G: the weights of the pairs
+    :type G: np.ndarray, num_data x num_data2
+    :rtype: np.ndarray, input_dim
+    """
+    if X2 is None: X2 = X
+    return (np.dot(G.sum(1), np.square(X)) + np.dot(G.sum(0), np.square(X2))
+            - 2. * np.sum(X * np.dot(G, X2), 0))
+
+def diff_sums(G, X, X2=None):
+    """
+    The sums over the second input, weighted by G, of the differences of
+    the inputs: sum_j G_ij (X_i - X2_j), as needed by gradients wrt X.
+
+    :param G: the weights of the pairs
+    :type G: np.ndarray, num_data x num_data2
+    :rtype: np.ndarray, num_data x input_dim
+    """
+    if X2 is None: X2 = X
+    return X * G.sum(1)[:, None] - np.dot(G, X2)
+
+class DistanceCache(object):
+    """
+    A bounded cache of squared distances, shared by the parts of a kernel
+    (see kern.distances) so that parts working on the same inputs do not
+    each recompute them, and dK_dtheta and dK_dX reuse those of K.
+
+    Entries are keyed by the inputs, compared by value (the parts receive
+    slices of the inputs of the kernel, which are new views at each call)
+    and by the lengthscales. The unscaled distances are cached as well, so
+    that parts with a single lengthscale only rescale them. When the cached
+    arrays exceed max_bytes, the least recently used entries are evicted,
+    which drops the distances of outdated inputs first.
+
+    The cached arrays are read only.
+
+    :param max_bytes: the memory available to the cache
+    :type max_bytes: int
+    """
+    def __init__(self, max_bytes=2 ** 28):
+        self.max_bytes = max_bytes
+        self.clear()
+
+    def clear(self):
+        # (X, X2, lengthscale, squared distances), most recently used last
+        self._entries = []
+
+    def _find(self, X, X2, lengthscale):
+        for i, (X_e, X2_e, l_e, r2) in enumerate(self._entries):
+            if _same(X, X_e) and _same(X2, X2_e) and _same(lengthscale, l_e):
+                self._entries.append(self._entries.pop(i))
+                return r2
+        return None
+
+    def _store(self, X, X2, lengthscale, r2):
+        if r2.nbytes > self.max_bytes:
+            return
+        r2.flags.writeable = False
+        self._entries.append((X.copy(), None if X2 is None else X2.copy(), lengthscale, r2))
+        while sum([e[3].nbytes for e in self._entries]) > self.max_bytes:
+            self._entries.pop(0)
+
+    def sqdist(self, X, X2=None):
+        """The squared distances between X and X2 (X if None), see sqdist."""
+        r2 = self._find(X, X2, None)
+        if r2 is None:
+            r2 = sqdist(X, X2)
+            self._store(X, X2, None, r2)
+        return r2
+
+    def scaled_sqdist(self, X, X2, lengthscale):
+        """The squared distances between X / lengthscale and X2 / lengthscale."""
+        lengthscale = np.array(lengthscale, dtype=np.float64).flatten()
+        r2 = self._find(X, X2, lengthscale)
+        if r2 is None:
+            if lengthscale.size == 1:
+                r2 = self.sqdist(X, X2) / np.square(lengthscale[0])
+            else:
+                r2 = scaled_sqdist(X, X2, lengthscale)
+            self._store(X, X2, lengthscale, r2)
+        return r2
+
+    def __getstate__(self):
+        # the cached distances are not worth pickling
+        return {'max_bytes': self.max_bytes}
+
+    def __setstate__(self, state):
+        self.max_bytes = state['max_bytes']
+        self.clear()
+
+def _same(A, B):
+    if A is None or B is None:
+        return A is None and B is None
+    return A is B or (A.shape == B.shape and np.array_equal(A, B))
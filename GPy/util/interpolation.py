@@ -0,0 +1,68 @@
+# Copyright (c) 2013, GPy authors (see AUTHORS.txt).
+# Licensed under the BSD 3-clause license (see LICENSE.txt)
+
+"""
+Sparse interpolation from scattered points onto regular grids.
+"""
+
+import itertools
+import numpy as np
+from scipy import sparse
+
+def cubic_kernel(s, a=-0.5):
+    """
+    Keys' cubic convolution kernel, which is zero beyond |s| = 2.
+    """
+    s = np.abs(s)
+    return np.where(s <= 1., ((a + 2.) * s - (a + 3.)) * s * s + 1.,
+                    np.where(s < 2., ((a * s - 5. * a) * s + 8. * a) * s - 4. * a, 0.))
+
+def regular_grid(X, grid_size):
+    """
+    A regular grid covering X, with one point before and one point after
+    the range of X in each dimension, as needed by cubic interpolation (the
+    largest inputs fall on the last but one point, at the end of the last
+    cell of 4 points).
+
+    :param X: the points to cover
+    :type X: np.ndarray, N x D
+    :param grid_size: the number of grid points in each dimension (at least 4)
+    :type grid_size: list of int
+    :returns: (start, step), the first grid point and the spacing of the grid, each of size D
+    """
+    grid_size = np.asarray(grid_size)
+    assert np.all(grid_size >= 4), "cubic interpolation needs at least 4 grid points per dimension"
+    lower, upper = X.min(0), X.max(0)
+    step = np.where(upper > lower, (upper - lower) / (grid_size - 3.), 1.)
+    return lower - step, step
+
+def cubic_interpolation_weights(X, start, step, grid_size):
+    """
+    The sparse matrix of the cubic interpolation weights of the points X
+    from the values at the points of a regular grid, listed in row-major
+    order. Each row has 4^D non zero weights.
+
+    Points outside the grid are interpolated from its nearest cells.
+
+    :param X: the points to interpolate
+    :type X: np.ndarray, N x D
+    :param start, step: the first grid point and the spacing, see regular_grid
+    :param grid_size: the number of grid points in each dimension
+    :rtype: scipy.sparse.csr_matrix, N x prod(grid_size)
+    """
+    N, D = X.shape
+    s = (X - start) / step
+    # the 4 points used in each dimension are j - 1, ..., j + 2
+    j = np.clip(np.floor(s).astype(np.int), 1, np.asarray(grid_size) - 3)
+    t = s - j
+    offsets = np.arange(-1, 3)
+    weights_1d = cubic_kernel(t[:, :, None] - offsets) # N x D x 4
+    strides = np.hstack((np.cumprod(np.asarray(grid_size)[::-1])[::-1][1:], 1))
+
+    rows, cols, vals = [], [], []
+    for o in itertools.product(range(4), repeat=D):
+        w = np.prod(weights_1d[:, range(D), o], 1)
+        cols.append(np.dot(j + offsets[list(o)], strides))
+        rows.append(np.arange(N))
+        vals.append(w)
+    return sparse.csr_matrix((np.hstack(vals), (np.hstack(rows), np.hstack(cols))), shape=(N, int(np.prod(grid_size))))
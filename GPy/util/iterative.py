@@ -0,0 +1,111 @@
+# Copyright (c) 2013, GPy authors (see AUTHORS.txt).
+# Licensed under the BSD 3-clause license (see LICENSE.txt)
+
+"""
+Iterative (matrix-free) linear algebra for symmetric positive definite
+matrices which are only available through matrix-vector products.
+"""
+
+import numpy as np
+
+def pcg(matvec, B, precondition=None, tol=1e-6, maxiter=None):
+    """
+    Solve A X = B by preconditioned conjugate gradients, for all the columns
+    of B at once. Each column converges independently: once its relative
+    residual is below tol it is left untouched.
+
+    :param matvec: function computing A V for an N x k array V
+    :param B: the right hand sides
+    :type B: np.ndarray, N x k
+    :param precondition: function computing P^{-1} R for an N x k array R (default: no preconditioning)
+    :param tol: relative tolerance on the norm of the residual of each column
+    :param maxiter: the maximum number of iterations (default: N)
+    :rval X: the solutions
+    :rtype X: np.ndarray, N x k
+    :rval alphas: the step sizes of each iteration
+    :rtype alphas: np.ndarray, num_iterations x k
+    :rval betas: the conjugation coefficients of each iteration
+    :rtype betas: np.ndarray, num_iterations x k
+    :rval iterations: the number of iterations taken by each column
+    :rtype iterations: np.ndarray, k
+
+    The coefficients alphas and betas define the Lanczos tridiagonal
+    matrices of the (preconditioned) problem, see lanczos_tridiagonal.
+    """
+    if precondition is None:
+        precondition = lambda R: R
+    N, k = B.shape
+    if maxiter is None:
+        maxiter = N
+    X = np.zeros((N, k))
+    R = B.copy()
+    Z = precondition(R)
+    P = Z.copy()
+    rz = np.sum(R * Z, 0)
+    bnorm = np.sqrt(np.sum(np.square(B), 0))
+    active = bnorm > 0
+    iterations = np.zeros(k, dtype=np.int)
+    alphas, betas = [], []
+    while np.any(active) and len(alphas) < maxiter:
+        AP = matvec(P)
+        pAp = np.sum(P * AP, 0)
+        alpha = np.where(active, rz / np.where(active, pAp, 1.), 0.)
+        X += alpha * P
+        R -= alpha * AP
+        iterations += active
+        Z = precondition(R)
+        rz_new = np.sum(R * Z, 0)
+        beta = np.where(active, rz_new / np.where(active, rz, 1.), 0.)
+        P = Z + beta * P
+        rz = rz_new
+        alphas.append(alpha)
+        betas.append(beta)
+        active &= np.sqrt(np.sum(np.square(R), 0)) > tol * bnorm
+    return X, np.array(alphas).reshape(-1, k), np.array(betas).reshape(-1, k), iterations
+
+def lanczos_tridiagonal(alphas, betas):
+    """
+    The Lanczos tridiagonal matrix corresponding to a run of (preconditioned)
+    conjugate gradients, for a single right hand side.
+
+    :param alphas: the step sizes of the iterations
+    :type alphas: np.ndarray, num_iterations
+    :param betas: the conjugation coefficients of the iterations
+    :type betas: np.ndarray, num_iterations
+    :rtype: np.ndarray, num_iterations x num_iterations
+    """
+    num_iterations = alphas.size
+    T = np.zeros((num_iterations, num_iterations))
+    T[0, 0] = 1. / alphas[0]
+    for j in range(1, num_iterations):
+        T[j, j] = 1. / alphas[j] + betas[j - 1] / alphas[j - 1]
+        T[j, j - 1] = T[j - 1, j] = np.sqrt(betas[j - 1]) / alphas[j - 1]
+    return T
+
+def lanczos_quadrature(alphas, betas, iterations, f=np.log):
+    """
+    Gauss quadrature estimates of z^T f(A) z / z^T z for each right hand side
+    z of a pcg run (see pcg), using the Lanczos tridiagonal matrices.
+
+    When pcg was preconditioned with P, this estimates the quantity for
+    the matrix P^{-1/2} A P^{-1/2} and the vector P^{-1/2} z.
+
+    :param alphas, betas, iterations: the outputs of pcg
+    :param f: the matrix function (default: the log, for log-determinants)
+    :rtype: np.ndarray, k
+    """
+    quad = np.zeros(iterations.size)
+    for i, num_iterations in enumerate(iterations):
+        if num_iterations == 0:
+            continue
+        T = lanczos_tridiagonal(alphas[:num_iterations, i], betas[:num_iterations, i])
+        theta, V = np.linalg.eigh(T)
+        quad[i] = np.sum(np.square(V[0]) * f(theta))
+    return quad
+
+def rademacher(N, num_probes):
+    """
+    Random probe vectors for Hutchinson trace estimators: the entries are
+    +1 or -1 with equal probability, so that E[z z^T] = I.
+    """
+    return 2. * (np.random.rand(N, num_probes) > .5) - 1.
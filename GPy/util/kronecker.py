@@ -0,0 +1,104 @@
+# Copyright (c) 2013, GPy authors (see AUTHORS.txt).
+# Licensed under the BSD 3-clause license (see LICENSE.txt)
+
+"""
+Linear algebra with Kronecker products A_1 x ... x A_D, which are never
+formed: the factors are applied one dimension at a time.
+"""
+
+import numpy as np
+
+def kron_mvprod(As, B):
+    """
+    Compute (A_1 x A_2 x ... x A_D) B without forming the Kronecker product.
+
+    :param As: the factors, each n_d x n_d (at most one may be None, standing for the identity)
+    :type As: list of np.ndarray
+    :param B: the matrix to multiply, with prod(n_d) rows
+    :type B: np.ndarray, N x k
+    :rtype: np.ndarray, N x k
+    """
+    sizes = [A.shape[1] for A in As if A is not None]
+    shape = [A.shape[1] if A is not None else 0 for A in As]
+    N, k = B.shape
+    # the size of identity factors is whatever is left
+    if 0 in shape:
+        shape[shape.index(0)] = N // int(np.prod(sizes))
+    X = B.reshape(shape + [k])
+    for d, A in enumerate(As):
+        if A is None:
+            continue
+        X = np.rollaxis(np.tensordot(A, X, axes=(1, d)), 0, d + 1)
+    return X.reshape(-1, k)
+
+def kron_vec(vs):
+    """
+    The Kronecker product of vectors, e.g. the eigenvalues of a Kronecker
+    product from the eigenvalues of its factors.
+    """
+    v = np.ones(1)
+    for u in vs:
+        v = np.kron(v, u)
+    return v
+
+def khatri_rao(As):
+    """
+    The column-wise Kronecker product of matrices with the same number of
+    columns: column j of the result is kron(A_1[:, j], ..., A_D[:, j]).
+
+    :param As: the factors, each n_d x k
+    :rtype: np.ndarray, prod(n_d) x k
+    """
+    k = As[0].shape[1]
+    C = np.ones((1, k))
+    for A in As:
+        C = (C[:, None, :] * A[None, :, :]).reshape(-1, k)
+    return C
+
+def unfold(X, shape, d):
+    """
+    The mode-d unfolding of X, reshaped to the tensor of the given shape
+    (plus a trailing axis for the columns of X): an n_d x (N k / n_d) matrix.
+    """
+    return np.rollaxis(X.reshape(list(shape) + [-1]), d, 0).reshape(shape[d], -1)
+
+def unique_rows(A):
+    """
+    The unique rows of A, and the index of each row of A in them.
+
+    :rtype: (np.ndarray, np.ndarray)
+    """
+    order = np.lexsort(A.T[::-1])
+    A_sorted = A[order]
+    new = np.any(np.diff(A_sorted, axis=0) != 0, 1)
+    inverse = np.empty(A.shape[0], dtype=np.int)
+    inverse[order] = np.hstack((0, np.cumsum(new)))
+    return A_sorted[np.hstack((True, new))], inverse
+
+def grid_structure(X, groups):
+    """
+    Check whether X is a Cartesian grid, i.e. whether its rows are all the
+    combinations of the points of each group of columns.
+
+    :param X: the inputs
+    :type X: np.ndarray, N x input_dim
+    :param groups: the columns of each dimension of the grid
+    :type groups: list of index arrays
+    :returns: (points, perm), the points of each dimension and the
+        permutation such that X[perm] lists the grid in row-major order
+        (the last dimension varying fastest), or None if X is not a grid.
+    """
+    points, indices = [], []
+    for columns in groups:
+        u, inverse = unique_rows(X[:, columns])
+        points.append(u)
+        indices.append(inverse)
+    sizes = [u.shape[0] for u in points]
+    if np.prod(sizes) != X.shape[0]:
+        return None
+    linear = np.ravel_multi_index(indices, sizes)
+    if np.any(np.bincount(linear, minlength=X.shape[0]) != 1):
+        return None
+    perm = np.empty(X.shape[0], dtype=np.int)
+    perm[linear] = np.arange(X.shape[0])
+    return points, perm
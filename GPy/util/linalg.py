@@ -6,13 +6,15 @@
 # http://homepages.inf.ed.ac.uk/imurray2/code/tdot/tdot.py
 
 import numpy as np
-from scipy import linalg, weave
+from scipy import linalg
 import types
 import ctypes
 from ctypes import byref, c_char, c_int, c_double # TODO
 # import scipy.lib.lapack
 import scipy
 import warnings
+import backend
+import parallel
 
 if np.all(np.float64((scipy.__version__).split('.')[:2]) >= np.array([0, 12])):
     import scipy.linalg.lapack as lapack
@@ -54,16 +56,29 @@ def dpotrs(A, B, lower=0):
     """
     return lapack.dpotrs(A, B, lower=lower)
 
-def dpotri(A, lower=0):
+def dpotrf(A, lower=0, overwrite_A=False):
+    """
+    Wrapper for lapack dpotrf function
+
+    :param A: Matrix A
+    :param lower: is matrix lower (true) or upper (false)
+    :param overwrite_A: whether to factorize A in place (A must be Fortran contiguous)
+    :returns: the Cholesky factor of A, info
+
+    """
+    return lapack.dpotrf(A, lower=lower, overwrite_a=overwrite_A)
+
+def dpotri(A, lower=0, overwrite_A=False):
     """
     Wrapper for lapack dpotri function
 
     :param A: Matrix A
     :param lower: is matrix lower (true) or upper (false)
+    :param overwrite_A: whether to invert A in place (A must be Fortran contiguous)
     :returns: A inverse
 
     """
-    return lapack.dpotri(A, lower=lower)
+    return lapack.dpotri(A, lower=lower, overwrite_c=overwrite_A)
 
 def pddet(A):
     """
@@ -186,6 +201,26 @@ def pdinv(A, *args):
 
     return Ai, L, Li, logdet
 
+def block_pdinv(A, blocks, num_threads=None):
+    """
+    pdinv of a matrix which is block diagonal up to a permutation of its
+    rows and columns, block by block (in threads, see GPy.util.parallel).
+
+    :param A: A DxD pd numpy array
+    :param blocks: the rows of each block (see GPy.util.block_matrices.label_blocks)
+    :param num_threads: the number of threads, [parallel] num_threads by default
+    :returns: Ai, L, Li, logdet as pdinv, where L holds the Cholesky factor
+              of each block on the rows and columns of the block (so that
+              A = L L^T, but L is only triangular up to the permutation),
+              and the list of the Cholesky factors of the blocks
+    """
+    results = parallel.thread_map(lambda b: pdinv(A[np.ix_(b, b)]), blocks, num_threads)
+    Ai, L, Li = np.zeros(A.shape), np.zeros(A.shape), np.zeros(A.shape)
+    for b, (Ai_b, L_b, Li_b, logdet_b) in zip(blocks, results):
+        Ai[np.ix_(b, b)] = Ai_b
+        L[np.ix_(b, b)] = L_b
+        Li[np.ix_(b, b)] = Li_b
+    return Ai, L, Li, sum([r[3] for r in results]), [r[1] for r in results]
 
 def chol_inv(L):
     """
@@ -452,53 +487,120 @@ def symmetrify(A, upper=False):
     Take the square matrix A and make it symmetrical by copting elements from the lower half to the upper
 
     works IN PLACE.
+
+    The implementation is chosen in the [backend] section of the configuration (see GPy.util.backend)
     """
     N, M = A.shape
     assert N == M
-    
-    c_contig_code = """
-    int iN;
-    for (int i=1; i<N; i++){
-      iN = i*N;
-      for (int j=0; j<i; j++){
-        A[i+j*N] = A[iN+j];
-      }
-    }
-    """
-    f_contig_code = """
-    int iN;
-    for (int i=1; i<N; i++){
-      iN = i*N;
-      for (int j=0; j<i; j++){
-        A[iN+j] = A[i+j*N];
-      }
-    }
-    """
-
-    N = int(N) # for safe type casting
-    if A.flags['C_CONTIGUOUS'] and upper:
-        weave.inline(f_contig_code, ['A', 'N'], extra_compile_args=['-O3'])
-    elif A.flags['C_CONTIGUOUS'] and not upper:
-        weave.inline(c_contig_code, ['A', 'N'], extra_compile_args=['-O3'])
-    elif A.flags['F_CONTIGUOUS'] and upper:
-        weave.inline(c_contig_code, ['A', 'N'], extra_compile_args=['-O3'])
-    elif A.flags['F_CONTIGUOUS'] and not upper:
-        weave.inline(f_contig_code, ['A', 'N'], extra_compile_args=['-O3'])
-    else:
+    backend.get('symmetrify')(A, upper)
+
+@backend.register('symmetrify', 'numpy')
+def _symmetrify_numpy(A, upper=False, block_size=256):
+    """
+    Copy the triangle blockwise, so that the transposed reads stay in cache
+    and no N x N temporary is formed.
+    """
+    N = A.shape[0]
+    for i in range(0, N, block_size):
+        j = min(i + block_size, N)
+        block = A[i:j, i:j]
         if upper:
-            tmp = np.tril(A.T)
+            A[j:, i:j] = A[i:j, j:].T
+            block[:] = np.triu(block) + np.triu(block, 1).T
         else:
-            tmp = np.tril(A)
-        A[:] = 0.0
-        A += tmp
-        A += np.tril(tmp, -1).T
-
+            A[i:j, j:] = A[j:, i:j].T
+            block[:] = np.tril(block) + np.tril(block, -1).T
 
 def symmetrify_murray(A):
     A += A.T
     nn = A.shape[0]
     A[[range(nn), range(nn)]] /= 2.0
 
+def symmetric_tiles(num_data, tile_size=None):
+    """
+    The (rows, cols) slices of the tiles which cover the upper triangle
+    (diagonal included) of a num_data x num_data matrix, tile_size x
+    tile_size each ([parallel] tile_size by default), so that the work on
+    a tile stays in cache.
+    """
+    if tile_size is None:
+        tile_size = parallel.configured_tile_size()
+    starts = range(0, num_data, tile_size)
+    for i in starts:
+        for j in starts[i // tile_size:]:
+            yield slice(i, min(i + tile_size, num_data)), slice(j, min(j + tile_size, num_data))
+
+def matrix_tiles(num_rows, num_cols, tile_size=None):
+    """
+    The (rows, cols) slices of the tiles which cover a num_rows x num_cols
+    matrix, tile_size x tile_size each ([parallel] tile_size by default).
+    """
+    if tile_size is None:
+        tile_size = parallel.configured_tile_size()
+    for i in range(0, num_rows, tile_size):
+        for j in range(0, num_cols, tile_size):
+            yield slice(i, min(i + tile_size, num_rows)), slice(j, min(j + tile_size, num_cols))
+
+def symmetric_map(f, matrices, tile_size=None):
+    """
+    Apply the elementwise function f to symmetric matrices, evaluating it
+    on the tiles of the upper triangle only and mirroring the result with
+    symmetrify. This halves the evaluations of f for large matrices.
+
+    :param f: the function, of a tile of each matrix, which returns an array or a tuple of arrays
+    :param matrices: a symmetric matrix or a list of them
+    :returns: the result of f on the whole matrices
+    """
+    if isinstance(matrices, np.ndarray):
+        matrices = [matrices]
+    num_data = matrices[0].shape[0]
+    if tile_size is None:
+        tile_size = parallel.configured_tile_size()
+    if num_data <= tile_size:
+        return f(*matrices)
+    results = None
+    for rows, cols in symmetric_tiles(num_data, tile_size):
+        values = f(*[A[rows, cols] for A in matrices])
+        single = not isinstance(values, tuple)
+        if single:
+            values = (values,)
+        if results is None:
+            results = [np.empty((num_data, num_data)) for v in values]
+        for R, v in zip(results, values):
+            R[rows, cols] = v
+    for R in results:
+        symmetrify(R, upper=True)
+    return results[0] if single else tuple(results)
+
+def symmetric_dot(A, B, tile_size=None):
+    """
+    The product np.dot(A, B.T), known to be symmetric, computed on the tiles
+    of its upper triangle only and mirrored with symmetrify.
+    """
+    num_data = A.shape[0]
+    if tile_size is None:
+        tile_size = parallel.configured_tile_size()
+    if num_data <= tile_size:
+        return np.dot(A, B.T)
+    C = np.empty((num_data, num_data))
+    for rows, cols in symmetric_tiles(num_data, tile_size):
+        C[rows, cols] = np.dot(A[rows], B[cols].T)
+    symmetrify(C, upper=True)
+    return C
+
+def symmetric_weights(dL_dK, rows, cols):
+    """
+    The weights W of the tile (rows, cols) of the upper triangle (see
+    symmetric_tiles) such that sum(dL_dK * K) is the sum over these tiles
+    of sum(W * K[rows, cols]) for any symmetric K, which halves the work of
+    the gradient reductions.
+    """
+    W = dL_dK[rows, cols] + dL_dK[cols, rows].T
+    if rows.start == cols.start:
+        W = np.triu(W)
+        W.flat[::W.shape[1] + 1] *= 0.5
+    return W
+
 def cholupdate(L, x):
     """
     update the LOWER cholesky factor of a pd matrix IN PLACE
@@ -507,26 +609,20 @@ def cholupdate(L, x):
     where L\_ is the lower chol of K + x*x^T
 
     """
-    support_code = """
-    #include <math.h>
-    """
-    code = """
-    double r,c,s;
-    int j,i;
-    for(j=0; j<N; j++){
-      r = sqrt(L(j,j)*L(j,j) + x(j)*x(j));
-      c = r / L(j,j);
-      s = x(j) / L(j,j);
-      L(j,j) = r;
-      for (i=j+1; i<N; i++){
-        L(i,j) = (L(i,j) + s*x(i))/c;
-        x(i) = c*x(i) - s*L(i,j);
-      }
-    }
-    """
-    x = x.copy()
-    N = x.size
-    weave.inline(code, support_code=support_code, arg_names=['N', 'L', 'x'], type_converters=weave.converters.blitz)
+    backend.get('cholupdate')(L, x)
+
+@backend.register('cholupdate', 'numpy')
+def _cholupdate_numpy(L, x):
+    x = np.array(x, dtype=np.float64).flatten()
+    for j in range(x.size):
+        r = np.sqrt(L[j, j] * L[j, j] + x[j] * x[j])
+        c = r / L[j, j]
+        s = x[j] / L[j, j]
+        L[j, j] = r
+        L[j + 1:, j] += s * x[j + 1:]
+        L[j + 1:, j] /= c
+        x[j + 1:] *= c
+        x[j + 1:] -= s * L[j + 1:, j]
 
 def backsub_both_sides(L, X, transpose='left'):
     """ Return L^-T * X * L^-1, assumuing X is symmetrical and L is lower cholesky"""
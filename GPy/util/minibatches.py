@@ -0,0 +1,173 @@
+# Copyright (c) 2013, GPy authors (see AUTHORS.txt).
+# Licensed under the BSD 3-clause license (see LICENSE.txt)
+
+"""
+Minibatches of rows of data for the stochastic models (see GPy.core.SVIGP),
+gathered ahead of their use by a background thread into preallocated
+buffers, so that reading the next batches (e.g. from np.memmap or from a
+stream) and preprocessing them overlaps with the computations on the
+current one.
+"""
+
+import threading
+import Queue
+import sys
+import numpy as np
+
+class _Gatherer(object):
+    """
+    The state of the gathering of the batches, used by the thread of
+    Minibatches only (or by Minibatches itself, without prefetching).
+    """
+    def __init__(self, source, batchsize, buffers, rng, preprocess):
+        self.source = source
+        self.batchsize = batchsize
+        self.buffers = buffers
+        self.rng = rng
+        self.preprocess = preprocess
+        self.epoch = 0
+        if callable(source):
+            self._iterator = iter(source())
+            self._chunk, self._row = None, 0
+        else:
+            self.num_data = source[0].shape[0]
+            self._permutation = rng.permutation(self.num_data)
+            self._start = 0
+
+    def _next_chunk(self):
+        """The next chunk of the stream, started again (in a new epoch) at its end."""
+        for restarted in [False, True]:
+            for chunk in self._iterator:
+                chunk = [np.asarray(c, dtype=np.float64) for c in chunk]
+                return [c[:, None] if c.ndim == 1 else c for c in chunk]
+            if restarted:
+                raise ValueError("the stream of data is empty")
+            self._iterator = iter(self.source())
+            self.epoch += 1
+
+    def gather(self, slot):
+        """Fill the buffers of slot with the next batch: its epoch, and the result of preprocess."""
+        buffers = self.buffers[slot]
+        if callable(self.source):
+            filled = 0
+            while filled < self.batchsize:
+                if self._chunk is None or self._row == self._chunk[0].shape[0]:
+                    self._chunk, self._row = self._next_chunk(), 0
+                n = min(self.batchsize - filled, self._chunk[0].shape[0] - self._row)
+                for buf, c in zip(buffers, self._chunk):
+                    buf[filled:filled + n] = c[self._row:self._row + n]
+                filled += n
+                self._row += n
+        else:
+            # the rows left at the end of an epoch wait for the next order
+            if self._start + self.batchsize > self.num_data:
+                self._permutation = self.rng.permutation(self.num_data)
+                self._start = 0
+                self.epoch += 1
+            # read in increasing order, the faster for memmaps
+            index = np.sort(self._permutation[self._start:self._start + self.batchsize])
+            self._start += self.batchsize
+            for buf, a in zip(buffers, self.source):
+                np.take(a, index, axis=0, out=buf)
+        extra = None if self.preprocess is None else self.preprocess(*buffers)
+        return self.epoch, extra
+
+    def run(self, free, ready):
+        """Gather the batches into the slots taken from free, until None is taken."""
+        while True:
+            slot = free.get()
+            if slot is None:
+                break
+            try:
+                ready.put((slot, self.gather(slot)))
+            except Exception:
+                ready.put((None, sys.exc_info()))
+                break
+
+class Minibatches(object):
+    """
+    An endless sequence of minibatches of batchsize rows of some arrays
+    (e.g. X and Y).
+
+    The arrays may be any arrays with the same number of rows, e.g.
+    np.memmap: only the rows of the batches are read. The rows are taken in
+    a random order, a new one for each epoch; the rows left at the end of an
+    epoch (fewer than batchsize) are left out of it.
+
+    Alternatively, arrays is a function which takes no argument and returns
+    a new iterator over tuples of chunks of rows of the arrays (e.g. a
+    generator function reading a stream, which may be infinite). The
+    batches are then the consecutive rows of the stream, which is started
+    again when it ends, in a new epoch.
+
+    The batches are gathered, and preprocessed, ahead of their use by a
+    background thread, in prefetch + 1 sets of buffers which are reused:
+    the arrays returned by next are overwritten after the following call.
+
+    :param arrays: the arrays, or a function returning an iterator over tuples of chunks of them
+    :param batchsize: the number of rows of a batch
+    :type batchsize: int
+    :param prefetch: the number of batches gathered ahead, 0 to gather each batch when it is asked for (no thread)
+    :type prefetch: int
+    :param seed: the seed of the random orders of the rows, drawn from np.random if None
+    :type seed: int | None
+    :param preprocess: a function of the arrays of a batch, whose result is returned with them
+    """
+    def __init__(self, arrays, batchsize, prefetch=2, seed=None, preprocess=None):
+        if seed is None:
+            seed = np.random.randint(2 ** 31 - 1)
+        if callable(arrays):
+            first = iter(arrays()).next()
+            shapes = [np.asarray(c).shape[1:] or (1,) for c in first]
+        else:
+            assert all(a.shape[0] == arrays[0].shape[0] for a in arrays)
+            assert arrays[0].shape[0] >= batchsize, "fewer data than batchsize"
+            shapes = [a.shape[1:] for a in arrays]
+        self.batchsize = batchsize
+        self.prefetch = prefetch
+        num_slots = prefetch + 1
+        buffers = [[np.empty((batchsize,) + s) for s in shapes] for i in range(num_slots)]
+        self._gatherer = _Gatherer(arrays, batchsize, buffers, np.random.RandomState(seed), preprocess)
+        self._slot = None
+        self._thread = None
+        if prefetch > 0:
+            self._free, self._ready = Queue.Queue(), Queue.Queue()
+            for slot in range(num_slots):
+                self._free.put(slot)
+            self._thread = threading.Thread(target=self._gatherer.run, args=(self._free, self._ready))
+            self._thread.daemon = True
+            self._thread.start()
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        """
+        The next batch, as a list of arrays (in buffers which are reused), with
+        its epoch and the result of preprocess (None without preprocess).
+
+        :rtype: arrays, epoch, preprocessed
+        """
+        if self.prefetch == 0:
+            epoch, extra = self._gatherer.gather(0)
+            return self._gatherer.buffers[0], epoch, extra
+        if self._thread is None:
+            raise StopIteration
+        if self._slot is not None:
+            self._free.put(self._slot)
+        self._slot, result = self._ready.get()
+        if self._slot is None:
+            self.close()
+            raise result[0], result[1], result[2]
+        epoch, extra = result
+        return self._gatherer.buffers[self._slot], epoch, extra
+
+    def close(self):
+        """Stop the background thread, which ends the batches."""
+        if self._thread is not None:
+            self._free.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def __del__(self):
+        self.close()
@@ -2,8 +2,8 @@
 # Licensed under the BSD 3-clause license (see LICENSE.txt)
 
 import numpy as np
-from scipy import weave
 from config import *
+import backend
 
 def chain_1(df_dg, dg_dx):
     """
@@ -85,135 +85,18 @@ def kmm_init(X, m = 10):
     return X[inducing]
 
 def fast_array_equal(A, B):
+    """
+    Whether A and B (either may be None) have the same shape and elements.
+
+    The implementation is chosen in the [backend] section of the configuration (see GPy.util.backend)
+    """
+    return backend.get('array_equal')(A, B)
 
-    if config.getboolean('parallel', 'openmp'):
-        pragma_string = '#pragma omp parallel for private(i, j)'
-    else:
-        pragma_string = ''
-
-    code2="""
-    int i, j;
-    return_val = 1;
-
-    %s
-    for(i=0;i<N;i++){
-       for(j=0;j<D;j++){
-          if(A(i, j) != B(i, j)){
-              return_val = 0;
-              break;
-          }
-       }
-    }
-    """ % pragma_string
-
-    if config.getboolean('parallel', 'openmp'):
-        pragma_string = '#pragma omp parallel for private(i, j, z)'
-    else:
-        pragma_string = ''
-
-    code3="""
-    int i, j, z;
-    return_val = 1;
-
-    %s
-    for(i=0;i<N;i++){
-       for(j=0;j<D;j++){
-         for(z=0;z<Q;z++){
-            if(A(i, j, z) != B(i, j, z)){
-               return_val = 0;
-               break;
-            }
-          }
-       }
-    }
-    """ % pragma_string
-
-    if config.getboolean('parallel', 'openmp'):
-        pragma_string = '#include <omp.h>'
-    else:
-        pragma_string = ''
-
-    support_code = """
-    %s
-    #include <math.h>
-    """ % pragma_string
-
-
-    weave_options_openmp = {'headers'           : ['<omp.h>'],
-                            'extra_compile_args': ['-fopenmp -O3'],
-                            'extra_link_args'   : ['-lgomp'],
-                            'libraries': ['gomp']}
-    weave_options_noopenmp = {'extra_compile_args': ['-O3']}
-
-    if config.getboolean('parallel', 'openmp'):
-        weave_options = weave_options_openmp
-    else:
-        weave_options = weave_options_noopenmp
-
-    value = False
-
-
-    if (A == None) and (B == None):
-        return True
-    elif ((A == None) and (B != None)) or ((A != None) and (B == None)):
-        return False
-    elif A.shape == B.shape:
-        if A.ndim == 2:
-            N, D = [int(i) for i in A.shape]
-            value = weave.inline(code2, support_code=support_code,
-                                 arg_names=['A', 'B', 'N', 'D'],
-                                 type_converters=weave.converters.blitz, **weave_options)
-        elif A.ndim == 3:
-            N, D, Q = [int(i) for i in A.shape]
-            value = weave.inline(code3, support_code=support_code,
-                                 arg_names=['A', 'B', 'N', 'D', 'Q'],
-                                 type_converters=weave.converters.blitz, **weave_options)
-        else:
-            value = np.array_equal(A,B)
-
-    return value
-
-def fast_array_equal2(A, B):
-    if (A == None) and (B == None):
-        return True
-    elif ((A == None) and (B != None)) or ((A != None) and (B == None)):
-        return False
-    elif not (A.shape == B.shape):
-        return False
-
-    if config.getboolean('parallel', 'openmp'):
-        pragma_string = '#include <omp.h>'
-        weave_options = {'headers'           : ['<omp.h>'],
-                         'extra_compile_args': ['-fopenmp -O3'],
-                         'extra_link_args'   : ['-lgomp'],
-                         'libraries'         : ['gomp']}
-    else:
-        weave_options = {'extra_compile_args': ['-O3']}
-        pragma_string = ''
-
-    support_code = """
-    %s
-    #include <math.h>
-    """ % pragma_string
-
-    code = """
-    int i;
-    return_val = 1;
-
-    %s
-    for(i=0;i<N;i++){
-      if(A[i] != B[i]){
-        return_val = 0;
-        break;
-      }
-    }
-    """ % pragma_string
-
-    N = A.size
-    value = weave.inline(code, support_code=support_code,
-                         arg_names=['A', 'B', 'N'],
-                         **weave_options)
-    return bool(value)
+@backend.register('array_equal', 'numpy')
+def _array_equal_numpy(A, B):
+    if A is None or B is None:
+        return A is None and B is None
+    return A.shape == B.shape and np.array_equal(A, B)
 
 
 
@@ -0,0 +1,212 @@
+# Copyright (c) 2013, GPy authors (see AUTHORS.txt).
+# Licensed under the BSD 3-clause license (see LICENSE.txt)
+
+"""
+A pool of threads for the independent blocks of numerical work, e.g. the
+tiles of a covariance matrix (see GPy.kern.tiling). numpy releases the GIL
+in its elementwise operations and products, so that these blocks run
+concurrently. The threads are set in the [parallel] section of the
+configuration file::
+
+    [parallel]
+    num_threads=4
+    tile_size=256
+
+with one thread (no pool) and tiles of 256 x 256 by default.
+
+Work on data which is spread over several processes, or machines, goes
+through RemoteObjects (see process_objects, socket_objects and serve).
+"""
+
+import threading
+import traceback
+from multiprocessing import Process, Pipe
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from multiprocessing.pool import ThreadPool
+from config import config
+
+def configured_num_threads():
+    """The number of threads of [parallel] num_threads, 1 by default."""
+    if config.has_option('parallel', 'num_threads'):
+        return max(config.getint('parallel', 'num_threads'), 1)
+    return 1
+
+def configured_tile_size():
+    """The size of the tiles of [parallel] tile_size, 256 by default."""
+    if config.has_option('parallel', 'tile_size'):
+        return max(config.getint('parallel', 'tile_size'), 1)
+    return 256
+
+# the pools of threads, {num_threads: pool}, created when first used
+_pools = {}
+_lock = threading.Lock()
+# set in the threads of the pools, whose own work is not spread again
+_worker = threading.local()
+
+def _run(args):
+    f, item = args
+    _worker.active = True
+    try:
+        return f(item)
+    finally:
+        _worker.active = False
+
+def thread_map(f, items, num_threads=None):
+    """
+    [f(item) for item in items], computed on a pool of num_threads threads.
+    Calls from the threads of a pool are computed in the calling thread.
+
+    :param f: the function, which must be safe to call concurrently
+    :param items: the arguments of f
+    :param num_threads: the number of threads, [parallel] num_threads by default
+    :rtype: list
+    """
+    items = list(items)
+    if num_threads is None:
+        num_threads = configured_num_threads()
+    if num_threads <= 1 or len(items) <= 1 or getattr(_worker, 'active', False):
+        return [f(item) for item in items]
+    with _lock:
+        if num_threads not in _pools:
+            _pools[num_threads] = ThreadPool(num_threads)
+        pool = _pools[num_threads]
+    return pool.map(_run, [(f, item) for item in items], chunksize=1)
+
+class RemoteError(Exception):
+    """An exception raised in the process of a remote object, with its traceback."""
+    pass
+
+def _serve(connection):
+    """
+    Receive an object on the connection, then call its methods with the
+    (name, args) received, sending back the results, until None is received.
+    """
+    obj = connection.recv()
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        name, args = message
+        try:
+            result = getattr(obj, name)(*args)
+        except Exception:
+            result = RemoteError(traceback.format_exc())
+        connection.send(result)
+    connection.close()
+
+class RemoteObjects(object):
+    """
+    Objects in other processes, whose methods are called on all of them at
+    once by map, so that they run concurrently. The objects are pickled to
+    their processes, and so are the arguments and the results of the calls.
+
+    :param connections: the connections to the processes, which have been sent their objects
+    :param processes: the local processes, to be joined on close
+    """
+    def __init__(self, connections, processes=[]):
+        self._connections = connections
+        self._processes = processes
+
+    def __len__(self):
+        return len(self._connections)
+
+    def map(self, name, args):
+        """
+        [obj.name(*a) for obj, a in zip(objects, args)], computed by the
+        processes of the objects concurrently.
+
+        :param name: the name of the method
+        :param args: the arguments of the method, a tuple for each object
+        :rtype: list
+        """
+        assert len(args) == len(self._connections)
+        for connection, a in zip(self._connections, args):
+            connection.send((name, tuple(a)))
+        results = [connection.recv() for connection in self._connections]
+        for result in results:
+            if isinstance(result, RemoteError):
+                raise result
+        return results
+
+    def close(self):
+        """Stop serving the objects, and wait for the local processes."""
+        for connection in self._connections:
+            connection.send(None)
+            connection.close()
+        for process in self._processes:
+            process.join()
+        self._connections, self._processes = [], []
+
+def process_objects(objects):
+    """
+    The objects, each in a new (daemon) process of this machine.
+
+    :rtype: RemoteObjects
+    """
+    connections, processes = [], []
+    for obj in objects:
+        connection, child_connection = Pipe()
+        process = Process(target=_serve, args=(child_connection,))
+        process.daemon = True
+        process.start()
+        connection.send(obj)
+        connections.append(connection)
+        processes.append(process)
+    return RemoteObjects(connections, processes)
+
+def _check_authkey(authkey):
+    # without a key, multiprocessing skips the authentication, and anyone
+    # reaching the port could have their pickles loaded
+    if not authkey:
+        raise ValueError("an authkey is required for the connections of remote objects")
+
+def socket_objects(objects, addresses, authkey):
+    """
+    The objects, each in the process listening at one of the addresses,
+    e.g. on other machines (see serve).
+
+    :param addresses: the (host, port) of the processes, one for each object
+    :param authkey: the key of the processes, a non empty string
+    :rtype: RemoteObjects
+    """
+    _check_authkey(authkey)
+    assert len(objects) == len(addresses)
+    connections = []
+    for obj, address in zip(objects, addresses):
+        connection = Client(address, authkey=authkey)
+        connection.send(obj)
+        connections.append(connection)
+    return RemoteObjects(connections)
+
+def serve(authkey, address=('localhost', 6000)):
+    """
+    Serve the objects sent by socket_objects at address, one at a time,
+    forever, e.g. on each of the machines running a distributed model::
+
+        python -c "import GPy; GPy.util.parallel.serve('secret', ('192.168.0.2', 6000))"
+
+    The connections are authenticated by the authkey, which is required,
+    but not encrypted: the objects are unpickled, so that only trusted
+    networks should be used. Clients which fail the authentication are
+    turned away before anything they send is unpickled.
+
+    :param authkey: the key of the clients, a non empty string
+    :param address: the (host, port) to listen at, a port of localhost by default
+    """
+    _check_authkey(authkey)
+    listener = Listener(address, authkey=authkey)
+    try:
+        while True:
+            try:
+                connection = listener.accept()
+            except (AuthenticationError, EOFError, IOError):
+                # a client without the key, or which went away
+                continue
+            try:
+                _serve(connection)
+            except (EOFError, IOError):
+                # the client went away
+                pass
+    finally:
+        listener.close()
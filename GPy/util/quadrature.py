@@ -0,0 +1,47 @@
+# Copyright (c) 2013, GPy authors (see AUTHORS.txt).
+# Licensed under the BSD 3-clause license (see LICENSE.txt)
+
+"""
+Quadrature rules for expectations under the standard normal distribution:
+E[f(xi)] ~= sum_p weights_p f(xi_p), for xi ~ N(0, I).
+"""
+
+import numpy as np
+import itertools
+
+def gauss_hermite(input_dim, degree):
+    """
+    The tensor Gauss-Hermite grid with degree nodes in each dimension, exact
+    for polynomials of degree up to 2*degree - 1 in each dimension.
+
+    :param input_dim: the number of dimensions
+    :type input_dim: int
+    :param degree: the number of nodes in each dimension
+    :type degree: int
+    :returns: the nodes (degree**input_dim x input_dim) and the weights
+    """
+    x, w = np.polynomial.hermite.hermgauss(degree)
+    # hermgauss is for the weight function exp(-x^2)
+    x, w = np.sqrt(2.) * x, w / np.sqrt(np.pi)
+    nodes = np.array(list(itertools.product(x, repeat=input_dim))).reshape(-1, input_dim)
+    weights = np.array([np.prod(ws) for ws in itertools.product(w, repeat=input_dim)])
+    return nodes, weights
+
+def unscented(input_dim, kappa=None):
+    """
+    The 2*input_dim + 1 sigma points of the unscented transform, exact for
+    polynomials of degree up to 3.
+
+    :param input_dim: the number of dimensions
+    :type input_dim: int
+    :param kappa: the spread of the points, 3 - input_dim by default (which
+                  also matches the fourth moments), bounded below by 0 so
+                  that the weights are non negative
+    :returns: the nodes (2*input_dim+1 x input_dim) and the weights
+    """
+    if kappa is None:
+        kappa = max(3. - input_dim, 0.)
+    scale = np.sqrt(input_dim + kappa)
+    nodes = np.vstack((np.zeros((1, input_dim)), scale * np.eye(input_dim), -scale * np.eye(input_dim)))
+    weights = np.hstack((kappa, 0.5 * np.ones(2 * input_dim))) / (input_dim + kappa)
+    return nodes, weights
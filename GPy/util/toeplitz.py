@@ -0,0 +1,159 @@
+# Copyright (c) 2013, GPy authors (see AUTHORS.txt).
+# Licensed under the BSD 3-clause license (see LICENSE.txt)
+
+"""
+Fast linear algebra with (multi-level) Toeplitz matrices, the covariance
+matrices of stationary kernels on regular grids.
+
+A grid has shape (n_1, ..., n_D), its points being listed in row-major
+order. The matrix is defined by its values t at all the lags between the
+points of the grid, -(n_d - 1), ..., n_d - 1 in each dimension, which are
+listed in the order of the circulant embedding (see embedding_lags).
+Products with the matrix are computed by FFTs of the embedding in
+O(N log N); the embedding is padded with zeros to sizes which are powers
+of two, for which FFTs are fast.
+"""
+
+import numpy as np
+
+def _axes(shape):
+    return range(len(shape))
+
+def _is_smooth(n):
+    for p in [2, 3, 5, 7]:
+        while n % p == 0:
+            n //= p
+    return n == 1
+
+def _fft(X, axis, inverse=False):
+    """
+    The (inverse) FFT of X along axis. Sizes with large prime factors, for
+    which np.fft is quadratic, use Bluestein's algorithm: the DFT is a
+    convolution with a chirp, computed by FFTs of a power of two size.
+    """
+    n = X.shape[axis]
+    if _is_smooth(n):
+        return np.fft.ifft(X, axis=axis) if inverse else np.fft.fft(X, axis=axis)
+    sign = 1. if inverse else -1.
+    k = np.arange(n)
+    chirp = np.exp(sign * 1j * np.pi * (k ** 2 % (2 * n)) / n)
+    m = 2 ** int(np.ceil(np.log2(2 * n - 1)))
+    X = np.rollaxis(X, axis, 0)
+    expand = (slice(None),) + (None,) * (X.ndim - 1)
+    a = np.zeros((m,) + X.shape[1:], dtype=np.complex)
+    a[:n] = X * chirp[expand]
+    b = np.zeros(m, dtype=np.complex)
+    b[:n] = np.conj(chirp)
+    b[m - n + 1:] = np.conj(chirp[1:])[::-1]
+    F = np.fft.ifft(np.fft.fft(a, axis=0) * np.fft.fft(b)[expand], axis=0)[:n] * chirp[expand]
+    if inverse:
+        F /= n
+    return np.rollaxis(F, 0, axis + 1)
+
+def _fftn(X, axes, inverse=False):
+    for axis in axes:
+        X = _fft(X, axis, inverse)
+    return X
+
+def _embedding_index(shape):
+    """
+    The sizes of the padded embedding, and the positions in it of the
+    values listed at embedding_lags(shape), for np.ix_.
+    """
+    sizes = [2 ** int(np.ceil(np.log2(2 * n - 1))) for n in shape]
+    index = [np.hstack((np.arange(n), np.arange(m - n + 1, m))) for n, m in zip(shape, sizes)]
+    return sizes, index
+
+def embedding_lags(shape):
+    """
+    The lags of the circulant embedding of a Toeplitz matrix over a grid:
+    along each dimension, 0, 1, ..., n_d - 1, -(n_d - 1), ..., -1.
+
+    :param shape: the shape of the grid
+    :rtype: np.ndarray of int, prod(2 n_d - 1) x D
+    """
+    lags = [np.hstack((np.arange(n), np.arange(1 - n, 0))) for n in shape]
+    return np.array([l.flatten() for l in np.broadcast_arrays(*np.ix_(*lags))]).T
+
+def bttb_eig(t, shape):
+    """
+    The eigenvalues of the circulant embedding of a (block) Toeplitz matrix.
+
+    :param t: the values of the matrix at embedding_lags(shape)
+    :param shape: the shape of the grid
+    :rtype: np.ndarray, of the shape of the padded embedding
+    """
+    sizes, index = _embedding_index(shape)
+    C = np.zeros(sizes)
+    C[np.ix_(*index)] = t.reshape([2 * n - 1 for n in shape])
+    return np.real(np.fft.fftn(C))
+
+def bttb_dot(eig, shape, V):
+    """
+    The product of a (block) Toeplitz matrix with V.
+
+    :param eig: the eigenvalues of the circulant embedding, see bttb_eig
+    :param shape: the shape of the grid
+    :param V: the matrix to multiply
+    :type V: np.ndarray, N x k
+    :rtype: np.ndarray, N x k
+    """
+    k = V.shape[1]
+    padded = np.zeros(list(eig.shape) + [k])
+    grid = [slice(0, n) for n in shape]
+    padded[grid] = V.reshape(list(shape) + [k])
+    # the input is real: only half of the last transformed axis is needed
+    half = [slice(None)] * (len(shape) - 1) + [slice(0, eig.shape[-1] // 2 + 1)]
+    TV = np.fft.irfftn(np.fft.rfftn(padded, axes=_axes(shape)) * eig[half][..., None], eig.shape, axes=_axes(shape))
+    return TV[grid].reshape(-1, k)
+
+def chan_eig(t, shape):
+    """
+    The eigenvalues of T. Chan's optimal circulant approximation of a
+    (block) Toeplitz matrix, a preconditioner for it.
+
+    :param t: the values of the matrix at embedding_lags(shape)
+    :param shape: the shape of the grid
+    :rtype: np.ndarray, n_1 x ... x n_D
+    """
+    C = t.reshape([2 * n - 1 for n in shape])
+    for d, n in enumerate(shape):
+        # c_k = ((n - k) t_k + k t_{k - n}) / n
+        k = np.arange(n).reshape([-1 if e == d else 1 for e in range(len(shape))])
+        C = ((n - k) * C.take(np.arange(n), axis=d) + k * C.take(np.arange(n - 1, 2 * n - 1), axis=d)) / float(n)
+    return np.real(_fftn(C, _axes(shape)))
+
+def circulant_dot(eig, R):
+    """
+    The product of a circulant matrix (over a grid of shape eig.shape) with
+    R, e.g. circulant_dot(1. / eig, R) solves the circulant system.
+
+    :param eig: the eigenvalues of the circulant matrix
+    :param R: the matrix to multiply
+    :type R: np.ndarray, N x k
+    """
+    k = R.shape[1]
+    axes = _axes(eig.shape)
+    CR = _fftn(_fftn(R.reshape(list(eig.shape) + [k]), axes) * eig[..., None], axes, inverse=True)
+    return np.real(CR).reshape(-1, k)
+
+def lag_sums(A, B, shape):
+    """
+    The sums of the entries of A B^T over each lag: W such that
+    sum_ij (A B^T)_ij f(x_i - x_j) = sum_lags W[lag] f(lag) on the grid.
+
+    This gives the gradient of trace(dL_dK K) for a low rank dL_dK = A B^T
+    from the gradients of the values of the Toeplitz matrix K at each lag.
+
+    :param A, B: the factors of the matrix, N x k
+    :param shape: the shape of the grid
+    :returns: W, at embedding_lags(shape)
+    """
+    k = A.shape[1]
+    sizes, index = _embedding_index(shape)
+    grid = [slice(0, n) for n in shape]
+    FA, FB = np.zeros(sizes + [k]), np.zeros(sizes + [k])
+    FA[grid], FB[grid] = A.reshape(list(shape) + [k]), B.reshape(list(shape) + [k])
+    FA, FB = np.fft.rfftn(FA, axes=_axes(shape)), np.fft.rfftn(FB, axes=_axes(shape))
+    W = np.fft.irfftn(np.sum(FA * np.conj(FB), -1), sizes)
+    return W[np.ix_(*index)].flatten()